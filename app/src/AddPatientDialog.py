@@ -1,13 +1,35 @@
-import os
-from PyQt5 import uic
-from PyQt5.QtWidgets import QDialog, QPushButton, QLineEdit, QPlainTextEdit, QComboBox, QDateEdit, QMessageBox
-from DB import insert_patient  # uses your 3-step insert (parties/persons/patients)
+from PyQt5.QtCore import Qt, QDate, QTimer
+from PyQt5.QtWidgets import (
+    QDialog, QPushButton, QLineEdit, QPlainTextEdit, QComboBox, QDateEdit, QMessageBox, QLabel, QListWidget
+)
+from UiLoader import load_ui
+from DB import insert_patient, validate_patient  # uses your 3-step insert (parties/persons/patients)
+from DbWorker import default_executor
+
+DEDUPE_DEBOUNCE_MS = 300  # look for duplicates once typing pauses
 
 class AddPatientDialog(QDialog):
-    def __init__(self):
+    """
+    Add/Edit patient form. `save(data)` runs off the GUI thread when Submit is
+    pressed (default: insert_patient); its return value ends up in `saved_result`.
+    With a Dedupe.DedupeIndex, likely duplicates are listed while the form is
+    filled in, and saving one of them needs a confirmation.
+
+    One instance can serve every Add and Edit: reset() empties the form (and
+    fill() loads a patient) instead of building the widgets again.
+    """
+
+    def __init__(self, save=insert_patient, executor=None, dedupe=None):
         super().__init__()
-        ui_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "ui", "add_patient_dialog.ui"))
-        uic.loadUi(ui_path, self)
+        self._save = save
+        self._executor = executor or default_executor()
+        self._dedupe = dedupe
+        self._duplicates = []  # candidates for the form as last checked
+        self._lookup = None  # DbCall of the duplicate check in flight
+        self._session = 0  # bumped by reset(): a save answers only the Add/Edit that started it
+        self._saving = False  # a save is in flight: the dialog stays open until it answers
+        self.saved_result = None
+        load_ui(self, "add_patient_dialog")
 
         # Find widgets by objectName (Designer must match these names)
         self.btnSubmit = self.findChild(QPushButton,  "btnSubmit")
@@ -19,8 +41,8 @@ class AddPatientDialog(QDialog):
         self.comboGender = self.findChild(QComboBox,    "comboGender")
         self.lineEditPhone = self.findChild(QLineEdit,    "lineEditPhone")
         self.plainTextAddress = self.findChild(QPlainTextEdit, "plainTextAddress")
-
-
+        self.labelDuplicates = self.findChild(QLabel, "labelDuplicates")
+        self.listDuplicates = self.findChild(QListWidget, "listDuplicates")
 
         self.btnSubmit.clicked.connect(self._on_submit)
         self.btnCancel.clicked.connect(self.reject)
@@ -29,25 +51,83 @@ class AddPatientDialog(QDialog):
         if self.dateEditBirth:
             self.dateEditBirth.setCalendarPopup(True)
 
-    def _validate(self) -> bool:
-        """Basic validation before hitting DB."""
-        fn = (self.lineEditFirstName.text() if self.lineEditFirstName else "").strip()
-        ln = (self.lineEditLastName.text() if self.lineEditLastName else "").strip()
-        nid = (self.lineEditNationalID.text() if self.lineEditNationalID else "").strip()
+        # Duplicate check: debounced, in the background, never blocks typing
+        self._dedupeTimer = QTimer(self)
+        self._dedupeTimer.setSingleShot(True)
+        self._dedupeTimer.setInterval(DEDUPE_DEBOUNCE_MS)
+        self._dedupeTimer.timeout.connect(self._check_duplicates)
+        for w in (self.lineEditFirstName, self.lineEditLastName, self.lineEditNationalID, self.lineEditPhone):
+            w.textChanged.connect(lambda *_: self._on_edited())
+        self.dateEditBirth.dateChanged.connect(lambda *_: self._on_edited())
 
-        if not fn or not ln or not nid:
-            QMessageBox.warning(self, "Validation", "First name, Last name and National ID are required.")
-            return False
+        # the form as Designer left it, restored by reset()
+        self._title = self.windowTitle()
+        self._birth_default = self.dateEditBirth.date()
+        self._warm_up()
 
-        # Simple phone/national id checks can be added as needed
-        return True
+    def reset(self, save=insert_patient, dedupe=None, title=None):
+        """Empty the form for the next Add (or, followed by fill(), the next Edit)."""
+        self._save = save
+        self._dedupe = dedupe
+        self._session += 1
+        self.saved_result = None
+        self.setWindowTitle(title or self._title)
+        self.lineEditFirstName.clear()
+        self.lineEditLastName.clear()
+        self.lineEditNationalID.clear()
+        self.dateEditBirth.setDate(self._birth_default)
+        self.comboGender.setCurrentIndex(0)
+        self.lineEditPhone.clear()
+        self.plainTextAddress.clear()
+        self._set_saving(False)
+        self._drop_duplicates()
+        self.lineEditFirstName.setFocus()
+        self._warm_up()
 
-    def _on_submit(self):
-        """Collect form values, insert into DB, and close with Accepted."""
-        if not self._validate():
-            return
+    def fill(self, p: dict):
+        """Load a patient record (DB.get_patient_by_id shape) into the form."""
+        self.lineEditFirstName.setText(p["FirstName"] or "")
+        self.lineEditLastName.setText(p["LastName"] or "")
+        self.lineEditNationalID.setText(p["NationalID"] or "")
+        if p["BirthDate"]:
+            self.dateEditBirth.setDate(QDate.fromString(str(p["BirthDate"]), "yyyy-MM-dd"))
+        idx = self.comboGender.findText((p["Gender"] or "").strip(), Qt.MatchFixedString)
+        if idx >= 0:
+            self.comboGender.setCurrentIndex(idx)
+        self.lineEditPhone.setText(p["Phone"] or "")
+        self.plainTextAddress.setPlainText(p["Address"] or "")
+        self._drop_duplicates()  # a loaded record is not a new duplicate
+
+    def _warm_up(self):
+        if self._dedupe is not None:
+            self._executor.submit(self._dedupe.ensure_fresh, key="dedupe_index")  # warm up while the form opens
+
+    def _on_edited(self):
+        if self._dedupe is not None:
+            self._dedupeTimer.start()
+
+    def _drop_duplicates(self):
+        self._dedupeTimer.stop()
+        if self._lookup is not None:
+            self._lookup.cancel()
+            self._lookup = None
+        self._show_duplicates([])
+
+    def _validate(self) -> bool:
+        """Basic validation before hitting DB (same rules as bulk import)."""
+        error = validate_patient({
+            "FirstName": self.lineEditFirstName.text() if self.lineEditFirstName else "",
+            "LastName": self.lineEditLastName.text() if self.lineEditLastName else "",
+            "NationalID": self.lineEditNationalID.text() if self.lineEditNationalID else "",
+        })
+        if error:
+            QMessageBox.warning(self, "Validation", error)
+            return False
+        return True
 
-        data = {
+    def collect_data(self) -> dict:
+        """Form values as the dict DB.insert_patient / update_patient expect."""
+        return {
             "FirstName": self.lineEditFirstName.text().strip(),
             "LastName": self.lineEditLastName.text().strip(),
             "NationalID": self.lineEditNationalID.text().strip(),
@@ -57,9 +137,65 @@ class AddPatientDialog(QDialog):
             "Address": self.plainTextAddress.toPlainText().strip() if self.plainTextAddress else "",
         }
 
-        try:
-            new_id = insert_patient(data)   # returns patient_id
-            QMessageBox.information(self, "Success", f"Patient added (ID={new_id}).")
-            self.accept()
-        except Exception as e:
-            QMessageBox.critical(self, "DB Error", str(e))
+    def _check_duplicates(self):
+        if self._lookup is not None:
+            self._lookup.cancel()  # superseded by the form as it is now
+            self._lookup = None
+        data = self.collect_data()
+        if not (data["LastName"] and (data["FirstName"] or data["Phone"])):
+            self._show_duplicates([])
+            return
+        self._lookup = self._executor.submit(self._dedupe.candidates, data,
+                                             on_result=self._show_duplicates,
+                                             on_error=lambda e: self._show_duplicates([]))  # advisory only
+
+    def _show_duplicates(self, candidates):
+        self._duplicates = candidates
+        self.listDuplicates.clear()
+        for score, (pid, first, last, national_id, dob, phone), reasons in candidates:
+            self.listDuplicates.addItem(f"#{pid}  {first} {last}  ID {national_id}  DOB {dob or '-'}  "
+                                        f"phone {phone or '-'}   ({score:.0%}: {', '.join(reasons)})")
+        self.labelDuplicates.setVisible(bool(candidates))
+        self.listDuplicates.setVisible(bool(candidates))
+
+    def _on_submit(self):
+        """Validate, save in the background, and close with Accepted once it succeeds."""
+        if not self._validate():
+            return
+        if self._duplicates:
+            pid, first, last = self._duplicates[0][1][:3]
+            answer = QMessageBox.question(
+                self, "Possible Duplicate",
+                f"This looks like existing patient #{pid} ({first} {last}).\nSave a new patient anyway?",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if answer != QMessageBox.Yes:
+                return
+
+        self._set_saving(True)  # no double submit, and no cancel of a save that may still commit
+        session = self._session
+        self._executor.submit(self._save, self.collect_data(),
+                              on_result=lambda result: self._on_saved(session, result),
+                              on_error=lambda e: self._on_save_failed(session, e))
+
+    def _set_saving(self, saving: bool):
+        self._saving = saving
+        self.btnSubmit.setEnabled(not saving)
+        self.btnCancel.setEnabled(not saving)
+
+    def _on_saved(self, session, result):
+        if session != self._session:
+            return  # the answer of an earlier Add/Edit
+        self._set_saving(False)
+        self.saved_result = result
+        self.accept()
+
+    def _on_save_failed(self, session, e):
+        if session != self._session:
+            return
+        self._set_saving(False)
+        QMessageBox.critical(self, "DB Error", str(e))
+
+    def reject(self):
+        if self._saving:
+            return  # Esc or the title bar's close: the save in flight decides how the dialog ends
+        super().reject()
@@ -0,0 +1,154 @@
+"""
+Thin-client side of ApiServer.py: DB.py operations as HTTP calls.
+
+With HMS_DB_DRIVER=api, DB.py calls install() on itself as it is imported: every
+function in ApiProtocol.OPERATIONS is replaced by a stub that calls the service
+at HMS_API_URL (default http://127.0.0.1:8765; https:// verifies the service's
+certificate, against HMS_API_CA if set). Anything else that needs a connection
+(export, bulk import, reports) is not available in this mode.
+Each DbWorker thread keeps its own keep-alive connection to the service.
+Every request carries the shared secret HMS_API_TOKEN, and the session the
+login (verify_user_password_plain) opened. Sessions live in the service's memory:
+when a call is refused for want of one (the service restarted, or the session
+idled out) the client logs in again with the same credentials and retries once.
+"""
+import http.client
+import json
+import os
+import ssl
+import threading
+import time
+from urllib.parse import urlsplit
+
+from ApiProtocol import (
+    DEFAULT_PORT, ERRORS, IDLE_SECONDS, OPERATIONS, ApiError, call_body, decode
+)
+
+RETRIES = 4           # attempts after a 503 (reads also after a dropped connection)
+TIMEOUT_SECONDS = 60.0
+
+
+class ApiClient:
+    def __init__(self, url=None, timeout=TIMEOUT_SECONDS, token=None):
+        parts = urlsplit(url or os.environ.get("HMS_API_URL") or f"http://127.0.0.1:{DEFAULT_PORT}")
+        self.host, self.port = parts.hostname, parts.port or DEFAULT_PORT
+        self.timeout = timeout
+        self._tls = ssl.create_default_context(cafile=os.environ.get("HMS_API_CA")) if parts.scheme == "https" else None
+        self._headers = {"Content-Type": "application/json",
+                         "Authorization": f"Bearer {token or os.environ.get('HMS_API_TOKEN', '')}"}
+        self._local = threading.local()  # (connection, last used) per thread
+        self._login = None               # (op, args, kwargs) of the last successful login
+        self._login_lock = threading.Lock()
+
+    def _connection(self):
+        conn, used = getattr(self._local, "conn", (None, 0.0))
+        if conn is not None and time.monotonic() - used > IDLE_SECONDS / 2:
+            conn.close()  # the server may be about to drop it; a fresh one avoids a failed write
+            conn = None
+        if conn is None:
+            if self._tls is not None:
+                conn = http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self._tls)
+            else:
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def _drop(self):
+        conn, _ = getattr(self._local, "conn", (None, 0.0))
+        if conn is not None:
+            conn.close()
+        self._local.conn = (None, 0.0)
+
+    def request(self, method, path, body=None, retry_dropped=True):
+        """(status, decoded JSON) of one request; 503s are retried after Retry-After."""
+        for attempt in range(RETRIES + 1):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body, self._headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (OSError, http.client.HTTPException) as e:
+                self._drop()
+                if not retry_dropped or attempt == RETRIES:
+                    raise ApiError(f"API service at {self.host}:{self.port} unreachable: {e}") from e
+                continue
+            self._local.conn = (conn, time.monotonic())
+            if resp.status == 503 and attempt < RETRIES:
+                time.sleep(float(resp.getheader("Retry-After") or 1) * (attempt + 1))
+                continue
+            return resp.status, json.loads(data)
+
+    def call(self, op, *args, **kwargs):
+        """Run one ApiProtocol operation on the service and return its result."""
+        kind = OPERATIONS[op].kind
+        session = self._headers.get("X-HMS-Session")
+        body = call_body(args, kwargs)
+        # a write whose connection dropped may have run: it is not sent twice
+        status, payload = self.request("POST", f"/v1/{op}", body, retry_dropped=kind != "write")
+        if status == 401 and kind != "login" and self._relogin(session):
+            # refused before it ran, so a write is safe to send again
+            status, payload = self.request("POST", f"/v1/{op}", body, retry_dropped=kind != "write")
+        if status == 200:
+            if payload.get("session"):  # a login: later calls run as the user who logged in
+                self._headers = {**self._headers, "X-HMS-Session": payload["session"]}
+                self._login = (op, args, kwargs)
+            return decode(payload["result"])
+        error = payload.get("error") or {}
+        raise ERRORS.get(error.get("type"), ApiError)(error.get("message") or f"HTTP {status}")
+
+    def _relogin(self, session) -> bool:
+        """After a 401 on `session`: log in again (once for all threads); True if a new session is held."""
+        with self._login_lock:
+            if self._login is None:
+                return False
+            if self._headers.get("X-HMS-Session") != session:
+                return True  # another thread already logged in again
+            op, args, kwargs = self._login
+            status, payload = self.request("POST", f"/v1/{op}", call_body(args, kwargs))
+            if status != 200 or not payload.get("session"):
+                self._login = None  # the credentials no longer work
+                return False
+            self._headers = {**self._headers, "X-HMS-Session": payload["session"]}
+            return True
+
+    def stats(self) -> dict:
+        status, payload = self.request("GET", "/v1/stats")
+        return decode(payload["result"])
+
+
+class RemoteDedupe:
+    """Dedupe.DedupeIndex look-alike for the add-patient form, answered by the service's shared index."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def ensure_fresh(self, max_age=None):
+        pass  # the service keeps its index current
+
+    def candidates(self, data: dict, exclude_id: int = None, limit: int = 5):
+        return self._client.call("dedupe_candidates", data, exclude_id, limit)
+
+
+_client = None
+
+
+def default_client() -> ApiClient:
+    global _client
+    if _client is None:
+        _client = ApiClient()
+    return _client
+
+
+def install(namespace: dict, client: ApiClient = None):
+    """Replace the OPERATIONS functions in `namespace` (DB.py's globals) with remote stubs."""
+    client = client or default_client()
+    ERRORS["ConcurrencyError"] = namespace["ConcurrencyError"]
+
+    def stub(op, local):
+        def remote(*args, **kwargs):
+            return client.call(op, *args, **kwargs)
+        remote.__name__, remote.__doc__ = op, local.__doc__
+        return remote
+
+    for op in OPERATIONS:
+        if callable(namespace.get(op)):
+            namespace[op] = stub(op, namespace[op])
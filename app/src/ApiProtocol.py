@@ -0,0 +1,148 @@
+"""
+What ApiServer.py serves and ApiClient.py calls: the operation table and the JSON encoding.
+
+Every operation is a DB.py function (or a shared object on the server, like
+the duplicate index) called as POST /v1/<name> with {"args": [...], "kwargs": {...}}.
+The answer is {"result": ...}, or {"error": {"type": ..., "message": ...}} with a
+4xx/5xx status. Requests carry "Authorization: Bearer <shared secret>" and, for all
+but the login, "X-HMS-Session: <id>" from the login's answer {"result": ..., "session": ...}. Values keep their Python types across the wire: tuples,
+dates, datetimes, Decimals and bytes (SQL Server rowversions) are tagged.
+"""
+import base64
+import json
+from collections import namedtuple
+from datetime import date, datetime, time
+from decimal import Decimal
+
+# kind: "read" (identical calls in flight at once share one execution), "write", or
+# "login" (never shared; a successful one opens the session the other operations need);
+# ttl: seconds a read's answer is served from the server's shared cache (0: never cached)
+Operation = namedtuple("Operation", "kind ttl")
+READ, WRITE, LOGIN = Operation("read", 0), Operation("write", 0), Operation("login", 0)
+
+OPERATIONS = {
+    # patients (get/search/insert/update go through the server's PatientCache)
+    "list_patients_page": READ,
+    "search_patients": READ,
+    "get_patient_by_id": READ,
+    "get_patient_row_version": READ,
+    "insert_patient": WRITE,
+    "insert_patients_bulk": WRITE,
+    "update_patient": WRITE,
+    "patient_change_watermark": READ,
+    "list_patient_changes": READ,
+    "prune_patient_changes": WRITE,
+    "get_patient_timeline": READ,
+    "list_timeline_section": READ,
+    "search_clinical": READ,
+    # scheduling
+    "list_specializations": Operation("read", 300),
+    "list_doctors": Operation("read", 300),
+    "list_booked_appointments": READ,
+    "book_appointment": WRITE,
+    # pharmacy
+    "list_medicines": Operation("read", 300),
+    "list_dispensable_batches": READ,
+    "list_medicine_stock": READ,
+    "list_near_expiry": READ,
+    "dispense_stock": WRITE,
+    "receive_batch": WRITE,
+    # reports (Reports.Dashboard refreshes through the server like any desk)
+    "refresh_report_rollups": WRITE,
+    "get_report_dashboard": READ,
+    "get_report_version": READ,
+    # users and audit (the first user is seeded on the server's machine, not over the API;
+    # audit rows get the session's user and the server's time)
+    "verify_user_password_plain": LOGIN,
+    "insert_audit_logs": WRITE,
+    # the server's own state
+    "pool_stats": READ,
+    "query_snapshot": READ,
+    "dedupe_candidates": READ,  # Dedupe.DedupeIndex.candidates on the server's shared index
+}
+
+DEFAULT_PORT = 8765
+MAX_BODY = 8 * 1024 * 1024  # bytes per request (bulk inserts included)
+IDLE_SECONDS = 60.0         # the server closes keep-alive connections idle this long
+
+
+class ApiError(RuntimeError):
+    """The service could not be reached, refused the call (overload) or failed in an unexpected way."""
+
+
+class IntegrityError(ApiError):
+    """The server's database refused the rows (a constraint); named like the DB-API class for DB.is_data_error."""
+
+
+class DataError(ApiError):
+    """The server's database refused a value (it does not fit its column); see IntegrityError."""
+
+
+# error "type" -> exception class the client raises; DB.ConcurrencyError is added by ApiClient.install
+ERRORS = {"ValueError": ValueError, "KeyError": KeyError, "LookupError": LookupError, "TypeError": TypeError,
+          "PermissionError": PermissionError, "IntegrityError": IntegrityError, "DataError": DataError}
+
+
+def encode(value):
+    """Python value -> JSON-ready value (see decode)."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, tuple):
+        return {"$t": [encode(v) for v in value]}
+    if isinstance(value, list):
+        return [encode(v) for v in value]
+    if isinstance(value, dict):
+        if all(isinstance(k, str) and not k.startswith("$") for k in value):
+            return {k: encode(v) for k, v in value.items()}
+        return {"$m": [[encode(k), encode(v)] for k, v in value.items()]}
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"$d": value.isoformat()}
+    if isinstance(value, time):
+        return {"$tm": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"$dec": str(value)}
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"$b": base64.b64encode(bytes(value)).decode("ascii")}
+    if isinstance(value, (set, frozenset)):
+        return {"$s": [encode(v) for v in value]}
+    raise TypeError(f"cannot send {type(value).__name__} over the API")
+
+
+_TAGS = {
+    "$t": lambda v: tuple(decode(x) for x in v),
+    "$m": lambda v: {decode(k): decode(x) for k, x in v},
+    "$dt": datetime.fromisoformat,
+    "$d": date.fromisoformat,
+    "$tm": time.fromisoformat,
+    "$dec": Decimal,
+    "$b": base64.b64decode,
+    "$s": lambda v: {decode(x) for x in v},
+}
+
+
+def decode(value):
+    """Inverse of encode."""
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    if isinstance(value, dict):
+        if len(value) == 1:
+            (tag, inner), = value.items()
+            if tag in _TAGS:
+                return _TAGS[tag](inner)
+        return {k: decode(v) for k, v in value.items()}
+    return value
+
+
+def dumps(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def call_body(args=(), kwargs=None) -> bytes:
+    """Request body of one operation call."""
+    return dumps({"args": encode(list(args)), "kwargs": encode(kwargs or {})})
+
+
+def error_body(e: BaseException) -> bytes:
+    return dumps({"error": {"type": type(e).__name__, "message": str(e)}})
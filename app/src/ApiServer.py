@@ -0,0 +1,345 @@
+"""
+Headless HTTP/JSON service in front of DB.py, shared by many desktop clients.
+
+    HMS_API_TOKEN=... python app/src/ApiServer.py                # 127.0.0.1:8765, backend from HMS_DB_DRIVER
+    python app/src/ApiServer.py --token-file /etc/hms/api_token --host 0.0.0.0 \
+        --tls-cert /etc/hms/api.pem --tls-key /etc/hms/api.key    # the desks of the network, over TLS
+    HMS_DB_DRIVER=api HMS_API_URL=https://hms-api:8765 HMS_API_TOKEN=... python app/src/HMS.py   # thin client
+
+One asyncio loop takes the requests; DB calls run on `workers` threads over the
+one shared connection pool, so 150 desks hold `workers` DB connections instead
+of 150 times the pool. Reads that are identical and in flight at the same time
+share one execution, patient records come from one shared PatientCache, and
+reference lists are cached for a few minutes (ApiProtocol.OPERATIONS).
+Backpressure: at most `max_pending` calls queue for a worker and further ones
+get 503 with Retry-After; slow readers are throttled by the socket buffers.
+
+Every request carries the installation's shared secret (Authorization: Bearer),
+and every operation but the login needs the session that login opened
+(X-HMS-Session). Audit rows are stamped here with the session's user and the
+server's clock, whatever the client sent. Beyond the loopback interface the
+service only runs with TLS (--tls-cert/--tls-key); to terminate TLS in a reverse
+proxy instead, bind 127.0.0.1 and let the proxy forward to it.
+"""
+import argparse
+import asyncio
+import functools
+import hmac
+import ipaddress
+import json
+import os
+import secrets
+import signal
+import ssl
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import DB
+from ApiProtocol import (
+    DEFAULT_PORT, IDLE_SECONDS, MAX_BODY, OPERATIONS, decode, dumps, encode, error_body
+)
+from Dedupe import DedupeIndex
+from PatientCache import patient_cache
+
+LATENCY_SAMPLES = 10_000  # recent request times kept for /v1/stats percentiles
+SESSION_IDLE_SECONDS = 12 * 3600  # a login's session ends after this long without a call
+REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class Overloaded(Exception):
+    """More calls are waiting for a worker than max_pending allows."""
+
+
+class ApiServer:
+    def __init__(self, token, workers=None, max_pending=None, max_connections=1024, coalesce=True, cache=True):
+        if not token:
+            raise ValueError("the API service needs a shared secret (HMS_API_TOKEN or --token-file)")
+        self._authorization = f"Bearer {token}".encode("utf-8")
+        self.workers = workers or DB.POOL_OPTIONS["max_size"]
+        self.max_pending = max_pending or self.workers * 16
+        self.max_connections = max_connections
+        self.coalesce = coalesce
+        self.cache = cache
+        self._threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="api-db")
+        self._dedupe = DedupeIndex()
+        self._handlers = {  # operations served from shared objects rather than straight from DB.py
+            "get_patient_by_id": patient_cache.get_patient,
+            "search_patients": patient_cache.search_patients,
+            "insert_patient": patient_cache.insert_patient,
+            "insert_patients_bulk": patient_cache.insert_patients_bulk,
+            "update_patient": patient_cache.update_patient,
+            "dedupe_candidates": self._dedupe.candidates,
+        }
+        self._user_handlers = {  # operations that take the session's user as their first argument
+            "insert_audit_logs": self._insert_audit_logs,
+        }
+        self._sessions = {}    # session id -> [user id, monotonic time it expires]
+        self._sessions_lock = threading.Lock()
+        self._inflight = {}    # (generation, op, body) -> future of the encoded answer
+        self._generation = 0   # bumped by every write: later reads do not join earlier ones
+        self._cached = {}      # (op, body) -> (expires, encoded answer)
+        self._pending = 0      # calls admitted and not finished (coalesced followers excluded)
+        self._connections = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.counters = {"requests": 0, "executed": 0, "coalesced": 0, "cache_hits": 0, "rejected": 0,
+                         "errors": 0, "unauthorized": 0}
+
+    # ---------- sessions ----------
+    def _open_session(self, user_id) -> str:
+        session = secrets.token_urlsafe(32)
+        with self._sessions_lock:
+            self._sessions[session] = [user_id, time.monotonic() + SESSION_IDLE_SECONDS]
+        return session
+
+    def session_user(self, session):
+        """User id of a live session (its idle timer restarts), or None."""
+        now = time.monotonic()
+        with self._sessions_lock:
+            entry = self._sessions.get(session) if session else None
+            if entry is None or entry[1] < now:
+                self._sessions.pop(session, None)
+                return None
+            entry[1] = now + SESSION_IDLE_SECONDS
+            return entry[0]
+
+    @staticmethod
+    def _insert_audit_logs(user_id, rows):
+        """Only the action and record come from the client; who and when are the session's and the server's."""
+        now = datetime.now()
+        return DB.insert_audit_logs([(user_id, action, table_name, record_id, now)
+                                     for _, action, table_name, record_id, *_ in rows])
+
+    # ---------- calls ----------
+    def _run(self, op, body, user_id=None):
+        """Worker thread: decode, call, encode. Returns (status, response body)."""
+        try:
+            request = decode(json.loads(body)) if body else {}
+            args, kwargs = request.get("args", []), request.get("kwargs", {})
+        except ValueError as e:
+            return 400, error_body(e)
+        if op in self._user_handlers:
+            fn = functools.partial(self._user_handlers[op], user_id)
+        else:
+            fn = self._handlers.get(op) or getattr(DB, op)
+        try:
+            result = fn(*args, **kwargs)
+            if OPERATIONS[op].kind == "login":
+                ok, user, message = result
+                if user:  # the client gets who logged in, never the password hash
+                    user = {k: v for k, v in user.items() if k != "password_hash"}
+                return 200, dumps({"result": encode((ok, user, message)),
+                                   "session": self._open_session(user["id"]) if ok else None})
+            return 200, dumps({"result": encode(result)})
+        except Exception as e:
+            return 500, error_body(e)
+
+    async def call(self, op, body, user_id=None):
+        spec = OPERATIONS.get(op)
+        if spec is None:
+            return 404, error_body(LookupError(f"no operation {op!r}"))
+        if spec.kind != "read":  # writes, and the login: never shared or cached
+            if spec.kind == "write":
+                self._generation += 1
+            return await self._execute(op, body, user_id)
+
+        now = time.monotonic()
+        if self.cache and spec.ttl:
+            hit = self._cached.get((op, body))
+            if hit and hit[0] > now:
+                self.counters["cache_hits"] += 1
+                return hit[1]
+        key = (self._generation, op, body)
+        if self.coalesce and key in self._inflight:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(self._inflight[key])
+        future = asyncio.ensure_future(self._execute(op, body))
+        if self.coalesce:
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        answer = await asyncio.shield(future)
+        if self.cache and spec.ttl and answer[0] == 200:
+            self._cached[(op, body)] = (now + spec.ttl, answer)
+        return answer
+
+    async def _execute(self, op, body, user_id=None):
+        if self._pending >= self.max_pending:
+            self.counters["rejected"] += 1
+            raise Overloaded()
+        self._pending += 1
+        self.counters["executed"] += 1
+        try:
+            answer = await asyncio.get_running_loop().run_in_executor(
+                self._threads, functools.partial(self._run, op, body, user_id))
+        finally:
+            self._pending -= 1
+        if answer[0] != 200:
+            self.counters["errors"] += 1
+        return answer
+
+    def stats(self) -> dict:
+        samples = sorted(self._latencies)
+        pct = {f"p{p}_ms": round(samples[min(len(samples) - 1, len(samples) * p // 100)] * 1000, 2) if samples
+               else None for p in (50, 95, 99)}
+        return {**self.counters, **pct, "pending": self._pending, "connections": self._connections,
+                "workers": self.workers, "max_pending": self.max_pending, "pool": DB.pool_stats()}
+
+    # ---------- HTTP ----------
+    def _unauthorized(self, message):
+        self.counters["unauthorized"] += 1
+        return 401, error_body(PermissionError(message))
+
+    async def _request(self, method, path, body, headers):
+        if not hmac.compare_digest(headers.get("authorization", "").encode("utf-8"), self._authorization):
+            return self._unauthorized("missing or wrong API token")
+        parts = [p for p in urlsplit(path).path.split("/") if p]
+        if len(parts) != 2 or parts[0] != "v1":
+            return 404, error_body(LookupError(f"no such path {path!r}"))
+        name = parts[1]
+        if name in ("health", "stats"):
+            if method != "GET":
+                return 405, error_body(ValueError("use GET"))
+            return 200, dumps({"result": encode(self.stats() if name == "stats" else {"ok": True})})
+        if method != "POST":
+            return 405, error_body(ValueError("use POST"))
+        user_id = None
+        if name not in OPERATIONS or OPERATIONS[name].kind != "login":
+            user_id = self.session_user(headers.get("x-hms-session"))
+            if user_id is None:
+                return self._unauthorized("not logged in, or the session expired")
+        return await self.call(name, body, user_id)
+
+    async def _serve(self, reader, writer):
+        """One client connection: HTTP/1.1 requests in turn, kept alive until idle or closed."""
+        self._connections += 1
+        try:
+            if self._connections > self.max_connections:
+                self.counters["rejected"] += 1
+                await self._respond(writer, 503, error_body(Overloaded("too many connections")), keep=False)
+                return
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), IDLE_SECONDS)
+                except asyncio.TimeoutError:
+                    return
+                if not line:
+                    return
+                method, path, version = line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = h.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, error_body(ValueError(f"body over {MAX_BODY} bytes")), False)
+                    return
+                body = await reader.readexactly(length) if length else b""
+                keep = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                t0 = time.perf_counter()
+                self.counters["requests"] += 1
+                try:
+                    status, payload = await self._request(method, path, body, headers)
+                except Overloaded:
+                    await self._respond(writer, 503, error_body(Overloaded("busy, retry later")), keep,
+                                        retry_after=1)
+                    continue
+                self._latencies.append(time.perf_counter() - t0)
+                await self._respond(writer, status, payload, keep)
+                if not keep:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass  # client went away or sent garbage: drop the connection
+        finally:
+            self._connections -= 1
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep, retry_after=None):
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                f"Connection: {'keep-alive' if keep else 'close'}\r\n")
+        if retry_after is not None:
+            head += f"Retry-After: {retry_after}\r\n"
+        writer.write(head.encode("latin-1") + b"\r\n" + payload)
+        await writer.drain()  # a client that does not read stops being served, not the loop
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT, ready=None, tls=None):
+        server = await asyncio.start_server(self._serve, host, port, backlog=self.max_connections, ssl=tls)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):  # Windows: Ctrl+C raises KeyboardInterrupt instead
+                pass
+        if ready:
+            ready(server.sockets[0].getsockname()[:2])
+        async with server:
+            await stop.wait()
+        self._threads.shutdown(wait=True)
+
+
+def _loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--host", default="127.0.0.1",
+                    help="anything but loopback needs --tls-cert/--tls-key")
+    ap.add_argument("--port", type=int, default=int(os.environ.get("HMS_API_PORT", DEFAULT_PORT)))
+    ap.add_argument("--sqlite", metavar="PATH", help="serve this SQLite file instead of HMS_DB_DRIVER's backend")
+    ap.add_argument("--workers", type=int, default=DB.POOL_OPTIONS["max_size"],
+                    help="DB calls at once (= connection pool size)")
+    ap.add_argument("--max-pending", type=int, help="calls waiting for a worker before 503 (default 16 per worker)")
+    ap.add_argument("--max-connections", type=int, default=1024)
+    ap.add_argument("--no-coalesce", action="store_true", help="run every read, even identical concurrent ones")
+    ap.add_argument("--no-cache", action="store_true", help="no shared cache for reference lists")
+    ap.add_argument("--token-file", metavar="PATH", help="shared secret the desks send (default: $HMS_API_TOKEN)")
+    ap.add_argument("--tls-cert", metavar="PEM", help="certificate chain to serve HTTPS with")
+    ap.add_argument("--tls-key", metavar="PEM", help="private key of --tls-cert")
+    args = ap.parse_args(argv)
+
+    token = os.environ.get("HMS_API_TOKEN")
+    if args.token_file:
+        with open(args.token_file, encoding="utf-8") as f:
+            token = f.read().strip()
+    if not token:
+        ap.error("no shared secret: set HMS_API_TOKEN or pass --token-file "
+                 "(generate one with: python -c \"import secrets; print(secrets.token_urlsafe(32))\")")
+    tls = None
+    if args.tls_cert:
+        tls = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        tls.load_cert_chain(args.tls_cert, args.tls_key)
+    elif not _loopback(args.host):
+        ap.error(f"{args.host} is not a loopback address: serve it with --tls-cert/--tls-key, "
+                 "or bind 127.0.0.1 behind a TLS reverse proxy")
+
+    if args.sqlite:
+        DB.use_sqlite(args.sqlite, max_size=args.workers)
+    else:
+        DB.configure_pool(max_size=args.workers)
+    server = ApiServer(token, args.workers, args.max_pending, args.max_connections,
+                       coalesce=not args.no_coalesce, cache=not args.no_cache)
+    asyncio.run(server.serve(args.host, args.port, tls=tls, ready=lambda addr: print(
+        f"HMS API on {'https' if tls else 'http'}://{addr[0]}:{addr[1]}  "
+        f"({server.workers} workers, {server.max_pending} pending max)", flush=True)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import DB
+
+BATCH_SIZE = 200         # rows per INSERT batch; a full buffer is flushed right away
+FLUSH_SECONDS = 2.0      # ...otherwise this long after its first row was recorded
+RETRY_SECONDS = 30.0     # after a failed flush, spill straight to the file this long before trying the DB
+CLOSE_TIMEOUT = 10.0     # how long shutdown waits for the last flush
+# rows that could not be written wait here (JSON lines, append-only) until the DB is back
+SPILL_PATH = os.environ.get("HMS_AUDIT_SPILL",
+                            os.path.join(os.path.expanduser("~"), ".hms", "audit_spill.jsonl"))
+# rows the DB refuses for good (DB.is_data_error) go here instead, with the error, for an admin to look at
+DEAD_LETTER_SUFFIX = ".rejected.jsonl"
+
+log = logging.getLogger("hms.audit")
+
+_STOP = object()
+
+
+class _FlushRequest:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class AuditLog:
+    """
+    Buffered, asynchronous writer for audit_logs.
+
+    record() only stamps the event and puts it on a queue, so the GUI never
+    waits for the database. One background thread drains the queue and writes
+    it with DB.insert_audit_logs in batches of batch_size rows, or every
+    flush_seconds when it is quiet. When a batch cannot be written it is
+    appended to the spill file and the DB is left alone for retry_seconds; the
+    file is replayed (and then removed) once a write succeeds again. A batch
+    the DB refuses on its data is written row by row instead, and the rows it
+    still refuses go to the dead-letter file, so they stall neither the spill
+    file nor new rows. close(), also registered with atexit for the shared
+    instance, flushes what is left.
+    """
+
+    def __init__(self, insert=DB.insert_audit_logs, spill_path=SPILL_PATH, batch_size=BATCH_SIZE,
+                 flush_seconds=FLUSH_SECONDS, retry_seconds=RETRY_SECONDS, clock=time.monotonic,
+                 dead_letter_path=None):
+        self._insert = insert
+        self.spill_path = spill_path
+        self.dead_letter_path = dead_letter_path or os.path.splitext(spill_path)[0] + DEAD_LETTER_SUFFIX
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.retry_seconds = retry_seconds
+        self._clock = clock
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._closed = False
+        self._down_until = 0.0  # DB writes failed: spill until then
+        self._stats = dict.fromkeys(("recorded", "flushed", "batches", "failures", "spilled", "replayed",
+                                     "rejected"), 0)
+
+    # ---------- API ----------
+    def record(self, user_id: int, action: str, table_name: str = None, record_id: int = None):
+        """Queue one audit event; never blocks on the database."""
+        row = (user_id, action, table_name, record_id, datetime.now())
+        self._stats["recorded"] += 1
+        if self._closed:
+            self._spill([row])  # after shutdown: straight to the file, replayed next start
+            return
+        self._ensure_started()
+        self._queue.put(row)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Write everything recorded so far (and retry the spill file); for tests, benchmarks and exports."""
+        if self._thread is None:
+            return True
+        request = _FlushRequest()
+        self._queue.put(request)
+        return request.done.wait(timeout)
+
+    def close(self, timeout: float = CLOSE_TIMEOUT):
+        """Flush and stop the writer. Rows it cannot write in time are spilled."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            # the DB is hanging: keep what is still queued on disk rather than lose it
+            rows = []
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, tuple):
+                    rows.append(item)
+            self._spill(rows)
+
+    def stats(self) -> dict:
+        return {**self._stats, "queued": self._queue.qsize(), "spill_pending": os.path.exists(self.spill_path)}
+
+    # ---------- writer thread ----------
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="hms-audit", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        buf, deadline = [], None
+        next_replay = self._clock()  # a spill left over from the last run is replayed first
+        while True:
+            now = self._clock()
+            if buf:
+                timeout = max(deadline - now, 0)
+            elif os.path.exists(self.spill_path):
+                timeout = max(next_replay - now, 0)
+            else:
+                timeout = None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, tuple):
+                if not buf:
+                    deadline = self._clock() + self.flush_seconds
+                buf.append(item)
+                if len(buf) < self.batch_size:
+                    continue
+            if buf and (item is not None or self._clock() >= deadline):
+                self._write(buf)
+                buf = []
+            if item is _STOP or isinstance(item, _FlushRequest) or self._clock() >= next_replay:
+                self._replay()
+                next_replay = self._clock() + self.retry_seconds
+            if isinstance(item, _FlushRequest):
+                item.done.set()
+            elif item is _STOP:
+                return
+
+    def _write(self, rows):
+        if self._clock() < self._down_until:
+            self._spill(rows)
+            return
+        done, rejected, error = self._insert_isolating(rows)
+        self._stats["flushed"] += done - rejected
+        if error is not None:
+            self._stats["failures"] += 1
+            self._down_until = self._clock() + self.retry_seconds
+            log.warning("audit log: writing %d rows failed (%s); spilled to %s",
+                        len(rows) - done, _describe(error), self.spill_path)
+            self._spill(rows[done:])
+            return
+        self._stats["batches"] += 1
+
+    def _insert_isolating(self, rows):
+        """
+        Insert rows; returns (rows done, how many of them were rejected, the failure that stopped it).
+        A batch refused on its data (DB.is_data_error: a user id that no longer exists, say) is
+        retried one row at a time, and rows refused again go to the dead-letter file. Any other
+        failure (DB unreachable, session gone) stops at the first row not written.
+        """
+        try:
+            self._insert(rows)
+            return len(rows), 0, None
+        except Exception as e:
+            if not DB.is_data_error(e):
+                return 0, 0, e
+        rejected = 0
+        for i, row in enumerate(rows):
+            try:
+                self._insert([row])
+            except Exception as e:
+                if not DB.is_data_error(e):
+                    return i, rejected, e
+                self._reject(row, e)
+                rejected += 1
+        return len(rows), rejected, None
+
+    # ---------- spill file ----------
+    def _spill(self, rows):
+        if not rows:
+            return
+        with self._spill_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.spill_path)), exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for user_id, action, table_name, record_id, created_at in rows:
+                    f.write(json.dumps([user_id, action, table_name, record_id, created_at.isoformat()]) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._stats["spilled"] += len(rows)
+
+    def _reject(self, row, error):
+        user_id, action, table_name, record_id, created_at = row
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps([user_id, action, table_name, record_id, created_at.isoformat(),
+                                _describe(error)]) + "\n")
+        self._stats["rejected"] += 1
+        log.error("audit log: the DB refused %r (%s); kept in %s", row, _describe(error), self.dead_letter_path)
+
+    def _replay(self):
+        """
+        Write the spill file to the DB in batches. The offset of the last row
+        written is kept beside it, so a crash mid-replay does not write rows twice.
+        """
+        offset_path = self.spill_path + ".offset"
+        with self._spill_lock:
+            if not os.path.exists(self.spill_path) or self._clock() < self._down_until:
+                return
+            try:
+                with open(offset_path, encoding="utf-8") as f:
+                    offset = int(f.read() or 0)
+            except (OSError, ValueError):
+                offset = 0
+            with open(self.spill_path, "rb") as f:
+                f.seek(offset)
+                while True:
+                    rows, ends = [], []  # ends: file offset after each row
+                    for line in f:
+                        try:
+                            user_id, action, table_name, record_id, created_at = json.loads(line)
+                        except ValueError:
+                            log.warning("audit log: skipping unreadable spill line %r", line[:200])
+                            continue
+                        rows.append((user_id, action, table_name, record_id, datetime.fromisoformat(created_at)))
+                        ends.append(f.tell())
+                        if len(rows) == self.batch_size:
+                            break
+                    if not rows:
+                        break
+                    done, rejected, error = self._insert_isolating(rows)
+                    self._stats["replayed"] += done - rejected
+                    if done:
+                        with open(offset_path + ".tmp", "w", encoding="utf-8") as out:
+                            out.write(str(ends[done - 1]))
+                        os.replace(offset_path + ".tmp", offset_path)
+                    if error is not None:
+                        self._stats["failures"] += 1
+                        self._down_until = self._clock() + self.retry_seconds
+                        log.warning("audit log: replaying %s failed (%s)", self.spill_path, _describe(error))
+                        return
+            os.remove(self.spill_path)
+            if os.path.exists(offset_path):
+                os.remove(offset_path)
+            log.info("audit log: spill file replayed")
+
+
+def _describe(error: BaseException) -> str:
+    return f"{type(error).__name__}: {error}"
+
+
+# shared by the main window and its pages; flushed when the interpreter exits
+audit_log = AuditLog()
+atexit.register(audit_log.close)
@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+
+import Migrations
+from ConnectionPool import StandInDriver
+
+SQLITE_SCHEMA = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "database", "HMS_DB.sqlite.sql"))
+# page cache per SQLite connection (the 2 MB default): a billing run inserts into indexes keyed
+# by patient and service id, and with the default most of those inserts miss the cache
+SQLITE_CACHE_KIB = 32768
+
+
+class Backend:
+    """
+    Storage backend under the DB.py API: a connection factory plus the SQL
+    dialect it speaks ("mssql" or "sqlite"). DB.py picks statements by dialect.
+    """
+    name = ""
+    dialect = ""
+
+    def connect(self):
+        raise NotImplementedError
+
+
+class SqlServerBackend(Backend):
+    """SQL Server through pyodbc (the production backend)."""
+    name = "pyodbc"
+    dialect = "mssql"
+
+    def __init__(self, conn_str: str):
+        self.conn_str = conn_str
+
+    def connect(self):
+        import pyodbc  # only needed when this backend is used
+        return pyodbc.connect(self.conn_str)
+
+
+class StandInBackend(Backend):
+    """Local stand-in driver: no SQL is run; used to measure pooling and round trips."""
+    name = "standin"
+    dialect = "mssql"
+
+    def __init__(self, connect_latency=0.05, query_latency=0.0):
+        self.driver = StandInDriver(connect_latency, query_latency)
+        self.connect = self.driver.connect
+
+
+# ---------- sqlite ----------
+_row_types = {}
+
+
+def _row(cursor, values):
+    """Row factory giving pyodbc-style rows: r[0] and r.column_name."""
+    names = tuple(d[0] for d in cursor.description)
+    cls = _row_types.get(names)
+    if cls is None:
+        cls = _row_types[names] = namedtuple("Row", names, rename=True)
+    return cls._make(values)
+
+
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_converter("datetime", lambda b: datetime.fromisoformat(b.decode()))
+sqlite3.register_converter("date", lambda b: date.fromisoformat(b.decode()[:10]))
+
+
+class SqliteBackend(Backend):
+    """
+    Embedded SQLite file with the schema of database/HMS_DB.sqlite.sql
+    (created, and brought up to the latest migration, on first connect).
+    The file is attached as "dbo", so the schema-qualified names DB.py uses
+    (dbo.patients, ...) resolve unchanged.
+    """
+    name = "sqlite"
+    dialect = "sqlite"
+
+    def __init__(self, path: str, schema: str = SQLITE_SCHEMA):
+        self.path = os.path.abspath(path)
+        self.schema = schema
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def connect(self):
+        self.ensure_schema()
+        # IMMEDIATE: a write transaction takes the write lock up front, which makes
+        # read-then-insert statements (booking, room assignment) atomic
+        conn = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES,
+                               isolation_level="IMMEDIATE", check_same_thread=False, timeout=30)
+        conn.row_factory = _row
+        conn.execute("ATTACH DATABASE ? AS dbo", (self.path,))
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA dbo.synchronous = NORMAL")
+        conn.execute(f"PRAGMA dbo.cache_size = -{SQLITE_CACHE_KIB}")
+        return conn
+
+    def raw_connect(self):
+        """Plain connection to the file (tables unqualified, no row factory); for schema work."""
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create_schema(self, conn):
+        """Run the base schema script if the file has no tables yet."""
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'patients'").fetchone():
+            with open(self.schema, encoding="utf-8") as f:
+                conn.executescript(f.read())
+
+    def ensure_schema(self):
+        """
+        Create the tables if the file is new and apply pending migrations;
+        switch it to WAL so readers don't block writers.
+        """
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            conn = self.raw_connect()
+            try:
+                conn.execute("PRAGMA journal_mode = WAL")
+                self.create_schema(conn)
+                Migrations.migrate(conn, self.dialect)
+            finally:
+                conn.close()
+            self._ready = True
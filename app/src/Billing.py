@@ -0,0 +1,191 @@
+"""
+Billing runs and invoice export.
+
+    python app/src/Billing.py run                          # end-of-day: bill today's services
+    python app/src/Billing.py run 2026-10-01 2026-10-17    # a date range (inclusive), one transaction per day
+    python app/src/Billing.py export 2026-10-01 2026-10-17 --csv invoices.csv --pdf invoices.pdf
+
+A run invoices every completed visit, prescription, lab test and room day in
+the range with a handful of set-based statements per day (DB.bill_services).
+Each line item records the service it bills, so running the same range again
+bills only what was added since. Exports stream the invoices straight from
+the cursor; memory stays flat however many patients there are.
+"""
+import argparse
+import csv
+import sys
+import time
+from datetime import date, timedelta
+
+import DB
+
+CSV_COLUMNS = ("invoice_id", "invoice_date", "status", "patient_id", "first_name", "last_name", "national_id",
+               "line_id", "service_type", "service_date", "description", "amount")
+
+
+def run_billing(start: date, end: date, chunk_days: int = 1, log=None) -> dict:
+    """
+    Bill [start, end) in chunks of chunk_days, each its own transaction, so an
+    interrupted run picks up where it stopped when started again.
+    Returns {"invoices", "lines", "amount", "by_type": {type: (count, amount)}, "seconds", "rows_per_s"}.
+    """
+    totals = {"invoices": 0, "lines": 0, "amount": 0, "by_type": {}}
+    t0 = time.perf_counter()
+    day = start
+    while day < end:
+        until = min(day + timedelta(days=chunk_days), end)
+        result = DB.bill_services(day, until)
+        totals["invoices"] += result["invoices"]
+        for kind, (n, amount) in result["lines"].items():
+            count, total = totals["by_type"].get(kind, (0, 0))
+            totals["by_type"][kind] = (count + n, total + (amount or 0))
+            totals["lines"] += n
+            totals["amount"] += amount or 0
+        if log:
+            lines = sum(n for n, _ in result["lines"].values())
+            log(f"{day} .. {until - timedelta(days=1)}  {result['invoices']:>7,} invoices  {lines:>8,} lines")
+        day = until
+    totals["seconds"] = time.perf_counter() - t0
+    rows = totals["invoices"] + totals["lines"]
+    totals["rows_per_s"] = rows / totals["seconds"] if totals["seconds"] else 0.0
+    return totals
+
+
+# ---------- export ----------
+def export_csv(path: str, start: date, end: date) -> int:
+    """Invoice lines dated in [start, end) as CSV, one row per line item. Returns rows written."""
+    n = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for row in DB.iter_invoice_lines(start, end):
+            writer.writerow(row)
+            n += 1
+    return n
+
+
+class _PdfStream:
+    """
+    Minimal text-only PDF writer that writes each page as soon as it is full.
+    Only object offsets and page ids are kept, so memory does not grow with
+    the content. Text is set in Helvetica (WinAnsi); other characters print as "?".
+    """
+
+    WIDTH, HEIGHT = 595, 842  # A4 in points
+    MARGIN, FONT_SIZE, LEADING = 48, 9, 13
+
+    def __init__(self, f):
+        self.f = f
+        self.offsets = [None, None, None, None]  # object 0 is free; 1 catalog, 2 pages, 3 font
+        self.page_ids = []
+        self.lines = []
+        self.per_page = (self.HEIGHT - 2 * self.MARGIN) // self.LEADING
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    def _write(self, data: bytes):
+        self.f.write(data)
+
+    def _object(self, number, body: bytes):
+        self.offsets[number] = self.f.tell()
+        self._write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+
+    def _new_object(self) -> int:
+        self.offsets.append(None)
+        return len(self.offsets) - 1
+
+    def line(self, text: str = ""):
+        self.lines.append(text)
+        if len(self.lines) == self.per_page:
+            self.flush_page()
+
+    def flush_page(self):
+        if not self.lines:
+            return
+        ops = [b"BT /F1 %d Tf %d TL %d %d Td" % (self.FONT_SIZE, self.LEADING, self.MARGIN,
+                                                 self.HEIGHT - self.MARGIN)]
+        for text in self.lines:
+            escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append(b"(" + escaped.encode("cp1252", "replace") + b") '")
+        ops.append(b"ET")
+        content = b"\n".join(ops)
+        stream = self._new_object()
+        self._object(stream, b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        page = self._new_object()
+        self._object(page, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+                           b"/Resources << /Font << /F1 3 0 R >> >> >>" % (self.WIDTH, self.HEIGHT, stream))
+        self.page_ids.append(page)
+        self.lines = []
+
+    def close(self):
+        self.flush_page()
+        kids = b" ".join(b"%d 0 R" % p for p in self.page_ids)
+        self._object(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.page_ids)))
+        self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref = self.f.tell()
+        self._write(b"xref\n0 %d\n0000000000 65535 f \n" % len(self.offsets))
+        for offset in self.offsets[1:]:
+            self._write(b"%010d 00000 n \n" % offset)
+        self._write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(self.offsets), xref))
+
+
+def export_pdf(path: str, start: date, end: date) -> int:
+    """Invoices dated in [start, end) as one PDF, each invoice with its lines and total. Returns invoices written."""
+    invoices = 0
+    with open(path, "wb") as f:
+        pdf = _PdfStream(f)
+        current, total = None, 0
+        for (invoice_id, invoice_date, status, patient_id, first, last, national_id,
+             _, kind, service_date, description, amount) in DB.iter_invoice_lines(start, end):
+            if invoice_id != current:
+                if current is not None:
+                    pdf.line(f"{'Total':>70}  {total:>10.2f}")
+                    pdf.line()
+                current, total = invoice_id, 0
+                invoices += 1
+                pdf.line(f"Invoice #{invoice_id}   {invoice_date}   {status}")
+                pdf.line(f"Patient #{patient_id}   {first} {last}   National ID {national_id}")
+            total += float(amount)
+            pdf.line(f"    {service_date or '':<12}{kind or '':<10}{description[:46]:<48}{float(amount):>10.2f}")
+        if current is not None:
+            pdf.line(f"{'Total':>70}  {total:>10.2f}")
+        pdf.close()
+    return invoices
+
+
+def _day(text: str) -> date:
+    return date.fromisoformat(text)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("command", choices=("run", "export"))
+    ap.add_argument("start", nargs="?", type=_day, default=date.today(), help="first day (default: today)")
+    ap.add_argument("end", nargs="?", type=_day, help="last day, inclusive (default: start)")
+    ap.add_argument("--chunk-days", type=int, default=1, help="days billed per transaction")
+    ap.add_argument("--csv", metavar="PATH", help="export: write the invoice lines as CSV")
+    ap.add_argument("--pdf", metavar="PATH", help="export: write the invoices as PDF")
+    ap.add_argument("--sqlite", metavar="PATH", help="use this SQLite file instead of HMS_DB_DRIVER's backend")
+    args = ap.parse_args(argv)
+    start, end = args.start, (args.end or args.start) + timedelta(days=1)
+    if args.sqlite:
+        DB.use_sqlite(args.sqlite)
+
+    if args.command == "run":
+        r = run_billing(start, end, args.chunk_days, log=print)
+        for kind, (n, amount) in sorted(r["by_type"].items()):
+            print(f"{kind:<10} {n:>9,} lines  {amount:>14,.2f}")
+        print(f"{r['invoices']:,} invoices, {r['lines']:,} lines, {r['amount']:,.2f} billed "
+              f"in {r['seconds']:.2f}s ({r['rows_per_s']:,.0f} rows/s)")
+        return 0
+    if not (args.csv or args.pdf):
+        ap.error("export needs --csv and/or --pdf")
+    if args.csv:
+        print(f"{export_csv(args.csv, start, end):,} invoice lines written to {args.csv}")
+    if args.pdf:
+        print(f"{export_pdf(args.pdf, start, end):,} invoices written to {args.pdf}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
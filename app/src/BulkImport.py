@@ -0,0 +1,221 @@
+"""
+Bulk patient import from CSV.
+
+    python app/src/BulkImport.py registry.csv --batch-size 5000 --errors registry.errors.csv
+
+Rows stream from the file, are validated with the Add Patient form's rules
+(DB.validate_patient) and are inserted set-based, one transaction per batch
+(DB.insert_patients_bulk). After every committed batch a checkpoint records
+the last line done, so an interrupted run picks up where it stopped. A batch
+the database refuses is split until the rows it refuses are alone; those go to
+the error report and the rest are inserted.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from DB import insert_patients_bulk, is_data_error, validate_patient
+
+# CSV header -> data key (headers are matched case-insensitively)
+COLUMNS = {
+    "firstname": "FirstName", "first_name": "FirstName",
+    "lastname": "LastName", "last_name": "LastName",
+    "nationalid": "NationalID", "national_id": "NationalID",
+    "birthdate": "BirthDate", "date_of_birth": "BirthDate",
+    "gender": "Gender",
+    "phone": "Phone", "phone_number": "Phone",
+    "address": "Address",
+}
+
+DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y")
+
+
+def _parse_date(text: str):
+    text = (text or "").strip()
+    if not text:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Unrecognised birth date '{text}'.")
+
+
+def read_rows(path: str, start_after: int = 0):
+    """
+    Stream (line_no, data, error) from a CSV file; data is None when error is set.
+    Lines up to `start_after` (a checkpoint) are skipped without being parsed.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        keys = [COLUMNS.get(h.strip().lower()) for h in header]
+        missing = {"FirstName", "LastName", "NationalID"} - set(keys)
+        if missing:
+            raise ValueError(f"CSV is missing column(s): {', '.join(sorted(missing))}")
+
+        for values in reader:
+            line_no = reader.line_num
+            if line_no <= start_after:
+                continue
+            data = {k: (v or "").strip() for k, v in zip(keys, values) if k}
+            error = validate_patient(data)
+            if not error:
+                try:
+                    data["BirthDate"] = _parse_date(data.get("BirthDate"))
+                except ValueError as e:
+                    error = str(e)
+            yield line_no, (None if error else data), error
+
+
+def insert_batch(rows) -> tuple:
+    """
+    DB.insert_patients_bulk(rows), isolating the rows the database refuses: a batch that
+    fails on its data (DB.is_data_error) is retried in halves down to single rows, which
+    are rejected with the database's message. Any other failure (connection lost, timeout)
+    is raised, and the batch runs again from the checkpoint next time.
+    """
+    try:
+        return insert_patients_bulk(rows)
+    except Exception as e:
+        if not is_data_error(e):
+            raise
+        if len(rows) == 1:
+            return [], [(rows[0][0], f"Refused by the database: {e}")]
+    mid = len(rows) // 2
+    inserted, rejected = insert_batch(rows[:mid])
+    more_inserted, more_rejected = insert_batch(rows[mid:])
+    return inserted + more_inserted, rejected + more_rejected
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.last_line = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return (self.inserted + self.rejected) / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f"{self.inserted} inserted, {self.rejected} rejected in {self.batches} batch(es), "
+                f"{self.seconds:.1f}s ({self.rows_per_second:,.0f} rows/s)")
+
+
+def _load_checkpoint(path: str, source: str) -> int:
+    try:
+        with open(path, encoding="utf-8") as f:
+            cp = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    return cp.get("line", 0) if cp.get("source") == os.path.abspath(source) else 0
+
+
+def _save_checkpoint(path: str, source: str, report: ImportReport):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({
+            "source": os.path.abspath(source),
+            "line": report.last_line,
+            "inserted": report.inserted,
+            "rejected": report.rejected,
+            "saved_at": datetime.now().isoformat(timespec="seconds"),
+        }, f)
+    os.replace(tmp, path)  # atomic: a crash never leaves a half-written checkpoint
+
+
+def import_patients(path: str, batch_size: int = 5000, checkpoint_path: str = None,
+                    error_path: str = None, restart: bool = False, progress=None) -> ImportReport:
+    """
+    Import patients from CSV. Rejected rows go to `error_path` as (line, national_id, error).
+    progress(report) is called after each committed batch.
+    """
+    checkpoint_path = checkpoint_path or path + ".checkpoint"
+    error_path = error_path or path + ".errors.csv"
+    start_after = 0 if restart else _load_checkpoint(checkpoint_path, path)
+
+    report = ImportReport()
+    report.last_line = start_after
+    new_report = restart or start_after == 0 or not os.path.exists(error_path)
+    t0 = time.perf_counter()
+
+    with open(error_path, "w" if new_report else "a", newline="", encoding="utf-8") as ef:
+        errors = csv.writer(ef)
+        if new_report:
+            errors.writerow(["line", "national_id", "error"])
+
+        batch, seen, nid_of = [], set(), {}
+
+        def flush():
+            inserted, rejected = insert_batch(batch)
+            for line_no, msg in rejected:
+                errors.writerow([line_no, nid_of[line_no], msg])
+            report.inserted += len(inserted)
+            report.rejected += len(rejected)
+            report.batches += 1
+            report.last_line = batch[-1][0]
+            ef.flush()
+            _save_checkpoint(checkpoint_path, path, report)
+            batch.clear()
+            seen.clear()
+            nid_of.clear()
+            report.seconds = time.perf_counter() - t0
+            if progress:
+                progress(report)
+
+        line_no = start_after
+        for line_no, data, error in read_rows(path, start_after):
+            # SQL Server compares national IDs case-insensitively: so does the in-file check
+            key = data["NationalID"].casefold() if data else None
+            if not error and key in seen:
+                error = "Duplicate National ID within the file."
+            if error:
+                errors.writerow([line_no, (data or {}).get("NationalID", ""), error])
+                report.rejected += 1
+                continue
+            seen.add(key)
+            nid_of[line_no] = data["NationalID"]
+            batch.append((line_no, data))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        if line_no > report.last_line:
+            # trailing rows were all rejected up front; don't re-report them on resume
+            report.last_line = line_no
+            _save_checkpoint(checkpoint_path, path, report)
+
+    report.seconds = time.perf_counter() - t0
+    return report
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Bulk import patients from a CSV file.")
+    ap.add_argument("csv", help="CSV with FirstName, LastName, NationalID[, BirthDate, Gender, Phone, Address]")
+    ap.add_argument("--batch-size", type=int, default=5000)
+    ap.add_argument("--errors", help="per-row error report (default: <csv>.errors.csv)")
+    ap.add_argument("--checkpoint", help="checkpoint file (default: <csv>.checkpoint)")
+    ap.add_argument("--restart", action="store_true", help="ignore any checkpoint and start over")
+    args = ap.parse_args(argv)
+
+    report = import_patients(
+        args.csv, batch_size=args.batch_size, checkpoint_path=args.checkpoint,
+        error_path=args.errors, restart=args.restart,
+        progress=lambda r: print(f"line {r.last_line}: {r}", flush=True),
+    )
+    print(f"Done: {report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+from datetime import datetime
+from PyQt5.QtCore import Qt, QDate, QTimer
+from PyQt5.QtWidgets import (
+    QDialog, QPushButton, QLineEdit, QCheckBox, QDateEdit, QLabel, QTreeWidget, QTreeWidgetItem, QHeaderView,
+    QMessageBox
+)
+
+from DB import search_clinical, clinical_search_terms
+from DbWorker import default_executor
+from UiLoader import load_ui
+
+SEARCH_DEBOUNCE_MS = 300  # search once typing pauses
+RESULT_LIMIT = 100
+SOURCE_TITLES = {"medical_records": "Record", "lab_tests": "Lab"}
+
+
+class ClinicalSearchDialog(QDialog):
+    """
+    Ranked full-text search over diagnoses, treatment plans and lab results,
+    optionally limited to one patient and a date range. Double-clicking a hit
+    calls open_patient(patient_id).
+    """
+
+    def __init__(self, patient: dict = None, executor=None, open_patient=None):
+        super().__init__()
+        load_ui(self, "clinical_search_dialog")
+        self._executor = executor or default_executor()
+        self._open_patient = open_patient
+        self._patient_id = int(patient["PatientID"]) if patient else None
+        self._search = None  # DbCall of the search in flight
+        self.searched = False  # any results shown, for the audit log
+
+        # Find widgets by objectName
+        self.lineEditQuery = self.findChild(QLineEdit, "lineEditQuery")
+        self.btnSearch = self.findChild(QPushButton, "btnSearch")
+        self.checkPatient = self.findChild(QCheckBox, "checkPatient")
+        self.checkDates = self.findChild(QCheckBox, "checkDates")
+        self.dateEditFrom = self.findChild(QDateEdit, "dateEditFrom")
+        self.dateEditTo = self.findChild(QDateEdit, "dateEditTo")
+        self.treeResults = self.findChild(QTreeWidget, "treeResults")
+        self.labelStatus = self.findChild(QLabel, "labelStatus")
+        self.btnClose = self.findChild(QPushButton, "btnClose")
+
+        if patient:
+            self.checkPatient.setText(f"Only {patient['FirstName']} {patient['LastName']} (#{self._patient_id})")
+            self.checkPatient.setChecked(True)
+        else:
+            self.checkPatient.setVisible(False)
+        today = QDate.currentDate()
+        self.dateEditFrom.setDate(today.addYears(-1))
+        self.dateEditTo.setDate(today)
+
+        header = self.treeResults.header()
+        header.setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(1, QHeaderView.Interactive)
+        header.setSectionResizeMode(2, QHeaderView.Interactive)
+        header.setStretchLastSection(True)
+        self.treeResults.setColumnWidth(1, 160)
+        self.treeResults.setColumnWidth(2, 240)
+
+        # Search-as-you-type, debounced; filters re-run the current query at once
+        self._searchTimer = QTimer(self)
+        self._searchTimer.setSingleShot(True)
+        self._searchTimer.setInterval(SEARCH_DEBOUNCE_MS)
+        self._searchTimer.timeout.connect(self.run_search)
+        self.lineEditQuery.textChanged.connect(lambda *_: self._searchTimer.start())
+        self.lineEditQuery.returnPressed.connect(self.run_search)
+        self.btnSearch.clicked.connect(self.run_search)
+        self.checkPatient.toggled.connect(lambda *_: self.run_search())
+        self.checkDates.toggled.connect(self._on_dates_toggled)
+        self.dateEditFrom.dateChanged.connect(lambda *_: self._searchTimer.start())
+        self.dateEditTo.dateChanged.connect(lambda *_: self._searchTimer.start())
+        self.treeResults.itemActivated.connect(self._on_item_activated)
+        self.btnClose.clicked.connect(self.accept)
+
+    def _on_dates_toggled(self, on):
+        self.dateEditFrom.setEnabled(on)
+        self.dateEditTo.setEnabled(on)
+        self.run_search()
+
+    def run_search(self):
+        self._searchTimer.stop()  # a pending debounced run is now stale
+        if self._search is not None:
+            self._search.cancel()  # superseded by the query as it is now
+            self._search = None
+        text = self.lineEditQuery.text()
+        if not clinical_search_terms(text):
+            self.treeResults.clear()
+            self.labelStatus.setText("")
+            return
+        patient_id = self._patient_id if self.checkPatient.isChecked() else None
+        date_from = self.dateEditFrom.date().toPyDate() if self.checkDates.isChecked() else None
+        date_to = self.dateEditTo.date().toPyDate() if self.checkDates.isChecked() else None
+        self.labelStatus.setText("Searching…")
+        self._search = self._executor.submit(
+            search_clinical, text, patient_id, date_from, date_to, limit=RESULT_LIMIT,
+            on_result=self._show_results,
+            on_error=lambda e: (self.labelStatus.setText(""),
+                                QMessageBox.critical(self, "DB Error", f"Search failed:\n{e}")))
+
+    def _show_results(self, rows):
+        self._search = None
+        self.treeResults.clear()
+        items = []
+        for source, _id, patient_id, first, last, at, title, detail, _score in rows:
+            item = QTreeWidgetItem([self._format_date(at), f"{first} {last} (#{patient_id})",
+                                    f"{SOURCE_TITLES[source]}: {title}", detail or ""])
+            item.setToolTip(2, title)
+            item.setToolTip(3, detail or "")
+            item.setData(0, Qt.UserRole, patient_id)
+            items.append(item)
+        self.treeResults.addTopLevelItems(items)
+        self.searched = self.searched or bool(rows)
+        more = "+" if len(rows) == RESULT_LIMIT else ""
+        self.labelStatus.setText(f"{len(rows)}{more} matches, best first" if rows else "No matches.")
+
+    def _on_item_activated(self, item, _column):
+        if self._open_patient is not None:
+            self._open_patient(item.data(0, Qt.UserRole))
+
+    @staticmethod
+    def _format_date(at):
+        if at is None:
+            return "—"
+        if isinstance(at, datetime):
+            return f"{at:%Y-%m-%d %H:%M}"
+        return str(at)
@@ -0,0 +1,265 @@
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became free within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of reusable DB connections.
+
+    connect: zero-arg factory returning a DB-API connection (pyodbc, sqlite3, stand-in).
+    min_size: connections that are never closed for being idle.
+    max_size: hard cap on open connections; further checkouts wait.
+    idle_timeout: seconds an idle connection (above min_size) is kept before closing.
+    ping_after: a connection idle for longer than this is pinged before checkout
+                (0 = always ping, None = never).
+    checkout_timeout: seconds to wait for a free connection before PoolTimeout.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, idle_timeout=300.0,
+                 ping_after=30.0, checkout_timeout=30.0, ping_sql="SELECT 1"):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size, max_size >= 1.")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self.checkout_timeout = checkout_timeout
+        self.ping_sql = ping_sql
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, last_used); right end = most recently used
+        self._size = 0        # open connections, idle + checked out
+        self._closed = False
+
+        # counters
+        self.hits = 0       # checkout served by an idle connection
+        self.misses = 0     # checkout had to open a new connection
+        self.waits = 0      # checkout had to wait for a connection to be released
+        self.timeouts = 0   # checkout gave up (PoolTimeout)
+        self.discarded = 0  # connections dropped (dead, broken or idle too long)
+
+    # ---------- checkout / checkin ----------
+    def acquire(self, timeout=None):
+        """Check out a live connection (caller must release it)."""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            conn, last_used = self._reserve(deadline)
+            if conn is None:
+                try:
+                    return self._connect()
+                except BaseException:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            if self._is_alive(conn, last_used):
+                return conn
+            self._drop(conn)
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool (discard=True closes it instead)."""
+        if discard or self._closed:
+            self._drop(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            stale = self._reap_locked()
+            self._cond.notify()
+        self._close_all(stale)
+
+    def connection(self):
+        """Context manager form: `with pool.connection() as conn: ...`"""
+        return _Checkout(self)
+
+    def warm(self):
+        """Open connections up to min_size ahead of the first checkout."""
+        conns = []
+        try:
+            for _ in range(self.min_size - self._size):
+                conns.append(self.acquire())
+        finally:
+            for c in conns:
+                self.release(c)
+
+    def close(self):
+        """Close idle connections; checked-out ones are closed on release."""
+        with self._cond:
+            self._closed = True
+            idle = [c for c, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        self._close_all(idle)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "discarded": self.discarded,
+            }
+
+    # ---------- internals ----------
+    def _reserve(self, deadline):
+        """Pop an idle connection or reserve a slot for a new one (returns (None, None))."""
+        stale = []
+        waited = False
+        try:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Connection pool is closed.")
+                    stale += self._reap_locked()
+                    if self._idle:
+                        # LIFO: reuse the warmest connection, let cold ones age out
+                        self.hits += 1
+                        return self._idle.pop()
+                    if self._size < self.max_size:
+                        self._size += 1
+                        self.misses += 1
+                        return None, None
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(f"No DB connection available after waiting (max_size={self.max_size}).")
+                    if not waited:
+                        self.waits += 1
+                        waited = True
+                    self._cond.wait(remaining)
+        finally:
+            self._close_all(stale)
+
+    def _reap_locked(self):
+        """Detach connections idle longer than idle_timeout, keeping min_size open."""
+        if self.idle_timeout is None:
+            return []
+        cutoff = time.monotonic() - self.idle_timeout
+        stale = []
+        # the left end holds the least recently used connections
+        while self._idle and self._size > self.min_size and self._idle[0][1] < cutoff:
+            stale.append(self._idle.popleft()[0])
+            self._size -= 1
+            self.discarded += 1
+        return stale
+
+    def _is_alive(self, conn, last_used) -> bool:
+        if self.ping_after is None or time.monotonic() - last_used < self.ping_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute(self.ping_sql)
+            cur.fetchone()
+            cur.close()
+            return True
+        except Exception:
+            return False
+
+    def _drop(self, conn):
+        with self._cond:
+            self._size -= 1
+            self.discarded += 1
+            self._cond.notify()
+        self._close_all([conn])
+
+    @staticmethod
+    def _close_all(conns):
+        for c in conns:
+            try:
+                c.close()
+            except Exception:
+                pass
+
+
+class _Checkout:
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn = None
+
+    def __enter__(self):
+        self.conn = self.pool.acquire()
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.pool.release(self.conn)
+        return False
+
+
+# ---------- stand-in driver (test mode, no SQL Server needed) ----------
+class StandInDriver:
+    """
+    Minimal DB-API look-alike for exercising the pool without SQL Server.
+    connect_latency mimics the connect handshake, query_latency each execute().
+    """
+
+    def __init__(self, connect_latency=0.05, query_latency=0.0):
+        self.connect_latency = connect_latency
+        self.query_latency = query_latency
+        self.connects = 0
+        self._lock = threading.Lock()
+
+    def connect(self):
+        if self.connect_latency:
+            time.sleep(self.connect_latency)
+        with self._lock:
+            self.connects += 1
+        return StandInConnection(self)
+
+
+class StandInConnection:
+    def __init__(self, driver):
+        self.driver = driver
+        self.closed = False
+        self.broken = False  # set True to simulate a dropped link
+
+    def cursor(self):
+        if self.closed:
+            raise RuntimeError("Connection is closed.")
+        return StandInCursor(self)
+
+    def commit(self):
+        if self.broken:
+            raise RuntimeError("Communication link failure.")
+
+    def rollback(self):
+        if self.broken:
+            raise RuntimeError("Communication link failure.")
+
+    def close(self):
+        self.closed = True
+
+
+class StandInCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = -1
+        self.description = None  # DB-API: no result set (fetches answer canned rows)
+
+    def execute(self, sql, params=()):
+        if self.conn.broken or self.conn.closed:
+            raise RuntimeError("Communication link failure.")
+        if self.conn.driver.query_latency:
+            time.sleep(self.conn.driver.query_latency)
+        self.rowcount = 1
+        return self
+
+    def fetchone(self):
+        return (1,)
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
@@ -1,5 +1,13 @@
-import pyodbc
+import os
+import re
+import sys
+import threading
 from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from time import perf_counter
+from ConnectionPool import ConnectionPool
+from Backends import Backend, SqliteBackend, SqlServerBackend, StandInBackend
+from QueryStats import QueryStats, log_slow_queries_to
 
 CONN_STR = (
     "Driver={ODBC Driver 17 for SQL Server};"
@@ -8,22 +16,281 @@ CONN_STR = (
     "Trusted_Connection=yes;"
 )
 
+# Connection pool settings (see ConnectionPool for what each one means)
+POOL_OPTIONS = {
+    "min_size": 1,
+    "max_size": 10,
+    "idle_timeout": 300.0,
+    "ping_after": 30.0,
+    "checkout_timeout": 30.0,
+}
+
+# "pyodbc" (default, SQL Server), "sqlite" (embedded file at HMS_SQLITE_PATH),
+# "standin" to run against the local stand-in driver, or "api" for a thin client
+# of ApiServer.py at HMS_API_URL (see the end of this module)
+DB_DRIVER = os.environ.get("HMS_DB_DRIVER", "pyodbc")
+SQLITE_PATH = os.environ.get(
+    "HMS_SQLITE_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "database", "HMS_DB.sqlite3")))
+
+# Statements slower than this (ms) are written to the "hms.slow_query" log,
+# to HMS_SLOW_QUERY_LOG (JSON lines) when set. HMS_METRICS_FILE keeps a
+# Prometheus text dump of the query stats up to date. HMS_QUERY_STATS=0 turns
+# all of it off (no timing, no histograms, no slow log).
+SLOW_QUERY_MS = float(os.environ.get("HMS_SLOW_QUERY_MS", "200"))
+QUERY_STATS = os.environ.get("HMS_QUERY_STATS", "1") != "0"
+SLOW_QUERY_LOG = os.environ.get("HMS_SLOW_QUERY_LOG")
+METRICS_FILE = os.environ.get("HMS_METRICS_FILE")
+
+query_stats = QueryStats(SLOW_QUERY_MS, QUERY_STATS)
+# Called as plan_hook(raw_cursor, function, sql, params) before every statement
+# (execution plan capture, see benchmarks/check_plans.py); None in normal runs.
+plan_hook = None
+if SLOW_QUERY_LOG:
+    log_slow_queries_to(SLOW_QUERY_LOG)
+if METRICS_FILE:
+    query_stats.dump_periodically(METRICS_FILE)
+
+_backend = None
+_pool = None
+_pool_lock = threading.Lock()
+
 # ---------- connections ----------
+def get_backend() -> Backend:
+    """Backend selected by HMS_DB_DRIVER, unless use_backend() picked another one."""
+    global _backend
+    if _backend is None:
+        with _pool_lock:
+            if _backend is None:
+                if DB_DRIVER == "sqlite":
+                    _backend = SqliteBackend(SQLITE_PATH)
+                elif DB_DRIVER == "standin":
+                    _backend = StandInBackend()
+                elif DB_DRIVER == "api":
+                    raise RuntimeError("HMS_DB_DRIVER=api: this operation needs a direct DB connection "
+                                       "and is not offered by the API service")
+                else:
+                    _backend = SqlServerBackend(CONN_STR)
+    return _backend
+
+def _sqlite() -> bool:
+    return get_backend().dialect == "sqlite"
+
 def get_connection():
-    """Return a new DB connection (caller must close/commit)."""
-    return pyodbc.connect(CONN_STR)
+    """Return a new, unpooled DB connection (caller must close/commit)."""
+    return get_backend().connect()
+
+def configure_pool(connect=None, **options) -> ConnectionPool:
+    """
+    (Re)build the shared pool. connect: zero-arg connection factory
+    (default: the active backend's); options override POOL_OPTIONS.
+    """
+    global _pool
+    pool = ConnectionPool(connect or get_backend().connect, **{**POOL_OPTIONS, **options})
+    with _pool_lock:
+        old, _pool = _pool, pool
+    if old:
+        old.close()
+    return pool
+
+def use_backend(backend: Backend, **options) -> Backend:
+    """Switch every DB helper to another backend (fresh pool)."""
+    global _backend
+    with _pool_lock:
+        _backend = backend
+    configure_pool(backend.connect, **options)
+    return backend
+
+def use_sqlite(path: str = None, **options) -> SqliteBackend:
+    """Back the DB helpers with an SQLite file (created with the HMS schema if new)."""
+    return use_backend(SqliteBackend(path or SQLITE_PATH), **options)
+
+def use_standin_driver(connect_latency=0.0, query_latency=0.0, **options):
+    """Test mode: back the pool with the local stand-in driver (no SQL Server)."""
+    return use_backend(StandInBackend(connect_latency, query_latency), **options).driver
+
+def get_pool() -> ConnectionPool:
+    """Shared pool used by conn_cursor(); created on first use."""
+    global _pool
+    if _pool is None:
+        backend = get_backend()
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(backend.connect, **POOL_OPTIONS)
+    return _pool
+
+def pool_stats() -> dict:
+    """Counters of the shared pool: size, idle, in_use, hits, misses, waits, ..."""
+    return get_pool().stats()
+
+class ConcurrencyError(Exception):
+    """The row changed (or vanished) since it was read; reload and retry."""
+
+# DB-API exception classes (sqlite3, pyodbc, and ApiProtocol's stand-ins over the API) of a
+# failure the rows themselves cause: a constraint, a value that does not fit the column
+_DATA_ERRORS = ("IntegrityError", "DataError")
+
+def is_data_error(e: BaseException) -> bool:
+    """True if the database refused the data itself: sending the same rows again fails again."""
+    return type(e).__name__ in _DATA_ERRORS
+
+# ---------- round trips ----------
+_round_trips = threading.local()  # per thread, so other threads' statements never show up in a count
+
+def round_trips() -> int:
+    """Statements this thread sent to the server (execute/executemany) since its last reset."""
+    return getattr(_round_trips, "n", 0)
+
+def reset_round_trips():
+    _round_trips.n = 0
+
+class RoundTrips:
+    """Result of count_round_trips(); `count` is final once the block exits."""
+    count = 0
+
+@contextmanager
+def count_round_trips():
+    """with count_round_trips() as rt: ... -> rt.count statements this thread sent inside the block."""
+    rt = RoundTrips()
+    start = round_trips()
+    try:
+        yield rt
+    finally:
+        rt.count = round_trips() - start
+
+def _count_round_trip():
+    _round_trips.n = getattr(_round_trips, "n", 0) + 1
+
+def query_snapshot(top: int = None) -> dict:
+    """Per-statement latency/rows/errors (hottest first) plus acquire and transaction times."""
+    return query_stats.snapshot(top)
+
+class _TrackedCursor:
+    """
+    Cursor proxy that counts every execute/executemany as one server round trip
+    and times it into query_stats. A statement's latency covers its execute and
+    all fetches up to the next execute (or close), so streamed rows count too.
+    """
+
+    def __init__(self, cur):
+        object.__setattr__(self, "_cur", cur)
+        object.__setattr__(self, "_open", None)  # [function, sql, params, ms, rows] of the current statement
+
+    def execute(self, sql, *params):
+        _count_round_trip()
+        self._finish()
+        function = sys._getframe(1).f_code.co_name  # the DB helper issuing the statement
+        params = params[0] if len(params) == 1 else params
+        if plan_hook:
+            plan_hook(self._cur, function, sql, params)
+        t0 = perf_counter()
+        try:
+            if params == ():
+                self._cur.execute(sql)
+            else:
+                self._cur.execute(sql, params)
+            if not query_stats.enabled:
+                return self
+        except Exception as e:
+            query_stats.record_statement(function, sql, (perf_counter() - t0) * 1000, 0, params, type(e).__name__)
+            raise
+        ms = (perf_counter() - t0) * 1000
+        rows = max(self._cur.rowcount, 0) if self._cur.description is None else 0
+        object.__setattr__(self, "_open", [function, sql, params, ms, rows])
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        _count_round_trip()
+        self._finish()
+        if not query_stats.enabled:
+            return self._cur.executemany(sql, seq_of_params)
+        function = sys._getframe(1).f_code.co_name
+        t0 = perf_counter()
+        try:
+            result = self._cur.executemany(sql, seq_of_params)
+        except Exception as e:
+            query_stats.record_statement(function, sql, (perf_counter() - t0) * 1000, 0, None, type(e).__name__)
+            raise
+        query_stats.record_statement(function, sql, (perf_counter() - t0) * 1000,
+                                     len(seq_of_params) if hasattr(seq_of_params, "__len__") else 0)
+        return result
+
+    def _fetch(self, name, *args):
+        t0 = perf_counter()
+        result = getattr(self._cur, name)(*args)
+        stmt = self._open
+        if stmt:
+            stmt[3] += (perf_counter() - t0) * 1000
+            stmt[4] += (result is not None) if name == "fetchone" else len(result)
+        return result
+
+    def fetchone(self):
+        return self._fetch("fetchone")
+
+    def fetchall(self):
+        return self._fetch("fetchall")
+
+    def fetchmany(self, *size):
+        return self._fetch("fetchmany", *size)
+
+    def _finish(self):
+        stmt = self._open
+        if stmt:
+            object.__setattr__(self, "_open", None)
+            function, sql, params, ms, rows = stmt
+            query_stats.record_statement(function, sql, ms, rows, params)
+
+    def close(self):
+        self._finish()
+        self._cur.close()
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cur, name, value)
 
 @contextmanager
 def conn_cursor():
-    conn = pyodbc.connect(CONN_STR)
+    pool = get_pool()
+    t0 = perf_counter()
+    conn = pool.acquire()
+    t1 = perf_counter()
+    query_stats.record_acquire((t1 - t0) * 1000)
+    cur = _TrackedCursor(conn.cursor())
+    broken = False
     try:
-        yield conn, conn.cursor()
+        yield conn, cur
         conn.commit()
     except:
-        conn.rollback()
+        try:
+            conn.rollback()
+        except Exception:
+            broken = True  # don't hand a dead link to the next caller
         raise
     finally:
-        conn.close()
+        try:
+            cur.close()
+        except Exception:
+            broken = True
+        pool.release(conn, discard=broken)
+        query_stats.record_transaction((perf_counter() - t1) * 1000)
+
+def _limit(sql: str, limit: int, params, **slots):
+    """
+    Fill the {top}/{limit} slots of a SELECT for the active dialect
+    (TOP (?) on SQL Server, LIMIT ? on SQLite). Returns (sql, params).
+    """
+    if _sqlite():
+        return sql.format(top="", limit="LIMIT ?", **slots), [*params, limit]
+    return sql.format(top="TOP (?)", limit="", **slots), [limit, *params]
 
 # ---------- patients ----------
 def list_patients():
@@ -43,11 +310,79 @@ def list_patients():
         rows = cur.fetchall()
         return [(r.PatientID, r.first_name, r.last_name, r.national_id) for r in rows]
 
+def list_patients_page(after_id: int = None, limit: int = 200):
+    """
+    Keyset page of patients, newest first.
+    after_id: last PatientID of the previous page (None = first page).
+    Returns: [(PatientID, FirstName, LastName, NationalID), ...]
+    """
+    sql = """
+    SELECT {top} p.id AS PatientID
+         , pr.first_name
+         , pr.last_name
+         , pr.national_id
+    FROM dbo.patients AS p
+    JOIN dbo.parties  AS pa ON pa.id = p.party_id
+    JOIN dbo.persons  AS pr ON pr.id = pa.id
+    {where}
+    ORDER BY p.id DESC
+    {limit};
+    """
+    if after_id is None:
+        sql, params = _limit(sql, limit, [], where="")
+    else:
+        sql, params = _limit(sql, limit, [after_id], where="WHERE p.id < ?")
+    with conn_cursor() as (_, cur):
+        cur.execute(sql, params)
+        return [(r.PatientID, r.first_name, r.last_name, r.national_id) for r in cur.fetchall()]
+
+def _like_prefix(text: str) -> str:
+    """Escape LIKE wildcards (ESCAPE '\\') and append % for a sargable prefix match."""
+    for ch in ("\\", "%", "_", "["):
+        text = text.replace(ch, "\\" + ch)
+    return text + "%"
+
+def search_patients(query: str, limit: int = 50, cursor: int = None):
+    """
+    Prefix search on national_id, last_name and first_name (index seeks, no scans).
+    cursor: next_cursor from the previous call (None = first page).
+    Returns: ([(PatientID, FirstName, LastName, NationalID), ...], next_cursor|None)
+    """
+    pattern = _like_prefix((query or "").strip())
+    sql = """
+    SELECT {top} p.id AS PatientID
+         , pr.first_name
+         , pr.last_name
+         , pr.national_id
+    FROM dbo.persons  AS pr
+    JOIN dbo.patients AS p ON p.party_id = pr.id
+    WHERE pr.id IN (
+              SELECT id FROM dbo.persons WHERE national_id LIKE ? ESCAPE '\\'
+        UNION ALL
+              SELECT id FROM dbo.persons WHERE last_name   LIKE ? ESCAPE '\\'
+        UNION ALL
+              SELECT id FROM dbo.persons WHERE first_name  LIKE ? ESCAPE '\\'
+    )
+    {page}
+    ORDER BY p.id DESC
+    {limit};
+    """
+    params = [pattern, pattern, pattern]
+    if cursor is not None:
+        params.append(cursor)
+    sql, params = _limit(sql, limit, params, page="AND p.id < ?" if cursor is not None else "")
+    with conn_cursor() as (_, cur):
+        cur.execute(sql, params)
+        rows = [(r.PatientID, r.first_name, r.last_name, r.national_id) for r in cur.fetchall()]
+    next_cursor = rows[-1][0] if len(rows) == limit else None
+    return rows, next_cursor
+
 def get_patient_by_id(patient_id: int):
     sql = """
     SELECT p.id AS PatientID
          , pr.first_name, pr.last_name, pr.national_id
          , pr.address, pr.gender, pr.date_of_birth, pr.phone_number
+         , pr.row_version
     FROM dbo.patients AS p
     JOIN dbo.parties  AS pa ON pa.id = p.party_id
     JOIN dbo.persons  AS pr ON pr.id = pa.id
@@ -67,67 +402,328 @@ def get_patient_by_id(patient_id: int):
             "Gender": (r.gender or "").strip(),
             "BirthDate": r.date_of_birth,
             "Phone": (r.phone_number or "").strip(),
+            "RowVersion": r.row_version,  # pass back to update_patient
         }
 
+def get_patient_row_version(patient_id: int):
+    """Current RowVersion of a patient (None if gone); cheap staleness check for cached records."""
+    with conn_cursor() as (_, cur):
+        cur.execute("""
+            SELECT pr.row_version
+            FROM dbo.patients AS p
+            JOIN dbo.persons  AS pr ON pr.id = p.party_id
+            WHERE p.id = ?;
+        """, (patient_id,))
+        r = cur.fetchone()
+        return r.row_version if r else None
+
+# form/import key -> (label, size of its dbo.persons column)
+PATIENT_FIELD_SIZES = {
+    "FirstName": ("First name", 100), "LastName": ("Last name", 100), "NationalID": ("National ID", 20),
+    "Address": ("Address", 255), "Gender": ("Gender", 20), "Phone": ("Phone", 50),
+}
+
+def validate_patient(data: dict):
+    """Rules shared by the Add/Edit form and bulk import. Returns an error message or None."""
+    if not all((data.get(k) or "").strip() for k in ("FirstName", "LastName", "NationalID")):
+        return "First name, Last name and National ID are required."
+    for key, (label, size) in PATIENT_FIELD_SIZES.items():
+        if len(data.get(key) or "") > size:  # SQL Server would refuse it (SQLite would not)
+            return f"{label} is longer than {size} characters."
+    # Simple phone/national id checks can be added as needed
+    return None
+
 def insert_patient(data: dict) -> int:
     """
     data: { FirstName, LastName, NationalID, BirthDate(date), Gender, Phone, Address }
     return: patient_id
+    parties -> persons -> patients in one batch (one round trip, one transaction);
+    on SQLite three statements in one transaction (in-process, so no network trips).
     """
+    values = (
+        data.get("FirstName"), data.get("LastName"), data.get("NationalID"),
+        data.get("Address") or "",
+        data.get("Gender") or "",
+        data.get("BirthDate"),
+        data.get("Phone") or "",
+    )
+    if _sqlite():
+        return _insert_patient_sqlite(values)
     with conn_cursor() as (conn, cur):
-        # 1) parties
-        cur.execute("INSERT INTO dbo.parties(party_type) VALUES ('PERSON');")
-        cur.execute("SELECT CAST(SCOPE_IDENTITY() AS INT);")
-        party_id = cur.fetchone()[0]
-
-        # 2) persons (id = party_id)
         cur.execute("""
+            SET NOCOUNT ON;
+            DECLARE @party TABLE (id int);
+            DECLARE @patient TABLE (id int);
+
+            INSERT INTO dbo.parties (party_type)
+            OUTPUT INSERTED.id INTO @party
+            VALUES ('PERSON');
+
             INSERT INTO dbo.persons
             (id, first_name, last_name, national_id, address, gender, date_of_birth, phone_number)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            party_id,
-            data.get("FirstName"), data.get("LastName"), data.get("NationalID"),
-            data.get("Address") or "",
-            data.get("Gender") or "",
-            data.get("BirthDate"),
-            data.get("Phone") or "",
-        ))
-
-        # 3) patients
-        cur.execute("INSERT INTO dbo.patients (party_id) VALUES (?);", (party_id,))
-        cur.execute("SELECT CAST(SCOPE_IDENTITY() AS INT);")
+            SELECT id, ?, ?, ?, ?, ?, ?, ?
+            FROM @party;
+
+            INSERT INTO dbo.patients (party_id)
+            OUTPUT INSERTED.id INTO @patient
+            SELECT id FROM @party;
+
+            SELECT id FROM @patient;
+        """, values)
         patient_id = cur.fetchone()[0]
         return patient_id
 
-def update_patient(patient_id: int, data: dict) -> bool:
-    """Update persons by patient_id."""
+def _insert_patient_sqlite(values) -> int:
+    # embedded: three statements cost no network round trips
     with conn_cursor() as (_, cur):
-        cur.execute("SELECT party_id FROM dbo.patients WHERE id = ?;", (patient_id,))
-        row = cur.fetchone()
-        if not row:
-            return False
-        party_id = row.party_id
-
-    with conn_cursor() as (_, cur):
-        cur.execute("""
-            UPDATE dbo.persons
-               SET first_name   = ?,
-                   last_name    = ?,
-                   national_id  = ?,
-                   address      = ?,
-                   gender       = ?,
-                   date_of_birth= ?,
-                   phone_number = ?
-             WHERE id = ?;
-        """, (
-            data.get("FirstName"), data.get("LastName"), data.get("NationalID"),
-            data.get("Address") or "", data.get("Gender") or "",
-            data.get("BirthDate"), data.get("Phone") or "", party_id
-        ))
-        return cur.rowcount > 0
+        cur.execute("INSERT INTO dbo.parties (party_type) VALUES ('PERSON') RETURNING id;")
+        party_id = cur.fetchall()[0][0]
+        cur.execute("""
+            INSERT INTO dbo.persons
+            (id, first_name, last_name, national_id, address, gender, date_of_birth, phone_number)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+        """, (party_id, *values))
+        cur.execute("INSERT INTO dbo.patients (party_id) VALUES (?) RETURNING id;", (party_id,))
+        return cur.fetchall()[0][0]
+
+def insert_patients_bulk(rows) -> tuple:
+    """
+    Set-based insert of many patients in ONE transaction.
+    rows: [(row_no, data), ...] with data shaped like insert_patient's.
+    Returns: ([(row_no, patient_id), ...], [(row_no, error), ...])
+    Rows whose national_id is already registered are rejected, not inserted.
+    """
+    params = [(
+        rn,
+        d.get("FirstName"), d.get("LastName"), d.get("NationalID"),
+        d.get("Address") or "", d.get("Gender") or "",
+        d.get("BirthDate"), d.get("Phone") or "",
+    ) for rn, d in rows]
+    if not params:
+        return [], []
+    if _sqlite():
+        return _insert_patients_bulk_sqlite(params)
+
+    with conn_cursor() as (_, cur):
+        cur.execute("""
+            SET NOCOUNT ON;
+            IF OBJECT_ID('tempdb..#patient_import') IS NOT NULL DROP TABLE #patient_import;
+            CREATE TABLE #patient_import (
+                rn            int PRIMARY KEY,
+                first_name    nvarchar(100),
+                last_name     nvarchar(100),
+                national_id   nvarchar(20),
+                address       nvarchar(255),
+                gender        nvarchar(20),
+                date_of_birth date,
+                phone_number  nvarchar(50)
+            );
+        """)
+        # stage the whole batch in one bulk parameter array
+        cur.fast_executemany = True
+        cur.executemany("""
+            INSERT INTO #patient_import
+            (rn, first_name, last_name, national_id, address, gender, date_of_birth, phone_number)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, params)
+
+        cur.execute("""
+            SET NOCOUNT ON;
+            DELETE s
+            OUTPUT DELETED.rn
+            FROM #patient_import AS s
+            JOIN dbo.persons AS pr ON pr.national_id = s.national_id;
+        """)
+        rejected = [(r[0], "National ID already registered.") for r in cur.fetchall()]
+
+        # MERGE (not INSERT) so OUTPUT can pair each staged row with its new id
+        cur.execute("""
+            SET NOCOUNT ON;
+            DECLARE @party TABLE (rn int PRIMARY KEY, party_id int NOT NULL);
+            DECLARE @patient TABLE (rn int PRIMARY KEY, patient_id int NOT NULL);
+
+            MERGE dbo.parties AS t
+            USING #patient_import AS s ON 1 = 0
+            WHEN NOT MATCHED THEN INSERT (party_type) VALUES ('PERSON')
+            OUTPUT s.rn, INSERTED.id INTO @party (rn, party_id);
+
+            INSERT INTO dbo.persons
+            (id, first_name, last_name, national_id, address, gender, date_of_birth, phone_number)
+            SELECT m.party_id, s.first_name, s.last_name, s.national_id,
+                   s.address, s.gender, s.date_of_birth, s.phone_number
+            FROM #patient_import AS s
+            JOIN @party AS m ON m.rn = s.rn;
+
+            DROP TABLE #patient_import;
+
+            MERGE dbo.patients AS t
+            USING @party AS m ON 1 = 0
+            WHEN NOT MATCHED THEN INSERT (party_id) VALUES (m.party_id)
+            OUTPUT m.rn, INSERTED.id INTO @patient (rn, patient_id);
+
+            SELECT rn, patient_id FROM @patient;
+        """)
+        inserted = [(r[0], r[1]) for r in cur.fetchall()]
+        return inserted, rejected
+
+def _insert_patients_bulk_sqlite(params) -> tuple:
+    # No MERGE ... OUTPUT here: ids are handed out as MAX(id) + row number, which is
+    # safe because SQLite write transactions are serialized (BEGIN IMMEDIATE).
+    with conn_cursor() as (_, cur):
+        cur.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS patient_import (
+                rn            integer PRIMARY KEY,
+                first_name    text,
+                last_name     text,
+                national_id   text,
+                address       text,
+                gender        text,
+                date_of_birth date,
+                phone_number  text,
+                party_id      integer,
+                patient_id    integer
+            );
+        """)
+        cur.executemany("""
+            INSERT INTO temp.patient_import
+            (rn, first_name, last_name, national_id, address, gender, date_of_birth, phone_number)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, params)
+
+        cur.execute("""
+            DELETE FROM temp.patient_import
+            WHERE EXISTS (SELECT 1 FROM dbo.persons AS pr WHERE pr.national_id = patient_import.national_id)
+            RETURNING rn;
+        """)
+        rejected = [(r[0], "National ID already registered.") for r in cur.fetchall()]
+
+        cur.execute("""
+            UPDATE temp.patient_import
+               SET party_id   = b.party_base + n.k,
+                   patient_id = b.patient_base + n.k
+              FROM (SELECT rn, ROW_NUMBER() OVER (ORDER BY rn) AS k FROM temp.patient_import) AS n,
+                   (SELECT (SELECT IFNULL(MAX(id), 0) FROM dbo.parties)  AS party_base,
+                           (SELECT IFNULL(MAX(id), 0) FROM dbo.patients) AS patient_base) AS b
+             WHERE n.rn = patient_import.rn;
+        """)
+        cur.execute("INSERT INTO dbo.parties (id, party_type) SELECT party_id, 'PERSON' FROM temp.patient_import;")
+        cur.execute("""
+            INSERT INTO dbo.persons
+            (id, first_name, last_name, national_id, address, gender, date_of_birth, phone_number)
+            SELECT party_id, first_name, last_name, national_id, address, gender, date_of_birth, phone_number
+            FROM temp.patient_import;
+        """)
+        cur.execute("INSERT INTO dbo.patients (id, party_id) SELECT patient_id, party_id FROM temp.patient_import;")
+        cur.execute("SELECT rn, patient_id FROM temp.patient_import ORDER BY rn;")
+        inserted = [(r[0], r[1]) for r in cur.fetchall()]
+        cur.execute("DROP TABLE temp.patient_import;")
+        return inserted, rejected
+
+def update_patient(patient_id: int, data: dict, row_version: bytes = None) -> bool:
+    """
+    Update persons by patient_id in one statement (UPDATE ... JOIN patients).
+    row_version: RowVersion from get_patient_by_id; when given, the update only
+    applies if nobody changed the row since, otherwise ConcurrencyError.
+    Returns False if the patient does not exist (without row_version).
+    """
+    sql = """
+        SET NOCOUNT ON;
+        DECLARE @changed TABLE (row_version binary(8));
+
+        UPDATE pr
+           SET first_name   = ?,
+               last_name    = ?,
+               national_id  = ?,
+               address      = ?,
+               gender       = ?,
+               date_of_birth= ?,
+               phone_number = ?
+        OUTPUT INSERTED.row_version INTO @changed
+          FROM dbo.persons  AS pr
+          JOIN dbo.patients AS p ON p.party_id = pr.id
+         WHERE p.id = ?{check};
+
+        SELECT row_version FROM @changed;
+    """
+    params = [
+        data.get("FirstName"), data.get("LastName"), data.get("NationalID"),
+        data.get("Address") or "", data.get("Gender") or "",
+        data.get("BirthDate"), data.get("Phone") or "", patient_id
+    ]
+    if row_version is not None:
+        params.append(row_version)
+    if _sqlite():
+        sql = """
+        UPDATE dbo.persons
+           SET first_name   = ?,
+               last_name    = ?,
+               national_id  = ?,
+               address      = ?,
+               gender       = ?,
+               date_of_birth= ?,
+               phone_number = ?,
+               row_version  = row_version + 1
+         WHERE id = (SELECT party_id FROM dbo.patients WHERE id = ?){check}
+        RETURNING row_version;
+        """
+    check = "" if row_version is None else " AND row_version = ?" if _sqlite() else " AND pr.row_version = ?"
+    with conn_cursor() as (_, cur):
+        cur.execute(sql.format(check=check), params)
+        updated = bool(cur.fetchall())
+    if not updated and row_version is not None:
+        raise ConcurrencyError("This patient was changed or removed by another user. Reload and try again.")
+    return updated
+
+# ---------- patient change feed (delta sync) ----------
+def patient_change_watermark():
+    """Watermark meaning "now": list_patient_changes(watermark) returns only later changes."""
+    with conn_cursor() as (_, cur):
+        if _sqlite():
+            cur.execute("SELECT IFNULL(MAX(seq), 0) FROM dbo.patient_changes;")
+        else:
+            cur.execute("SELECT CAST(CAST(MIN_ACTIVE_ROWVERSION() AS bigint) - 1 AS binary(8));")
+        return cur.fetchone()[0]
+
+def list_patient_changes(watermark, limit: int = 1000):
+    """
+    Patients inserted, updated or deleted after `watermark` (from patient_change_watermark
+    or a previous call), oldest first, each with its current grid row.
+    Returns: ([(PatientID, op, (PatientID, FirstName, LastName, NationalID) | None), ...], new_watermark)
+    op is "I", "U" or "D"; the row is None once the patient is gone.
+    """
+    sql = """
+    SELECT {top} c.{version} AS version, c.patient_id, c.op
+         , p.id AS current_id, pr.first_name, pr.last_name, pr.national_id
+    FROM dbo.patient_changes AS c
+    LEFT JOIN dbo.patients   AS p  ON p.id = c.patient_id
+    LEFT JOIN dbo.persons    AS pr ON pr.id = p.party_id
+    WHERE c.{version} > ?{in_flight}
+    ORDER BY c.{version}
+    {limit};
+    """
+    if _sqlite():
+        sql, params = _limit(sql, limit, [watermark], version="seq", in_flight="")
+    else:
+        # versions at or above MIN_ACTIVE_ROWVERSION() may still be joined by uncommitted ones
+        sql, params = _limit(sql, limit, [watermark], version="version",
+                             in_flight=" AND c.version < MIN_ACTIVE_ROWVERSION()")
+    with conn_cursor() as (_, cur):
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    changes = [(r.patient_id, r.op,
+                (r.current_id, r.first_name, r.last_name, r.national_id) if r.current_id is not None else None)
+               for r in rows]
+    return changes, rows[-1].version if rows else watermark
+
+def prune_patient_changes(keep_days: int = 7) -> int:
+    """Delete change-log rows older than keep_days; desks poll every few seconds. Returns rows deleted."""
+    with conn_cursor() as (_, cur):
+        cur.execute("DELETE FROM dbo.patient_changes WHERE changed_at < ?;",
+                    (datetime.now() - timedelta(days=keep_days),))
+        return cur.rowcount
 
 def insert_appointment(patient_id: int, doctor_id: int, when_dt, status="Scheduled") -> bool:
+    """One INSERT, one round trip."""
     with conn_cursor() as (_, cur):
         cur.execute("""
             INSERT INTO dbo.appointments (patient_id, doctor_id, appointment_at, status)
@@ -135,11 +731,1241 @@ def insert_appointment(patient_id: int, doctor_id: int, when_dt, status="Schedul
         """, (patient_id, doctor_id, when_dt, status))
         return True
 
+def book_appointment(patient_id: int, doctor_id: int, when_dt, slot_minutes: int = 30):
+    """
+    Conflict-checked booking in one atomic statement: the doctor must have no
+    other (non-cancelled) appointment within slot_minutes of when_dt.
+    UPDLOCK/HOLDLOCK range-lock the doctor's slot, so two desks cannot both win.
+    Returns the new appointment id, or None if the slot is taken.
+    """
+    if _sqlite():
+        # SQLite serializes write transactions, so the NOT EXISTS check is atomic as is
+        slot = timedelta(minutes=slot_minutes)
+        with conn_cursor() as (_, cur):
+            cur.execute("""
+                INSERT INTO dbo.appointments (patient_id, doctor_id, appointment_at, status)
+                SELECT ?, ?, ?, 'Scheduled'
+                WHERE NOT EXISTS (
+                    SELECT 1
+                    FROM dbo.appointments
+                    WHERE doctor_id = ?
+                      AND appointment_at > ?
+                      AND appointment_at < ?
+                      AND status <> 'Cancelled'
+                )
+                RETURNING id;
+            """, (patient_id, doctor_id, when_dt, doctor_id, when_dt - slot, when_dt + slot))
+            r = cur.fetchall()
+            return r[0][0] if r else None
+    with conn_cursor() as (_, cur):
+        cur.execute("""
+            SET NOCOUNT ON;
+            DECLARE @new TABLE (id int);
+
+            INSERT INTO dbo.appointments (patient_id, doctor_id, appointment_at, status)
+            OUTPUT INSERTED.id INTO @new
+            SELECT ?, ?, ?, 'Scheduled'
+            WHERE NOT EXISTS (
+                SELECT 1
+                FROM dbo.appointments WITH (UPDLOCK, HOLDLOCK)
+                WHERE doctor_id = ?
+                  AND appointment_at > DATEADD(minute, -?, ?)
+                  AND appointment_at < DATEADD(minute, ?, ?)
+                  AND status <> 'Cancelled'
+            );
+
+            SELECT id FROM @new;
+        """, (patient_id, doctor_id, when_dt,
+              doctor_id, slot_minutes, when_dt, slot_minutes, when_dt))
+        r = cur.fetchone()
+        return r[0] if r else None
+
+def list_booked_appointments(start_dt, end_dt):
+    """Returns: [(doctor_id, appointment_at), ...] of non-cancelled appointments in [start, end)."""
+    with conn_cursor() as (_, cur):
+        cur.execute("""
+            SELECT doctor_id, appointment_at
+            FROM dbo.appointments
+            WHERE appointment_at >= ? AND appointment_at < ?
+              AND status <> 'Cancelled';
+        """, (start_dt, end_dt))
+        return [(r.doctor_id, r.appointment_at) for r in cur.fetchall()]
+
+# ---------- patient timeline ----------
+# section -> (alias, date column, SELECT with {top}/{keyset}/{limit} slots, row -> (title, detail)).
+# Each section is read newest first on a (patient_id, date) index; undated rows come last.
+def _dose(r):
+    text = f"{float(r.dosage_amount):g} {r.dosage_unit}"
+    if r.frequency_value:
+        text += f", {r.frequency_value} x {r.frequency_type or ''}".rstrip()
+    if r.duration_value:
+        text += f" for {r.duration_value} {r.duration_unit or ''}".rstrip()
+    return text + (f" — {r.instructions}" if r.instructions else "")
+
+TIMELINE_SECTIONS = {
+    "appointments": ("a", "appointment_at", """
+        SELECT {top} a.id, a.appointment_at AS at, a.status, d.first_name, d.last_name
+        FROM dbo.appointments AS a
+        JOIN dbo.employees AS e ON e.id = a.doctor_id
+        JOIN dbo.persons AS d ON d.id = e.party_id
+        WHERE a.patient_id = ? {keyset}
+        ORDER BY a.appointment_at DESC, a.id DESC {limit};
+    """, lambda r: (f"Visit ({r.status})", f"Dr. {r.first_name} {r.last_name}")),
+    "medical_records": ("mr", "created_at", """
+        SELECT {top} mr.id, mr.created_at AS at, mr.diagnosis, mr.treatment_plan
+        FROM dbo.medical_records AS mr
+        WHERE mr.patient_id = ? {keyset}
+        ORDER BY mr.created_at DESC, mr.id DESC {limit};
+    """, lambda r: (r.diagnosis, r.treatment_plan or "")),
+    "lab_tests": ("lt", "ordered_at", """
+        SELECT {top} lt.id, lt.ordered_at AS at, lt.test_type, lt.result
+        FROM dbo.lab_tests AS lt
+        WHERE lt.patient_id = ? {keyset}
+        ORDER BY lt.ordered_at DESC, lt.id DESC {limit};
+    """, lambda r: (r.test_type, r.result or "Pending")),
+    "prescriptions": ("rx", "created_at", """
+        SELECT {top} rx.id, rx.created_at AS at, m.name
+             , rx.dosage_amount, rx.dosage_unit, rx.frequency_type, rx.frequency_value
+             , rx.duration_unit, rx.duration_value, rx.instructions
+        FROM dbo.prescriptions AS rx
+        JOIN dbo.medicines AS m ON m.id = rx.medicine_id
+        WHERE rx.patient_id = ? {keyset}
+        ORDER BY rx.created_at DESC, rx.id DESC {limit};
+    """, lambda r: (r.name, _dose(r))),
+    "invoices": ("i", "invoice_date", """
+        SELECT {top} i.id, i.invoice_date AS at, i.status
+             , (SELECT SUM(li.amount) FROM dbo.invoice_line_items AS li WHERE li.invoice_id = i.id) AS total
+        FROM dbo.invoices AS i
+        WHERE i.patient_id = ? {keyset}
+        ORDER BY i.invoice_date DESC, i.id DESC {limit};
+    """, lambda r: (f"Invoice #{r.id} ({r.status})", f"{float(r.total or 0):,.2f}")),
+    "room_stays": ("ra", "start_at", """
+        SELECT {top} ra.id, ra.start_at AS at, r.room_number, ra.end_at
+        FROM dbo.room_assignments AS ra
+        JOIN dbo.rooms AS r ON r.id = ra.room_id
+        WHERE ra.patient_id = ? {keyset}
+        ORDER BY ra.start_at DESC, ra.id DESC {limit};
+    """, lambda r: (f"Room {r.room_number}", f"until {r.end_at:%Y-%m-%d %H:%M}" if r.end_at else "Current stay")),
+}
+
+def _timeline_sql(section: str, patient_id: int, before, limit: int):
+    """(sql, params) for one keyset page of a section; before = (at, id) of the last row shown."""
+    alias, column, sql, _ = TIMELINE_SECTIONS[section]
+    at, key = f"{alias}.{column}", f"{alias}.id"
+    if before is None:
+        keyset, params = "", [patient_id]
+    elif before[0] is None:  # already in the undated tail
+        keyset, params = f"AND {at} IS NULL AND {key} < ?", [patient_id, before[1]]
+    else:
+        keyset = f"AND ({at} < ? OR ({at} = ? AND {key} < ?) OR {at} IS NULL)"
+        params = [patient_id, before[0], before[0], before[1]]
+    return _limit(sql, limit, params, keyset=keyset)
+
+def _timeline_rows(section: str, rows):
+    to_text = TIMELINE_SECTIONS[section][3]
+    return [(r.id, r.at, *to_text(r)) for r in rows]
+
+def get_patient_timeline(patient_id: int, per_section: int = 20) -> dict:
+    """
+    First page of every timeline section for one patient.
+    SQL Server: one batch, one round trip, read with nextset(). SQLite runs
+    in-process, so the sections are plain statements on the same connection.
+    Returns: {section: [(id, at, title, detail), ...]} newest first; a section
+    with per_section rows may have more (list_timeline_section).
+    """
+    pages = [_timeline_sql(section, patient_id, None, per_section) for section in TIMELINE_SECTIONS]
+    timeline = {}
+    with conn_cursor() as (_, cur):
+        if _sqlite():
+            for section, (sql, params) in zip(TIMELINE_SECTIONS, pages):
+                cur.execute(sql, params)
+                timeline[section] = _timeline_rows(section, cur.fetchall())
+            return timeline
+        cur.execute("SET NOCOUNT ON;\n" + "\n".join(sql for sql, _ in pages),
+                    [p for _, params in pages for p in params])
+        for i, section in enumerate(TIMELINE_SECTIONS):
+            if i:
+                cur.nextset()
+            timeline[section] = _timeline_rows(section, cur.fetchall())
+    return timeline
+
+def list_timeline_section(patient_id: int, section: str, before=None, limit: int = 50):
+    """
+    Keyset page of one timeline section, older than `before` = (at, id) of the
+    last row already shown (None = newest). Returns [(id, at, title, detail), ...].
+    """
+    sql, params = _timeline_sql(section, patient_id, before, limit)
+    with conn_cursor() as (_, cur):
+        cur.execute(sql, params)
+        return _timeline_rows(section, cur.fetchall())
+
+# ---------- duplicate detection ----------
+_MATCH_FIELDS = """
+    SELECT p.id, pr.first_name, pr.last_name, pr.national_id, pr.date_of_birth, pr.phone_number
+    FROM dbo.patients AS p
+    JOIN dbo.persons  AS pr ON pr.id = p.party_id
+"""
+
+def iter_patient_match_fields(batch: int = 5000):
+    """
+    Stream every patient's matching fields in id order, `batch` rows per fetch
+    (builds the duplicate blocking index and the batch report in constant memory).
+    Yields: (PatientID, first_name, last_name, national_id, date_of_birth, phone_number)
+    """
+    with conn_cursor() as (_, cur):
+        cur.execute(_MATCH_FIELDS + "ORDER BY p.id;")
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows:
+                return
+            for r in rows:
+                yield tuple(r)
+
+def get_patient_match_fields(patient_ids):
+    """The same fields for the given patients (missing ids are left out), 500 ids per statement."""
+    ids = list(dict.fromkeys(patient_ids))
+    out = []
+    with conn_cursor() as (_, cur):
+        for i in range(0, len(ids), 500):  # SQL Server takes at most 2100 parameters
+            chunk = ids[i:i + 500]
+            cur.execute(_MATCH_FIELDS + f"WHERE p.id IN ({', '.join('?' * len(chunk))});", chunk)
+            out += [tuple(r) for r in cur.fetchall()]
+    return out
+
+# ---------- clinical search ----------
+# source -> (alias, date column, SQLite FTS5 table, SQL Server full-text columns, title, detail).
+# Migration 0006 builds the inverted indexes; triggers (SQLite) and change tracking
+# (SQL Server) keep them current as records are written.
+CLINICAL_SOURCES = {
+    "medical_records": ("mr", "created_at", "medical_records_fts", "(diagnosis, treatment_plan)",
+                        "mr.diagnosis", "mr.treatment_plan"),
+    "lab_tests": ("lt", "ordered_at", "lab_tests_fts", "(test_type, result)", "lt.test_type", "lt.result"),
+}
+SEARCH_MAX_TERMS = 8
+SEARCH_WINDOW = 2000  # SQLite: newest matches per source that bm25 ranks (bounds common-word queries)
+
+def clinical_search_terms(text: str) -> list:
+    """Lower-cased word tokens of a search box entry, at most SEARCH_MAX_TERMS."""
+    return re.findall(r"\w+", (text or "").lower())[:SEARCH_MAX_TERMS]
+
+def _clinical_match(terms) -> str:
+    """Every term must match; the last one as a prefix (search as you type). Tokens are \\w+, safe to quote."""
+    if _sqlite():
+        return " ".join(f'"{t}"' for t in terms) + "*"
+    return " AND ".join(f'"{t}"' for t in terms[:-1]) + (" AND " if len(terms) > 1 else "") + f'"{terms[-1]}*"'
+
+def _clinical_part(source: str, filters: str, by_patient: bool) -> str:
+    """One source's best {top}/{limit} hits; its params are (match, *filter values)."""
+    a, at, fts, columns, title, detail = CLINICAL_SOURCES[source]
+    filters = filters.format(a=a, at=at)
+    select = f"SELECT {{top}} '{source}' AS source, {a}.id, {a}.patient_id, {a}.{at} AS at, " \
+             f"{title} AS title, {detail} AS detail"
+    if not _sqlite():
+        return f"""
+            {select}, ft.[RANK] AS score
+            FROM CONTAINSTABLE(dbo.{source}, {columns}, ?) AS ft
+            JOIN dbo.{source} AS {a} ON {a}.id = ft.[KEY]
+            WHERE 1 = 1{filters}
+            ORDER BY {f"{a}.{at}" if by_patient else "ft.[RANK]"} DESC {{limit}}"""
+    if by_patient:
+        # the patient's own notes that match: one pass over the hits, no per-row index cursor
+        return f"""
+            {select}, NULL AS score
+            FROM dbo.{source} AS {a}
+            WHERE {a}.id IN (SELECT rowid FROM dbo.{fts} WHERE {fts} MATCH ?){filters}
+            ORDER BY {a}.{at} DESC {{limit}}"""
+    # bm25 over the newest SEARCH_WINDOW hits; FTS5 streams them in rowid order
+    return f"""
+            SELECT {{top}} * FROM (
+                {select}, -bm25({fts}, 2.0, 1.0) AS score
+                FROM dbo.{fts}
+                JOIN dbo.{source} AS {a} ON {a}.id = {fts}.rowid
+                WHERE {fts} MATCH ?{filters}
+                ORDER BY {fts}.rowid DESC LIMIT {SEARCH_WINDOW}
+            ) AS w
+            ORDER BY score DESC {{limit}}"""
+
+def search_clinical(text: str, patient_id: int = None, date_from=None, date_to=None, sources=None,
+                    limit: int = 50):
+    """
+    Full-text search over diagnoses, treatment plans and lab results. Every
+    word must occur (the last may be a prefix); optional date range, date_to
+    inclusive. Across patients the best matches come first (on SQLite bm25
+    ranks each source's newest SEARCH_WINDOW hits); within one patient the
+    hits are few and come newest first.
+    Returns: [(source, id, patient_id, first_name, last_name, at, title, detail, score), ...]
+    """
+    terms = clinical_search_terms(text)
+    if not terms:
+        return []
+    match = _clinical_match(terms)
+    filters, values = "", []
+    if patient_id is not None:
+        filters += " AND {a}.patient_id = ?"
+        values.append(patient_id)
+    if date_from is not None:
+        filters += " AND {a}.{at} >= ?"
+        values.append(datetime.combine(date_from, datetime.min.time()))
+    if date_to is not None:
+        filters += " AND {a}.{at} < ?"
+        values.append(datetime.combine(date_to, datetime.min.time()) + timedelta(days=1))
+    parts, params = [], []
+    for i, source in enumerate(sources or CLINICAL_SOURCES):
+        sql, part_params = _limit(_clinical_part(source, filters, patient_id is not None), limit, [match, *values])
+        parts.append(f"SELECT * FROM ({sql}) AS s{i}")
+        params += part_params
+    sql, params = _limit("""
+        SELECT {top} x.source, x.id, x.patient_id, pr.first_name, pr.last_name, x.at, x.title, x.detail, x.score
+        FROM ({union}) AS x
+        JOIN dbo.patients AS p  ON p.id = x.patient_id
+        JOIN dbo.persons  AS pr ON pr.id = p.party_id
+        ORDER BY {order} {limit};
+    """, limit, params, union="\n        UNION ALL ".join(parts),
+        order="x.at DESC" if patient_id is not None else "x.score DESC, x.at DESC")
+    with conn_cursor() as (_, cur):
+        cur.execute(sql, params)
+        return [tuple(r) for r in cur.fetchall()]
+
+# ---------- doctors ----------
+def list_specializations():
+    """Returns: [(id, name), ...]"""
+    with conn_cursor() as (_, cur):
+        cur.execute("SELECT id, name FROM dbo.specializations ORDER BY name;")
+        return [(r.id, r.name) for r in cur.fetchall()]
+
+def list_doctors():
+    """Returns: [(doctor_id, full_name, specialization_id), ...] (one row per specialization)."""
+    with conn_cursor() as (_, cur):
+        cur.execute("""
+            SELECT e.id AS doctor_id
+                 , pr.first_name, pr.last_name
+                 , pp.specialization_id
+            FROM dbo.employees AS e
+            JOIN dbo.professional_profiles AS pp ON pp.employee_id = e.id
+            JOIN dbo.persons AS pr ON pr.id = e.party_id;
+        """)
+        return [(r.doctor_id, f"{r.first_name} {r.last_name}", r.specialization_id)
+                for r in cur.fetchall()]
+
+# ---------- rooms ----------
+def list_rooms():
+    """Returns: [(room_id, room_number, ward), ...]"""
+    with conn_cursor() as (_, cur):
+        cur.execute("SELECT id, room_number, ward FROM dbo.rooms ORDER BY ward, room_number;")
+        return [(r.id, r.room_number, r.ward) for r in cur.fetchall()]
+
+def list_room_assignments(since_dt, room_id: int = None):
+    """Assignments still relevant at/after since_dt (open, or ending later), of one room if given.
+    Returns: [(assignment_id, room_id, patient_id, start_at, end_at|None), ...]"""
+    with conn_cursor() as (_, cur):
+        if room_id is None:
+            cur.execute("""
+                SELECT id, room_id, patient_id, start_at, end_at
+                FROM dbo.room_assignments
+                WHERE end_at IS NULL OR end_at > ?;
+            """, (since_dt,))
+        else:
+            cur.execute("""
+                SELECT id, room_id, patient_id, start_at, end_at
+                FROM dbo.room_assignments
+                WHERE room_id = ? AND (end_at IS NULL OR end_at > ?);
+            """, (room_id, since_dt))
+        return [(r.id, r.room_id, r.patient_id, r.start_at, r.end_at) for r in cur.fetchall()]
+
+def insert_room_assignment(patient_id: int, room_id: int, start_at, end_at=None):
+    """
+    Assign a room for [start_at, end_at) (end_at None = until discharge).
+    Overlap-checked atomically (UPDLOCK/HOLDLOCK); the schema trigger is the backstop.
+    Returns the assignment id, or None if the room is taken in that range.
+    """
+    if _sqlite():
+        with conn_cursor() as (_, cur):
+            cur.execute("""
+                INSERT INTO dbo.room_assignments (patient_id, room_id, start_at, end_at)
+                SELECT ?, ?, ?, ?
+                WHERE NOT EXISTS (
+                    SELECT 1
+                    FROM dbo.room_assignments
+                    WHERE room_id = ?
+                      AND start_at < IFNULL(?, '9999-12-31')
+                      AND ? < IFNULL(end_at, '9999-12-31')
+                )
+                RETURNING id;
+            """, (patient_id, room_id, start_at, end_at, room_id, end_at, start_at))
+            r = cur.fetchall()
+            return r[0][0] if r else None
+    with conn_cursor() as (_, cur):
+        cur.execute("""
+            SET NOCOUNT ON;
+            DECLARE @new TABLE (id int);
+
+            INSERT INTO dbo.room_assignments (patient_id, room_id, start_at, end_at)
+            OUTPUT INSERTED.id INTO @new
+            SELECT ?, ?, ?, ?
+            WHERE NOT EXISTS (
+                SELECT 1
+                FROM dbo.room_assignments WITH (UPDLOCK, HOLDLOCK)
+                WHERE room_id = ?
+                  AND start_at < ISNULL(CAST(? AS datetime), '9999-12-31')  -- typed: a NULL parameter may bind as a short varchar
+                  AND ? < ISNULL(end_at, '9999-12-31')
+            );
+
+            SELECT id FROM @new;
+        """, (patient_id, room_id, start_at, end_at, room_id, end_at, start_at))
+        r = cur.fetchone()
+        return r[0] if r else None
+
+def end_room_assignment(assignment_id: int, end_at) -> bool:
+    """Close an assignment (discharge / transfer out)."""
+    with conn_cursor() as (_, cur):
+        cur.execute("""
+            UPDATE dbo.room_assignments SET end_at = ?
+            WHERE id = ? AND (end_at IS NULL OR end_at > ?);
+        """, (end_at, assignment_id, end_at))
+        return cur.rowcount > 0
+
+# ---------- pharmacy ----------
+def list_medicines():
+    """Returns: [(id, name), ...]"""
+    with conn_cursor() as (_, cur):
+        cur.execute("SELECT id, name FROM dbo.medicines ORDER BY name;")
+        return [(r.id, r.name) for r in cur.fetchall()]
+
+def list_dispensable_batches(as_of, medicine_id: int = None):
+    """
+    Batches with stock that have not expired by as_of (a date), FEFO order per medicine.
+    Returns: [(batch_id, medicine_id, expiration_date, quantity_on_hand), ...]
+    """
+    sql = """
+        SELECT id, medicine_id, expiration_date, quantity_on_hand
+        FROM dbo.medicine_batches
+        WHERE quantity_on_hand > 0 AND expiration_date >= ?{medicine}
+        ORDER BY medicine_id, expiration_date, id;
+    """
+    params = [as_of]
+    if medicine_id is not None:
+        params.append(medicine_id)
+    with conn_cursor() as (_, cur):
+        cur.execute(sql.format(medicine=" AND medicine_id = ?" if medicine_id is not None else ""), params)
+        return [(r.id, r.medicine_id, r.expiration_date, r.quantity_on_hand) for r in cur.fetchall()]
+
+def dispense_stock(allocations, user_id: int, prescription_id: int = None) -> int:
+    """
+    Take stock out of batches and log one DISPENSE movement per batch, in one transaction.
+    allocations: [(batch_id, quantity), ...], one entry per batch (PharmacyEngine.allocate).
+    A batch is only decremented if it still holds the quantity; if any does not (another
+    terminal dispensed from it first) nothing is written and ConcurrencyError is raised.
+    Returns the number of movements written.
+    """
+    lines = sorted(allocations)  # every terminal locks batches in the same order
+    now = datetime.now()
+    if _sqlite():
+        # SQLite serializes write transactions; the guarded UPDATEs are the whole check
+        with conn_cursor() as (_, cur):
+            cur.executemany("""
+                UPDATE dbo.medicine_batches SET quantity_on_hand = quantity_on_hand - ?
+                WHERE id = ? AND quantity_on_hand >= ?;
+            """, [(qty, batch_id, qty) for batch_id, qty in lines])
+            if cur.rowcount != len(lines):
+                raise ConcurrencyError("Stock of this medicine changed on another terminal. Try again.")
+            cur.executemany("""
+                INSERT INTO dbo.inventory_movements
+                (batch_id, quantity_change, movement_type, created_by_user_id, created_at, prescription_id)
+                VALUES (?, ?, 'DISPENSE', ?, ?, ?);
+            """, [(batch_id, -qty, user_id, now, prescription_id) for batch_id, qty in lines])
+        return len(lines)
+    values = ", ".join("(?, ?)" for _ in lines)
+    with conn_cursor() as (_, cur):
+        cur.execute(f"""
+            SET NOCOUNT ON;
+            DECLARE @lines TABLE (batch_id int PRIMARY KEY, qty int NOT NULL);
+            DECLARE @taken TABLE (batch_id int);
+            INSERT INTO @lines (batch_id, qty) VALUES {values};
+
+            UPDATE b SET quantity_on_hand = b.quantity_on_hand - l.qty
+            OUTPUT INSERTED.id INTO @taken
+            FROM dbo.medicine_batches AS b
+            JOIN @lines AS l ON l.batch_id = b.id
+            WHERE b.quantity_on_hand >= l.qty;
+
+            IF (SELECT COUNT(*) FROM @taken) = (SELECT COUNT(*) FROM @lines)
+                INSERT INTO dbo.inventory_movements
+                (batch_id, quantity_change, movement_type, created_by_user_id, created_at, prescription_id)
+                SELECT batch_id, -qty, 'DISPENSE', ?, ?, ?
+                FROM @lines;
+
+            SELECT (SELECT COUNT(*) FROM @taken) AS taken;
+        """, [v for line in lines for v in line] + [user_id, now, prescription_id])
+        if cur.fetchone().taken != len(lines):
+            # raising inside conn_cursor rolls the partial UPDATE back
+            raise ConcurrencyError("Stock of this medicine changed on another terminal. Try again.")
+    return len(lines)
+
+def receive_batch(medicine_id: int, batch_number: str, expiration_date, quantity: int, user_id: int) -> int:
+    """New batch plus its RECEIVE movement in one transaction. Returns the batch id."""
+    now = datetime.now()
+    if _sqlite():
+        with conn_cursor() as (_, cur):
+            cur.execute("""
+                INSERT INTO dbo.medicine_batches (medicine_id, batch_number, expiration_date, quantity_on_hand)
+                VALUES (?, ?, ?, ?)
+                RETURNING id;
+            """, (medicine_id, batch_number, expiration_date, quantity))
+            batch_id = cur.fetchall()[0][0]
+            cur.execute("""
+                INSERT INTO dbo.inventory_movements
+                (batch_id, quantity_change, movement_type, created_by_user_id, created_at)
+                VALUES (?, ?, 'RECEIVE', ?, ?);
+            """, (batch_id, quantity, user_id, now))
+            return batch_id
+    with conn_cursor() as (_, cur):
+        cur.execute("""
+            SET NOCOUNT ON;
+            DECLARE @batch TABLE (id int);
+
+            INSERT INTO dbo.medicine_batches (medicine_id, batch_number, expiration_date, quantity_on_hand)
+            OUTPUT INSERTED.id INTO @batch
+            VALUES (?, ?, ?, ?);
+
+            INSERT INTO dbo.inventory_movements
+            (batch_id, quantity_change, movement_type, created_by_user_id, created_at)
+            SELECT id, ?, 'RECEIVE', ?, ? FROM @batch;
+
+            SELECT id FROM @batch;
+        """, (medicine_id, batch_number, expiration_date, quantity, quantity, user_id, now))
+        return cur.fetchone()[0]
+
+def list_medicine_stock():
+    """Stock on hand per medicine from the medicine_stock aggregate. Returns: [(medicine_id, name, quantity), ...]"""
+    with conn_cursor() as (_, cur):
+        cur.execute("""
+            SELECT m.id, m.name, s.quantity_on_hand
+            FROM dbo.medicines AS m
+            LEFT JOIN dbo.medicine_stock AS s ON s.medicine_id = m.id
+            ORDER BY m.name;
+        """)
+        return [(r.id, r.name, r.quantity_on_hand or 0) for r in cur.fetchall()]
+
+def list_near_expiry(until):
+    """
+    Batches still holding stock that expire before `until` (a date); expired ones included.
+    Returns: [(batch_id, medicine_name, batch_number, expiration_date, quantity_on_hand), ...]
+    """
+    with conn_cursor() as (_, cur):
+        cur.execute("""
+            SELECT b.id, m.name, b.batch_number, b.expiration_date, b.quantity_on_hand
+            FROM dbo.medicine_batches AS b
+            JOIN dbo.medicines AS m ON m.id = b.medicine_id
+            WHERE b.quantity_on_hand > 0 AND b.expiration_date < ?
+            ORDER BY b.expiration_date, m.name;
+        """, (until,))
+        return [(r.id, r.name, r.batch_number, r.expiration_date, r.quantity_on_hand) for r in cur.fetchall()]
+
+# ---------- billing ----------
+# Billable services per day: completed visits, prescriptions, lab tests (by ordered_at) and
+# every day a room assignment covers. Each is priced from billing_tariffs.
+_BILLABLE_SQLITE = """
+    INSERT INTO temp.billing_stage
+        (patient_id, service_date, source_service_type, source_service_id, description, amount)
+    SELECT a.patient_id, date(a.appointment_at), 'Visit', a.id, t.description, t.amount
+    FROM dbo.appointments AS a
+    JOIN dbo.billing_tariffs AS t ON t.service_type = 'Visit'
+    WHERE a.appointment_at >= ? AND a.appointment_at < ? AND a.status = 'Completed'
+    UNION ALL
+    SELECT p.patient_id, date(p.created_at), 'Pharmacy', p.id, t.description || ': ' || m.name, t.amount
+    FROM dbo.prescriptions AS p
+    JOIN dbo.medicines AS m ON m.id = p.medicine_id
+    JOIN dbo.billing_tariffs AS t ON t.service_type = 'Pharmacy'
+    WHERE p.created_at >= ? AND p.created_at < ?
+    UNION ALL
+    SELECT l.patient_id, date(l.ordered_at), 'Lab', l.id, t.description || ': ' || l.test_type, t.amount
+    FROM dbo.lab_tests AS l
+    JOIN dbo.billing_tariffs AS t ON t.service_type = 'Lab'
+    WHERE l.ordered_at >= ? AND l.ordered_at < ?;
+"""
+
+# datetime(), not the bare date: '2024-03-05 00:00:00' > '2024-03-05' as text, which would bill
+# a stay ending at midnight for the day it left (SQL Server compares datetimes and does not).
+_ROOM_DAYS_SQLITE = """
+    WITH RECURSIVE days (d) AS (
+        SELECT date(?)
+        UNION ALL
+        SELECT date(d, '+1 day') FROM days WHERE date(d, '+1 day') < date(?)
+    )
+    INSERT INTO temp.billing_stage
+        (patient_id, service_date, source_service_type, source_service_id, description, amount)
+    SELECT ra.patient_id, days.d, 'Room', ra.id, t.description || ': ' || r.room_number, t.amount
+    FROM days
+    JOIN dbo.room_assignments AS ra
+      ON ra.start_at < datetime(days.d, '+1 day') AND (ra.end_at IS NULL OR ra.end_at > datetime(days.d))
+    JOIN dbo.rooms AS r ON r.id = ra.room_id
+    JOIN dbo.billing_tariffs AS t ON t.service_type = 'Room';
+"""
+
+def bill_services(start, end) -> dict:
+    """
+    Invoice every billable service dated in [start, end) (dates), set-based, in one transaction.
+    Services already on an invoice line are skipped, so a rerun bills nothing twice: a visit,
+    prescription or lab test by type and id (even after its date was corrected), a room day
+    by assignment and date. Lines go on the patient's unpaid invoice for the service date,
+    created when there is none.
+    Returns: {"invoices": created, "lines": {service_type: (count, amount)}}
+    """
+    if _sqlite():
+        with conn_cursor() as (_, cur):
+            cur.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS billing_stage (
+                  patient_id integer, service_date date, source_service_type nvarchar(50),
+                  source_service_id integer, description nvarchar(255), amount decimal(18,2)
+                );
+            """)
+            cur.execute("DELETE FROM temp.billing_stage;")
+            cur.execute(_BILLABLE_SQLITE, (start, end) * 3)
+            cur.execute(_ROOM_DAYS_SQLITE, (start, end))
+            cur.execute("""
+                DELETE FROM temp.billing_stage
+                WHERE source_service_type <> 'Room' AND EXISTS (
+                    SELECT 1
+                    FROM dbo.invoice_line_items AS li
+                    WHERE li.source_service_type = billing_stage.source_service_type
+                      AND li.source_service_id = billing_stage.source_service_id
+                      AND li.source_service_type <> 'Room'
+                );
+            """)
+            cur.execute("""
+                DELETE FROM temp.billing_stage
+                WHERE source_service_type = 'Room' AND EXISTS (
+                    SELECT 1
+                    FROM dbo.invoice_line_items AS li
+                    WHERE li.source_service_type = 'Room'
+                      AND li.source_service_id = billing_stage.source_service_id
+                      AND li.service_date = billing_stage.service_date
+                );
+            """)
+            cur.execute("""
+                INSERT INTO dbo.invoices (patient_id, invoice_date, status)
+                SELECT DISTINCT s.patient_id, s.service_date, 'Unpaid'
+                FROM temp.billing_stage AS s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM dbo.invoices AS i
+                    WHERE i.patient_id = s.patient_id AND i.invoice_date = s.service_date AND i.status = 'Unpaid'
+                );
+            """)
+            invoices = cur.rowcount
+            cur.execute("""
+                INSERT INTO dbo.invoice_line_items
+                (invoice_id, description, amount, source_service_type, source_service_id, service_date)
+                SELECT (SELECT MIN(i.id) FROM dbo.invoices AS i
+                        WHERE i.patient_id = s.patient_id AND i.invoice_date = s.service_date
+                          AND i.status = 'Unpaid')
+                     , s.description, s.amount, s.source_service_type, s.source_service_id, s.service_date
+                FROM temp.billing_stage AS s;
+            """)
+            cur.execute("""
+                SELECT source_service_type, COUNT(*) AS n, SUM(amount) AS amount
+                FROM temp.billing_stage
+                GROUP BY source_service_type;
+            """)
+            lines = {r.source_service_type: (r.n, r.amount) for r in cur.fetchall()}
+        return {"invoices": invoices, "lines": lines}
+    with conn_cursor() as (_, cur):
+        cur.execute("""
+            SET NOCOUNT ON;
+            -- one billing run at a time; released at commit or rollback
+            EXEC sp_getapplock @Resource = 'hms_billing', @LockMode = 'Exclusive', @LockOwner = 'Transaction';
+            DECLARE @start date = ?, @end date = ?;
+            DECLARE @invoices TABLE (id int);
+
+            IF OBJECT_ID('tempdb..#billing_stage') IS NOT NULL DROP TABLE #billing_stage;
+            CREATE TABLE #billing_stage (
+              patient_id int, service_date date, source_service_type nvarchar(50),
+              source_service_id int, description nvarchar(255), amount decimal(18,2)
+            );
+
+            INSERT INTO #billing_stage
+                (patient_id, service_date, source_service_type, source_service_id, description, amount)
+            SELECT a.patient_id, CAST(a.appointment_at AS date), N'Visit', a.id, t.description, t.amount
+            FROM dbo.appointments AS a
+            JOIN dbo.billing_tariffs AS t ON t.service_type = N'Visit'
+            WHERE a.appointment_at >= @start AND a.appointment_at < @end AND a.status = N'Completed'
+            UNION ALL
+            SELECT p.patient_id, CAST(p.created_at AS date), N'Pharmacy', p.id, t.description + N': ' + m.name, t.amount
+            FROM dbo.prescriptions AS p
+            JOIN dbo.medicines AS m ON m.id = p.medicine_id
+            JOIN dbo.billing_tariffs AS t ON t.service_type = N'Pharmacy'
+            WHERE p.created_at >= @start AND p.created_at < @end
+            UNION ALL
+            SELECT l.patient_id, CAST(l.ordered_at AS date), N'Lab', l.id, t.description + N': ' + l.test_type, t.amount
+            FROM dbo.lab_tests AS l
+            JOIN dbo.billing_tariffs AS t ON t.service_type = N'Lab'
+            WHERE l.ordered_at >= @start AND l.ordered_at < @end;
+
+            WITH days (d) AS (
+                SELECT @start
+                UNION ALL
+                SELECT DATEADD(day, 1, d) FROM days WHERE DATEADD(day, 1, d) < @end
+            )
+            INSERT INTO #billing_stage
+                (patient_id, service_date, source_service_type, source_service_id, description, amount)
+            SELECT ra.patient_id, days.d, N'Room', ra.id, t.description + N': ' + r.room_number, t.amount
+            FROM days
+            JOIN dbo.room_assignments AS ra
+              ON ra.start_at < DATEADD(day, 1, CAST(days.d AS datetime))
+             AND (ra.end_at IS NULL OR ra.end_at > CAST(days.d AS datetime))
+            JOIN dbo.rooms AS r ON r.id = ra.room_id
+            JOIN dbo.billing_tariffs AS t ON t.service_type = N'Room'
+            OPTION (MAXRECURSION 0);
+
+            DELETE s
+            FROM #billing_stage AS s
+            WHERE s.source_service_type <> N'Room' AND EXISTS (
+                SELECT 1
+                FROM dbo.invoice_line_items AS li
+                WHERE li.source_service_type = s.source_service_type
+                  AND li.source_service_id = s.source_service_id
+                  AND li.source_service_type <> N'Room'
+            );
+
+            DELETE s
+            FROM #billing_stage AS s
+            WHERE s.source_service_type = N'Room' AND EXISTS (
+                SELECT 1
+                FROM dbo.invoice_line_items AS li
+                WHERE li.source_service_type = N'Room'
+                  AND li.source_service_id = s.source_service_id
+                  AND li.service_date = s.service_date
+            );
+
+            INSERT INTO dbo.invoices (patient_id, invoice_date, status)
+            OUTPUT INSERTED.id INTO @invoices
+            SELECT DISTINCT s.patient_id, s.service_date, N'Unpaid'
+            FROM #billing_stage AS s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM dbo.invoices AS i
+                WHERE i.patient_id = s.patient_id AND i.invoice_date = s.service_date AND i.status = N'Unpaid'
+            );
+
+            INSERT INTO dbo.invoice_line_items
+            (invoice_id, description, amount, source_service_type, source_service_id, service_date)
+            SELECT i.id, s.description, s.amount, s.source_service_type, s.source_service_id, s.service_date
+            FROM #billing_stage AS s
+            CROSS APPLY (
+                SELECT MIN(i.id) AS id FROM dbo.invoices AS i
+                WHERE i.patient_id = s.patient_id AND i.invoice_date = s.service_date AND i.status = N'Unpaid'
+            ) AS i;
+
+            SELECT (SELECT COUNT(*) FROM @invoices) AS invoices;
+            SELECT source_service_type, COUNT(*) AS n, SUM(amount) AS amount
+            FROM #billing_stage
+            GROUP BY source_service_type;
+            DROP TABLE #billing_stage;
+        """, (start, end))
+        invoices = cur.fetchone().invoices
+        cur.nextset()
+        lines = {r.source_service_type: (r.n, r.amount) for r in cur.fetchall()}
+    return {"invoices": invoices, "lines": lines}
+
+def iter_invoice_lines(start, end, batch: int = 1000):
+    """
+    Stream the line items of invoices dated in [start, end), in invoice order, `batch` rows
+    per fetch, so exports run in constant memory. Holds a pooled connection until exhausted
+    or closed.
+    Yields: (invoice_id, invoice_date, status, patient_id, first_name, last_name, national_id,
+             line_id, source_service_type, service_date, description, amount)
+    """
+    with conn_cursor() as (_, cur):
+        cur.execute("""
+            SELECT i.id AS invoice_id, i.invoice_date, i.status, i.patient_id
+                 , pr.first_name, pr.last_name, pr.national_id
+                 , li.id AS line_id, li.source_service_type, li.service_date, li.description, li.amount
+            FROM dbo.invoices AS i
+            JOIN dbo.patients AS p ON p.id = i.patient_id
+            JOIN dbo.persons AS pr ON pr.id = p.party_id
+            JOIN dbo.invoice_line_items AS li ON li.invoice_id = i.id
+            WHERE i.invoice_date >= ? AND i.invoice_date < ?
+            ORDER BY i.invoice_date, i.id, li.id;
+        """, (start, end))
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows:
+                return
+            for r in rows:
+                yield tuple(r)
+
+# ---------- report rollups ----------
+# Daily rollups behind the dashboard (migration 0007). A refresh stages the days to
+# recompute in a temp table, deletes their rollup rows and rebuilds them with one
+# grouped INSERT per table; every source is read by an index seek per staged day.
+# No-shows: appointments marked 'No-Show', and ones still 'Scheduled' on a past day.
+
+# Days to recompute: those in the dirty log past the watermark (open room stays: until
+# today) and every day since the last refresh ran.
+_ROLLUP_DAYS_SQLITE = """
+    WITH RECURSIVE ranges (d, last) AS (
+        SELECT DISTINCT day_from, IFNULL(day_to, :today)
+        FROM dbo.report_dirty_days
+        WHERE seq > :watermark AND seq <= :upto
+        UNION ALL
+        SELECT :since, :today
+        UNION ALL
+        SELECT date(d, '+1 day'), last FROM ranges WHERE d < last
+    )
+    INSERT OR IGNORE INTO temp.report_days (d) SELECT d FROM ranges;
+"""
+
+# Full rebuild: every day from the oldest source row to today (or the last booked day).
+_ROLLUP_ALL_DAYS_SQLITE = """
+    WITH RECURSIVE span (lo, hi) AS (
+        SELECT date(MIN(lo)), MAX(date(MAX(hi)), :today)
+        FROM (SELECT MIN(appointment_at) AS lo, MAX(appointment_at) AS hi FROM dbo.appointments
+              UNION ALL SELECT MIN(ordered_at), MAX(ordered_at) FROM dbo.lab_tests
+              UNION ALL SELECT MIN(invoice_date), MAX(invoice_date) FROM dbo.invoices
+              UNION ALL SELECT MIN(service_date), MAX(service_date) FROM dbo.invoice_line_items
+              UNION ALL SELECT MIN(start_at), MAX(end_at) FROM dbo.room_assignments)
+    ),
+    days (d, last) AS (
+        SELECT IFNULL(lo, :today), hi FROM span
+        UNION ALL
+        SELECT date(d, '+1 day'), last FROM days WHERE d < last
+    )
+    INSERT INTO temp.report_days (d) SELECT d FROM days;
+"""
+
+_ROLLUPS_SQLITE = [
+    *(f"DELETE FROM dbo.{table} WHERE day IN (SELECT d FROM temp.report_days);" for table in (
+        "report_doctor_day", "report_specialization_day", "report_lab_day", "report_revenue_day",
+        "report_room_day")),
+    """
+    INSERT INTO dbo.report_doctor_day (day, doctor_id, appointments, completed, cancelled, no_shows, lab_tests)
+    SELECT day, doctor_id, SUM(appointments), SUM(completed), SUM(cancelled), SUM(no_shows), SUM(lab_tests)
+    FROM (
+        SELECT d.d AS day, a.doctor_id, 1 AS appointments
+             , a.status = 'Completed' AS completed, a.status = 'Cancelled' AS cancelled
+             , a.status = 'No-Show' OR (a.status = 'Scheduled' AND d.d < :today) AS no_shows
+             , 0 AS lab_tests
+        FROM temp.report_days AS d
+        CROSS JOIN dbo.appointments AS a
+        WHERE a.appointment_at >= d.d AND a.appointment_at < date(d.d, '+1 day')
+        UNION ALL
+        SELECT d.d, l.ordered_by_doctor_id, 0, 0, 0, 0, 1
+        FROM temp.report_days AS d
+        CROSS JOIN dbo.lab_tests AS l
+        WHERE l.ordered_at >= d.d AND l.ordered_at < date(d.d, '+1 day')
+    )
+    GROUP BY day, doctor_id;
+    """,
+    # from the doctor rollup, not the source tables
+    """
+    INSERT INTO dbo.report_specialization_day
+        (day, specialization_id, appointments, completed, cancelled, no_shows, lab_tests)
+    SELECT r.day, pp.specialization_id, SUM(r.appointments), SUM(r.completed), SUM(r.cancelled)
+         , SUM(r.no_shows), SUM(r.lab_tests)
+    FROM dbo.report_doctor_day AS r
+    JOIN dbo.professional_profiles AS pp ON pp.employee_id = r.doctor_id
+    WHERE r.day IN (SELECT d FROM temp.report_days)
+    GROUP BY r.day, pp.specialization_id;
+    """,
+    """
+    INSERT INTO dbo.report_lab_day (day, test_type, tests)
+    SELECT d.d, l.test_type, COUNT(*)
+    FROM temp.report_days AS d
+    CROSS JOIN dbo.lab_tests AS l
+    WHERE l.ordered_at >= d.d AND l.ordered_at < date(d.d, '+1 day')
+    GROUP BY d.d, l.test_type;
+    """,
+    # IN, not a join on the staged days: the planner has no statistics for temp.report_days, and
+    # joined it builds a Bloom filter on invoice_line_items by scanning all of it (~20 ms per refresh)
+    """
+    INSERT INTO dbo.report_revenue_day (day, service_type, lines, amount)
+    SELECT day, service_type, COUNT(*), ROUND(SUM(amount), 2)
+    FROM (
+        SELECT li.service_date AS day, IFNULL(li.source_service_type, 'Other') AS service_type, li.amount
+        FROM dbo.invoice_line_items AS li
+        WHERE li.service_date IN (SELECT d FROM temp.report_days)
+        UNION ALL
+        SELECT i.invoice_date, IFNULL(li.source_service_type, 'Other'), li.amount
+        FROM dbo.invoices AS i
+        JOIN dbo.invoice_line_items AS li ON li.invoice_id = i.id
+        WHERE i.invoice_date IN (SELECT d FROM temp.report_days) AND li.service_date IS NULL
+    )
+    GROUP BY day, service_type;
+    """,
+    # each stay overlapping a run of consecutive staged days, one row per day of the run it
+    # covers; open stays end now. Per run rather than over MIN..MAX: a correction to a day
+    # two years back must not expand every stay since.
+    """
+    WITH RECURSIVE runs (lo, hi) AS (
+        SELECT MIN(d), date(MAX(d), '+1 day')
+        FROM (SELECT d, julianday(d) - ROW_NUMBER() OVER (ORDER BY d) AS run FROM temp.report_days)
+        GROUP BY run
+    ),
+    overlapping (room_id, start_at, end_at, lo, hi) AS (
+        SELECT ra.room_id, ra.start_at, ra.end_at, runs.lo, runs.hi
+        FROM runs JOIN dbo.room_assignments AS ra ON ra.end_at > runs.lo AND ra.start_at < runs.hi
+        UNION ALL
+        SELECT ra.room_id, ra.start_at, :now, runs.lo, runs.hi
+        FROM runs JOIN dbo.room_assignments AS ra ON ra.end_at IS NULL AND ra.start_at < runs.hi
+        WHERE runs.lo < :now
+    ),
+    stays (ward, day, start_at, end_at, hi) AS (
+        SELECT r.ward, MAX(date(o.start_at), o.lo), o.start_at, o.end_at, o.hi
+        FROM overlapping AS o
+        JOIN dbo.rooms AS r ON r.id = o.room_id
+        WHERE o.start_at < o.end_at
+        UNION ALL
+        SELECT ward, date(day, '+1 day'), start_at, end_at, hi
+        FROM stays
+        WHERE date(day, '+1 day') < hi AND date(day, '+1 day') < end_at
+    )
+    INSERT INTO dbo.report_room_day (day, ward, stays, occupied_minutes)
+    SELECT day, ward, COUNT(*)
+         , CAST(ROUND(SUM(julianday(MIN(end_at, date(day, '+1 day'))) - julianday(MAX(start_at, day))) * 1440)
+                AS integer)
+    FROM stays
+    GROUP BY day, ward;
+    """,
+]
+
+def refresh_report_rollups(full: bool = False, today: date = None) -> dict:
+    """
+    Bring the report rollups up to date in one transaction (one refresh at a time).
+    Recomputes the days written to since the last refresh, found in report_dirty_days
+    past the watermark, plus the days since the last refresh ran; full=True (and the
+    first refresh) rebuilds every day instead.
+    Returns: {"full": bool, "days": recomputed, "first": day, "last": day, "changes": log rows consumed}
+    """
+    today, now = today or date.today(), datetime.now()
+    if _sqlite():
+        with conn_cursor() as (_, cur):
+            cur.execute("UPDATE dbo.report_state SET refreshed_at = ? WHERE id = 1;", (now,))  # takes the write lock
+            cur.execute("SELECT watermark, refreshed_on FROM dbo.report_state WHERE id = 1;")
+            state = cur.fetchone()
+            cur.execute("SELECT IFNULL(MAX(seq), 0) AS upto, COUNT(*) AS n FROM dbo.report_dirty_days;")
+            log = cur.fetchone()
+            full = bool(full or state.refreshed_on is None)
+            cur.execute("CREATE TEMP TABLE IF NOT EXISTS report_days (d date PRIMARY KEY);")
+            cur.execute("DELETE FROM temp.report_days;")
+            params = {"today": today, "now": now, "watermark": state.watermark, "upto": log.upto,
+                      "since": min(state.refreshed_on or today, today)}
+            for sql in [_ROLLUP_ALL_DAYS_SQLITE if full else _ROLLUP_DAYS_SQLITE, *_ROLLUPS_SQLITE]:
+                cur.execute(sql, {k: v for k, v in params.items() if f":{k}" in sql})
+            cur.execute("DELETE FROM dbo.report_dirty_days WHERE seq <= ?;", (log.upto,))
+            cur.execute("UPDATE dbo.report_state SET watermark = ?, refreshed_on = ? WHERE id = 1;",
+                        (log.upto, today))
+            cur.execute("SELECT COUNT(*) AS days, MIN(d) AS first, MAX(d) AS last FROM temp.report_days;")
+            r = cur.fetchone()
+        return {"full": full, "days": r.days, "first": _as_date(r.first), "last": _as_date(r.last),
+                "changes": log.n}
+    with conn_cursor() as (_, cur):
+        cur.execute("""
+            SET NOCOUNT ON;
+            -- one refresh at a time; released at commit or rollback
+            EXEC sp_getapplock @Resource = 'hms_report_rollups', @LockMode = 'Exclusive', @LockOwner = 'Transaction';
+            DECLARE @today date = ?, @now datetime = ?, @full bit = ?;
+            DECLARE @watermark binary(8), @since date, @lo date, @hi date, @changes int;
+            -- versions at or above MIN_ACTIVE_ROWVERSION() may still be joined by uncommitted ones
+            DECLARE @upto binary(8) = CAST(CAST(MIN_ACTIVE_ROWVERSION() AS bigint) - 1 AS binary(8));
+            SELECT @watermark = watermark, @since = refreshed_on FROM dbo.report_state WHERE id = 1;
+            IF @since IS NULL SET @full = 1;
+            IF @since IS NULL OR @since > @today SET @since = @today;
+
+            IF OBJECT_ID('tempdb..#report_days') IS NOT NULL DROP TABLE #report_days;
+            CREATE TABLE #report_days (d date PRIMARY KEY);
+
+            IF @full = 1
+            BEGIN
+                SELECT @lo = MIN(lo), @hi = MAX(hi)
+                FROM (SELECT CAST(MIN(appointment_at) AS date) AS lo, CAST(MAX(appointment_at) AS date) AS hi
+                      FROM dbo.appointments
+                      UNION ALL SELECT CAST(MIN(ordered_at) AS date), CAST(MAX(ordered_at) AS date) FROM dbo.lab_tests
+                      UNION ALL SELECT MIN(invoice_date), MAX(invoice_date) FROM dbo.invoices
+                      UNION ALL SELECT MIN(service_date), MAX(service_date) FROM dbo.invoice_line_items
+                      UNION ALL SELECT CAST(MIN(start_at) AS date), CAST(MAX(end_at) AS date)
+                      FROM dbo.room_assignments) AS spans;
+                SET @lo = ISNULL(@lo, @today);
+                IF @hi IS NULL OR @hi < @today SET @hi = @today;
+                WITH days (d) AS (
+                    SELECT @lo
+                    UNION ALL
+                    SELECT DATEADD(day, 1, d) FROM days WHERE d < @hi
+                )
+                INSERT INTO #report_days (d) SELECT d FROM days OPTION (MAXRECURSION 0);
+            END
+            ELSE
+            BEGIN
+                WITH ranges (d, last) AS (
+                    SELECT day_from, last
+                    FROM (SELECT DISTINCT day_from, ISNULL(day_to, @today) AS last
+                          FROM dbo.report_dirty_days
+                          WHERE version > @watermark AND version <= @upto) AS logged
+                    UNION ALL
+                    SELECT @since, @today
+                    UNION ALL
+                    SELECT DATEADD(day, 1, d), last FROM ranges WHERE d < last
+                )
+                INSERT INTO #report_days (d) SELECT DISTINCT d FROM ranges OPTION (MAXRECURSION 0);
+            END;
+
+            DELETE r FROM dbo.report_doctor_day AS r JOIN #report_days AS d ON d.d = r.day;
+            DELETE r FROM dbo.report_specialization_day AS r JOIN #report_days AS d ON d.d = r.day;
+            DELETE r FROM dbo.report_lab_day AS r JOIN #report_days AS d ON d.d = r.day;
+            DELETE r FROM dbo.report_revenue_day AS r JOIN #report_days AS d ON d.d = r.day;
+            DELETE r FROM dbo.report_room_day AS r JOIN #report_days AS d ON d.d = r.day;
+
+            INSERT INTO dbo.report_doctor_day (day, doctor_id, appointments, completed, cancelled, no_shows, lab_tests)
+            SELECT day, doctor_id, SUM(appointments), SUM(completed), SUM(cancelled), SUM(no_shows), SUM(lab_tests)
+            FROM (
+                SELECT d.d AS day, a.doctor_id, 1 AS appointments
+                     , CASE WHEN a.status = N'Completed' THEN 1 ELSE 0 END AS completed
+                     , CASE WHEN a.status = N'Cancelled' THEN 1 ELSE 0 END AS cancelled
+                     , CASE WHEN a.status = N'No-Show' OR (a.status = N'Scheduled' AND d.d < @today)
+                            THEN 1 ELSE 0 END AS no_shows
+                     , 0 AS lab_tests
+                FROM #report_days AS d
+                JOIN dbo.appointments AS a
+                  ON a.appointment_at >= CAST(d.d AS datetime) AND a.appointment_at < DATEADD(day, 1, CAST(d.d AS datetime))
+                UNION ALL
+                SELECT d.d, l.ordered_by_doctor_id, 0, 0, 0, 0, 1
+                FROM #report_days AS d
+                JOIN dbo.lab_tests AS l
+                  ON l.ordered_at >= CAST(d.d AS datetime) AND l.ordered_at < DATEADD(day, 1, CAST(d.d AS datetime))
+            ) AS s
+            GROUP BY day, doctor_id;
+
+            INSERT INTO dbo.report_specialization_day
+                (day, specialization_id, appointments, completed, cancelled, no_shows, lab_tests)
+            SELECT r.day, pp.specialization_id, SUM(r.appointments), SUM(r.completed), SUM(r.cancelled)
+                 , SUM(r.no_shows), SUM(r.lab_tests)
+            FROM #report_days AS d
+            JOIN dbo.report_doctor_day AS r ON r.day = d.d
+            JOIN dbo.professional_profiles AS pp ON pp.employee_id = r.doctor_id
+            GROUP BY r.day, pp.specialization_id;
+
+            INSERT INTO dbo.report_lab_day (day, test_type, tests)
+            SELECT d.d, l.test_type, COUNT(*)
+            FROM #report_days AS d
+            JOIN dbo.lab_tests AS l
+              ON l.ordered_at >= CAST(d.d AS datetime) AND l.ordered_at < DATEADD(day, 1, CAST(d.d AS datetime))
+            GROUP BY d.d, l.test_type;
+
+            INSERT INTO dbo.report_revenue_day (day, service_type, lines, amount)
+            SELECT day, service_type, COUNT(*), SUM(amount)
+            FROM (
+                SELECT d.d AS day, ISNULL(li.source_service_type, N'Other') AS service_type, li.amount
+                FROM #report_days AS d
+                JOIN dbo.invoice_line_items AS li ON li.service_date = d.d
+                UNION ALL
+                SELECT d.d, ISNULL(li.source_service_type, N'Other'), li.amount
+                FROM #report_days AS d
+                JOIN dbo.invoices AS i ON i.invoice_date = d.d
+                JOIN dbo.invoice_line_items AS li ON li.invoice_id = i.id AND li.service_date IS NULL
+            ) AS s
+            GROUP BY day, service_type;
+
+            -- each stay overlapping a run of consecutive staged days, one row per day of the run
+            -- it covers; open stays end now
+            WITH runs (lo, hi) AS (
+                SELECT MIN(d), DATEADD(day, 1, MAX(d))
+                FROM (SELECT d, DATEADD(day, -ROW_NUMBER() OVER (ORDER BY d), d) AS run FROM #report_days) AS staged
+                GROUP BY run
+            ),
+            stays (ward, day, start_at, end_at, hi) AS (
+                SELECT r.ward, CASE WHEN ra.start_at > runs.lo THEN CAST(ra.start_at AS date) ELSE runs.lo END
+                     , ra.start_at, ISNULL(ra.end_at, @now), runs.hi
+                FROM runs
+                JOIN dbo.room_assignments AS ra
+                  ON ra.start_at < runs.hi AND (ra.end_at > runs.lo OR (ra.end_at IS NULL AND @now > runs.lo))
+                JOIN dbo.rooms AS r ON r.id = ra.room_id
+                WHERE ra.start_at < ISNULL(ra.end_at, @now)
+                UNION ALL
+                SELECT ward, DATEADD(day, 1, day), start_at, end_at, hi
+                FROM stays
+                WHERE DATEADD(day, 1, day) < hi AND CAST(DATEADD(day, 1, day) AS datetime) < end_at
+            )
+            INSERT INTO dbo.report_room_day (day, ward, stays, occupied_minutes)
+            SELECT s.day, s.ward, COUNT(*)
+                 , SUM(DATEDIFF(minute
+                     , CASE WHEN s.start_at > CAST(s.day AS datetime) THEN s.start_at ELSE CAST(s.day AS datetime) END
+                     , CASE WHEN s.end_at < DATEADD(day, 1, CAST(s.day AS datetime)) THEN s.end_at
+                            ELSE DATEADD(day, 1, CAST(s.day AS datetime)) END))
+            FROM stays AS s
+            GROUP BY s.day, s.ward
+            OPTION (MAXRECURSION 0);
+
+            DELETE FROM dbo.report_dirty_days WHERE version <= @upto;
+            SET @changes = @@ROWCOUNT;
+            UPDATE dbo.report_state SET watermark = @upto, refreshed_on = @today, refreshed_at = @now WHERE id = 1;
+
+            SELECT @full AS full_rebuild, COUNT(*) AS days, MIN(d) AS first, MAX(d) AS last, @changes AS changes
+            FROM #report_days;
+            DROP TABLE #report_days;
+        """, (today, now, full))
+        r = cur.fetchone()
+    return {"full": bool(r.full_rebuild), "days": r.days, "first": r.first, "last": r.last, "changes": r.changes}
+
+def _as_date(value):
+    """SQLite hands back dates computed in SQL as text."""
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+# dashboard section -> SELECT over the rollups for days in [start, end) (both parameters, in that order)
+REPORT_SECTIONS = {
+    "daily": """
+        SELECT r.day, SUM(r.appointments) AS appointments, SUM(r.completed) AS completed
+             , SUM(r.no_shows) AS no_shows, SUM(r.lab_tests) AS lab_tests
+             , (SELECT ROUND(SUM(v.amount), 2) FROM dbo.report_revenue_day AS v WHERE v.day = r.day) AS revenue
+             , (SELECT SUM(o.occupied_minutes) FROM dbo.report_room_day AS o WHERE o.day = r.day) AS occupied_minutes
+        FROM dbo.report_doctor_day AS r
+        WHERE r.day >= ? AND r.day < ?
+        GROUP BY r.day
+        ORDER BY r.day;
+    """,
+    "doctors": """
+        SELECT r.doctor_id, pr.first_name, pr.last_name
+             , SUM(r.appointments) AS appointments, SUM(r.completed) AS completed, SUM(r.cancelled) AS cancelled
+             , SUM(r.no_shows) AS no_shows, SUM(r.lab_tests) AS lab_tests
+        FROM dbo.report_doctor_day AS r
+        JOIN dbo.employees AS e ON e.id = r.doctor_id
+        JOIN dbo.persons AS pr ON pr.id = e.party_id
+        WHERE r.day >= ? AND r.day < ?
+        GROUP BY r.doctor_id, pr.first_name, pr.last_name
+        ORDER BY SUM(r.appointments) DESC, r.doctor_id;
+    """,
+    "specializations": """
+        SELECT s.name
+             , SUM(r.appointments) AS appointments, SUM(r.completed) AS completed, SUM(r.cancelled) AS cancelled
+             , SUM(r.no_shows) AS no_shows, SUM(r.lab_tests) AS lab_tests
+        FROM dbo.report_specialization_day AS r
+        JOIN dbo.specializations AS s ON s.id = r.specialization_id
+        WHERE r.day >= ? AND r.day < ?
+        GROUP BY s.name
+        ORDER BY SUM(r.appointments) DESC, s.name;
+    """,
+    "labs": """
+        SELECT test_type, SUM(tests) AS tests
+        FROM dbo.report_lab_day
+        WHERE day >= ? AND day < ?
+        GROUP BY test_type
+        ORDER BY SUM(tests) DESC, test_type;
+    """,
+    "revenue": """
+        SELECT service_type, SUM(lines) AS lines, ROUND(SUM(amount), 2) AS amount
+        FROM dbo.report_revenue_day
+        WHERE day >= ? AND day < ?
+        GROUP BY service_type
+        ORDER BY SUM(amount) DESC, service_type;
+    """,
+    "rooms": """
+        SELECT w.ward, w.rooms, SUM(o.stays) AS stay_days, SUM(o.occupied_minutes) AS occupied_minutes
+        FROM (SELECT ward, COUNT(*) AS rooms FROM dbo.rooms GROUP BY ward) AS w
+        LEFT JOIN dbo.report_room_day AS o ON o.ward = w.ward AND o.day >= ? AND o.day < ?
+        GROUP BY w.ward, w.rooms
+        ORDER BY w.ward;
+    """,
+}
+
+def get_report_dashboard(start, end) -> dict:
+    """
+    Dashboard figures for days in [start, end), read from the rollups only
+    (refresh_report_rollups keeps them current). SQL Server: one batch, one round trip.
+    Returns: {section: [row tuple, ...] (columns as in REPORT_SECTIONS), ..., "refreshed_at": datetime|None}
+    """
+    sections = list(REPORT_SECTIONS)
+    figures = {}
+    with conn_cursor() as (_, cur):
+        if _sqlite():
+            for section in sections:
+                cur.execute(REPORT_SECTIONS[section], (start, end))
+                figures[section] = [tuple(r) for r in cur.fetchall()]
+            cur.execute("SELECT refreshed_at FROM dbo.report_state WHERE id = 1;")
+        else:
+            cur.execute("SET NOCOUNT ON;\n" + "\n".join(REPORT_SECTIONS[s] for s in sections)
+                        + "\nSELECT refreshed_at FROM dbo.report_state WHERE id = 1;", (start, end) * len(sections))
+            for i, section in enumerate(sections):
+                if i:
+                    cur.nextset()
+                figures[section] = [tuple(r) for r in cur.fetchall()]
+            cur.nextset()
+        row = cur.fetchone()
+    figures["refreshed_at"] = row.refreshed_at if row else None
+    return figures
+
+def get_report_version():
+    """
+    The rollups' version: (watermark, refreshed_at) of report_state. Every refresh
+    changes it, whichever desk (or the cron) runs it.
+    """
+    with conn_cursor() as (_, cur):
+        cur.execute("SELECT watermark, refreshed_at FROM dbo.report_state WHERE id = 1;")
+        return tuple(cur.fetchone())
+
+# ---------- streaming export ----------
+# table -> (columns, FROM clause, key column); rows are exported in key order
+EXPORT_TABLES = {
+    "patients": (
+        ("p.id", "p.party_id", "pr.first_name", "pr.last_name", "pr.national_id", "pr.gender",
+         "pr.date_of_birth", "pr.phone_number", "pr.address"),
+        "dbo.patients AS p JOIN dbo.persons AS pr ON pr.id = p.party_id", "p.id"),
+    "appointments": (
+        ("id", "patient_id", "doctor_id", "appointment_at", "status"),
+        "dbo.appointments", "id"),
+    "medical_records": (
+        ("id", "patient_id", "appointment_id", "diagnosis", "treatment_plan", "created_by_user_id", "created_at"),
+        "dbo.medical_records", "id"),
+    "prescriptions": (
+        ("id", "patient_id", "doctor_id", "medicine_id", "dosage_amount", "dosage_unit", "frequency_type",
+         "frequency_value", "duration_unit", "duration_value", "instructions", "created_at"),
+        "dbo.prescriptions", "id"),
+    "lab_tests": (
+        ("id", "patient_id", "test_type", "result", "ordered_by_doctor_id", "ordered_at"),
+        "dbo.lab_tests", "id"),
+}
+
+def export_columns(table: str):
+    """Column names iter_export yields for `table`, key first."""
+    return tuple(c.split(".")[-1] for c in EXPORT_TABLES[table][0])
+
+def iter_export(table: str, after_id: int = None, batch: int = 5000):
+    """
+    Stream one EXPORT_TABLES table in key order, after `after_id` (a previous run's last key),
+    as lists of up to `batch` row tuples from cursor.fetchmany: memory stays flat whatever the
+    row count. Holds a pooled connection until exhausted or closed.
+    """
+    columns, source, key = EXPORT_TABLES[table]
+    with conn_cursor() as (_, cur):
+        cur.execute(f"""
+            SELECT {", ".join(columns)}
+            FROM {source}
+            WHERE {key} > ?
+            ORDER BY {key};
+        """, (after_id if after_id is not None else 0,))
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows:
+                return
+            yield [tuple(r) for r in rows]
+
+# ---------- audit log ----------
+def insert_audit_logs(rows) -> int:
+    """
+    Batch insert into audit_logs in one transaction (AuditLog's flusher).
+    rows: [(user_id, action, table_name, record_id, created_at), ...]. Returns rows written.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    with conn_cursor() as (_, cur):
+        if not _sqlite():
+            cur.fast_executemany = True  # one parameter array, not a round trip per row
+        cur.executemany("""
+            INSERT INTO dbo.audit_logs (user_id, action, table_name, record_id, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, rows)
+    return len(rows)
+
 # ---------- users (plain auth for testing) ----------
 def get_user_by_username(username: str):
     """Fetch one user by username. Returns dict or None."""
-    with get_connection() as conn:
-        cur = conn.cursor()
+    with conn_cursor() as (_, cur):
         cur.execute("""
             SELECT id, username, password_hash, account_status, party_id
             FROM dbo.users
@@ -158,13 +1984,24 @@ def get_user_by_username(username: str):
 
 def create_user_plain(username: str, password: str, party_id: int = None, status: str = "Active"):
     """Create a user with plain password (TEST ONLY)."""
-    with get_connection() as conn:
-        cur = conn.cursor()
+    with conn_cursor() as (_, cur):
         cur.execute("""
             INSERT INTO dbo.users (party_id, username, password_hash, account_status)
             VALUES (?, ?, ?, ?)
         """, (party_id, username, password, status))
-        conn.commit()
+
+def create_first_user_plain(username: str, password: str, party_id: int = None, status: str = "Active") -> bool:
+    """
+    Create a user with plain password only while there are no users at all
+    (TEST ONLY). One statement; True if the user was created.
+    """
+    with conn_cursor() as (_, cur):
+        cur.execute("""
+            INSERT INTO dbo.users (party_id, username, password_hash, account_status)
+            SELECT ?, ?, ?, ?
+            WHERE NOT EXISTS (SELECT 1 FROM dbo.users)
+        """, (party_id, username, password, status))
+        return cur.rowcount > 0
 
 def verify_user_password_plain(username: str, password: str):
     """
@@ -179,3 +2016,9 @@ def verify_user_password_plain(username: str, password: str):
     if (user["password_hash"] or "") != password:
         return False, None, "Invalid username or password."
     return True, user, "OK"
+
+# ---------- thin client ----------
+# HMS_DB_DRIVER=api: the operations the API service offers run there (ApiProtocol.OPERATIONS)
+if DB_DRIVER == "api":
+    import ApiClient
+    ApiClient.install(globals())
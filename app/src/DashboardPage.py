@@ -0,0 +1,127 @@
+from datetime import timedelta
+
+from PyQt5.QtCore import QDate, QObject, Qt, QTimer
+from PyQt5.QtWidgets import (
+    QDateEdit, QHeaderView, QLabel, QMessageBox, QPushButton, QStackedWidget, QTableWidget,
+    QTableWidgetItem, QWidget
+)
+
+from Reports import Dashboard, elapsed_days, no_show_rate, utilization
+
+REFRESH_MS = 60000  # re-read while the page is visible (rollups older than Reports.REFRESH_SECONDS are refreshed)
+DEFAULT_DAYS = 30
+
+
+class DashboardPage(QObject):
+    """Drives the dashboard page (page_1) of HMS.ui: figures from the report rollups (Reports.Dashboard)."""
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.window = window
+        self.dashboard = Dashboard()  # refreshes the rollups and caches figures per date range
+        self.stackedWidget = window.findChild(QStackedWidget, "stackedWidget")
+        self.page = window.findChild(QWidget, "page_1")
+        self.dateEditReportFrom = window.findChild(QDateEdit, "dateEditReportFrom")
+        self.dateEditReportTo = window.findChild(QDateEdit, "dateEditReportTo")
+        self.btnReportRefresh = window.findChild(QPushButton, "btnReportRefresh")
+        self.labelReportSummary = window.findChild(QLabel, "labelReportSummary")
+        self.tableReportDaily = window.findChild(QTableWidget, "tableReportDaily")
+        self.tableReportDoctors = window.findChild(QTableWidget, "tableReportDoctors")
+        self.tableReportSpecializations = window.findChild(QTableWidget, "tableReportSpecializations")
+        self.tableReportLabs = window.findChild(QTableWidget, "tableReportLabs")
+        self.tableReportRevenue = window.findChild(QTableWidget, "tableReportRevenue")
+        self.tableReportRooms = window.findChild(QTableWidget, "tableReportRooms")
+
+        for table in (self.tableReportDaily, self.tableReportDoctors, self.tableReportSpecializations,
+                      self.tableReportLabs, self.tableReportRevenue, self.tableReportRooms):
+            header = table.horizontalHeader()
+            header.setSectionResizeMode(QHeaderView.ResizeToContents)
+            header.setStretchLastSection(True)
+            table.verticalHeader().setVisible(False)
+        today = QDate.currentDate()
+        self.dateEditReportTo.setDate(today)
+        self.dateEditReportFrom.setDate(today.addDays(1 - DEFAULT_DAYS))
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(REFRESH_MS)
+        self._timer.timeout.connect(self.refresh)
+        # only re-read while someone is looking at the figures
+        self.stackedWidget.currentChanged.connect(
+            lambda *_: self._timer.start() if self.stackedWidget.currentWidget() is self.page else self._timer.stop())
+
+        self.btnReportRefresh.clicked.connect(lambda: self.refresh(max_age=0))
+        self.dateEditReportFrom.dateChanged.connect(lambda *_: self.refresh())
+        self.dateEditReportTo.dateChanged.connect(lambda *_: self.refresh())
+
+    def show(self):
+        self.stackedWidget.setCurrentWidget(self.page)
+        self.refresh()
+
+    def _range(self):
+        """[start, end) of the date edits (the "to" day is included)."""
+        start = self.dateEditReportFrom.date().toPyDate()
+        end = self.dateEditReportTo.date().toPyDate() + timedelta(days=1)
+        return start, max(end, start)
+
+    # ---------- loading ----------
+    def refresh(self, max_age=None):
+        """Figures for the selected range, read on a DB thread (rollups refreshed first when stale)."""
+        start, end = self._range()
+        self.window.db.submit(
+            lambda: (start, end, self.dashboard.figures(start, end, max_age)),
+            on_result=self._fill,
+            on_error=lambda err: QMessageBox.critical(self.window, "Dashboard", f"Loading the dashboard failed:\n{err}"),
+            key=("report_dashboard", start, end, max_age == 0))
+
+    def _fill(self, result):
+        start, end, figures = result
+        if (start, end) != self._range():
+            return  # the range changed while this one was loading; its own load is on the way
+        total_rooms = sum(rooms for _, rooms, _, _ in figures["rooms"])
+        days = elapsed_days(start, end)
+
+        self._set_rows(self.tableReportDaily, [
+            (str(day), appointments, completed, no_shows, labs, float(revenue or 0),
+             utilization(occupied, total_rooms, 1) * 100)
+            for day, appointments, completed, no_shows, labs, revenue, occupied in figures["daily"]])
+        self._set_rows(self.tableReportDoctors, [
+            (f"{first_name} {last_name}", appointments, completed, cancelled, no_shows,
+             no_show_rate(completed, no_shows) * 100, labs)
+            for _, first_name, last_name, appointments, completed, cancelled, no_shows, labs in figures["doctors"]])
+        self._set_rows(self.tableReportSpecializations, [
+            (name, appointments, completed, cancelled, no_shows, no_show_rate(completed, no_shows) * 100, labs)
+            for name, appointments, completed, cancelled, no_shows, labs in figures["specializations"]])
+        self._set_rows(self.tableReportLabs, figures["labs"])
+        self._set_rows(self.tableReportRevenue, [
+            (service_type, lines, float(amount or 0)) for service_type, lines, amount in figures["revenue"]])
+        self._set_rows(self.tableReportRooms, [
+            (ward, rooms, stay_days or 0, utilization(occupied, rooms, days) * 100)
+            for ward, rooms, stay_days, occupied in figures["rooms"]])
+
+        daily = figures["daily"]
+        appointments, completed, no_shows, labs = (sum(r[i] for r in daily) for i in range(1, 5))
+        revenue = sum(float(r[5] or 0) for r in daily)
+        occupied = sum(r[6] or 0 for r in daily)
+        refreshed = figures["refreshed_at"]
+        last = self.dashboard.last_refresh
+        self.labelReportSummary.setText(
+            f"{appointments:,} appointments, {completed:,} completed, {no_shows:,} no-shows "
+            f"({no_show_rate(completed, no_shows):.1%} of visits due)    {labs:,} lab tests    "
+            f"Revenue: {revenue:,.2f}    Room utilization: {utilization(occupied, total_rooms, days):.1%}\n"
+            + (f"Rollups refreshed {refreshed:%Y-%m-%d %H:%M:%S}" if refreshed else "Rollups never refreshed")
+            + (f" (last refresh here: {last['days']:,} days recomputed in {last['seconds'] * 1000:.0f} ms)"
+               if last else ""))
+
+    def _set_rows(self, table, rows):
+        table.setSortingEnabled(False)  # keep rows in place while filling
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for col, value in enumerate(values):
+                item = QTableWidgetItem()
+                if isinstance(value, (int, float)):
+                    item.setData(Qt.DisplayRole, round(value, 2) if isinstance(value, float) else value)
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)  # numeric, so sorting is numeric
+                else:
+                    item.setText(str(value))
+                table.setItem(row, col, item)
+        table.setSortingEnabled(True)
@@ -0,0 +1,138 @@
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class Cancelled(Exception):
+    """Outcome of a job every caller cancelled before it started running."""
+
+
+class _JobSignals(QObject):
+    done = pyqtSignal(bool, object)  # ok, result or exception
+
+
+class _Job(QRunnable):
+    """One DB call run on the thread pool; may be shared by several DbCall handles."""
+
+    def __init__(self, key, fn, args, kwargs):
+        super().__init__()
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = _JobSignals()
+        self.calls = []
+        self.cancelled = False
+
+    def run(self):
+        if self.cancelled:
+            # still report back: the executor only lets go of a job (and goes idle) in _finish
+            self.signals.done.emit(False, Cancelled())
+            return
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.done.emit(False, e)
+        else:
+            self.signals.done.emit(True, result)
+
+
+class DbCall:
+    """Handle returned by DbExecutor.submit(); cancel() drops this caller's callbacks."""
+
+    def __init__(self, executor, job, on_result, on_error):
+        self._executor = executor
+        self._job = job
+        self.on_result = on_result
+        self.on_error = on_error
+        self.cancelled = False
+        self.done = False
+
+    def cancel(self):
+        if self.cancelled or self.done:
+            return
+        self.cancelled = True
+        self._executor._call_cancelled(self._job)
+
+
+class DbExecutor(QObject):
+    """
+    Runs DB.py functions off the GUI thread on a QThreadPool.
+
+    Results come back on the GUI thread through on_result/on_error callbacks
+    (delivered by queued signals). Calls submitted with the same `key` while
+    one is already in flight share that single execution. Cancelling a call
+    that has not started removes it from the queue; a running one finishes in
+    the background and its result is discarded.
+    """
+
+    busyChanged = pyqtSignal(bool)
+
+    def __init__(self, max_threads=4, parent=None):
+        super().__init__(parent)
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(max_threads)
+        self._inflight = {}  # key -> _Job
+        self._jobs = set()   # keeps jobs (and their signals) alive until done
+
+    def submit(self, fn, *args, on_result=None, on_error=None, key=None, **kwargs) -> DbCall:
+        job = self._inflight.get(key) if key is not None else None
+        if job is None or job.cancelled:
+            job = _Job(key, fn, args, kwargs)
+            job.signals.done.connect(lambda ok, payload, j=job: self._finish(j, ok, payload))
+            if key is not None:
+                self._inflight[key] = job
+            self._jobs.add(job)
+            if len(self._jobs) == 1:
+                self.busyChanged.emit(True)
+            self._pool.start(job)
+        call = DbCall(self, job, on_result, on_error)
+        job.calls.append(call)
+        return call
+
+    def is_busy(self) -> bool:
+        return bool(self._jobs)
+
+    def wait(self, msecs=-1) -> bool:
+        """Block until queued jobs finish (shutdown / scripts only)."""
+        return self._pool.waitForDone(msecs)
+
+    # ---------- internals ----------
+    def _call_cancelled(self, job):
+        if any(not c.cancelled for c in job.calls):
+            return
+        job.cancelled = True
+        if self._inflight.get(job.key) is job:
+            del self._inflight[job.key]
+        try:
+            taken = self._pool.tryTake(job)
+        except RuntimeError:  # already ran; the pool has deleted it
+            taken = False
+        if taken:
+            self._forget(job)
+
+    def _finish(self, job, ok, payload):
+        if self._inflight.get(job.key) is job:
+            del self._inflight[job.key]
+        self._forget(job)
+        for call in job.calls:
+            if call.cancelled:
+                continue
+            call.done = True
+            cb = call.on_result if ok else call.on_error
+            if cb:
+                cb(payload)
+
+    def _forget(self, job):
+        if job in self._jobs:
+            self._jobs.discard(job)
+            if not self._jobs:
+                self.busyChanged.emit(False)
+
+
+_default = None
+
+def default_executor() -> DbExecutor:
+    """Shared executor for windows and dialogs (create after QApplication)."""
+    global _default
+    if _default is None:
+        _default = DbExecutor()
+    return _default
@@ -0,0 +1,385 @@
+"""
+Duplicate-patient detection.
+
+    python app/src/Dedupe.py report candidates.csv                 # whole registry, one process per core
+    python app/src/Dedupe.py report candidates.csv --workers 4 --threshold 0.9
+
+Patients are only compared inside blocks: records that share a blocking key
+(last seven phone digits, phonetic surname + birth year, phonetic first name
++ date of birth, phonetic name pair + birthday, phonetic name pair). Each pair
+in a block is scored with fuzzy similarity on name, date of birth, phone and
+national ID; pairs scoring at least the threshold are merge candidates. A block larger than MAX_BLOCK (a
+very common name) says nothing about identity and is skipped, so the work
+grows with the registry instead of with its square.
+
+The add-patient form uses DedupeIndex: the same keys held in memory, kept
+current from the patient change feed, with each lookup's candidates fetched
+and scored on the spot.
+"""
+import argparse
+import csv
+import os
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from datetime import date
+
+import DB
+
+MATCH_THRESHOLD = 0.8  # score from which two records are reported as the same person
+MAX_BLOCK = 500        # larger blocks are skipped: too common to tell people apart
+REBUILD_SECONDS = 24 * 3600  # DedupeIndex reloads after this; the change feed only keeps a week
+UNKNOWN = 0.5          # similarity of a field missing on either side: neither for nor against
+
+# ---------- normalizing and keys ----------
+_SOUNDEX = {c: d for d, letters in enumerate(("AEIOUYHW", "BFPV", "CGJKQSXZ", "DT", "L", "MN", "R"))
+            for c in letters}
+
+
+def normalize(text) -> str:
+    """Case-folded letters and digits only, accents removed ("Zahrā-Ali " -> "zahraali")."""
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    return "".join(c for c in text.casefold() if c.isalnum())
+
+
+def soundex(name: str) -> str:
+    """American Soundex of the Latin letters in `name` ("" if there are none)."""
+    letters = [c for c in unicodedata.normalize("NFKD", name or "").upper() if "A" <= c <= "Z"]
+    if not letters:
+        return ""
+    code, prev = letters[0], _SOUNDEX[letters[0]]
+    for c in letters[1:]:
+        digit = _SOUNDEX[c]
+        if digit and digit != prev:
+            code += str(digit)
+            if len(code) == 4:
+                break
+        if c not in "HW":  # H and W do not separate equal codes; vowels do
+            prev = digit
+    return code.ljust(4, "0")
+
+
+def _phonetic(name: str) -> str:
+    return soundex(name) or normalize(name)[:6]  # non-Latin scripts: the name's first letters
+
+
+def prepare(row):
+    """(id, first, last, national_id, date_of_birth, phone) -> the normalized record scoring works on."""
+    patient_id, first, last, national_id, dob, phone = row
+    if isinstance(dob, str):
+        dob = date.fromisoformat(dob[:10]) if dob.strip() else None
+    digits = "".join(c for c in str(phone or "") if c.isdigit())
+    return (patient_id, normalize(first), normalize(last), normalize(national_id), dob,
+            digits[-7:] if len(digits) >= 7 else "")
+
+
+def block_keys(rec):
+    """Blocking keys of a prepared record, most specific first."""
+    _, first, last, _, dob, phone = rec
+    pf, pl = _phonetic(first), _phonetic(last)
+    names = "|".join(sorted((pf, pl))) if pf and pl else ""  # sorted: swapped names share the key
+    keys = []
+    if phone:
+        keys.append("P" + phone)
+    if dob and pl:
+        keys.append(f"Y{pl}{dob.year}")
+    if dob and pf:
+        keys.append(f"B{pf}{dob:%Y%m%d}")  # a typo in the surname still meets
+    if dob and names:
+        keys.append(f"D{names}{dob:%m%d}")  # a typo in the birth year still meets
+    if names:
+        keys.append("N" + names)
+    return keys
+
+
+# ---------- scoring ----------
+def jaro_winkler(a: str, b: str) -> float:
+    if a == b:
+        return 1.0 if a else 0.0
+    la, lb = len(a), len(b)
+    if not la or not lb:
+        return 0.0
+    window = max(max(la, lb) // 2 - 1, 0)
+    used = [False] * lb
+    matched_a = []
+    for i, ch in enumerate(a):
+        for j in range(max(0, i - window), min(lb, i + window + 1)):
+            if not used[j] and b[j] == ch:
+                used[j] = True
+                matched_a.append(ch)
+                break
+    m = len(matched_a)
+    if not m:
+        return 0.0
+    matched_b = [b[j] for j in range(lb) if used[j]]
+    transpositions = sum(x != y for x, y in zip(matched_a, matched_b)) / 2
+    jaro = (m / la + m / lb + (m - transpositions) / m) / 3
+    prefix = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefix += 1
+    return jaro + prefix * 0.1 * (1 - jaro)
+
+
+def _one_edit(a: str, b: str) -> bool:
+    """At most one insertion, deletion, substitution or adjacent swap apart."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diff) == 1 or (len(diff) == 2 and diff[1] == diff[0] + 1
+                                  and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]])
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+def _dob_similarity(a: date, b: date) -> float:
+    if a == b:
+        return 1.0
+    if (a.year == b.year and (a.month == b.month or a.day == b.day)) \
+            or (a.year == b.year and a.month == b.day and a.day == b.month) \
+            or ((a.month, a.day) == (b.month, b.day) and _one_edit(str(a.year), str(b.year))):
+        return 0.7  # one part mistyped, or day and month swapped
+    return 0.0
+
+
+def score(a, b, floor: float = 0.0):
+    """
+    (similarity 0..1, reasons) of two prepared records. Names are compared
+    last and only if the pair can still reach `floor`; otherwise (0.0, []).
+    """
+    reasons = []
+    if a[4] and b[4]:
+        dob = _dob_similarity(a[4], b[4])
+        reasons.append("DOB same" if dob == 1 else "DOB close" if dob else "DOB differs")
+    else:
+        dob = UNKNOWN
+    if a[5] and b[5]:
+        phone = 1.0 if a[5] == b[5] else 0.7 if _one_edit(a[5], b[5]) else 0.0
+        reasons.append("phone same" if phone == 1 else "phone close" if phone else "phone differs")
+    else:
+        phone = UNKNOWN
+    if a[3] and b[3]:
+        nid = 1.0 if a[3] == b[3] else 0.8 if _one_edit(a[3], b[3]) else 0.0
+        reasons.append("ID same" if nid == 1 else "ID one edit" if nid else "ID differs")
+    else:
+        nid = UNKNOWN
+    total = 0.25 * dob + 0.15 * phone + 0.10 * nid
+    if total + 0.50 < floor:  # even identical names would not be enough
+        return 0.0, []
+    straight = (jaro_winkler(a[2], b[2]), jaro_winkler(a[1], b[1]))
+    swapped = (jaro_winkler(a[2], b[1]), jaro_winkler(a[1], b[2]))
+    last, first = max(straight, swapped, key=sum)
+    reasons.insert(0, f"name {(last + first) / 2:.2f}" + (" (swapped)" if (last, first) != straight else ""))
+    return total + 0.30 * last + 0.20 * first, reasons
+
+
+# ---------- interactive lookups ----------
+_ID_BITS = 28                      # packed entry: key hash in the high bits, patient id in the low 28
+_ID_MASK = (1 << _ID_BITS) - 1
+_HASH_MASK = (1 << (63 - _ID_BITS)) - 1
+
+
+def _key_hash(key: str) -> int:
+    return hash(key) & _HASH_MASK  # process-local: the index never leaves this process
+
+
+class DedupeIndex:
+    """
+    In-memory blocking index for the add-patient form.
+
+    Every (key, patient) pair is packed into one int64 of a sorted array, so a
+    block is one bisect and a million patients take about 40 MB. Patients
+    added or edited since the load live in a small dict beside it, fed from
+    the patient change feed before each lookup. candidates() then fetches the
+    block members' fields in one query and scores them.
+    """
+
+    def __init__(self, threshold: float = MATCH_THRESHOLD, max_block: int = MAX_BLOCK):
+        self.threshold = threshold
+        self.max_block = max_block
+        self._entries = array("q")
+        self._recent = {}  # key hash -> {patient_id, ...} changed since the load
+        self._watermark = None
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()  # one load/sync at a time; lookups queue behind a first load
+        self.loaded_at = None
+
+    # ---------- loading ----------
+    def load(self):
+        """Build the index from the whole registry (streams it; the change feed covers writes meanwhile)."""
+        watermark = DB.patient_change_watermark()
+        packed = []
+        for row in DB.iter_patient_match_fields():
+            rec = prepare(row)
+            packed += [(_key_hash(k) << _ID_BITS) | (rec[0] & _ID_MASK) for k in block_keys(rec)]
+        packed.sort()
+        entries = array("q", packed)
+        with self._lock:
+            self._entries, self._recent, self._watermark = entries, {}, watermark
+            self.loaded_at = time.monotonic()
+
+    def sync(self):
+        """Index patients added or edited since the last sync (old keys of edited rows just go stale)."""
+        changed = []
+        while True:
+            changes, watermark = DB.list_patient_changes(self._watermark)
+            changed += [pid for pid, op, _ in changes if op != "D"]  # deleted ids are simply not found later
+            self._watermark = watermark
+            if len(changes) < 1000:
+                break
+        if not changed:
+            return
+        rows = DB.get_patient_match_fields(changed)
+        with self._lock:
+            for row in rows:
+                rec = prepare(row)
+                for key in block_keys(rec):
+                    self._recent.setdefault(_key_hash(key), set()).add(rec[0])
+
+    def ensure_fresh(self, max_age: float = REBUILD_SECONDS):
+        with self._refreshing:
+            if self.loaded_at is None or time.monotonic() - self.loaded_at > max_age:
+                self.load()
+            else:
+                self.sync()
+
+    # ---------- lookups ----------
+    def _block(self, key: str):
+        h = _key_hash(key)
+        lo = bisect_left(self._entries, h << _ID_BITS)
+        hi = bisect_left(self._entries, (h + 1) << _ID_BITS, lo)
+        ids = {e & _ID_MASK for e in self._entries[lo:hi]} if hi - lo <= self.max_block else set()
+        return ids | self._recent.get(h, set())
+
+    def candidates(self, data: dict, exclude_id: int = None, limit: int = 5):
+        """
+        Existing patients that look like `data` (the add form's dict), best first.
+        Returns: [(score, (PatientID, first, last, national_id, dob, phone), reasons), ...]
+        """
+        self.ensure_fresh()
+        rec = prepare((0, data.get("FirstName"), data.get("LastName"), data.get("NationalID"),
+                       data.get("BirthDate"), data.get("Phone")))
+        with self._lock:
+            ids = set().union(*(self._block(k) for k in block_keys(rec)))
+        ids.discard(exclude_id)
+        found = []
+        for row in DB.get_patient_match_fields(ids):
+            s, reasons = score(rec, prepare(row), self.threshold)
+            if s >= self.threshold:
+                found.append((s, row, reasons))
+        found.sort(key=lambda c: -c[0])
+        return found[:limit]
+
+
+# ---------- batch report ----------
+def _score_blocks(blocks, threshold):
+    """Worker: every pair of every block at or above threshold -> [(score, id_a, id_b, reasons), ...]."""
+    out = []
+    for block in blocks:
+        for i, a in enumerate(block):
+            for b in block[i + 1:]:
+                s, reasons = score(a, b, threshold)
+                if s >= threshold:
+                    out.append((s, *sorted((a[0], b[0])), reasons))
+    return out
+
+
+def _blocks(records, max_block, stats):
+    """Group prepared records by key; yields each block of 2..max_block members."""
+    by_key = {}
+    for rec in records.values():
+        for key in block_keys(rec):
+            by_key.setdefault(key, []).append(rec[0])
+    for ids in by_key.values():
+        if len(ids) > max_block:
+            stats["skipped_blocks"] += 1
+        elif len(ids) > 1:
+            stats["blocks"] += 1
+            stats["comparisons"] += len(ids) * (len(ids) - 1) // 2
+            yield [records[i] for i in ids]
+
+
+def find_duplicates(workers: int = None, threshold: float = MATCH_THRESHOLD, max_block: int = MAX_BLOCK,
+                    chunk_pairs: int = 200_000, log=None):
+    """
+    Scan the whole registry for merge candidates, scoring blocks on a process pool.
+    Returns (pairs, stats): pairs = [(score, id_a, id_b, reasons), ...] best first, each pair once.
+    """
+    t0 = time.perf_counter()
+    records = {}
+    for row in DB.iter_patient_match_fields():
+        records[row[0]] = prepare(row)
+    stats = {"patients": len(records), "blocks": 0, "skipped_blocks": 0, "comparisons": 0}
+    if log:
+        log(f"{len(records):,} patients read in {time.perf_counter() - t0:.1f}s")
+
+    from concurrent.futures import ProcessPoolExecutor  # only the report needs it; multiprocessing is slow to import
+
+    best = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures, chunk, pairs = [], [], 0
+        for block in _blocks(records, max_block, stats):
+            chunk.append(block)
+            pairs += len(block) * (len(block) - 1) // 2
+            if pairs >= chunk_pairs:  # tasks of similar work, so every worker stays busy
+                futures.append(pool.submit(_score_blocks, chunk, threshold))
+                chunk, pairs = [], 0
+        if chunk:
+            futures.append(pool.submit(_score_blocks, chunk, threshold))
+        for f in futures:
+            for s, a, b, reasons in f.result():
+                if s > best.get((a, b), (0,))[0]:  # a pair can share several blocks
+                    best[(a, b)] = (s, a, b, reasons)
+    stats["seconds"] = time.perf_counter() - t0
+    return sorted(best.values(), key=lambda p: -p[0]), stats
+
+
+def write_report(path: str, pairs) -> int:
+    """Merge-candidate CSV: one row per pair with both records side by side. Returns rows written."""
+    fields = {}
+    ids = [i for _, a, b, _ in pairs for i in (a, b)]
+    for i in range(0, len(ids), 5000):
+        fields.update((r[0], r) for r in DB.get_patient_match_fields(ids[i:i + 5000]))
+    columns = ("patient_id", "first_name", "last_name", "national_id", "date_of_birth", "phone")
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("score", "reasons", *(c + "_a" for c in columns), *(c + "_b" for c in columns)))
+        for s, a, b, reasons in pairs:
+            empty = (None,) * len(columns)
+            writer.writerow((f"{s:.3f}", "; ".join(reasons), *fields.get(a, empty), *fields.get(b, empty)))
+    return len(pairs)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("command", choices=("report",))
+    ap.add_argument("out", help="merge-candidate CSV to write")
+    ap.add_argument("--workers", type=int, default=os.cpu_count(), help="scoring processes")
+    ap.add_argument("--threshold", type=float, default=MATCH_THRESHOLD)
+    ap.add_argument("--max-block", type=int, default=MAX_BLOCK, help="skip blocks with more patients")
+    ap.add_argument("--sqlite", metavar="PATH", help="read this SQLite file instead of HMS_DB_DRIVER's backend")
+    args = ap.parse_args(argv)
+    if args.sqlite:
+        DB.use_sqlite(args.sqlite)
+
+    pairs, stats = find_duplicates(args.workers, args.threshold, args.max_block, log=print)
+    write_report(args.out, pairs)
+    print(f"{stats['comparisons']:,} comparisons in {stats['blocks']:,} blocks "
+          f"({stats['skipped_blocks']:,} oversized blocks skipped)")
+    print(f"{len(pairs):,} merge candidates written to {args.out} in {stats['seconds']:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+from PyQt5.QtCore import QObject, Qt, QTimer
+from PyQt5.QtWidgets import (
+    QFileDialog, QHeaderView, QLabel, QMessageBox, QPushButton, QStackedWidget, QTableWidget,
+    QTableWidgetItem, QWidget
+)
+
+from DB import pool_stats, query_snapshot, query_stats
+from PatientCache import patient_cache
+from AuditLog import audit_log
+
+REFRESH_MS = 2000  # auto refresh while the page is visible
+TOP_STATEMENTS = 50
+
+# snapshot keys of tableStatements columns 1..8 (0 is the function, the last one the statement)
+NUMERIC_COLUMNS = ("count", "total_ms", "p50_ms", "p95_ms", "p99_ms", "rows", "errors", "slow")
+
+
+class DiagnosticsPage(QObject):
+    """Drives the diagnostics page (page_14) of HMS.ui: hot statements from DB.query_snapshot()."""
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.window = window
+        self.stackedWidget = window.findChild(QStackedWidget, "stackedWidget")
+        self.page = window.findChild(QWidget, "page_14")
+        self.labelDiagSummary = window.findChild(QLabel, "labelDiagSummary")
+        self.tableStatements = window.findChild(QTableWidget, "tableStatements")
+        self.btnDiagRefresh = window.findChild(QPushButton, "btnDiagRefresh")
+        self.btnDiagReset = window.findChild(QPushButton, "btnDiagReset")
+        self.btnDiagExport = window.findChild(QPushButton, "btnDiagExport")
+
+        header = self.tableStatements.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeToContents)
+        header.setStretchLastSection(True)
+        self.tableStatements.verticalHeader().setVisible(False)
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(REFRESH_MS)
+        self._timer.timeout.connect(self.refresh)
+        # only poll the stats while someone is looking at them
+        self.stackedWidget.currentChanged.connect(
+            lambda *_: self._timer.start() if self.stackedWidget.currentWidget() is self.page else self._timer.stop())
+
+        self.btnDiagRefresh.clicked.connect(self.refresh)
+        self.btnDiagReset.clicked.connect(self.reset)
+        self.btnDiagExport.clicked.connect(self.export)
+
+    def show(self):
+        self.stackedWidget.setCurrentWidget(self.page)
+        self.refresh()
+
+    def refresh(self):
+        snap = query_snapshot(TOP_STATEMENTS)
+        pool = pool_stats()
+        acq, tx = snap["acquire"], snap["transaction"]
+        cache = patient_cache.stats()
+        audit = audit_log.stats()
+        self.labelDiagSummary.setText(
+            f"Pool: {pool['in_use']} in use / {pool['size']} open (max {pool['max_size']}), "
+            f"{pool['waits']} waits, {pool['timeouts']} timeouts    "
+            f"Acquire p50/p99: {acq['p50_ms']:.2f} / {acq['p99_ms']:.2f} ms    "
+            f"Transaction p50/p99: {tx['p50_ms']:.2f} / {tx['p99_ms']:.2f} ms    "
+            f"Slow threshold: {query_stats.slow_ms:g} ms\n"
+            f"Patient cache: {cache['hit_rate']:.0%} hits ({cache['hits']} / {cache['hits'] + cache['misses']}), "
+            f"{cache['revalidated']} revalidated, {cache['stale']} stale, {cache['entries']} entries, "
+            f"{cache['bytes'] / 1024:.0f} KiB, {cache['evictions']} evictions    "
+            f"Audit log: {audit['flushed']} written in {audit['batches']} batches, {audit['queued']} queued, "
+            f"{audit['spilled']} spilled{' (replay pending)' if audit['spill_pending'] else ''}")
+
+        table = self.tableStatements
+        table.setSortingEnabled(False)  # keep rows in place while filling
+        table.setRowCount(len(snap["statements"]))
+        for row, st in enumerate(snap["statements"]):
+            table.setItem(row, 0, QTableWidgetItem(st["function"]))
+            for col, key in enumerate(NUMERIC_COLUMNS, 1):
+                item = QTableWidgetItem()
+                item.setData(Qt.DisplayRole, st[key])  # numeric, so sorting is numeric
+                item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                table.setItem(row, col, item)
+            sql = QTableWidgetItem(st["sql"][:300])
+            sql.setToolTip(st["sql"])
+            table.setItem(row, len(NUMERIC_COLUMNS) + 1, sql)
+        table.setSortingEnabled(True)
+
+    def reset(self):
+        query_stats.reset()
+        self.refresh()
+
+    def export(self):
+        path, _ = QFileDialog.getSaveFileName(self.window, "Export metrics", "hms_metrics.prom",
+                                              "Prometheus text (*.prom);;All files (*)")
+        if not path:
+            return
+        try:
+            query_stats.write_prometheus(path)
+        except OSError as e:
+            QMessageBox.critical(self.window, "Export", f"Failed to write metrics:\n{e}")
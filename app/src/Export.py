@@ -0,0 +1,188 @@
+"""
+Streaming export of the patient registry and clinical tables.
+
+    python app/src/Export.py exports/                                  # every table, CSV, gzip
+    python app/src/Export.py exports/ --tables patients lab_tests --format jsonl --compression xz
+    python app/src/Export.py exports/ --format columnar --workers 5 --restart
+
+Each table (DB.EXPORT_TABLES) is read in key order with cursor.fetchmany and
+written chunk by chunk; every chunk is compressed on its own (concatenated
+gzip / bz2 / xz streams, which zcat, bzcat and xzcat read as one file), so
+memory stays flat whatever the row count. After each chunk a checkpoint
+records the last key and the file size: a rerun truncates the file to that
+size and continues after that key (new rows only, once an export finished),
+unless --restart is given. Tables are exported in parallel, one worker each.
+
+Formats: csv (with a header row), jsonl (one object per row) and columnar
+(one JSON line per chunk holding a value array per column, after a header
+line naming the table and columns).
+"""
+import argparse
+import bz2
+import csv
+import gzip
+import io
+import json
+import lzma
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+
+import DB
+
+FORMATS = {"csv": ".csv", "jsonl": ".jsonl", "columnar": ".columnar.jsonl"}
+COMPRESSION = {
+    "gzip": (".gz", lambda b: gzip.compress(b, compresslevel=6, mtime=0)),
+    "bz2": (".bz2", bz2.compress),
+    "xz": (".xz", lambda b: lzma.compress(b, preset=3)),  # higher presets need ~100 MB of encoder state per worker
+    "none": ("", lambda b: b),
+}
+BATCH_ROWS = 5000  # rows per fetchmany, per chunk and per checkpoint
+
+
+class ExportStopped(Exception):
+    """stop was set; the checkpoint lets the next run continue."""
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.hex()
+    raise TypeError(f"cannot export {type(value).__name__}")
+
+
+def _encode(fmt: str, columns, rows) -> bytes:
+    if fmt == "csv":
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        return buf.getvalue().encode("utf-8")
+    if fmt == "jsonl":
+        return "".join(json.dumps(dict(zip(columns, r)), default=_json_value, ensure_ascii=False) + "\n"
+                       for r in rows).encode("utf-8")
+    block = {"rows": len(rows), "columns": dict(zip(columns, (list(c) for c in zip(*rows))))}
+    return (json.dumps(block, default=_json_value, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _header(fmt: str, table: str, columns) -> bytes:
+    if fmt == "csv":
+        buf = io.StringIO()
+        csv.writer(buf).writerow(columns)
+        return buf.getvalue().encode("utf-8")
+    if fmt == "columnar":
+        return (json.dumps({"table": table, "columns": list(columns)}) + "\n").encode("utf-8")
+    return b""
+
+
+def export_path(out_dir: str, table: str, fmt: str, compression: str) -> str:
+    return os.path.join(out_dir, table + FORMATS[fmt] + COMPRESSION[compression][0])
+
+
+def _load_checkpoint(path: str, fmt: str, compression: str):
+    """(after_id, offset, rows) to continue from, or None when the export has to start over."""
+    try:
+        with open(path + ".checkpoint", encoding="utf-8") as f:
+            cp = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (cp.get("format"), cp.get("compression")) != (fmt, compression) or not os.path.exists(path) \
+            or os.path.getsize(path) < cp["offset"]:
+        return None
+    return cp["after_id"], cp["offset"], cp["rows"]
+
+
+def _save_checkpoint(path: str, table: str, fmt: str, compression: str, after_id, offset: int, rows: int):
+    tmp = path + ".checkpoint.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"table": table, "format": fmt, "compression": compression, "after_id": after_id,
+                   "offset": offset, "rows": rows, "saved_at": datetime.now().isoformat(timespec="seconds")}, f)
+    os.replace(tmp, path + ".checkpoint")  # atomic: a crash never leaves a half-written checkpoint
+
+
+def export_table(table: str, out_dir: str, fmt: str = "csv", compression: str = "gzip", batch: int = BATCH_ROWS,
+                 restart: bool = False, progress=None, stop: threading.Event = None) -> dict:
+    """
+    Export one table; returns {"table", "path", "rows" (this run), "total_rows", "bytes", "seconds"}.
+    progress(table, total_rows) is called after every chunk, from this worker's thread.
+    """
+    path = export_path(out_dir, table, fmt, compression)
+    columns = DB.export_columns(table)
+    compress = COMPRESSION[compression][1]
+    resume = None if restart else _load_checkpoint(path, fmt, compression)
+    after_id, offset, total = resume or (None, 0, 0)
+    rows = 0
+    t0 = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    with open(path, "r+b" if resume else "wb") as f:
+        f.truncate(offset)  # drop a chunk written after the last checkpoint
+        f.seek(offset)
+        if not resume:
+            header = _header(fmt, table, columns)
+            if header:
+                f.write(compress(header))
+        chunks = DB.iter_export(table, after_id, batch)
+        try:
+            for chunk in chunks:
+                if stop is not None and stop.is_set():
+                    raise ExportStopped(table)
+                f.write(compress(_encode(fmt, columns, chunk)))
+                f.flush()
+                os.fsync(f.fileno())  # the checkpoint must never point past what is on disk
+                rows += len(chunk)
+                after_id = chunk[-1][0]
+                _save_checkpoint(path, table, fmt, compression, after_id, f.tell(), total + rows)
+                if progress:
+                    progress(table, total + rows)
+        finally:
+            chunks.close()  # hand the connection back when stopped or failed mid-way
+        if not resume and rows == 0:
+            _save_checkpoint(path, table, fmt, compression, after_id, f.tell(), 0)
+        size = f.tell()
+    return {"table": table, "path": path, "rows": rows, "total_rows": total + rows, "bytes": size,
+            "seconds": time.perf_counter() - t0}
+
+
+def export_tables(out_dir: str, tables=None, fmt: str = "csv", compression: str = "gzip", workers: int = 4,
+                  batch: int = BATCH_ROWS, restart: bool = False, progress=None, stop: threading.Event = None):
+    """Export several tables, up to `workers` at a time (each on its own pooled connection). Returns [result, ...]."""
+    tables = list(tables or DB.EXPORT_TABLES)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tables))), thread_name_prefix="hms-export") as pool:
+        futures = [pool.submit(export_table, t, out_dir, fmt, compression, batch, restart, progress, stop)
+                   for t in tables]
+        return [f.result() for f in futures]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("out_dir")
+    ap.add_argument("--tables", nargs="+", choices=sorted(DB.EXPORT_TABLES), help="default: all")
+    ap.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    ap.add_argument("--compression", choices=sorted(COMPRESSION), default="gzip")
+    ap.add_argument("--workers", type=int, default=4, help="tables exported at the same time")
+    ap.add_argument("--batch", type=int, default=BATCH_ROWS, help="rows per chunk")
+    ap.add_argument("--restart", action="store_true", help="ignore checkpoints and export everything again")
+    ap.add_argument("--sqlite", metavar="PATH", help="read this SQLite file instead of HMS_DB_DRIVER's backend")
+    args = ap.parse_args(argv)
+    if args.sqlite:
+        DB.use_sqlite(args.sqlite)
+
+    t0 = time.perf_counter()
+    results = export_tables(args.out_dir, args.tables, args.format, args.compression, args.workers,
+                            args.batch, args.restart)
+    for r in results:
+        print(f"{r['table']:<16} {r['rows']:>11,} rows ({r['total_rows']:,} in file)  "
+              f"{r['bytes'] / 1e6:8.1f} MB  {r['seconds']:6.1f}s  {r['path']}")
+    rows = sum(r["rows"] for r in results)
+    seconds = time.perf_counter() - t0
+    print(f"{rows:,} rows in {seconds:.1f}s ({rows / seconds if seconds else 0:,.0f} rows/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
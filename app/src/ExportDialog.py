@@ -0,0 +1,122 @@
+import os
+import threading
+from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtWidgets import (
+    QDialog, QPushButton, QComboBox, QSpinBox, QLineEdit, QCheckBox, QLabel, QListWidget, QListWidgetItem,
+    QFileDialog, QMessageBox
+)
+
+from DB import EXPORT_TABLES
+from DbWorker import default_executor
+from UiLoader import load_ui
+from Export import FORMATS, COMPRESSION, ExportStopped, export_tables
+
+DEFAULT_FOLDER = os.path.join(os.path.expanduser("~"), "hms_export")
+
+
+class ExportDialog(QDialog):
+    """Stream the chosen tables to files in the background; a stopped export continues where it left off."""
+
+    progressed = pyqtSignal(str, int)  # table, rows in its file; emitted from the export workers
+
+    def __init__(self, executor=None):
+        super().__init__()
+        load_ui(self, "export_dialog")
+        self._executor = executor or default_executor()
+        self._stop = None  # threading.Event while an export runs
+        self._counts = {}
+        self.exported = []  # tables rows were written to, whether the export completed or not (audit log)
+
+        # Find widgets by objectName
+        self.listTables = self.findChild(QListWidget, "listTables")
+        self.comboFormat = self.findChild(QComboBox, "comboFormat")
+        self.comboCompression = self.findChild(QComboBox, "comboCompression")
+        self.spinWorkers = self.findChild(QSpinBox, "spinWorkers")
+        self.lineEditFolder = self.findChild(QLineEdit, "lineEditFolder")
+        self.btnBrowse = self.findChild(QPushButton, "btnBrowse")
+        self.checkRestart = self.findChild(QCheckBox, "checkRestart")
+        self.labelProgress = self.findChild(QLabel, "labelProgress")
+        self.btnExport = self.findChild(QPushButton, "btnExport")
+        self.btnClose = self.findChild(QPushButton, "btnClose")
+
+        for table in EXPORT_TABLES:
+            item = QListWidgetItem(table)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked)
+            self.listTables.addItem(item)
+        self.comboFormat.addItems(FORMATS)
+        self.comboCompression.addItems(COMPRESSION)
+        self.lineEditFolder.setText(DEFAULT_FOLDER)
+
+        self.progressed.connect(self._on_progress)
+        self.btnBrowse.clicked.connect(self._browse)
+        self.btnExport.clicked.connect(self._on_export)
+        self.btnClose.clicked.connect(self.close)
+
+    def _browse(self):
+        folder = QFileDialog.getExistingDirectory(self, "Export folder", self.lineEditFolder.text())
+        if folder:
+            self.lineEditFolder.setText(folder)
+
+    def _selected_tables(self):
+        return [self.listTables.item(i).text() for i in range(self.listTables.count())
+                if self.listTables.item(i).checkState() == Qt.Checked]
+
+    def _on_export(self):
+        tables, folder = self._selected_tables(), self.lineEditFolder.text().strip()
+        if not tables or not folder:
+            QMessageBox.warning(self, "Export", "Choose at least one table and a folder.")
+            return
+        self._stop = threading.Event()
+        self._counts = dict.fromkeys(tables, 0)
+        self._set_running(True)
+        self.labelProgress.setText("Starting…")
+
+        def done(results):
+            self._set_running(False)
+            rows = sum(r["rows"] for r in results)
+            self.labelProgress.setText(f"{rows:,} rows exported to {folder}.")
+
+        def failed(e):
+            self._set_running(False)
+            if isinstance(e, ExportStopped):
+                self.labelProgress.setText("Stopped. Export again to continue from here.")
+            else:
+                QMessageBox.critical(self, "Export Error", f"Export failed:\n{e}")
+
+        self._executor.submit(export_tables, folder, tables, self.comboFormat.currentText(),
+                              self.comboCompression.currentText(), self.spinWorkers.value(),
+                              restart=self.checkRestart.isChecked(), progress=self._progress,
+                              stop=self._stop, on_result=done, on_error=failed)
+        self.checkRestart.setChecked(False)  # "Export" after a stop continues rather than starting over
+
+    def _progress(self, table, rows):
+        """Export workers, after each chunk on disk: noted here, not in the GUI slot, so a table
+        still counts when the export is stopped, fails or the dialog closes first."""
+        if table not in self.exported:
+            self.exported.append(table)
+        self.progressed.emit(table, rows)
+
+    def _on_progress(self, table, rows):
+        self._counts[table] = rows
+        self.labelProgress.setText("   ".join(f"{t}: {n:,}" for t, n in self._counts.items()))
+
+    def _set_running(self, running):
+        for w in (self.listTables, self.comboFormat, self.comboCompression, self.spinWorkers,
+                  self.lineEditFolder, self.btnBrowse, self.checkRestart):
+            w.setEnabled(not running)
+        self.btnExport.setText("Stop" if running else "Export")
+        self.btnExport.clicked.disconnect()
+        self.btnExport.clicked.connect((lambda: self._stop_export()) if running else self._on_export)
+
+    def _stop_export(self):
+        if self._stop is not None:
+            self._stop.set()  # the checkpoints keep what was written
+
+    def reject(self):
+        self._stop_export()
+        super().reject()
+
+    def closeEvent(self, event):
+        self._stop_export()
+        super().closeEvent(event)
@@ -1,31 +1,44 @@
 import sys
-import os
-from datetime import datetime, timedelta
+import argparse
+from StartupProfile import startup  # first import: the cold start clock starts here
 from Login import LoginDialog
-from PyQt5 import uic
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QStackedWidget,
-    QTableWidget, QTableWidgetItem, QPushButton, QLineEdit,
-    QMessageBox, QDialog, QHeaderView
+    QTableView, QPushButton, QLineEdit,
+    QMessageBox, QDialog, QHeaderView, QAbstractItemView, QProgressBar, QAction
 )
+from UiLoader import load_ui
 
 from DB import (
-    list_patients,  # returns [(PatientID, first_name, last_name, national_id), ...]
-    get_patient_by_id,  # returns dict for one patient
-    insert_patient,  # inserts party/person/patient and returns new patient_id
-    update_patient,  # updates persons data by patient_id
-    insert_appointment  # inserts an appointment
+    list_patients_page,  # keyset page of patients for the grid
+    patient_change_watermark, list_patient_changes,  # delta feed that keeps the grid in sync
+    prune_patient_changes,  # trims the feed's log (once per start)
+    DB_DRIVER,  # "api": thin client of ApiServer.py
 )
+# get / search / update / insert patients through the LRU cache (write-through invalidation)
+from PatientCache import patient_cache
 from AddPatientDialog import AddPatientDialog
+from PatientModel import PatientTableModel  # lazy, paged patient grid
+from DbWorker import default_executor  # runs DB calls off the GUI thread
+from Scheduling import SchedulingEngine  # in-memory doctor availability index
+from Dedupe import DedupeIndex  # blocking-key index for duplicate-patient warnings
+from AuditLog import audit_log  # buffered, written off the GUI thread
+# Imported on first use, not at startup: ReserveVisitDialog, PatientTimelineDialog,
+# ExportDialog (File > Export data…), ClinicalSearchDialog (Clinical > Search notes…),
+# DashboardPage (page_1), DiagnosticsPage (page_14) and PharmacyPage (page_6)
+
+SEARCH_DEBOUNCE_MS = 250  # wait for a typing pause before querying
+SEARCH_MIN_CHARS = 2      # shorter input shows the full list again
+SYNC_INTERVAL_MS = 3000   # poll the patient change feed (one indexed range read when idle)
+SYNC_BATCH = 500          # changes per poll; a full batch polls again right away
 
 
 class MainWindow(QMainWindow):
     def __init__(self, current_user=None):
         super().__init__()
         self.current_user = current_user  # keep the logged-in user
-        ui_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "ui", "HMS.ui"))
-        uic.loadUi(ui_path, self)
+        load_ui(self, "HMS")
 
         # Add widget
         self.stackedWidget = self.findChild(QStackedWidget, "stackedWidget")
@@ -37,31 +50,148 @@ class MainWindow(QMainWindow):
         self.btnView = self.findChild(QPushButton, "btnView")
         self.btnEdit = self.findChild(QPushButton, "btnEdit")
         self.btnReserve = self.findChild(QPushButton, "btnReserve")
-        self.tablePatients = self.findChild(QTableWidget, "tablePatients")
+        self.tablePatients = self.findChild(QTableView, "tablePatients")
+        self.btnDashboard = self.findChild(QPushButton, "btnDashboard")
+        self.btnReports = self.findChild(QPushButton, "btnReports")
+        self.btnDiagnostics = self.findChild(QPushButton, "btnDiagnostics")
+        self.btnPharmacy = self.findChild(QPushButton, "btnPharmacy")
+        self.actionExportData = self.findChild(QAction, "actionExportData")
+        self.actionClinicalSearch = self.findChild(QAction, "actionClinicalSearch")
+
+        # All DB work goes through the executor; the status bar shows a busy
+        # indicator while anything is in flight
+        self.db = default_executor()
+        self.busyIndicator = QProgressBar(self)
+        self.busyIndicator.setRange(0, 0)  # indeterminate
+        self.busyIndicator.setMaximumWidth(120)
+        self.busyIndicator.setVisible(False)
+        self.statusBar().addPermanentWidget(self.busyIndicator)
+        self.db.busyChanged.connect(self.busyIndicator.setVisible)
+        self._started = False  # first data load waits for the first show()
+
+        # Free-slot index shared by every reservation dialog (loaded on first use)
+        self.scheduler = SchedulingEngine()
+        # Duplicate-patient index shared by every Add Patient dialog (loaded on first use);
+        # a thin client asks the API service's index instead of loading the registry
+        if DB_DRIVER == "api":
+            from ApiClient import RemoteDedupe, default_client
+            self.dedupe = RemoteDedupe(default_client())
+        else:
+            self.dedupe = DedupeIndex()
+
+        # Patient grid: rows are fetched page by page while scrolling
+        self.patientModel = PatientTableModel(executor=self.db, parent=self)
+        self.patientModel.loadFailed.connect(
+            lambda err: QMessageBox.critical(self, "DB Error", f"Failed to load patients:\n{err}"))
+        self.tablePatients.setModel(self.patientModel)
+        self.tablePatients.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.tablePatients.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.tablePatients.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        # fixed row height: the view never measures rows it does not paint
+        self.tablePatients.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        # rows added/removed above the viewport must not move what the user is looking at
+        self.patientModel.rowsInserted.connect(lambda _, first, last: self._keep_scroll(first, last - first + 1))
+        self.patientModel.rowsAboutToBeRemoved.connect(
+            lambda _, first, last: self._keep_scroll(first, -(last - first + 1)))
+
+        # Delta sync: other desks' (and our own) writes are applied to the grid in place
+        self._watermark = None
+        self._syncTimer = QTimer(self)
+        self._syncTimer.setInterval(SYNC_INTERVAL_MS)
+        self._syncTimer.timeout.connect(self.sync_patients)
 
         # Connect btn
         self.btnPatients.clicked.connect(self.go_to_patients_page)
         self.btnAddPatient.clicked.connect(self.open_add_patient_dialog)
         # Enable/disable action buttons based on selection
-        self.tablePatients.itemSelectionChanged.connect(self._toggle_actions)
+        self.tablePatients.selectionModel().selectionChanged.connect(lambda *_: self._toggle_actions())
         # Double-click to open View
-        self.tablePatients.itemDoubleClicked.connect(lambda *_: self.view_patient())
+        self.tablePatients.doubleClicked.connect(lambda *_: self.view_patient())
         self.btnView.clicked.connect(self.view_patient)
         self.btnEdit.clicked.connect(self.edit_patient)
         self.btnReserve.clicked.connect(self.reserve_visit)
         self.btnSearch.clicked.connect(self.search_patients)
 
+        # Dashboard: appointments, no-shows, lab volumes, revenue and room use from the report rollups
+        self.dashboard = None  # built on first visit
+        self.btnDashboard.clicked.connect(self.show_dashboard)
+        self.btnReports.clicked.connect(self.show_dashboard)
+
+        # Diagnostics page: hot statements, latency percentiles, pool counters
+        self.diagnostics = None  # built on first visit
+        self.btnDiagnostics.clicked.connect(self.show_diagnostics)
+
+        # Pharmacy page: dispensing from the earliest-expiring batches, stock and expiry reports
+        self.pharmacy = None  # built on first visit
+        self.btnPharmacy.clicked.connect(self.show_pharmacy)
+
+        # One Add/Edit Patient form, reset for every use (built on first use)
+        self._patientDialog = None
+
+        # Streaming export of the registry and clinical tables (Export.py)
+        self.actionExportData.triggered.connect(self.export_data)
+        self.actionClinicalSearch.triggered.connect(self.clinical_search)
+
+        # Search-as-you-type: every keystroke restarts the timer, so only the
+        # last query of a typing burst reaches the DB
+        self._active_query = ""
+        self._searchTimer = QTimer(self)
+        self._searchTimer.setSingleShot(True)
+        self._searchTimer.setInterval(SEARCH_DEBOUNCE_MS)
+        self._searchTimer.timeout.connect(self.search_patients)
+        self.lineEditSearch.textChanged.connect(lambda *_: self._searchTimer.start())
+        self.lineEditSearch.returnPressed.connect(self.search_patients)
+
         # Initially, action buttons are disabled (until a row is selected)
         for b in (self.btnView, self.btnEdit, self.btnReserve):
             if b:
                 b.setEnabled(False)
 
-        # Start app with that page
-        self.stackedWidget.setCurrentIndex(0)
-        # Initial data load from DB
+        # Start app on the patients page (the dashboard loads on first visit); the first data
+        # load runs once the window is up (showEvent)
+        self.stackedWidget.setCurrentWidget(self.page_5)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self._started:
+            self._started = True
+            QTimer.singleShot(0, self._first_load)  # after the first paint
+
+    def _first_load(self):
+        """Initial data load from DB, once the window is on screen."""
+        startup.mark("main window shown")
+        self.patientModel.pageLoaded.connect(self._first_page)
+        self.patientModel.loadFailed.connect(self._first_page)
         self.load_patients_from_db()
+        self.db.submit(prune_patient_changes, key="prune_patient_changes")
+
+    def _first_page(self, *_):
+        self.patientModel.pageLoaded.disconnect(self._first_page)
+        self.patientModel.loadFailed.disconnect(self._first_page)
+        if not startup.finish("first patient page") and startup.enabled:
+            self.statusBar().showMessage(
+                f"Startup took {startup.interactive_ms():.0f} ms (budget {startup.budget_ms:.0f} ms)", 10000)
+        QTimer.singleShot(0, self._patient_dialog)  # build the Add/Edit form while idle, not on the first click
 
     # Navigation
+    def show_dashboard(self):
+        if self.dashboard is None:
+            from DashboardPage import DashboardPage
+            self.dashboard = DashboardPage(self)
+        self.dashboard.show()
+
+    def show_diagnostics(self):
+        if self.diagnostics is None:
+            from DiagnosticsPage import DiagnosticsPage
+            self.diagnostics = DiagnosticsPage(self)
+        self.diagnostics.show()
+
+    def show_pharmacy(self):
+        if self.pharmacy is None:
+            from PharmacyPage import PharmacyPage
+            self.pharmacy = PharmacyPage(self)
+        self.pharmacy.show()
+
     def go_to_patients_page(self):
         """Show the patient page using the widget reference (safer than hard index)."""
         if self.stackedWidget and self.page_5:
@@ -69,18 +199,22 @@ class MainWindow(QMainWindow):
         else:
             QMessageBox.warning(self, "Navigation", "stackedWidget or page_5 not found.")
 
+    def _audit(self, action, table_name, record_id):
+        """Queue an audit event for the logged-in user (returns at once)."""
+        user_id = (self.current_user or {}).get("id")
+        if user_id is not None:
+            audit_log.record(user_id, action, table_name, record_id)
+
     # Helpers for table selection
 
     def _selected_patient_id(self):
-        """Return currently selected patient ID from the table (assumes col 0 = ID)."""
+        """Return currently selected patient ID from the grid model."""
         if not self.tablePatients:
             return None
-        sel = self.tablePatients.selectedItems()
+        sel = self.tablePatients.selectionModel().selectedRows()
         if not sel:
             return None
-        row = sel[0].row()
-        it = self.tablePatients.item(row, 0)
-        return it.text() if it else None
+        return self.patientModel.patient_id(sel[0].row())
 
     def _toggle_actions(self):
         """Enable/disable action buttons based on whether a row is selected."""
@@ -91,167 +225,226 @@ class MainWindow(QMainWindow):
 
     # Data loading / searching
     def load_patients_from_db(self):
-        """Fetch patients from DB and populate the table."""
+        """(Re)load the patient grid; pages are fetched lazily as the view scrolls."""
         if not self.tablePatients:
             return
 
-        try:
-            rows = list_patients()  # [(PatientID, first_name, last_name, national_id), ...]
-        except Exception as e:
-            QMessageBox.critical(self, "DB Error", f"Failed to load patients:\n{e}")
-            return
+        # Read the change-feed watermark before the first page, so no write falls
+        # between the two (one seen twice is harmless: changes are applied idempotently)
+        self._watermark = None
+        self._syncTimer.stop()
+
+        def start(watermark):
+            self._watermark = watermark
+            self._syncTimer.start()
+            self.patientModel.reload()
 
-        self.tablePatients.clear()
-        self.tablePatients.setColumnCount(4)
-        self.tablePatients.setHorizontalHeaderLabels(["ID", "First Name", "Last Name", "National ID"])
-        self.tablePatients.setRowCount(len(rows))
+        def failed(e):
+            self.statusBar().showMessage(f"Live updates unavailable: {e}", 10000)
+            self.patientModel.reload()
 
-        for r, (pid, fn, ln, nid) in enumerate(rows):
-            self.tablePatients.setItem(r, 0, QTableWidgetItem(str(pid)))
-            self.tablePatients.setItem(r, 1, QTableWidgetItem(fn or ""))
-            self.tablePatients.setItem(r, 2, QTableWidgetItem(ln or ""))
-            self.tablePatients.setItem(r, 3, QTableWidgetItem(nid or ""))
+        self.db.submit(patient_change_watermark, on_result=start, on_error=failed)
 
         # After reload, disable actions until use selects a row again
         self._toggle_actions()
 
-        # Table style
-        header = self.tablePatients.horizontalHeader()
-        header.setSectionResizeMode(QHeaderView.Stretch)
+    def sync_patients(self):
+        """Fetch changes past the watermark and apply them to the grid in place."""
+        watermark = self._watermark
+        if watermark is None:
+            return
 
-        for row in range(self.tablePatients.rowCount()):
-            for col in range(self.tablePatients.columnCount()):
-                item = self.tablePatients.item(row, col)
-                if item:
-                    item.setTextAlignment(Qt.AlignCenter)
+        def done(result):
+            if self._watermark != watermark:
+                return  # the grid was reloaded meanwhile
+            changes, self._watermark = result
+            if not changes:
+                return
+            # another desk's edit also makes our cached copies stale
+            patient_cache.invalidate(*{pid for pid, _, _ in changes})
+            self.patientModel.apply_changes(changes, complete=not self._active_query)
+            self._toggle_actions()
+            if len(changes) == SYNC_BATCH:
+                self.sync_patients()
+
+        self.db.submit(list_patient_changes, watermark, SYNC_BATCH, key="list_patient_changes",
+                       on_result=done,
+                       on_error=lambda e: self.statusBar().showMessage(f"Live update failed: {e}", 5000))
+
+    def _keep_scroll(self, first, delta):
+        """Shift the scroll bar by rows inserted (delta > 0) or removed above the top visible row."""
+        bar = self.tablePatients.verticalScrollBar()
+        top = self.tablePatients.rowAt(0)
+        if bar.value() == 0 or top < 0 or first > top:
+            return
+        step = 1 if self.tablePatients.verticalScrollMode() == QAbstractItemView.ScrollPerItem \
+            else self.tablePatients.verticalHeader().defaultSectionSize()
+        # removal happens after this signal, insertion already did: the bar range follows
+        QTimer.singleShot(0, lambda: bar.setValue(bar.value() + delta * step))
 
     def search_patients(self):
-        """Very basic in-memory filter on the already loaded table (optional).
-        For large datasets, implement server-side filtering in DB instead."""
+        """Server-side prefix search; results are paged into the grid like the full list."""
         if not (self.tablePatients and self.lineEditSearch):
             return
 
-        q = (self.lineEditSearch.text() or "").strip().lower()
-        # Simple row-visibility filter on table items
-        for row in range(self.tablePatients.rowCount()):
-            # Concatenate all visible columns for a quick contains check
-            row_text = " ".join(
-                (self.tablePatients.item(row, c).text() if self.tablePatients.item(row, c) else "")
-                for c in range(self.tablePatients.columnCount())
-            ).lower()
-            self.tablePatients.setRowHidden(row, q not in row_text)
+        self._searchTimer.stop()  # a pending debounced run is now stale
+        q = (self.lineEditSearch.text() or "").strip()
+        if len(q) < SEARCH_MIN_CHARS:
+            q = ""
+        if q == self._active_query:
+            return
+        self._active_query = q
+
+        if q:
+            self.patientModel.set_source(lambda after_id, limit: patient_cache.search_patients(q, limit, after_id)[0])
+        else:
+            self.patientModel.set_source(list_patients_page)
+        self._toggle_actions()
+
+    def _patient_dialog(self):
+        """The shared Add/Edit Patient form; callers reset() it before use."""
+        if self._patientDialog is None:
+            self._patientDialog = AddPatientDialog(executor=self.db)
+        return self._patientDialog
 
     def open_add_patient_dialog(self):
-        dlg = AddPatientDialog()
+        dlg = self._patient_dialog()
+        dlg.reset(save=patient_cache.insert_patient, dedupe=self.dedupe)
         if dlg.exec_() == QDialog.Accepted:
-            self.load_patients_from_db()  # refresh table from DB
+            self._audit("INSERT", "patients", dlg.saved_result)
+            QMessageBox.information(self, "Success", f"Patient added (ID={dlg.saved_result}).")
+            if self._watermark is None:
+                self.load_patients_from_db()  # no live updates: refresh the table from DB
+            else:
+                self.sync_patients()  # the change feed brings the new row in
             self.go_to_patients_page()  # optional: ensure patients page is visible
 
+    def _fetch_patient(self, pid, on_result, what="fetch patient"):
+        """Load one patient off the GUI thread; repeated clicks share one query."""
+        def done(p):
+            if not p:
+                QMessageBox.warning(self, "Not Found", "Patient not found.")
+                return
+            on_result(p)
+
+        self.db.submit(patient_cache.get_patient, int(pid), key=("get_patient_by_id", int(pid)),
+                       on_result=done,
+                       on_error=lambda e: QMessageBox.critical(self, "DB Error", f"Failed to {what}:\n{e}"))
+
     def view_patient(self):
-        """Show a simple read-only summary for the selected patient."""
+        """Show the selected patient's details and clinical timeline (read-only)."""
         pid = self._selected_patient_id()
         if not pid:
             return
-        try:
-            p = get_patient_by_id(int(pid))
-        except Exception as e:
-            QMessageBox.critical(self, "DB Error", f"Failed to fetch patient:\n{e}")
-            return
-        if not p:
-            QMessageBox.warning(self, "Not Found", "Patient not found.")
-            return
+        self._fetch_patient(pid, self._show_patient)
 
-        # Basic info dialog (you can replace with a custom view dialog)
-        msg = (
-            f"ID: {p['PatientID']}\n"
-            f"Name: {p['FirstName']} {p['LastName']}\n"
-            f"NationalID: {p['NationalID']}\n"
-            f"DOB: {p['BirthDate']}\n"
-            f"Gender: {p['Gender']}\n"
-            f"Phone: {p['Phone']}\n"
-            f"Address: {p['Address']}"
-        )
-        QMessageBox.information(self, "Patient", msg)
+    def _show_patient(self, p):
+        self._audit("VIEW", "patients", p["PatientID"])
+        # header renders from the record we already have; the history loads in the background
+        from PatientTimelineDialog import PatientTimelineDialog
+        PatientTimelineDialog(p, executor=self.db).exec_()
 
     def edit_patient(self):
         """Open AddPatientDialog as an edit form, then update DB."""
         pid = self._selected_patient_id()
         if not pid:
             return
+        self._fetch_patient(pid, lambda p: self._open_edit_dialog(int(pid), p))
 
-        try:
-            p = get_patient_by_id(int(pid))
-        except Exception as e:
-            QMessageBox.critical(self, "DB Error", f"Failed to fetch patient:\n{e}")
-            return
-        if not p:
-            QMessageBox.warning(self, "Not Found", "Patient not found.")
-            return
-
-        # Open dialog and pre-fill fields
-        dlg = AddPatientDialog()
-        dlg.setWindowTitle("Edit Patient")
-        dlg.lineEditFirstName.setText(p["FirstName"] or "")
-        dlg.lineEditLastName.setText(p["LastName"] or "")
-        dlg.lineEditNationalID.setText(p["NationalID"] or "")
-        if p["BirthDate"]:
-            dlg.dateEditBirth.setDate(dlg.dateEditBirth.date().fromString(str(p["BirthDate"]), "yyyy-MM-dd"))
-        # Set gender
-        idx = dlg.comboGender.findText((p["Gender"] or "").strip(), Qt.MatchFixedString)
-        if idx >= 0:
-            dlg.comboGender.setCurrentIndex(idx)
-        dlg.lineEditPhone.setText(p["Phone"] or "")
-        dlg.plainTextAddress.setPlainText(p["Address"] or "")
+    def _open_edit_dialog(self, pid, p):
+        self._audit("VIEW", "patients", pid)  # the form shows the whole record
+        # Open dialog and pre-fill fields; Submit runs update_patient (not insert)
+        # RowVersion makes the update fail instead of overwriting someone else's edit
+        dlg = self._patient_dialog()
+        dlg.reset(save=lambda data: patient_cache.update_patient(pid, data, p["RowVersion"]), title="Edit Patient")
+        dlg.fill(p)
 
         if dlg.exec_() == QDialog.Accepted:
-            try:
-                data = {
-                    "FirstName": dlg.lineEditFirstName.text().strip(),
-                    "LastName": dlg.lineEditLastName.text().strip(),
-                    "NationalID": dlg.lineEditNationalID.text().strip(),
-                    "BirthDate": dlg.dateEditBirth.date().toPyDate(),
-                    "Gender": dlg.comboGender.currentText().strip(),
-                    "Phone": dlg.lineEditPhone.text().strip(),
-                    "Address": dlg.plainTextAddress.toPlainText().strip(),
-                }
-                ok = update_patient(int(pid), data)
-                if ok:
-                    QMessageBox.information(self, "Updated", "Patient updated successfully.")
-                    self.load_patients_from_db()
-                else:
-                    QMessageBox.warning(self, "No Change", "No rows were updated.")
-            except Exception as e:
-                QMessageBox.critical(self, "DB Error", f"Failed to update patient:\n{e}")
+            if dlg.saved_result:
+                self._audit("UPDATE", "patients", pid)
+                QMessageBox.information(self, "Updated", "Patient updated successfully.")
+                # patch the visible row instead of reloading the whole grid
+                data = dlg.collect_data()
+                self.patientModel.update_row((pid, data["FirstName"], data["LastName"], data["NationalID"]))
+            else:
+                QMessageBox.warning(self, "No Change", "No rows were updated.")
 
     def reserve_visit(self):
-        """Quick reservation example (replace with a real reservation dialog)."""
+        """Open the reservation dialog (free slots come from the in-memory scheduling engine)."""
         pid = self._selected_patient_id()
         if not pid:
             return
 
-        # Demo: reserve an appointment 3 days from now with doctor_id=1
-        when_dt = datetime.now() + timedelta(days=3)
-        try:
-            ok = insert_appointment(int(pid), doctor_id=1, when_dt=when_dt, status="Scheduled")
-            if ok:
-                QMessageBox.information(self, "Reserved", "Appointment reserved.")
-            else:
-                QMessageBox.warning(self, "Not Reserved", "No reservation was made.")
-        except Exception as e:
-            QMessageBox.critical(self, "DB Error", f"Failed to reserve appointment:\n{e}")
-
-
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
+        from ReserveVisitDialog import ReserveVisitDialog
+        dlg = ReserveVisitDialog(int(pid), self.scheduler, executor=self.db)
+        if dlg.exec_() == QDialog.Accepted and dlg.appointment:
+            appointment_id, when, doctor = dlg.appointment
+            self._audit("RESERVE", "appointments", appointment_id)
+            QMessageBox.information(self, "Reserved", f"Appointment reserved with Dr. {doctor} at {when:%Y-%m-%d %H:%M}.")
+
+    def export_data(self):
+        """File > Export data…: the export runs in the background while the dialog shows progress."""
+        from ExportDialog import ExportDialog
+        dlg = ExportDialog(executor=self.db)
+        dlg.exec_()
+        for table in list(dlg.exported):  # stopped and failed exports too: their files hold patient data
+            self._audit("EXPORT", table, None)
+
+    def clinical_search(self):
+        """Clinical > Search notes…: limited to the selected patient (if any) until unticked."""
+        pid = self._selected_patient_id()
+        if pid:
+            self._fetch_patient(pid, self._open_clinical_search)
+        else:
+            self._open_clinical_search(None)
+
+    def _open_clinical_search(self, p):
+        from ClinicalSearchDialog import ClinicalSearchDialog
+        dlg = ClinicalSearchDialog(p, executor=self.db,
+                                   open_patient=lambda pid: self._fetch_patient(pid, self._show_patient))
+        dlg.exec_()
+        if dlg.searched:  # matching notes were on screen
+            self._audit("SEARCH", "medical_records", None)
+            self._audit("SEARCH", "lab_tests", None)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="MedDesk HMS desktop client")
+    ap.add_argument("--profile-startup", action="store_true",
+                    help="print how long each startup phase took (also HMS_STARTUP_PROFILE=1)")
+    ap.add_argument("--startup-budget-ms", type=float,
+                    help="cold start to interactive budget; over it, the profile and status bar say so")
+    ap.add_argument("--startup-check", action="store_true",
+                    help="quit once interactive, with exit status 1 if over the budget (benchmarks/bench_startup.py)")
+    args, qt_args = ap.parse_known_args(argv)
+    startup.enabled = startup.enabled or args.profile_startup or args.startup_check
+    if args.startup_budget_ms:
+        startup.budget_ms = args.startup_budget_ms
+    startup.mark("imports")
+
+    app = QApplication.instance() or QApplication(sys.argv[:1] + qt_args)
+    app.aboutToQuit.connect(audit_log.close)  # last audit rows are written before exit
+    startup.mark("Qt application")
 
     # 1) Show login first
     login = LoginDialog()
+    QTimer.singleShot(0, lambda: startup.mark("login dialog"))  # runs once it is on screen
     if login.exec_() != LoginDialog.Accepted:
-        sys.exit(0)
+        return 0
+    startup.mark("waiting for sign-in", counted=False)
 
-    # 2) Open main window with current user
+    # 2) Open main window with current user; patients load after the first paint
     user = login.auth_user()
     win = MainWindow(current_user=user)
+    startup.mark("main window")
     win.show()
+    if args.startup_check:  # exit after _first_page has closed the profile
+        win.patientModel.pageLoaded.connect(
+            lambda *_: QTimer.singleShot(0, lambda: app.exit(1 if startup.over_budget() else 0)))
+        win.patientModel.loadFailed.connect(lambda *_: QTimer.singleShot(0, lambda: app.exit(2)))
+
+    return app.exec_()
 
-    sys.exit(app.exec_())
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,11 @@
 import sys
-import os
-from PyQt5 import uic
+import threading
 from PyQt5.QtWidgets import (
     QApplication, QDialog, QLabel, QLineEdit, QPushButton, QMessageBox
 )
-from DB import verify_user_password_plain, get_user_by_username, create_user_plain, get_connection
+from UiLoader import load_ui
+from DB import DB_DRIVER, verify_user_password_plain, create_first_user_plain
+from DbWorker import default_executor
 
 
 class LoginDialog(QDialog):
@@ -12,8 +13,7 @@ class LoginDialog(QDialog):
 
     def __init__(self):
         super().__init__()
-        ui_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "ui", "login.ui"))
-        uic.loadUi(ui_path, self)
+        load_ui(self, "login")
 
         # Add widget
         self.txtUsername: QLineEdit = self.findChild(QLineEdit, "txtUsername")
@@ -27,23 +27,31 @@ class LoginDialog(QDialog):
 
         self.btnLogin.clicked.connect(self._on_login)
 
-        # seed a test user if table is empty
-        self._ensure_test_user()
-
         self._auth_user = None
+        self._executor = default_executor()
+
+        # seed a test user if table is empty (in the background, errors ignored);
+        # a thin client cannot: the API service does not create users
+        self._seeded = threading.Event()
+        if DB_DRIVER == "api":
+            self._seeded.set()
+        else:
+            self._executor.submit(self._ensure_test_user)
 
     def _ensure_test_user(self):
-        """Create a test user 'admin'/'admin123' if users table is empty."""
+        """Create a test user 'admin'/'admin123' if users table is empty (one statement)."""
         try:
-            with get_connection() as conn:
-                cur = conn.cursor()
-                cur.execute("SELECT TOP(1) 1 FROM dbo.users")
-                has_any = cur.fetchone() is not None
-            if not has_any and not get_user_by_username("admin"):
-                create_user_plain("admin", "admin123", party_id=None, status="Active")
+            create_first_user_plain("admin", "admin123", party_id=None, status="Active")
         except Exception:
             # If something fails, just skip seeding silently.
             pass
+        finally:
+            self._seeded.set()
+
+    def _check_login(self, username, password):
+        """Worker side of _on_login; lets a still-running seed finish first."""
+        self._seeded.wait(10)
+        return verify_user_password_plain(username, password)
 
     def _on_login(self):
         username = (self.txtUsername.text() if self.txtUsername else "").strip()
@@ -51,13 +59,29 @@ class LoginDialog(QDialog):
         if not username or not password:
             QMessageBox.warning(self, "Login", "Username and password are required.")
             return
-        ok, user, msg = verify_user_password_plain(username, password)
+        self.btnLogin.setEnabled(False)
+        self.btnLogin.setText("Signing in…")
+        # never coalesced: each attempt checks its own password
+        self._executor.submit(self._check_login, username, password,
+                              on_result=self._on_login_result, on_error=self._on_login_error)
+
+    def _on_login_result(self, result):
+        self._reset_login_button()
+        ok, user, msg = result
         if not ok:
             QMessageBox.warning(self, "Login", msg)
             return
         self._auth_user = user
         self.accept()
 
+    def _on_login_error(self, e):
+        self._reset_login_button()
+        QMessageBox.critical(self, "DB Error", str(e))
+
+    def _reset_login_button(self):
+        self.btnLogin.setEnabled(True)
+        self.btnLogin.setText("Login")
+
     def auth_user(self):
         """Return user dict after success."""
         return self._auth_user
@@ -0,0 +1,161 @@
+"""
+Versioned schema migrations.
+
+    python app/src/Migrations.py            # apply pending migrations (backend from HMS_DB_DRIVER)
+    python app/src/Migrations.py status     # list applied / pending / modified
+    python app/src/Migrations.py --sqlite database/HMS_DB.sqlite3
+
+Migrations live in database/migrations as NNNN_name.<dialect>.sql, one file per
+dialect ("mssql", "sqlite"). They run on top of the base schema script
+(HMS_DB.sql / HMS_DB.sqlite.sql), in version order, each in its own
+transaction together with its schema_migrations row, so a migration is applied
+exactly once. SQL Server files are split into batches on GO lines; a file whose
+first line is "-- no-transaction" (DDL SQL Server refuses inside a transaction,
+such as full-text indexes) runs in autocommit, so its batches must be safe to rerun.
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+
+MIGRATIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "database", "migrations"))
+
+_FILE = re.compile(r"^(\d{4})_(\w+)\.(mssql|sqlite)\.sql$")
+_GO = re.compile(r"^\s*GO\s*$", re.IGNORECASE | re.MULTILINE)
+_NO_TRANSACTION = re.compile(r"\A\s*--\s*no-transaction\s*$", re.IGNORECASE | re.MULTILINE)
+
+_CREATE_TABLE = {
+    "mssql": """
+        IF OBJECT_ID('dbo.schema_migrations') IS NULL
+        CREATE TABLE dbo.schema_migrations (
+            version    int PRIMARY KEY,
+            name       nvarchar(200) NOT NULL,
+            checksum   char(64) NOT NULL,
+            applied_at datetime NOT NULL DEFAULT (getdate())
+        );
+    """,
+    "sqlite": """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version    integer PRIMARY KEY,
+            name       text NOT NULL,
+            checksum   text NOT NULL,
+            applied_at datetime NOT NULL DEFAULT (datetime('now', 'localtime'))
+        );
+    """,
+}
+
+
+class Migration:
+    def __init__(self, version: int, name: str, path: str):
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path, encoding="utf-8") as f:
+            self.sql = f.read()
+        self.checksum = hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+        self.transactional = not _NO_TRANSACTION.match(self.sql)
+
+    def batches(self):
+        return [b for b in _GO.split(self.sql) if b.strip()]
+
+
+def discover(dialect: str, directory: str = MIGRATIONS_DIR) -> list:
+    """Migrations for one dialect, in version order."""
+    found = {}
+    for fname in os.listdir(directory) if os.path.isdir(directory) else ():
+        m = _FILE.match(fname)
+        if m and m.group(3) == dialect:
+            version = int(m.group(1))
+            if version in found:
+                raise ValueError(f"Duplicate migration version {version:04d} for {dialect}.")
+            found[version] = Migration(version, m.group(2), os.path.join(directory, fname))
+    return [found[v] for v in sorted(found)]
+
+
+def applied(conn, dialect: str) -> dict:
+    """{version: checksum} of migrations already recorded in schema_migrations."""
+    cur = conn.cursor()
+    cur.execute(_CREATE_TABLE[dialect])
+    conn.commit()
+    cur.execute("SELECT version, checksum FROM schema_migrations")
+    return {r[0]: r[1] for r in cur.fetchall()}
+
+
+def migrate(conn, dialect: str, directory: str = MIGRATIONS_DIR, log=None) -> list:
+    """Apply pending migrations on a raw DB-API connection. Returns the versions applied."""
+    done = applied(conn, dialect)
+    ran = []
+    for m in discover(dialect, directory):
+        if m.version in done:
+            continue
+        if log:
+            log(f"applying {m.version:04d}_{m.name}")
+        if dialect == "sqlite":
+            # executescript() manages its own transaction; keep the row in the same one
+            conn.executescript(
+                f"BEGIN;\n{m.sql}\n;\n"
+                f"INSERT INTO schema_migrations (version, name, checksum) "
+                f"VALUES ({m.version}, '{m.name}', '{m.checksum}');\nCOMMIT;")
+        elif not m.transactional:
+            conn.autocommit = True  # a failed run leaves the batches done so far; they are rerun-safe
+            try:
+                cur = conn.cursor()
+                for batch in m.batches():
+                    cur.execute(batch)
+                cur.execute("INSERT INTO dbo.schema_migrations (version, name, checksum) VALUES (?, ?, ?)",
+                            (m.version, m.name, m.checksum))
+            finally:
+                conn.autocommit = False
+        else:
+            cur = conn.cursor()
+            try:
+                for batch in m.batches():
+                    cur.execute(batch)
+                cur.execute("INSERT INTO dbo.schema_migrations (version, name, checksum) VALUES (?, ?, ?)",
+                            (m.version, m.name, m.checksum))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        ran.append(m.version)
+    return ran
+
+
+def status(conn, dialect: str, directory: str = MIGRATIONS_DIR) -> list:
+    """[(version, name, "applied" | "pending" | "modified"), ...]"""
+    done = applied(conn, dialect)
+    out = []
+    for m in discover(dialect, directory):
+        state = "pending" if m.version not in done else "applied" if done[m.version] == m.checksum else "modified"
+        out.append((m.version, m.name, state))
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("command", nargs="?", choices=("up", "status"), default="up")
+    ap.add_argument("--sqlite", metavar="PATH", help="migrate this SQLite file instead of HMS_DB_DRIVER's backend")
+    args = ap.parse_args(argv)
+
+    import DB
+    if args.sqlite:
+        DB.use_sqlite(args.sqlite)
+    backend = DB.get_backend()
+    conn = backend.raw_connect() if backend.dialect == "sqlite" else backend.connect()
+    try:
+        if backend.dialect == "sqlite":
+            backend.create_schema(conn)  # a new file starts from HMS_DB.sqlite.sql
+        if args.command == "status":
+            for version, name, state in status(conn, backend.dialect):
+                print(f"{version:04d}_{name:<40} {state}")
+        else:
+            ran = migrate(conn, backend.dialect, log=print)
+            print(f"{len(ran)} migration(s) applied" if ran else "schema is up to date")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    main()
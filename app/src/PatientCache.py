@@ -0,0 +1,183 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import DB
+
+MAX_ENTRIES = 500             # patient records kept
+MAX_BYTES = 4 * 1024 * 1024   # rough cap on what the cached values take in memory
+TTL_SECONDS = 600.0           # a record older than this is fetched again in full
+REVALIDATE_SECONDS = 5.0      # older than this, check its row_version before serving it
+SEARCH_TTL_SECONDS = 30.0     # search result pages; dropped on every patient write anyway
+
+
+def _size(value) -> int:
+    """Approximate deep size of a cached value (dicts, lists and tuples of scalars)."""
+    n = sys.getsizeof(value)
+    if isinstance(value, dict):
+        n += sum(_size(k) + _size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        n += sum(_size(v) for v in value)
+    return n
+
+
+class _Entry:
+    __slots__ = ("value", "stored", "checked", "size")
+
+    def __init__(self, value, now):
+        self.value = value
+        self.stored = now
+        self.checked = now
+        self.size = _size(value)
+
+
+class PatientCache:
+    """
+    Bounded LRU cache in front of DB.get_patient_by_id and DB.search_patients.
+
+    Writes go through the cache (update_patient / insert_patient /
+    insert_patients_bulk): the patient's record and all cached searches are
+    dropped once the write commits. Edits made from another workstation are
+    caught by comparing the cached RowVersion with the row's current one (a
+    single-column lookup) before serving a record older than
+    revalidate_after seconds; only a changed row is fetched again.
+
+    Thread-safe: the GUI calls it from DbExecutor threads.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, ttl=TTL_SECONDS,
+                 revalidate_after=REVALIDATE_SECONDS, search_ttl=SEARCH_TTL_SECONDS, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.revalidate_after = revalidate_after
+        self.search_ttl = search_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # ("patient", id) | ("search", query, limit, cursor) -> _Entry
+        self._bytes = 0
+        self._generation = 0  # bumped by every write; results fetched across a write are not stored
+        self._stats = dict.fromkeys(("hits", "misses", "revalidated", "stale", "expired",
+                                     "evictions", "invalidations"), 0)
+
+    # ---------- reads ----------
+    def get_patient(self, patient_id: int):
+        """DB.get_patient_by_id, served from the cache when the row has not changed."""
+        key = ("patient", int(patient_id))
+        now = self._clock()
+        with self._lock:
+            entry = self._lookup(key, now, self.ttl)
+            generation = self._generation
+            if entry and now - entry.checked < self.revalidate_after:
+                self._stats["hits"] += 1
+                return entry.value
+        if entry:
+            # cheap staleness check instead of re-reading the whole record
+            current = DB.get_patient_row_version(patient_id)
+            with self._lock:
+                if current is not None and current == entry.value["RowVersion"]:
+                    entry.checked = now
+                    self._stats["hits"] += 1
+                    self._stats["revalidated"] += 1
+                    return entry.value
+                self._stats["stale"] += 1
+                self._drop(key)
+        with self._lock:
+            self._stats["misses"] += 1
+        patient = DB.get_patient_by_id(patient_id)
+        if patient:
+            self._store(key, patient, generation)
+        return patient
+
+    def search_patients(self, query: str, limit: int = 50, cursor: int = None):
+        """DB.search_patients, with result pages kept for search_ttl seconds."""
+        key = ("search", (query or "").strip().lower(), limit, cursor)
+        with self._lock:
+            entry = self._lookup(key, self._clock(), self.search_ttl)
+            generation = self._generation
+            self._stats["hits" if entry else "misses"] += 1
+            if entry:
+                return entry.value
+        result = DB.search_patients(query, limit, cursor)
+        self._store(key, result, generation)
+        return result
+
+    # ---------- writes (write-through invalidation) ----------
+    def update_patient(self, patient_id: int, data: dict, row_version=None) -> bool:
+        try:
+            return DB.update_patient(patient_id, data, row_version)
+        finally:
+            # also on ConcurrencyError: the cached copy is the stale one
+            self.invalidate(patient_id)
+
+    def insert_patient(self, data: dict) -> int:
+        patient_id = DB.insert_patient(data)
+        self.invalidate()
+        return patient_id
+
+    def insert_patients_bulk(self, rows) -> tuple:
+        result = DB.insert_patients_bulk(rows)
+        self.invalidate()
+        return result
+
+    def invalidate(self, *patient_ids):
+        """Drop these patients' records and every cached search."""
+        with self._lock:
+            self._generation += 1
+            self._stats["invalidations"] += 1
+            for patient_id in patient_ids:
+                self._drop(("patient", int(patient_id)))
+            for key in [k for k in self._entries if k[0] == "search"]:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    # ---------- internals (callers hold the lock unless noted) ----------
+    def _lookup(self, key, now, ttl):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now - entry.stored >= ttl:
+            self._stats["expired"] += 1
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, value, generation):
+        """Takes the lock itself; skips values read before a write that may have changed them."""
+        entry = _Entry(value, self._clock())
+        with self._lock:
+            if generation != self._generation or entry.size > self.max_bytes:
+                return
+            self._drop(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self._bytes -= old.size
+                self._stats["evictions"] += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+
+# shared by the main window, its dialogs and the diagnostics page
+patient_cache = PatientCache()
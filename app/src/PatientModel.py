@@ -0,0 +1,295 @@
+from bisect import bisect_right
+from collections import OrderedDict
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant, pyqtSignal
+
+from DB import list_patients_page
+
+
+class PatientTableModel(QAbstractTableModel):
+    """
+    Lazy, keyset-paginated patient grid model.
+
+    Rows are fetched page by page as the view scrolls (canFetchMore/fetchMore).
+    Only `max_pages` pages of compact (PatientID, FirstName, LastName, NationalID)
+    tuples are kept; an evicted page is re-fetched from its remembered key when
+    it scrolls back into view, so memory stays flat however far the user scrolls.
+
+    Page i covers the ids in [low_i, key_i) (newest first). Changes from
+    DB.list_patient_changes are applied in place with apply_changes(): rows are
+    inserted, replaced or removed inside their page, so pages may grow or shrink
+    and the view keeps its selection and position.
+
+    With an `executor` (DbWorker.DbExecutor) pages load off the GUI thread;
+    switching source or reloading cancels fetches that are still pending.
+    """
+
+    HEADERS = ("ID", "First Name", "Last Name", "National ID")
+
+    loadFailed = pyqtSignal(str)
+    pageLoaded = pyqtSignal(int)  # rows appended by a fetchMore (0 at the end of the list)
+
+    def __init__(self, fetch_page=list_patients_page, page_size=200, max_pages=20,
+                 executor=None, parent=None):
+        super().__init__(parent)
+        self._fetch_page = fetch_page  # (after_id, limit) -> [row tuple, ...]
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self._executor = executor
+        self._generation = 0
+        self._calls = []
+        self._reset_state()
+
+    def _reset_state(self):
+        self._pages = OrderedDict()  # page index -> tuple of rows, LRU order
+        self._page_keys = []         # page index -> after_id used to fetch it
+        self._page_lows = []         # page index -> lowest id it covers
+        self._page_lens = []         # page index -> rows it holds (also while evicted)
+        self._starts = []            # page index -> its first row number
+        self._next_key = None        # after_id for the next page
+        self._row_count = 0
+        self._exhausted = False
+        self._loading = False
+        self._refetching = set()     # evicted pages being fetched again
+
+    # ---------- Qt model API ----------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignCenter)
+        if role != Qt.DisplayRole:
+            return QVariant()
+        row = self.row_at(index.row())
+        if row is None:
+            return QVariant()
+        value = row[index.column()]
+        return str(value) if value is not None else ""
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted and not self._loading
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted or self._loading:
+            return
+        key = self._next_key
+        self._loading = True
+
+        def done(rows):
+            self._loading = False
+            self._append_page(key, rows)
+            self.pageLoaded.emit(len(rows))
+
+        def failed(err):
+            self._loading = False
+            self._exhausted = True  # stop the view from retrying in a loop
+            self.loadFailed.emit(str(err))
+
+        self._call(done, failed, key)
+
+    # ---------- helpers ----------
+    def reload(self):
+        """Drop everything and start again from the first page."""
+        self._generation += 1
+        for call in self._calls:
+            call.cancel()
+        self._calls = []
+        self.beginResetModel()
+        self._reset_state()
+        self.endResetModel()
+        self.fetchMore()
+
+    def set_source(self, fetch_page):
+        """Switch the page source (e.g. a search) and reload."""
+        self._fetch_page = fetch_page
+        self.reload()
+
+    def update_row(self, row) -> bool:
+        """Replace a loaded row in place (e.g. after an edit); evicted pages re-fetch fresh anyway."""
+        row = tuple(row)
+        page_no = self._page_for(row[0])
+        page = self._pages.get(page_no)
+        if page is None:
+            return False
+        for offset, r in enumerate(page):
+            if r[0] == row[0]:
+                self._pages[page_no] = page[:offset] + (row,) + page[offset + 1:]
+                i = self._starts[page_no] + offset
+                self.dataChanged.emit(self.index(i, 0), self.index(i, len(self.HEADERS) - 1))
+                return True
+        return False
+
+    def apply_changes(self, changes, complete=True):
+        """
+        Apply [(patient_id, op, row|None), ...] from DB.list_patient_changes in place.
+        complete: the source lists every patient (not a search), so a new patient
+        belongs in the grid and an id inside a page's range is known to be in it.
+        """
+        latest = {}  # patient_id -> (inserted, row), oldest change first
+        for patient_id, op, row in changes:
+            inserted = op == "I" or latest.get(patient_id, (False, None))[0]
+            latest[patient_id] = (inserted, row)
+        for patient_id, (inserted, row) in latest.items():
+            if row is None:
+                self._remove(patient_id, complete)
+            elif not self.update_row(row) and inserted and complete:
+                self._insert(tuple(row))
+
+    def patient_id(self, row: int):
+        r = self.row_at(row)
+        return r[0] if r else None
+
+    def row_at(self, row: int):
+        if row < 0 or row >= self._row_count:
+            return None
+        page_no = bisect_right(self._starts, row) - 1
+        offset = row - self._starts[page_no]
+        page = self._page(page_no)
+        return page[offset] if page and offset < len(page) else None
+
+    def _page(self, page_no: int):
+        page = self._pages.get(page_no)
+        if page is not None:
+            self._pages.move_to_end(page_no)
+            return page
+        # evicted earlier: re-fetch from its remembered key
+        if page_no in self._refetching:
+            return None
+        self._refetching.add(page_no)
+
+        def done(rows):
+            self._refetching.discard(page_no)
+            low = self._page_lows[page_no]
+            self._refill_page(page_no, tuple(tuple(r) for r in rows if r[0] >= low))
+
+        def failed(err):
+            self._refetching.discard(page_no)
+            self.loadFailed.emit(str(err))
+
+        self._call(done, failed, self._page_keys[page_no], max(self._page_lens[page_no], 1))
+        return self._pages.get(page_no)  # already there when fetched synchronously
+
+    def _refill_page(self, page_no, rows):
+        """Store a re-fetched page; rows changed unseen while it was evicted shift the rows after it."""
+        first = self._starts[page_no]
+        old = self._page_lens[page_no]
+        if len(rows) > old:
+            self.beginInsertRows(QModelIndex(), first + old, first + len(rows) - 1)
+        elif len(rows) < old:
+            self.beginRemoveRows(QModelIndex(), first + len(rows), first + old - 1)
+        self._cache_page(page_no, rows)
+        if len(rows) != old:
+            self._resize(page_no, len(rows) - old)
+            self.endInsertRows() if len(rows) > old else self.endRemoveRows()
+        if self._executor is None or not rows:
+            return  # synchronous: data() is still on the stack and reads it directly
+        self.dataChanged.emit(self.index(first, 0), self.index(first + len(rows) - 1, len(self.HEADERS) - 1))
+
+    def _call(self, on_result, on_error, after_id, limit=None):
+        """Fetch one page, on the executor if there is one; drop results of older generations."""
+        generation = self._generation
+        limit = limit or self.page_size
+
+        def done(rows):
+            if generation == self._generation:
+                on_result(rows)
+
+        def failed(err):
+            if generation == self._generation:
+                on_error(err)
+
+        if self._executor is None:
+            try:
+                rows = self._fetch_page(after_id, limit)
+            except Exception as e:
+                failed(e)
+            else:
+                done(rows)
+            return
+        self._calls = [c for c in self._calls if not c.done]
+        self._calls.append(self._executor.submit(
+            self._fetch_page, after_id, limit, on_result=done, on_error=failed))
+
+    def _append_page(self, key, rows):
+        rows = tuple(tuple(r) for r in rows)
+        if len(rows) < self.page_size:
+            self._exhausted = True
+        if not rows:
+            return
+        page_no = len(self._page_keys)
+        self._page_keys.append(key)
+        self._page_lows.append(rows[-1][0])
+        self._page_lens.append(len(rows))
+        self._starts.append(self._row_count)
+        self._next_key = rows[-1][0]
+        self.beginInsertRows(QModelIndex(), self._row_count, self._row_count + len(rows) - 1)
+        self._cache_page(page_no, rows)
+        self._row_count += len(rows)
+        self.endInsertRows()
+
+    def _cache_page(self, page_no, rows):
+        self._pages[page_no] = rows
+        self._pages.move_to_end(page_no)
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+
+    # ---------- in-place changes ----------
+    def _page_for(self, patient_id):
+        """Page whose id range holds patient_id; None if it is not loaded yet."""
+        for page_no, low in enumerate(self._page_lows):
+            if patient_id >= low:
+                return page_no
+        # below the last page: only part of it once nothing more will be fetched
+        return len(self._page_lows) - 1 if self._exhausted and self._page_lows else None
+
+    def _insert(self, row):
+        page_no = self._page_for(row[0])
+        if page_no is None:
+            if not self._page_lows and self._exhausted:
+                self.reload()  # empty grid: fetch the new patient as the first page
+            return
+        page = self._pages.get(page_no)
+        # ids are newest first; an evicted page gets its rows right when re-fetched
+        offset = sum(1 for r in page if r[0] > row[0]) if page is not None else 0
+        at = self._starts[page_no] + offset
+        self.beginInsertRows(QModelIndex(), at, at)
+        if page is not None:
+            self._pages[page_no] = page[:offset] + (row,) + page[offset:]
+        self._resize(page_no, 1)
+        self.endInsertRows()
+
+    def _remove(self, patient_id, complete):
+        page_no = self._page_for(patient_id)
+        if page_no is None:
+            return
+        page = self._pages.get(page_no)
+        if page is None:
+            if not complete or not self._page_lens[page_no]:
+                return  # may not be in this page at all; the re-fetch settles it
+            offset = self._page_lens[page_no] - 1  # which row goes is settled by the re-fetch
+        else:
+            offset = next((i for i, r in enumerate(page) if r[0] == patient_id), None)
+            if offset is None:
+                return
+        at = self._starts[page_no] + offset
+        self.beginRemoveRows(QModelIndex(), at, at)
+        if page is not None:
+            self._pages[page_no] = page[:offset] + page[offset + 1:]
+        self._resize(page_no, -1)
+        self.endRemoveRows()
+
+    def _resize(self, page_no, delta):
+        self._page_lens[page_no] += delta
+        self._row_count += delta
+        for i in range(page_no + 1, len(self._starts)):
+            self._starts[i] += delta
@@ -0,0 +1,122 @@
+from datetime import datetime
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QDialog, QLabel, QPushButton, QTreeWidget, QTreeWidgetItem, QHeaderView, QMessageBox
+
+from DB import TIMELINE_SECTIONS, get_patient_timeline, list_timeline_section
+from DbWorker import default_executor
+from UiLoader import load_ui
+
+FIRST_PAGE = 20   # rows per section in the first (single round trip) fetch
+MORE_PAGE = 100   # rows per "Load more…" click
+SECTION_TITLES = {
+    "appointments": "Appointments",
+    "medical_records": "Medical records",
+    "lab_tests": "Lab tests",
+    "prescriptions": "Prescriptions",
+    "invoices": "Invoices",
+    "room_stays": "Room stays",
+}
+_MORE = "more"  # Qt.UserRole marker of the "Load more…" row
+
+
+class PatientTimelineDialog(QDialog):
+    """
+    Demographics plus the patient's clinical history, one section per kind.
+    The header shows at once; every section's newest rows arrive in one
+    background fetch, and older rows are paged in per section on demand.
+    """
+
+    def __init__(self, patient: dict, executor=None):
+        super().__init__()
+        load_ui(self, "patient_timeline_dialog")
+        self.patient_id = int(patient["PatientID"])
+        self._executor = executor or default_executor()
+
+        # Find widgets by objectName
+        self.labelPatientName = self.findChild(QLabel, "labelPatientName")
+        self.labelPatientDetails = self.findChild(QLabel, "labelPatientDetails")
+        self.treeTimeline = self.findChild(QTreeWidget, "treeTimeline")
+        self.btnClose = self.findChild(QPushButton, "btnClose")
+
+        self.setWindowTitle(f"Patient #{self.patient_id}")
+        self.labelPatientName.setText(f"{patient['FirstName']} {patient['LastName']}")
+        self.labelPatientDetails.setText(
+            f"ID: {self.patient_id}    National ID: {patient['NationalID']}    DOB: {patient['BirthDate'] or '-'}    "
+            f"Gender: {patient['Gender'] or '-'}    Phone: {patient['Phone'] or '-'}\n"
+            f"Address: {patient['Address'] or '-'}")
+
+        header = self.treeTimeline.header()
+        header.setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(1, QHeaderView.Interactive)
+        header.setStretchLastSection(True)
+        self.treeTimeline.setColumnWidth(1, 220)
+        self._sections = {}
+        self._last = {}  # section -> (at, id) of its oldest row shown: keyset position of the next page
+        for section in TIMELINE_SECTIONS:
+            item = QTreeWidgetItem([SECTION_TITLES[section], "", ""])
+            item.setFirstColumnSpanned(True)
+            item.addChild(QTreeWidgetItem(["", "Loading…", ""]))
+            self.treeTimeline.addTopLevelItem(item)
+            self._sections[section] = item
+
+        self.treeTimeline.itemClicked.connect(self._on_item_activated)
+        self.treeTimeline.itemActivated.connect(self._on_item_activated)
+        self.btnClose.clicked.connect(self.accept)
+
+        # every section's first page in one fetch; the header is already on screen
+        self._executor.submit(get_patient_timeline, self.patient_id, FIRST_PAGE,
+                              key=f"timeline_{self.patient_id}",
+                              on_result=self._on_timeline,
+                              on_error=lambda e: QMessageBox.critical(self, "DB Error",
+                                                                      f"Failed to load the history:\n{e}"))
+
+    def _on_timeline(self, timeline):
+        for section, rows in timeline.items():
+            item = self._sections[section]
+            item.takeChildren()
+            self._append(section, rows, FIRST_PAGE)
+            item.setExpanded(bool(rows))
+
+    def _append(self, section, rows, page_size):
+        """Add a page of rows under the section, with a "Load more…" row if the page was full."""
+        item = self._sections[section]
+        more = item.child(item.childCount() - 1) if item.childCount() else None
+        if more is not None and more.data(0, Qt.UserRole) == _MORE:
+            item.removeChild(more)
+        children = []
+        for row_id, at, title, detail in rows:
+            child = QTreeWidgetItem([self._format_date(at), title or "", detail or ""])
+            child.setToolTip(2, detail or "")
+            children.append(child)
+        item.addChildren(children)
+        if rows:
+            self._last[section] = (rows[-1][1], rows[-1][0])
+        if len(rows) == page_size:
+            more = QTreeWidgetItem(["", "Load more…", ""])
+            more.setData(0, Qt.UserRole, _MORE)
+            item.addChild(more)
+        shown = sum(1 for i in range(item.childCount()) if item.child(i).data(0, Qt.UserRole) != _MORE)
+        suffix = "+" if len(rows) == page_size else ""
+        item.setText(0, f"{SECTION_TITLES[section]} ({shown}{suffix})" if shown else
+                     f"{SECTION_TITLES[section]} (none)")
+
+    def _on_item_activated(self, item, _column):
+        if item.data(0, Qt.UserRole) != _MORE or item.text(1) == "Loading…":
+            return
+        parent = item.parent()
+        section = next(s for s, top in self._sections.items() if top is parent)
+        item.setText(1, "Loading…")
+        self._executor.submit(list_timeline_section, self.patient_id, section, self._last[section], MORE_PAGE,
+                              key=f"timeline_{self.patient_id}_{section}",
+                              on_result=lambda rows: self._append(section, rows, MORE_PAGE),
+                              on_error=lambda e: (item.setText(1, "Load more…"),
+                                                  QMessageBox.critical(self, "DB Error",
+                                                                       f"Failed to load more rows:\n{e}")))
+
+    @staticmethod
+    def _format_date(at):
+        if at is None:
+            return "—"
+        if isinstance(at, datetime):
+            return f"{at:%Y-%m-%d %H:%M}"
+        return str(at)
@@ -0,0 +1,191 @@
+import heapq
+import threading
+import time as _time
+from datetime import date
+
+from DB import ConcurrencyError, dispense_stock, list_dispensable_batches, receive_batch
+
+REFRESH_SECONDS = 300  # ensure_fresh() reloads when the queues are older than this
+RETRIES = 3            # re-plan after another terminal took the stock we planned on
+
+
+class OutOfStockError(Exception):
+    """Not enough unexpired stock of a medicine for the requested quantity."""
+
+
+class BatchQueue:
+    """
+    Unexpired batches of one medicine as a min-heap of (expiration_date, batch_id),
+    with quantities alongside. Emptied batches are dropped lazily when they reach the top.
+    """
+
+    def __init__(self, batches=()):
+        self.quantity = {}  # batch_id -> quantity on hand
+        self.heap = []
+        self.total = 0
+        self.lock = threading.Lock()
+        for batch_id, expiration_date, qty in batches:
+            self.add(batch_id, expiration_date, qty)
+
+    def add(self, batch_id: int, expiration_date: date, qty: int):
+        self.quantity[batch_id] = self.quantity.get(batch_id, 0) + qty
+        self.total += qty
+        heapq.heappush(self.heap, (expiration_date, batch_id))
+
+    def allocate(self, qty: int, today: date):
+        """[(batch_id, take), ...] first-expiry-first-out, or None if there is not enough stock."""
+        plan, popped = [], []
+        while qty > 0 and self.heap:
+            expiration_date, batch_id = heapq.heappop(self.heap)
+            on_hand = self.quantity.get(batch_id, 0)
+            if expiration_date < today or on_hand <= 0:
+                # expired or empty: never dispensable again
+                self.total -= max(on_hand, 0)
+                self.quantity.pop(batch_id, None)
+                continue
+            popped.append((expiration_date, batch_id))
+            take = min(qty, on_hand)
+            plan.append((batch_id, take))
+            qty -= take
+        for entry in popped:
+            heapq.heappush(self.heap, entry)
+        return plan if qty == 0 else None
+
+    def take(self, plan):
+        for batch_id, qty in plan:
+            self.quantity[batch_id] -= qty
+            self.total -= qty
+
+    def next_expiry(self, today: date):
+        while self.heap:
+            expiration_date, batch_id = self.heap[0]
+            if expiration_date >= today and self.quantity.get(batch_id, 0) > 0:
+                return expiration_date
+            heapq.heappop(self.heap)
+            self.total -= max(self.quantity.pop(batch_id, 0), 0)
+        return None
+
+
+class PharmacyEngine:
+    """
+    FEFO dispensing over medicine_batches.
+
+    Each medicine's unexpired batches sit in a priority queue by expiration
+    date, so allocating a dispense line costs O(k log n) for the k batches it
+    draws from, with no query. DB.dispense_stock then writes the quantity
+    updates and movements in one transaction and re-checks every batch's stock
+    in SQL; when another terminal got there first the affected medicines are
+    reloaded and the dispense is planned again. A medicine that looks short is
+    re-read once before OutOfStockError, in case stock arrived elsewhere.
+    """
+
+    def __init__(self, today=date.today):
+        self._today = today
+        self._queues = {}  # medicine_id -> BatchQueue
+        self._lock = threading.Lock()  # guards _queues itself, not the queues
+        self.loaded_at = None
+
+    # ---------- loading ----------
+    def load(self, batches):
+        """batches: [(batch_id, medicine_id, expiration_date, quantity_on_hand), ...]"""
+        grouped = {}
+        for batch_id, medicine_id, expiration_date, qty in batches:
+            grouped.setdefault(medicine_id, []).append((batch_id, expiration_date, qty))
+        with self._lock:
+            self._queues = {m: BatchQueue(b) for m, b in grouped.items()}
+        self.loaded_at = _time.monotonic()
+
+    def refresh_from_db(self):
+        self.load(list_dispensable_batches(self._today()))
+
+    def ensure_fresh(self, max_age: float = REFRESH_SECONDS):
+        if self.loaded_at is None or _time.monotonic() - self.loaded_at > max_age:
+            self.refresh_from_db()
+
+    def _reload(self, medicine_id: int):
+        """Re-read one medicine's batches (caller holds its queue lock)."""
+        fresh = BatchQueue((b, e, q) for b, _, e, q in list_dispensable_batches(self._today(), medicine_id))
+        queue = self._queue(medicine_id)
+        queue.quantity, queue.heap, queue.total = fresh.quantity, fresh.heap, fresh.total
+
+    def _queue(self, medicine_id: int) -> BatchQueue:
+        with self._lock:
+            queue = self._queues.get(medicine_id)
+            if queue is None:
+                queue = self._queues[medicine_id] = BatchQueue()
+            return queue
+
+    # ---------- queries ----------
+    def on_hand(self, medicine_id: int) -> int:
+        """Unexpired stock as this terminal last saw it."""
+        queue = self._queue(medicine_id)
+        with queue.lock:
+            queue.next_expiry(self._today())  # drops batches that expired since loading
+            return queue.total
+
+    def next_expiry(self, medicine_id: int):
+        queue = self._queue(medicine_id)
+        with queue.lock:
+            return queue.next_expiry(self._today())
+
+    # ---------- dispensing ----------
+    def allocate(self, medicine_id: int, quantity: int):
+        """FEFO plan [(batch_id, quantity), ...] without taking anything; OutOfStockError if short."""
+        queue = self._queue(medicine_id)
+        with queue.lock:
+            plan = queue.allocate(quantity, self._today())
+        if plan is None:
+            raise OutOfStockError(f"Not enough unexpired stock (medicine {medicine_id}).")
+        return plan
+
+    def dispense(self, lines, user_id: int, prescription_id: int = None, dispense=dispense_stock):
+        """
+        Dispense [(medicine_id, quantity), ...] in one transaction.
+        Returns {medicine_id: [(batch_id, quantity), ...]}; raises OutOfStockError.
+        """
+        wanted = {}
+        for medicine_id, qty in lines:
+            if qty <= 0:
+                raise ValueError("Quantity must be positive.")
+            wanted[medicine_id] = wanted.get(medicine_id, 0) + qty
+        queues = [(m, self._queue(m)) for m in sorted(wanted)]  # fixed lock order
+        for q in (q for _, q in queues):
+            q.lock.acquire()
+        try:
+            today = self._today()
+            reloaded = set()
+            for attempt in range(RETRIES + 1):
+                plans = {}
+                for medicine_id, queue in queues:
+                    plan = queue.allocate(wanted[medicine_id], today)
+                    if plan is None and medicine_id not in reloaded:
+                        # short as this terminal saw it: another one may have received stock since
+                        self._reload(medicine_id)
+                        reloaded.add(medicine_id)
+                        plan = queue.allocate(wanted[medicine_id], today)
+                    if plan is None:
+                        raise OutOfStockError(f"Not enough unexpired stock (medicine {medicine_id}).")
+                    plans[medicine_id] = plan
+                try:
+                    dispense([line for plan in plans.values() for line in plan], user_id, prescription_id)
+                except ConcurrencyError:
+                    if attempt == RETRIES:
+                        raise
+                    for medicine_id, _ in queues:
+                        self._reload(medicine_id)
+                        reloaded.add(medicine_id)
+                    continue
+                for medicine_id, queue in queues:
+                    queue.take(plans[medicine_id])
+                return plans
+        finally:
+            for q in (q for _, q in queues):
+                q.lock.release()
+
+    def receive(self, medicine_id: int, batch_number: str, expiration_date: date, quantity: int,
+                user_id: int, receive=receive_batch) -> int:
+        batch_id = receive(medicine_id, batch_number, expiration_date, quantity, user_id)
+        queue = self._queue(medicine_id)
+        with queue.lock:
+            queue.add(batch_id, expiration_date, quantity)
+        return batch_id
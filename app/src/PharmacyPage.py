@@ -0,0 +1,138 @@
+from datetime import date, timedelta
+
+from PyQt5.QtCore import QDate, QObject, Qt
+from PyQt5.QtWidgets import (
+    QComboBox, QDateEdit, QHeaderView, QLabel, QLineEdit, QMessageBox, QPushButton, QSpinBox,
+    QStackedWidget, QTableWidget, QTableWidgetItem, QWidget
+)
+
+from DB import ConcurrencyError, list_medicine_stock, list_medicines, list_near_expiry
+from Pharmacy import OutOfStockError, PharmacyEngine
+
+
+class PharmacyPage(QObject):
+    """Drives the pharmacy page (page_6) of HMS.ui: FEFO dispensing, receiving, stock and near-expiry."""
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.window = window
+        self.engine = PharmacyEngine()  # batch queues, loaded on first show
+        self.stackedWidget = window.findChild(QStackedWidget, "stackedWidget")
+        self.page = window.findChild(QWidget, "page_6")
+        self.comboMedicine = window.findChild(QComboBox, "comboMedicine")
+        self.spinDispenseQty = window.findChild(QSpinBox, "spinDispenseQty")
+        self.btnDispense = window.findChild(QPushButton, "btnDispense")
+        self.lineEditBatchNumber = window.findChild(QLineEdit, "lineEditBatchNumber")
+        self.dateEditBatchExpiry = window.findChild(QDateEdit, "dateEditBatchExpiry")
+        self.spinReceiveQty = window.findChild(QSpinBox, "spinReceiveQty")
+        self.btnReceive = window.findChild(QPushButton, "btnReceive")
+        self.labelPharmacyStatus = window.findChild(QLabel, "labelPharmacyStatus")
+        self.tableStock = window.findChild(QTableWidget, "tableStock")
+        self.spinExpiryDays = window.findChild(QSpinBox, "spinExpiryDays")
+        self.tableNearExpiry = window.findChild(QTableWidget, "tableNearExpiry")
+        self.btnPharmacyRefresh = window.findChild(QPushButton, "btnPharmacyRefresh")
+
+        for table in (self.tableStock, self.tableNearExpiry):
+            header = table.horizontalHeader()
+            header.setSectionResizeMode(QHeaderView.ResizeToContents)
+            header.setStretchLastSection(True)
+            table.verticalHeader().setVisible(False)
+        self.dateEditBatchExpiry.setDate(QDate.currentDate().addYears(1))
+
+        self.btnDispense.clicked.connect(self.dispense)
+        self.btnReceive.clicked.connect(self.receive)
+        self.btnPharmacyRefresh.clicked.connect(lambda: self.refresh(reload=True))
+        self.spinExpiryDays.valueChanged.connect(lambda *_: self.refresh())
+
+    def show(self):
+        self.stackedWidget.setCurrentWidget(self.page)
+        self.refresh()
+
+    def _user_id(self):
+        return (self.window.current_user or {}).get("id")
+
+    def _error(self, title):
+        return lambda err: QMessageBox.critical(self.window, title, f"{title} failed:\n{err}")
+
+    # ---------- loading ----------
+    def refresh(self, reload=False):
+        """Stock and near-expiry tables; the batch queues are re-read when stale (or on reload)."""
+        until = date.today() + timedelta(days=self.spinExpiryDays.value())
+
+        def load():
+            if reload:
+                self.engine.refresh_from_db()
+            else:
+                self.engine.ensure_fresh()
+            stock = [(m, name, qty, self.engine.next_expiry(m)) for m, name, qty in list_medicine_stock()]
+            return list_medicines(), stock, list_near_expiry(until)
+
+        self.window.db.submit(load, on_result=self._fill, on_error=self._error("Loading stock"),
+                              key="pharmacy_refresh")
+
+    def _fill(self, result):
+        medicines, stock, near = result
+        current = self.comboMedicine.currentData()
+        self.comboMedicine.clear()
+        for medicine_id, name in medicines:
+            self.comboMedicine.addItem(name, medicine_id)
+        if current is not None:
+            self.comboMedicine.setCurrentIndex(max(self.comboMedicine.findData(current), 0))
+
+        self._fill_table(self.tableStock, [(name, qty, expiry or "") for _, name, qty, expiry in stock])
+        self._fill_table(self.tableNearExpiry, [(name, number, expiry, qty) for _, name, number, expiry, qty in near])
+
+    @staticmethod
+    def _fill_table(table, rows):
+        table.setSortingEnabled(False)  # keep rows in place while filling
+        table.setRowCount(len(rows))
+        for r, values in enumerate(rows):
+            for c, value in enumerate(values):
+                item = QTableWidgetItem()
+                item.setData(Qt.DisplayRole, value if isinstance(value, int) else str(value))
+                if isinstance(value, int):
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                table.setItem(r, c, item)
+        table.setSortingEnabled(True)
+
+    # ---------- actions ----------
+    def dispense(self):
+        medicine_id = self.comboMedicine.currentData()
+        if medicine_id is None:
+            return
+        name, qty = self.comboMedicine.currentText(), self.spinDispenseQty.value()
+
+        def done(plans):
+            self.btnDispense.setEnabled(True)
+            batches = ", ".join(f"{q} from batch {b}" for b, q in plans[medicine_id])
+            self.labelPharmacyStatus.setText(f"Dispensed {qty} × {name}: {batches}.")
+            self.refresh()
+
+        def failed(err):
+            self.btnDispense.setEnabled(True)
+            if isinstance(err, (OutOfStockError, ConcurrencyError)):
+                QMessageBox.warning(self.window, "Dispense", str(err))
+                self.refresh(reload=True)
+            else:
+                self._error("Dispense")(err)
+
+        self.btnDispense.setEnabled(False)  # one dispense at a time from this desk
+        self.window.db.submit(self.engine.dispense, [(medicine_id, qty)], self._user_id(),
+                              on_result=done, on_error=failed)
+
+    def receive(self):
+        medicine_id = self.comboMedicine.currentData()
+        number = self.lineEditBatchNumber.text().strip()
+        if medicine_id is None or not number:
+            QMessageBox.warning(self.window, "Receive", "Pick a medicine and enter the batch number.")
+            return
+        expiry = self.dateEditBatchExpiry.date().toPyDate()
+        qty = self.spinReceiveQty.value()
+
+        def done(batch_id):
+            self.labelPharmacyStatus.setText(f"Received batch {number} ({qty} × {self.comboMedicine.currentText()}).")
+            self.lineEditBatchNumber.clear()
+            self.refresh()
+
+        self.window.db.submit(self.engine.receive, medicine_id, number, expiry, qty, self._user_id(),
+                              on_result=done, on_error=self._error("Receive"))
@@ -0,0 +1,259 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+
+# Histogram bucket upper bounds in milliseconds (roughly x2 steps); the last bucket is +Inf
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+slow_log = logging.getLogger("hms.slow_query")
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; percentiles are interpolated inside the bucket."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = self.count * p / 100
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lo = BUCKETS_MS[i - 1] if i else 0.0
+                hi = BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max
+                return min(self.max, lo + (hi - lo) * (rank - seen) / n)
+            seen += n
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 3),
+            "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50), 3),
+            "p95_ms": round(self.percentile(95), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "max_ms": round(self.max, 3),
+        }
+
+
+class StatementStats:
+    __slots__ = ("function", "sql", "latency", "rows", "errors", "slow")
+
+    def __init__(self, function: str, sql: str):
+        self.function = function
+        self.sql = sql
+        self.latency = Histogram()
+        self.rows = 0
+        self.errors = 0
+        self.slow = 0
+
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """One-line statement text used as the grouping key (whitespace collapsed)."""
+    return _WS.sub(" ", sql).strip()
+
+
+def redact(params) -> list:
+    """Parameter shapes only (type and length), never values: they may be patient data."""
+    if params is None:
+        return []
+    if not isinstance(params, (list, tuple)):
+        params = [params]
+    out = []
+    for p in params:
+        if p is None:
+            out.append("NULL")
+        elif isinstance(p, (str, bytes)):
+            out.append(f"<{type(p).__name__}:{len(p)}>")
+        else:
+            out.append(f"<{type(p).__name__}>")
+    return out
+
+
+class QueryStats:
+    """
+    Per-statement latency histograms, row counts and errors, plus pool acquire
+    and transaction duration histograms. Fed by DB.conn_cursor(); read with
+    snapshot() or prometheus_text(). Statements slower than slow_ms go to the
+    "hms.slow_query" logger as one JSON object per line, parameters redacted.
+    With enabled False nothing is recorded (and nothing logged).
+    """
+
+    def __init__(self, slow_ms: float = 200.0, enabled: bool = True):
+        self.slow_ms = slow_ms
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._statements = {}  # (function, sql) -> StatementStats
+        self._normalized = {}  # raw sql -> normalized (statements are mostly constants)
+        self.acquire = Histogram()
+        self.transaction = Histogram()
+        self.started = time.time()
+
+    def reset(self):
+        with self._lock:
+            self._statements = {}
+            self.acquire = Histogram()
+            self.transaction = Histogram()
+            self.started = time.time()
+
+    # ---------- recording ----------
+    def record_statement(self, function: str, sql: str, ms: float, rows: int, params=None, error: str = None):
+        if not self.enabled:
+            return
+        text = self._normalized.get(sql)
+        if text is None:
+            text = normalize_sql(sql)
+            if len(self._normalized) < 4096:
+                self._normalized[sql] = text
+        slow = ms >= self.slow_ms
+        with self._lock:
+            st = self._statements.get((function, text))
+            if st is None:
+                st = self._statements[(function, text)] = StatementStats(function, text)
+            st.latency.observe(ms)
+            st.rows += rows
+            if error:
+                st.errors += 1
+            if slow:
+                st.slow += 1
+        if slow:
+            slow_log.warning(json.dumps({
+                "ts": datetime.now().isoformat(timespec="milliseconds"),
+                "function": function,
+                "ms": round(ms, 3),
+                "rows": rows,
+                "sql": text,
+                "params": redact(params),
+                "error": error,
+            }))
+
+    def record_acquire(self, ms: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.acquire.observe(ms)
+
+    def record_transaction(self, ms: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.transaction.observe(ms)
+
+    # ---------- reading ----------
+    def snapshot(self, top: int = None) -> dict:
+        """
+        {"statements": [...by total time, hottest first], "acquire": {...},
+         "transaction": {...}, "since": epoch seconds}
+        """
+        with self._lock:
+            statements = [{
+                "function": st.function,
+                "sql": st.sql,
+                "rows": st.rows,
+                "errors": st.errors,
+                "slow": st.slow,
+                **st.latency.summary(),
+            } for st in self._statements.values()]
+            acquire, transaction = self.acquire.summary(), self.transaction.summary()
+        statements.sort(key=lambda s: s["total_ms"], reverse=True)
+        return {
+            "since": self.started,
+            "statements": statements[:top] if top else statements,
+            "acquire": acquire,
+            "transaction": transaction,
+        }
+
+    def prometheus_text(self) -> str:
+        """Prometheus text exposition format (histograms in seconds)."""
+        lines = []
+
+        def histogram(name, h, labels=""):
+            cumulative = 0
+            for bound, n in zip(BUCKETS_MS + (None,), h.counts):
+                cumulative += n
+                le = "+Inf" if bound is None else repr(bound / 1000)
+                sep = "," if labels else ""
+                lines.append(f'{name}_bucket{{{labels}{sep}le="{le}"}} {cumulative}')
+            wrapped = f"{{{labels}}}" if labels else ""
+            lines.append(f"{name}_sum{wrapped} {h.total / 1000}")
+            lines.append(f"{name}_count{wrapped} {h.count}")
+
+        with self._lock:
+            lines.append("# HELP hms_db_statement_seconds Statement latency (execute + fetch).")
+            lines.append("# TYPE hms_db_statement_seconds histogram")
+            for st in self._statements.values():
+                histogram("hms_db_statement_seconds", st.latency, self._labels(st))
+            for metric, attr, help_text in (("hms_db_statement_rows_total", "rows", "Rows returned or affected."),
+                                            ("hms_db_statement_errors_total", "errors", "Failed executions."),
+                                            ("hms_db_statement_slow_total", "slow", "Executions over the slow threshold.")):
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for st in self._statements.values():
+                    lines.append(f"{metric}{{{self._labels(st)}}} {getattr(st, attr)}")
+            lines.append("# HELP hms_db_pool_acquire_seconds Time to check a connection out of the pool.")
+            lines.append("# TYPE hms_db_pool_acquire_seconds histogram")
+            histogram("hms_db_pool_acquire_seconds", self.acquire)
+            lines.append("# HELP hms_db_transaction_seconds conn_cursor() block duration, commit included.")
+            lines.append("# TYPE hms_db_transaction_seconds histogram")
+            histogram("hms_db_transaction_seconds", self.transaction)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _labels(st) -> str:
+        sql = st.sql[:200].replace("\\", "\\\\").replace('"', '\\"')
+        return f'function="{st.function}",sql="{sql}"'
+
+    def write_prometheus(self, path: str):
+        """Write prometheus_text() atomically (node_exporter textfile collector style)."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def dump_periodically(self, path: str, interval: float = 15.0) -> threading.Event:
+        """Rewrite the dump file every `interval` seconds on a daemon thread; set the event to stop."""
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                try:
+                    self.write_prometheus(path)
+                except OSError:
+                    pass  # metrics must never take the app down
+
+        threading.Thread(target=loop, name="hms-metrics-dump", daemon=True).start()
+        return stop
+
+
+def log_slow_queries_to(path: str):
+    """Send the slow-query log (JSON lines) to a file."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    slow_log.addHandler(handler)
+    slow_log.setLevel(logging.WARNING)
+    slow_log.propagate = False
+    return handler
@@ -0,0 +1,155 @@
+"""
+Management dashboard figures from precomputed daily rollups.
+
+    python app/src/Reports.py refresh                       # bring the rollups up to date (cron / Task Scheduler)
+    python app/src/Reports.py refresh --full                # rebuild every day from the source tables
+    python app/src/Reports.py show 2026-10-01 2026-10-17    # the dashboard for a date range (inclusive)
+
+Appointments, lab tests, invoice lines and room stays are written as usual;
+triggers (migration 0007) log the days each write touches. A refresh recomputes
+only those days and the days since the previous refresh (DB.refresh_report_rollups),
+so it costs about the same however long the history is, and the dashboard reads
+a few hundred rollup rows instead of grouping the OLTP tables under the front desk.
+"""
+import argparse
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import DB
+
+REFRESH_SECONDS = 60  # Dashboard.figures refreshes rollups older than this first
+CACHE_ENTRIES = 16    # date ranges whose figures Dashboard keeps
+
+
+def refresh(full: bool = False) -> dict:
+    """DB.refresh_report_rollups plus "seconds" it took."""
+    t0 = time.perf_counter()
+    result = DB.refresh_report_rollups(full)
+    result["seconds"] = time.perf_counter() - t0
+    return result
+
+
+def no_show_rate(completed: int, no_shows: int) -> float:
+    """Share of the visits that were due (kept or missed) that were missed."""
+    due = (completed or 0) + (no_shows or 0)
+    return (no_shows or 0) / due if due else 0.0
+
+
+def utilization(occupied_minutes, rooms: int, days: int) -> float:
+    """Occupied room time over the time the rooms were available."""
+    return (occupied_minutes or 0) / (rooms * days * 1440) if rooms and days > 0 else 0.0
+
+
+def elapsed_days(start: date, end: date, today: date = None) -> int:
+    """Days of [start, end) up to and including today: room time does not accrue in the future."""
+    return max((min(end, (today or date.today()) + timedelta(days=1)) - start).days, 0)
+
+
+class Dashboard:
+    """
+    Dashboard figures for the GUI, called on DbExecutor threads. Rollups are
+    refreshed at most once per max_age seconds; figures are kept per date range
+    while the rollups' version (DB.get_report_version) is the one they were read
+    at, so a refresh by any desk or the cron retires them.
+    """
+
+    def __init__(self, max_age: float = REFRESH_SECONDS, entries: int = CACHE_ENTRIES):
+        self.max_age = max_age
+        self.entries = entries
+        self.last_refresh = None  # result of the latest refresh from this desk
+        self.hits = self.misses = 0
+        self._refreshed = None    # time.monotonic() of that refresh
+        self._cache = OrderedDict()  # (start, end) -> (version, figures), least recently used first
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def ensure_fresh(self, max_age: float = None):
+        """Refresh the rollups if this desk has not in max_age seconds; returns the refresh result or None."""
+        max_age = self.max_age if max_age is None else max_age
+        with self._refresh_lock:  # concurrent callers wait for one refresh instead of running their own
+            if self._refreshed is not None and time.monotonic() - self._refreshed < max_age:
+                return None
+            result = refresh()
+            self._refreshed = time.monotonic()
+        with self._lock:
+            self.last_refresh = result
+        return result
+
+    def figures(self, start: date, end: date, max_age: float = None) -> dict:
+        """DB.get_report_dashboard(start, end) over rollups at most max_age seconds old."""
+        self.ensure_fresh(max_age)
+        key = (start, end)
+        # one row, read before the figures: a refresh in between leaves them under the older version
+        version = DB.get_report_version()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return entry[1]
+            self.misses += 1
+        figures = DB.get_report_dashboard(start, end)
+        with self._lock:
+            self._cache[key] = (version, figures)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.entries:
+                self._cache.popitem(last=False)
+        return figures
+
+
+def _day(text: str) -> date:
+    return date.fromisoformat(text)
+
+
+def print_dashboard(figures: dict, start: date, end: date):
+    days = elapsed_days(start, end)
+    total_rooms = sum(rooms for _, rooms, _, _ in figures["rooms"])
+    print(f"{'day':<12}{'appts':>8}{'done':>8}{'no-show':>9}{'labs':>7}{'revenue':>14}{'rooms':>8}")
+    for day, appointments, completed, no_shows, labs, revenue, occupied in figures["daily"]:
+        print(f"{day!s:<12}{appointments:>8,}{completed:>8,}{no_shows:>9,}{labs:>7,}{float(revenue or 0):>14,.2f}"
+              f"{utilization(occupied, total_rooms, 1):>8.0%}")
+    print(f"\n{'specialization':<22}{'appts':>8}{'no-show rate':>14}{'labs':>7}")
+    for name, appointments, completed, _, no_shows, labs in figures["specializations"]:
+        print(f"{name:<22}{appointments:>8,}{no_show_rate(completed, no_shows):>14.1%}{labs:>7,}")
+    print(f"\n{'lab test':<22}{'tests':>8}")
+    for test_type, tests in figures["labs"]:
+        print(f"{test_type:<22}{tests:>8,}")
+    print(f"\n{'service':<22}{'lines':>8}{'amount':>16}")
+    for service_type, lines, amount in figures["revenue"]:
+        print(f"{service_type:<22}{lines:>8,}{float(amount or 0):>16,.2f}")
+    print(f"\n{'ward':<22}{'rooms':>8}{'utilization':>13}")
+    for ward, rooms, _, occupied in figures["rooms"]:
+        print(f"{ward:<22}{rooms:>8,}{utilization(occupied, rooms, days):>13.1%}")
+    print(f"\nrollups refreshed {figures['refreshed_at']:%Y-%m-%d %H:%M:%S}" if figures["refreshed_at"]
+          else "\nrollups never refreshed")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("command", choices=("refresh", "show"))
+    ap.add_argument("start", nargs="?", type=_day, help="show: first day (default: 30 days ago)")
+    ap.add_argument("end", nargs="?", type=_day, help="show: last day, inclusive (default: today)")
+    ap.add_argument("--full", action="store_true", help="refresh: rebuild every day instead of the changed ones")
+    ap.add_argument("--sqlite", metavar="PATH", help="use this SQLite file instead of HMS_DB_DRIVER's backend")
+    args = ap.parse_args(argv)
+    if args.sqlite:
+        DB.use_sqlite(args.sqlite)
+
+    if args.command == "refresh":
+        r = refresh(args.full)
+        span = f" ({r['first']} .. {r['last']})" if r["days"] else ""
+        print(f"{'full rebuild' if r['full'] else 'refresh'}: {r['days']:,} days recomputed{span} "
+              f"from {r['changes']:,} logged changes in {r['seconds'] * 1000:.0f} ms")
+        return 0
+    end = (args.end or date.today()) + timedelta(days=1)
+    start = args.start or end - timedelta(days=30)
+    refresh()
+    print_dashboard(DB.get_report_dashboard(start, end), start, end)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+from datetime import datetime, time
+from PyQt5.QtCore import Qt, QDate
+from PyQt5.QtWidgets import QDialog, QPushButton, QComboBox, QDateEdit, QListWidget, QListWidgetItem, QMessageBox
+
+from DB import list_specializations
+from DbWorker import default_executor
+from UiLoader import load_ui
+from Scheduling import SlotTakenError
+
+SLOT_COUNT = 20  # free slots listed at a time
+
+
+class ReserveVisitDialog(QDialog):
+    """Pick a specialization and one of the next free slots, then book it for the patient."""
+
+    def __init__(self, patient_id: int, engine, executor=None):
+        super().__init__()
+        load_ui(self, "reserve_visit_dialog")
+        self.patient_id = patient_id
+        self.engine = engine  # Scheduling.SchedulingEngine shared by the main window
+        self._executor = executor or default_executor()
+        self.appointment = None  # (appointment_id, when, doctor_name) after success
+
+        # Find widgets by objectName
+        self.comboSpecialization = self.findChild(QComboBox, "comboSpecialization")
+        self.dateEditFrom = self.findChild(QDateEdit, "dateEditFrom")
+        self.listSlots = self.findChild(QListWidget, "listSlots")
+        self.btnReserve = self.findChild(QPushButton, "btnReserve")
+        self.btnCancel = self.findChild(QPushButton, "btnCancel")
+
+        self.dateEditFrom.setDate(QDate.currentDate())
+        self.dateEditFrom.setMinimumDate(QDate.currentDate())
+        self.btnReserve.setEnabled(False)
+        self.listSlots.addItem("Loading doctors' schedules…")
+
+        self.comboSpecialization.currentIndexChanged.connect(lambda *_: self._refresh_slots())
+        self.dateEditFrom.dateChanged.connect(lambda *_: self._refresh_slots())
+        self.listSlots.itemSelectionChanged.connect(
+            lambda: self.btnReserve.setEnabled(bool(self.listSlots.selectedItems())))
+        self.listSlots.itemDoubleClicked.connect(lambda *_: self._on_reserve())
+        self.btnReserve.clicked.connect(self._on_reserve)
+        self.btnCancel.clicked.connect(self.reject)
+
+        # bookings index + specializations load in the background
+        self._executor.submit(self._load, key="reserve_visit_load",
+                              on_result=self._on_loaded,
+                              on_error=lambda e: QMessageBox.critical(self, "DB Error", f"Failed to load schedules:\n{e}"))
+
+    def _load(self):
+        self.engine.ensure_fresh()
+        return list_specializations()
+
+    def _on_loaded(self, specializations):
+        self.comboSpecialization.blockSignals(True)
+        self.comboSpecialization.addItem("Any specialization", None)
+        for spec_id, name in specializations:
+            self.comboSpecialization.addItem(name, spec_id)
+        self.comboSpecialization.blockSignals(False)
+        self._refresh_slots()
+
+    def _refresh_slots(self):
+        """In-memory lookup of the next free slots (no DB round trip)."""
+        if self.engine.loaded_at is None:
+            return
+        after = max(datetime.now(), datetime.combine(self.dateEditFrom.date().toPyDate(), time.min))
+        slots = self.engine.next_free_slots(self.comboSpecialization.currentData(), SLOT_COUNT, after)
+        self.listSlots.clear()
+        for when, doctor_id in slots:
+            item = QListWidgetItem(f"{when:%Y-%m-%d %H:%M}  —  Dr. {self.engine.doctor_name(doctor_id)}")
+            item.setData(Qt.UserRole, (when, doctor_id))
+            self.listSlots.addItem(item)
+        if not slots:
+            self.listSlots.addItem("No free slots in the loaded range.")
+
+    def _on_reserve(self):
+        items = self.listSlots.selectedItems()
+        slot = items[0].data(Qt.UserRole) if items else None
+        if not slot:
+            return
+        when, doctor_id = slot
+        self.btnReserve.setEnabled(False)
+
+        def done(appointment_id):
+            self.appointment = (appointment_id, when, self.engine.doctor_name(doctor_id))
+            self.accept()
+
+        def failed(e):
+            if isinstance(e, SlotTakenError):
+                QMessageBox.warning(self, "Not Reserved", str(e))
+                self._refresh_slots()
+            else:
+                self.btnReserve.setEnabled(True)
+                QMessageBox.critical(self, "DB Error", f"Failed to reserve appointment:\n{e}")
+
+        self._executor.submit(self.engine.book, self.patient_id, doctor_id, when,
+                              on_result=done, on_error=failed)
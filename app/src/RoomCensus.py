@@ -0,0 +1,345 @@
+"""
+Room assignments and the bed census, from an in-memory index over room_assignments.
+
+    python app/src/RoomCensus.py census                                # occupied / total rooms by ward
+    python app/src/RoomCensus.py free 2026-10-20T08:00 2026-10-23T08:00 --ward ICU
+    python app/src/RoomCensus.py admit 1042 R0107 --until 2026-10-22T12:00
+    python app/src/RoomCensus.py discharge R0107
+
+Writes go through DB.insert_room_assignment / end_room_assignment, which
+check overlaps atomically (the schema trigger is the backstop); the index
+answers "which rooms are free" and the census without scanning history.
+"""
+import argparse
+import heapq
+import random
+import sys
+import threading
+from datetime import datetime
+
+from DB import end_room_assignment, insert_room_assignment, list_room_assignments, list_rooms, use_sqlite
+from Scheduling import from_minutes, to_minutes
+
+OPEN = 2 ** 62  # end of an assignment that has no end_at yet (patient still in the room)
+
+
+class RoomOccupiedError(Exception):
+    """The room is already assigned for (part of) the requested range."""
+
+
+class _Stay:
+    __slots__ = ("start", "end", "id", "next")
+
+    def __init__(self, start, end, assignment_id, levels):
+        self.start, self.end, self.id = start, end, assignment_id
+        self.next = [None] * levels  # next stay on each level of the skip list
+
+
+class RoomIntervals:
+    """
+    Assignments of one room as non-overlapping [start, end) minute ranges, in a
+    skip list ordered by start (O(log n) expected to find or add a range) plus a
+    dict by assignment id (O(1) to close one). Because ranges never overlap the
+    ends are ordered too, so an overlap check is one search plus two neighbour
+    comparisons. Writers hold `lock`; readers do not need it, since a stay is
+    linked bottom level first and a reader sees it either fully or not at all.
+    """
+
+    MAX_LEVELS = 24  # enough for 16M ranges at p = 1/2
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._head = _Stay(-1, -1, None, self.MAX_LEVELS)
+        self._by_id = {}
+        self._levels = 1  # levels in use; the head has them all, so readers may see either count
+
+    def replace(self, ranges):
+        """Swap every range for [(assignment_id, start, end), ...] (caller holds lock); O(n) once sorted."""
+        head, by_id, levels = _Stay(-1, -1, None, self.MAX_LEVELS), {}, 1  # built aside, then swapped in
+        tails = [head] * self.MAX_LEVELS  # last stay linked on each level: sorted input only appends
+        for assignment_id, start, end in sorted(ranges, key=lambda r: r[1]):
+            stay = _Stay(start, end, assignment_id, self._random_levels())
+            for level in range(len(stay.next)):
+                tails[level].next[level] = tails[level] = stay
+            levels = max(levels, len(stay.next))
+            by_id[assignment_id] = stay
+        self._head, self._by_id, self._levels = head, by_id, levels
+
+    def _random_levels(self) -> int:
+        levels = 1
+        while levels < self.MAX_LEVELS and random.random() < 0.5:
+            levels += 1
+        return levels
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def _before(self, t: int, path=None) -> _Stay:
+        """Last stay starting at or before minute t (the head if none); fills path[level] on the way."""
+        node = self._head
+        for level in range(self._levels - 1, -1, -1):
+            nxt = node.next[level]
+            while nxt is not None and nxt.start <= t:
+                node, nxt = nxt, nxt.next[level]
+            if path is not None:
+                path[level] = node
+        return node
+
+    def overlaps(self, start: int, end: int) -> bool:
+        prev = self._before(start)
+        if prev is not self._head and prev.end > start:
+            return True  # previous range runs into ours
+        nxt = prev.next[0]
+        return nxt is not None and nxt.start < end  # next range starts inside ours
+
+    def add(self, assignment_id: int, start: int, end: int):
+        levels = self._random_levels()
+        path = [self._head] * self.MAX_LEVELS
+        self._before(start, path)
+        stay = _Stay(start, end, assignment_id, levels)
+        for level in range(levels):  # bottom up: readers walking the list never lose the rest of it
+            stay.next[level] = path[level].next[level]
+            path[level].next[level] = stay
+        self._levels = max(self._levels, levels)
+        self._by_id[assignment_id] = stay
+
+    def close(self, assignment_id: int, end: int):
+        self._by_id[assignment_id].end = end
+
+    def end_of(self, assignment_id: int):
+        """End minute of an assignment, or None if the room no longer holds it (reloaded since)."""
+        stay = self._by_id.get(assignment_id)
+        return stay.end if stay else None
+
+    def occupant_at(self, t: int):
+        """Id of the assignment covering minute t, or None."""
+        stay = self._before(t)
+        return stay.id if stay is not self._head and stay.end > t else None
+
+
+class RoomCensusEngine:
+    """
+    Room assignment index plus an occupancy snapshot that is updated on every
+    admit/discharge, so "free rooms between T1 and T2" costs O(rooms * log n)
+    and "census by ward" O(wards) instead of scanning assignment history.
+    Writes still go through DB.insert_room_assignment (atomic, trigger-backed).
+    """
+
+    def __init__(self):
+        self.rooms = {}       # room_id -> (room_number, ward)
+        self._intervals = {}  # room_id -> RoomIntervals
+        self._occupied = {}   # room_id -> (assignment_id, patient_id, end) for current occupants
+        self._expiry = []     # heap of (end, room_id, assignment_id) for occupants with an end_at
+        self._pending = []    # heap of (start, room_id, assignment_id, patient_id, end) not started yet
+        self._ward_total = {}
+        self._ward_occupied = {}
+        self._lock = threading.Lock()  # guards the snapshot, not the per-room intervals
+
+    # ---------- loading ----------
+    def load(self, rooms, assignments, now: datetime = None):
+        """
+        rooms: [(room_id, room_number, ward), ...]
+        assignments: [(assignment_id, room_id, patient_id, start_at, end_at|None), ...]
+        """
+        by_id = {rid: (number, ward) for rid, number, ward in rooms}
+        ranges = {rid: [] for rid in by_id}
+        current = []
+        for aid, rid, pid, start_at, end_at in assignments:
+            start, end = to_minutes(start_at), (to_minutes(end_at) if end_at else OPEN)
+            ranges[rid].append((aid, start, end))
+            current.append((aid, rid, pid, start, end))
+        intervals = {rid: RoomIntervals() for rid in by_id}
+        for rid, room_ranges in ranges.items():
+            intervals[rid].replace(room_ranges)
+        self._intervals, self.rooms = intervals, by_id  # a room is listed only once it has its intervals
+        self._ward_total = {}
+        for _, ward in self.rooms.values():
+            self._ward_total[ward] = self._ward_total.get(ward, 0) + 1
+        with self._lock:
+            self._occupied, self._expiry, self._pending = {}, [], []
+            self._ward_occupied = {w: 0 for w in self._ward_total}
+            t = to_minutes(now or datetime.now())
+            for aid, rid, pid, start, end in current:
+                self._track(rid, aid, pid, start, end, t)
+
+    def refresh_from_db(self):
+        """Rooms plus assignments that are open or end in the future (two queries)."""
+        now = datetime.now()
+        self.load(list_rooms(), list_room_assignments(now), now)
+
+    def _room(self, room_id: int) -> RoomIntervals:
+        """Intervals of a room; a room created since the last load reloads everything once."""
+        intervals = self._intervals.get(room_id)
+        if intervals is None:
+            self.refresh_from_db()
+            intervals = self._intervals.get(room_id)
+            if intervals is None:
+                raise LookupError(f"There is no room with id {room_id}.")
+        return intervals
+
+    # ---------- queries ----------
+    def is_free(self, room_id: int, start_at: datetime, end_at: datetime = None) -> bool:
+        return not self._room(room_id).overlaps(to_minutes(start_at), to_minutes(end_at) if end_at else OPEN)
+
+    def free_rooms(self, start_at: datetime, end_at: datetime = None, ward: str = None):
+        """[room_id, ...] free for the whole of [start_at, end_at)."""
+        start, end = to_minutes(start_at), (to_minutes(end_at) if end_at else OPEN)
+        return [rid for rid, (_, w) in self.rooms.items()
+                if (ward is None or w == ward) and not self._intervals[rid].overlaps(start, end)]
+
+    def census(self, now: datetime = None) -> dict:
+        """{ward: (occupied, total)} from the incrementally maintained snapshot."""
+        with self._lock:
+            self._advance(to_minutes(now or datetime.now()))
+            return {w: (self._ward_occupied.get(w, 0), total) for w, total in self._ward_total.items()}
+
+    def occupant(self, room_id: int):
+        """(assignment_id, patient_id, end_at|None) of the current occupant, or None."""
+        with self._lock:
+            self._advance(to_minutes(datetime.now()))
+            occ = self._occupied.get(room_id)
+        if not occ:
+            return None
+        aid, pid, end = occ
+        return aid, pid, (None if end == OPEN else from_minutes(end))
+
+    # ---------- writes ----------
+    def admit(self, patient_id: int, room_id: int, start_at: datetime = None, end_at: datetime = None,
+              insert=insert_room_assignment) -> int:
+        """Assign a room (thread-safe); raises RoomOccupiedError on overlap."""
+        start_at = start_at or datetime.now()
+        start, end = to_minutes(start_at), (to_minutes(end_at) if end_at else OPEN)
+        intervals = self._room(room_id)
+        with intervals.lock:
+            if intervals.overlaps(start, end):
+                raise RoomOccupiedError(f"Room {self.rooms[room_id][0]} is not free for that period.")
+            aid = insert(patient_id, room_id, start_at, end_at)
+            if aid is None:
+                # another workstation got there first: take this room's stays from the database,
+                # so the next check (and free_rooms) sees them
+                self._reload_room(room_id, intervals)
+                raise RoomOccupiedError(f"Room {self.rooms[room_id][0]} was just assigned elsewhere.")
+            intervals.add(aid, start, end)
+        with self._lock:
+            self._track(room_id, aid, patient_id, start, end, to_minutes(datetime.now()))
+        return aid
+
+    def discharge(self, room_id: int, assignment_id: int, end_at: datetime = None,
+                  close=end_room_assignment) -> bool:
+        end_at = end_at or datetime.now()
+        intervals = self._room(room_id)
+        with intervals.lock:
+            if not close(assignment_id, end_at):
+                return False
+            intervals.close(assignment_id, to_minutes(end_at))
+        end = to_minutes(end_at)
+        with self._lock:
+            occ = self._occupied.get(room_id)
+            if occ and occ[0] == assignment_id:
+                if end <= to_minutes(datetime.now()):
+                    self._vacate(room_id)
+                else:  # planned discharge: stays in the census until then
+                    self._occupy(room_id, assignment_id, occ[1], end)
+        return True
+
+    def _reload_room(self, room_id: int, intervals: RoomIntervals):
+        """Replace one room's intervals with its assignments in the database (caller holds intervals.lock)."""
+        now = datetime.now()
+        rows = list_room_assignments(now, room_id)
+        known = {aid for aid, *_ in rows if intervals.end_of(aid) is not None}
+        intervals.replace([(aid, to_minutes(start_at), to_minutes(end_at) if end_at else OPEN)
+                           for aid, _, _, start_at, end_at in rows])
+        with self._lock:
+            t = to_minutes(now)
+            for aid, _, pid, start_at, end_at in rows:
+                if aid not in known:  # stays this desk had not seen join the snapshot
+                    self._track(room_id, aid, pid, to_minutes(start_at),
+                                to_minutes(end_at) if end_at else OPEN, t)
+
+    # ---------- snapshot internals (caller holds self._lock) ----------
+    def _track(self, room_id, aid, pid, start, end, now):
+        if start > now:
+            heapq.heappush(self._pending, (start, room_id, aid, pid, end))
+        elif end > now:
+            self._occupy(room_id, aid, pid, end)
+
+    def _occupy(self, room_id, aid, pid, end):
+        if room_id not in self._occupied:
+            ward = self.rooms[room_id][1]
+            self._ward_occupied[ward] = self._ward_occupied.get(ward, 0) + 1
+        self._occupied[room_id] = (aid, pid, end)
+        if end != OPEN:
+            heapq.heappush(self._expiry, (end, room_id, aid))
+
+    def _vacate(self, room_id):
+        if self._occupied.pop(room_id, None):
+            self._ward_occupied[self.rooms[room_id][1]] -= 1
+
+    def _advance(self, now: int):
+        """Move the snapshot forward to `now`: start pending stays, end finished ones."""
+        while self._pending and self._pending[0][0] <= now:
+            _, rid, aid, pid, _ = heapq.heappop(self._pending)
+            end = self._intervals[rid].end_of(aid)  # not the queued end: a discharge may have moved it
+            if end is not None and end > now:
+                self._occupy(rid, aid, pid, end)
+        while self._expiry and self._expiry[0][0] <= now:
+            _, rid, aid = heapq.heappop(self._expiry)
+            occ = self._occupied.get(rid)
+            if occ and occ[0] == aid:
+                self._vacate(rid)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = ap.add_subparsers(dest="command", required=True)
+    sub.add_parser("census", help="occupied / total rooms by ward, now")
+    free = sub.add_parser("free", help="rooms free for the whole of [start, end)")
+    free.add_argument("start", type=datetime.fromisoformat)
+    free.add_argument("end", nargs="?", type=datetime.fromisoformat, help="default: open-ended")
+    free.add_argument("--ward")
+    admit = sub.add_parser("admit", help="assign a room to a patient")
+    admit.add_argument("patient_id", type=int)
+    admit.add_argument("room", help="room number")
+    admit.add_argument("--from", dest="start", type=datetime.fromisoformat, help="default: now")
+    admit.add_argument("--until", type=datetime.fromisoformat, help="default: until discharge")
+    discharge = sub.add_parser("discharge", help="end the current stay in a room")
+    discharge.add_argument("room", help="room number")
+    discharge.add_argument("--at", type=datetime.fromisoformat, help="default: now")
+    ap.add_argument("--sqlite", metavar="PATH", help="use this SQLite file instead of HMS_DB_DRIVER's backend")
+    args = ap.parse_args(argv)
+    if args.sqlite:
+        use_sqlite(args.sqlite)
+
+    engine = RoomCensusEngine()
+    engine.refresh_from_db()
+    room_ids = {number: rid for rid, (number, _) in engine.rooms.items()}
+    if args.command == "census":
+        for ward, (occupied, total) in sorted(engine.census().items()):
+            print(f"{ward:<22}{occupied:>5,} / {total:,}")
+        return 0
+    if args.command == "free":
+        rooms = engine.free_rooms(args.start, args.end, args.ward)
+        print("\n".join(sorted(engine.rooms[rid][0] for rid in rooms)) or "no free room")
+        return 0
+    if args.room not in room_ids:
+        print(f"There is no room {args.room}.", file=sys.stderr)
+        return 1
+    room_id = room_ids[args.room]
+    if args.command == "admit":
+        try:
+            aid = engine.admit(args.patient_id, room_id, args.start, args.until)
+        except RoomOccupiedError as e:
+            print(e, file=sys.stderr)
+            return 1
+        print(f"assignment {aid}: patient {args.patient_id} in room {args.room}")
+        return 0
+    occupant = engine.occupant(room_id)
+    if occupant is None or not engine.discharge(room_id, occupant[0], args.at):
+        print(f"Room {args.room} has no current stay.", file=sys.stderr)
+        return 1
+    print(f"assignment {occupant[0]}: patient {occupant[1]} discharged from room {args.room}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
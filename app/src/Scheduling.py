@@ -0,0 +1,154 @@
+import heapq
+import threading
+import time as _time
+from array import array
+from bisect import bisect_right, insort
+from datetime import datetime, timedelta
+from itertools import islice
+
+from DB import book_appointment, list_booked_appointments, list_doctors
+
+SLOT_MINUTES = 30
+DAY_START = 8 * 60         # first slot of the day, minutes after midnight
+DAY_END = 16 * 60          # no slot may start at or after this
+WORK_DAYS = (0, 1, 2, 3, 4)  # datetime.weekday() numbers; adjust to the clinic's week
+HORIZON_DAYS = 60          # how far ahead refresh_from_db() loads bookings
+REFRESH_SECONDS = 300      # ensure_fresh() reloads when the index is older than this
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class SlotTakenError(Exception):
+    """The slot was booked by someone else between listing and booking."""
+
+
+def to_minutes(dt: datetime) -> int:
+    return int((dt - _EPOCH).total_seconds() // 60)
+
+
+def from_minutes(m: int) -> datetime:
+    return _EPOCH + timedelta(minutes=m)
+
+
+class DoctorSchedule:
+    """
+    Booked appointment starts of one doctor as sorted epoch minutes (array('q')).
+    Each booking blocks [start, start + slot), so overlap checks are one bisect.
+    """
+
+    def __init__(self, doctor_id: int, name: str = "", starts=()):
+        self.doctor_id = doctor_id
+        self.name = name
+        self.starts = array("q", sorted(starts))
+        self.lock = threading.Lock()
+
+    def is_free(self, start: int, slot: int) -> bool:
+        i = bisect_right(self.starts, start - slot)  # first booking that could overlap
+        return i == len(self.starts) or self.starts[i] >= start + slot
+
+    def add(self, start: int):
+        insort(self.starts, start)
+
+    def free_slots(self, start: int, end: int, slot: int):
+        """Yield free grid-aligned slot starts in [start, end), in order."""
+        day, minute = divmod(start, 1440)
+        # align to the day's slot grid
+        minute = DAY_START if minute < DAY_START else DAY_START + -(-(minute - DAY_START) // slot) * slot
+        t = day * 1440 + minute
+        while t < end:
+            day, minute = divmod(t, 1440)
+            if (day + 3) % 7 not in WORK_DAYS or minute + slot > DAY_END:
+                t = (day + 1) * 1440 + DAY_START  # 1970-01-01 was a Thursday (weekday 3)
+                continue
+            if minute < DAY_START:
+                t = day * 1440 + DAY_START
+                continue
+            i = bisect_right(self.starts, t - slot)
+            if i < len(self.starts) and self.starts[i] < t + slot:
+                # skip past the blocking booking, back onto the grid
+                t += -(-(self.starts[i] + slot - t) // slot) * slot
+                continue
+            yield t
+            t += slot
+
+
+class SchedulingEngine:
+    """
+    In-memory availability index over appointments.
+
+    Answers "next N free slots for specialization X" by merging each doctor's
+    free-slot stream (heapq.merge), so the cost depends on N and the number of
+    doctors, not on how many appointments exist. Bookings still go through
+    DB.book_appointment, which re-checks the conflict atomically in SQL.
+    """
+
+    def __init__(self, slot_minutes: int = SLOT_MINUTES):
+        self.slot = slot_minutes
+        self._doctors = {}   # doctor_id -> DoctorSchedule
+        self._by_spec = {}   # specialization_id -> [doctor_id, ...]
+        self._window = (0, 0)
+        self.loaded_at = None
+
+    # ---------- loading ----------
+    def load(self, doctors, booked, window_start: datetime, window_end: datetime):
+        """
+        doctors: [(doctor_id, name, specialization_id), ...]
+        booked:  [(doctor_id, appointment_at), ...]
+        """
+        starts, names, by_spec = {}, {}, {}
+        for doctor_id, name, spec_id in doctors:
+            names[doctor_id] = name
+            starts.setdefault(doctor_id, [])
+            by_spec.setdefault(spec_id, []).append(doctor_id)
+        for doctor_id, when in booked:
+            if doctor_id in starts:
+                starts[doctor_id].append(to_minutes(when))
+        self._doctors = {d: DoctorSchedule(d, names[d], s) for d, s in starts.items()}
+        self._by_spec = by_spec
+        self._window = (to_minutes(window_start), to_minutes(window_end))
+        self.loaded_at = _time.monotonic()
+
+    def refresh_from_db(self, horizon_days: int = HORIZON_DAYS):
+        """Reload doctors and bookings from now to now + horizon_days (two queries)."""
+        start = datetime.now().replace(second=0, microsecond=0)
+        end = start + timedelta(days=horizon_days)
+        self.load(list_doctors(), list_booked_appointments(start, end), start, end)
+
+    def ensure_fresh(self, max_age: float = REFRESH_SECONDS):
+        if self.loaded_at is None or _time.monotonic() - self.loaded_at > max_age:
+            self.refresh_from_db()
+
+    # ---------- queries ----------
+    def doctor_name(self, doctor_id: int) -> str:
+        d = self._doctors.get(doctor_id)
+        return d.name if d else ""
+
+    def is_free(self, doctor_id: int, when: datetime) -> bool:
+        return self._doctors[doctor_id].is_free(to_minutes(when), self.slot)
+
+    def next_free_slots(self, specialization_id=None, n: int = 10, after: datetime = None):
+        """[(when, doctor_id), ...]: the n earliest free slots across matching doctors."""
+        start = max(to_minutes(after or datetime.now()), self._window[0])
+        end = self._window[1]
+        ids = self._doctors if specialization_id is None else self._by_spec.get(specialization_id, ())
+        streams = [self._tagged_slots(self._doctors[i], start, end) for i in ids]
+        return [(from_minutes(t), doctor_id) for t, doctor_id in islice(heapq.merge(*streams), n)]
+
+    def _tagged_slots(self, sched, start, end):
+        for t in sched.free_slots(start, end, self.slot):
+            yield t, sched.doctor_id
+
+    # ---------- booking ----------
+    def book(self, patient_id: int, doctor_id: int, when: datetime, book=book_appointment) -> int:
+        """Book a slot (thread-safe); raises SlotTakenError if it is no longer free."""
+        sched = self._doctors[doctor_id]
+        start = to_minutes(when)
+        with sched.lock:
+            if not sched.is_free(start, self.slot):
+                raise SlotTakenError("That slot has just been taken. Pick another one.")
+            appointment_id = book(patient_id, doctor_id, when, self.slot)
+            # taken or not, the slot is now occupied (by us or by another desk)
+            sched.add(start)
+        if appointment_id is None:
+            raise SlotTakenError("That slot has just been taken. Pick another one.")
+        return appointment_id
@@ -0,0 +1,71 @@
+"""
+Where cold start time goes, phase by phase, against an optional budget.
+
+    HMS_STARTUP_PROFILE=1 python app/src/HMS.py
+    python app/src/HMS.py --profile-startup --startup-budget-ms 1500
+    python benchmarks/bench_startup.py --runs 10 --budget-ms 1500   # headless, signs in by itself
+
+Phases are wall-clock spans between marks, starting when HMS.py imports this
+module (its first import). Time spent waiting for someone to sign in is shown
+but not counted: "interactive" is the sum of the other phases, up to the first
+page of patients on screen.
+"""
+import os
+import sys
+import time
+
+_T0 = time.perf_counter()
+
+
+class StartupProfile:
+    def __init__(self):
+        self.enabled = os.environ.get("HMS_STARTUP_PROFILE") == "1"
+        self.budget_ms = float(os.environ.get("HMS_STARTUP_BUDGET_MS") or 0) or None
+        self.json_path = os.environ.get("HMS_STARTUP_PROFILE_JSON")  # for benchmarks/bench_startup.py
+        self.phases = []  # (phase, ms, counted)
+        self.done = False
+        self._last = _T0
+
+    def mark(self, phase, counted=True):
+        """End `phase` now; it began at the previous mark."""
+        if self.done:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self._last) * 1000, counted))
+        self._last = now
+
+    def finish(self, phase) -> bool:
+        """Last mark: report (if enabled) and return True if within budget (or there is none)."""
+        if self.done:
+            return True
+        self.mark(phase)
+        self.done = True
+        if self.enabled:
+            self.report()
+        if self.json_path:
+            import json  # not before the first mark: this module is imported ahead of everything else
+            with open(self.json_path, "w", encoding="utf-8") as f:
+                json.dump({"phases": self.phases, "interactive_ms": self.interactive_ms(),
+                           "budget_ms": self.budget_ms}, f)
+        return not self.over_budget()
+
+    def interactive_ms(self) -> float:
+        return sum(ms for _, ms, counted in self.phases if counted)
+
+    def over_budget(self) -> bool:
+        return self.budget_ms is not None and self.interactive_ms() > self.budget_ms
+
+    def report(self, out=None):
+        out = out or sys.stderr
+        print("startup profile (ms):", file=out)
+        for phase, ms, counted in self.phases:
+            print(f"  {phase:<28} {ms:9.1f}{'' if counted else '  (not counted)'}", file=out)
+        total = self.interactive_ms()
+        line = f"  {'interactive after':<28} {total:9.1f}"
+        if self.budget_ms is not None:
+            line += f"  budget {self.budget_ms:.0f}: {'OVER' if self.over_budget() else 'ok'}"
+        print(line, file=out)
+
+
+# one per process, like the app's other shared helpers
+startup = StartupProfile()
@@ -0,0 +1,103 @@
+"""
+Build the Designer forms from precompiled Python modules instead of parsing the .ui XML.
+
+    python app/src/UiLoader.py           # compile app/ui/*.ui into app/ui/compiled (not in git)
+    python app/src/UiLoader.py --check   # list forms that are not compiled or older than their .ui
+
+load_ui(widget, "login") runs ui/compiled/ui_login.py when it is at least as
+new as ui/login.ui. A missing or stale module is compiled on the spot, so only
+the first start after a .ui edit pays for the XML; if that fails (read-only
+install) or HMS_UI_RUNTIME=1 is set, the form is parsed with uic.loadUi as
+before. Either way the named widgets end up as attributes of `widget`.
+"""
+import argparse
+import glob
+import importlib.util
+import logging
+import os
+import sys
+
+UI_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "ui"))
+COMPILED_DIR = os.path.join(UI_DIR, "compiled")
+
+log = logging.getLogger("hms.ui")
+
+
+def _paths(name):
+    return os.path.join(UI_DIR, f"{name}.ui"), os.path.join(COMPILED_DIR, f"ui_{name}.py")
+
+
+def is_fresh(name) -> bool:
+    """True if the compiled module of form `name` exists and is not older than its .ui."""
+    ui_path, py_path = _paths(name)
+    try:
+        return os.path.getmtime(py_path) >= os.path.getmtime(ui_path)
+    except OSError:
+        return False
+
+
+def compile_form(name):
+    """Write ui/compiled/ui_<name>.py (atomically: a half-written module is never imported)."""
+    from PyQt5 import uic  # only to compile or fall back: importing uic costs as much as a small form
+    ui_path, py_path = _paths(name)
+    os.makedirs(COMPILED_DIR, exist_ok=True)
+    tmp = f"{py_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as out:
+            uic.compileUi(ui_path, out)
+        os.replace(tmp, py_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _form_class(name):
+    _, py_path = _paths(name)
+    spec = importlib.util.spec_from_file_location(f"ui_{name}", py_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)  # bytecode is cached next to it like any module
+    return next(v for k, v in vars(module).items() if k.startswith("Ui_") and hasattr(v, "setupUi"))
+
+
+def load_ui(widget, name):
+    """Build form `name` (app/ui/<name>.ui) into `widget`, like uic.loadUi(path, widget)."""
+    form = None
+    if os.environ.get("HMS_UI_RUNTIME") != "1":
+        try:
+            if not is_fresh(name):
+                compile_form(name)
+            form = _form_class(name)()
+        except Exception as e:
+            log.warning("%s.ui: no precompiled form (%s), parsing the XML", name, e)
+    if form is None:
+        from PyQt5 import uic
+        uic.loadUi(_paths(name)[0], widget)
+        return
+    form.setupUi(widget)
+    for attr, obj in vars(form).items():  # what uic.loadUi sets on the widget
+        setattr(widget, attr, obj)
+
+
+def forms():
+    return sorted(os.path.splitext(os.path.basename(p))[0] for p in glob.glob(os.path.join(UI_DIR, "*.ui")))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--check", action="store_true", help="only list forms that need compiling (exit 1 if any)")
+    args = ap.parse_args(argv)
+
+    stale = [name for name in forms() if not is_fresh(name)]
+    if args.check:
+        for name in stale:
+            print(f"{name}.ui: not compiled or changed since")
+        return 1 if stale else 0
+    for name in stale:
+        compile_form(name)
+        print(f"compiled {name}.ui -> compiled/ui_{name}.py")
+    print(f"{len(forms())} forms, {len(stale)} compiled, {len(forms()) - len(stale)} up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
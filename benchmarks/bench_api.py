@@ -0,0 +1,214 @@
+"""
+Load test of the API service: hundreds of simulated desks against one ApiServer on SQLite.
+
+    python benchmarks/bench_api.py                              # 500 clients, 20 s, 100k patients
+    python benchmarks/bench_api.py --clients 500 --think-ms 0   # closed loop, no pauses: saturation
+    python benchmarks/bench_api.py --no-coalesce --no-cache     # the same without sharing reads
+
+The service runs in its own process on a copy of the generated database (see
+run.py), with a fresh shared secret and one user every desk logs in as. Every
+client holds one keep-alive connection and repeats what a desk does: poll the patient change feed, page and search the grid, open patients
+and their timelines, read reference lists and now and then save an edit, with
+an exponential pause (--think-ms on average) in between. A 503 is retried
+after its Retry-After, as ApiClient does, and counts toward the latency.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.abspath(os.path.join(HERE, "..", "app", "src"))
+sys.path.insert(0, SRC)
+
+from ApiProtocol import call_body, decode  # noqa: E402
+from bench_scheduling import percentiles  # noqa: E402
+
+USERNAME, PASSWORD = "loadtest", "loadtest"
+PREFIXES = ("al", "ar", "ma", "mo", "re", "sa", "za", "ka", "ja", "le", "sm", "wi", "gr", "ki", "jo")
+
+
+class Connection:
+    """Minimal keep-alive HTTP/1.1 client on asyncio streams (one request at a time)."""
+
+    def __init__(self, host, port, token):
+        self.host, self.port = host, port
+        self.headers = f"Authorization: Bearer {token}\r\n"  # plus X-HMS-Session once logged in
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=b""):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+                          f"{self.headers}Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        payload = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection") == "close":
+            self.writer.close()
+            self.writer = None
+        return status, headers, payload
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class Desk:
+    """One simulated workstation."""
+
+    def __init__(self, conn, rnd, patients, results):
+        self.conn, self.rnd, self.patients, self.results = conn, rnd, patients, results
+        self.watermark = None
+
+    async def login(self):
+        status, _, payload = await self.conn.request("POST", "/v1/verify_user_password_plain",
+                                                     call_body((USERNAME, PASSWORD)))
+        session = json.loads(payload).get("session") if status == 200 else None
+        if not session:
+            raise RuntimeError(f"login failed: HTTP {status} {payload[:200]!r}")
+        self.conn.headers += f"X-HMS-Session: {session}\r\n"
+
+    async def call(self, op, *args):
+        body = call_body(args)
+        t0 = time.perf_counter()
+        while True:
+            status, headers, payload = await self.conn.request("POST", f"/v1/{op}", body)
+            if status != 503:
+                break
+            self.results["rejected"] += 1
+            await asyncio.sleep(float(headers.get("retry-after") or 1))
+        self.results["latency"].setdefault(op, []).append(time.perf_counter() - t0)
+        if status != 200:
+            self.results["errors"] += 1
+            return None
+        return decode(json.loads(payload)["result"])
+
+    async def step(self):
+        r, pid = self.rnd.random(), self.rnd.randint(1, self.patients)
+        if r < 0.35 or self.watermark is None:  # every desk polls the feed every few seconds
+            if self.watermark is None:
+                self.watermark = await self.call("patient_change_watermark")
+            else:
+                answer = await self.call("list_patient_changes", self.watermark, 500)
+                if answer:
+                    self.watermark = answer[1]
+        elif r < 0.50:
+            await self.call("list_patients_page", None, 200)  # grid opened or reloaded
+        elif r < 0.55:
+            await self.call("list_patients_page", self.rnd.randint(200, self.patients), 200)  # scrolled
+        elif r < 0.70:
+            await self.call("get_patient_by_id", self.rnd.choice((pid, self.rnd.randint(1, 50))))  # some are busy
+        elif r < 0.80:
+            await self.call("search_patients", self.rnd.choice(PREFIXES), 50)
+        elif r < 0.88:
+            await self.call("list_specializations")
+        elif r < 0.97:
+            await self.call("get_patient_timeline", pid, 20)
+        else:
+            p = await self.call("get_patient_by_id", pid)
+            if p:
+                await self.call("update_patient", pid, {**p, "Phone": f"09{self.rnd.randrange(10 ** 9):09d}"},
+                                p["RowVersion"])
+
+
+async def desk_loop(desk, deadline, think):
+    await desk.login()
+    while time.perf_counter() < deadline:
+        await desk.step()
+        if think:
+            await asyncio.sleep(desk.rnd.expovariate(1 / think))
+
+
+async def load(host, port, token, clients, seconds, think, patients, seed):
+    results = {"latency": {}, "rejected": 0, "errors": 0}
+    conns = [Connection(host, port, token) for _ in range(clients)]
+    desks = [Desk(c, random.Random(seed + i), patients, results) for i, c in enumerate(conns)]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(desk_loop(d, t0 + seconds, think) for d in desks))
+    elapsed = time.perf_counter() - t0
+    _, _, payload = await conns[0].request("GET", "/v1/stats")
+    for c in conns:
+        c.close()
+    return results, elapsed, decode(json.loads(payload)["result"])
+
+
+def start_server(db_path, port, token, extra):
+    proc = subprocess.Popen([sys.executable, os.path.join(SRC, "ApiServer.py"), "--sqlite", db_path,
+                             "--port", str(port), *extra], stdout=subprocess.PIPE, text=True,
+                            env={**os.environ, "HMS_API_TOKEN": token})
+    line = proc.stdout.readline()
+    if not line.startswith("HMS API on"):
+        proc.kill()
+        sys.exit(f"API service did not start: {line}")
+    return proc
+
+
+def free_port():
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--clients", type=int, default=500)
+    ap.add_argument("--seconds", type=float, default=20)
+    ap.add_argument("--think-ms", type=float, default=250, help="average pause between a desk's calls")
+    ap.add_argument("--patients", type=int, default=100_000)
+    ap.add_argument("--doctors", type=int, default=500)
+    ap.add_argument("--workers", type=int, default=10, help="service DB workers (= connections)")
+    ap.add_argument("--max-pending", type=int)
+    ap.add_argument("--no-coalesce", action="store_true")
+    ap.add_argument("--no-cache", action="store_true")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args(argv)
+
+    from run import DB, sqlite_copy
+    db_path = sqlite_copy(args)
+    DB.use_sqlite(db_path)
+    DB.create_user_plain(USERNAME, PASSWORD, party_id=args.patients + 1)  # the first generated doctor
+    DB.get_pool().close()
+    token = secrets.token_urlsafe(32)
+    port = free_port()
+    extra = ["--workers", str(args.workers)]
+    extra += ["--max-pending", str(args.max_pending)] if args.max_pending else []
+    extra += ["--no-coalesce"] * args.no_coalesce + ["--no-cache"] * args.no_cache
+    server = start_server(db_path, port, token, extra)
+    try:
+        results, elapsed, stats = asyncio.run(load("127.0.0.1", port, token, args.clients, args.seconds,
+                                                   args.think_ms / 1000, args.patients, args.seed))
+    finally:
+        server.terminate()
+        server.wait()
+
+    every = [t for samples in results["latency"].values() for t in samples]
+    p = percentiles(every)
+    print(f"{args.clients} clients, {elapsed:.1f} s, think {args.think_ms:.0f} ms, {args.workers} DB workers"
+          f"{', no coalescing' if args.no_coalesce else ''}{', no cache' if args.no_cache else ''}")
+    for op, samples in sorted(results["latency"].items(), key=lambda kv: -len(kv[1])):
+        q = percentiles(samples)
+        print(f"  {op:<26} {len(samples):7,} calls  p50={q[50]:7.2f} ms  p99={q[99]:8.2f} ms")
+    print(f"throughput {len(every) / elapsed:,.0f} calls/s   p50={p[50]:.2f} ms  p95={p[95]:.2f} ms  "
+          f"p99={p[99]:.2f} ms   503s retried: {results['rejected']:,}   errors: {results['errors']:,}")
+    print(f"service: {stats['requests']:,} requests, {stats['executed']:,} ran on the DB, "
+          f"{stats['coalesced']:,} coalesced, {stats['cache_hits']:,} from cache; "
+          f"DB connections open: {stats['pool']['size']} (max {stats['pool']['max_size']})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Audit log throughput: one INSERT per event vs the buffered AuditLog writer.
+
+    python benchmarks/bench_audit.py --events 20000
+    HMS_DB_DRIVER=pyodbc python benchmarks/bench_audit.py --driver env   # against CONN_STR
+
+Both write the same events to audit_logs. "caller" is the time the recording
+code is blocked, "end to end" includes the final flush.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app", "src")))
+
+import DB  # noqa: E402
+from AuditLog import AuditLog  # noqa: E402
+from bench_scheduling import percentiles  # noqa: E402
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--driver", choices=("sqlite", "env"), default="sqlite",
+                    help="sqlite: scratch SQLite file; env: the backend HMS_DB_DRIVER selects")
+    ap.add_argument("--events", type=int, default=20_000)
+    ap.add_argument("--batch", type=int, default=200, help="AuditLog batch size")
+    ap.add_argument("--party-id", type=int, default=1, help="--driver env: existing party for the bench user")
+    args = ap.parse_args(argv)
+
+    work = tempfile.mkdtemp(prefix="hms_audit_")
+    if args.driver == "sqlite":
+        DB.use_sqlite(os.path.join(work, "hms.sqlite3"))
+        with DB.conn_cursor() as (_, cur):
+            cur.execute("INSERT INTO dbo.parties (party_type) VALUES ('PERSON');")
+            cur.execute("SELECT MAX(id) FROM dbo.parties;")
+            party_id = cur.fetchone()[0]
+    else:
+        party_id = args.party_id
+    username = f"auditbench{int(time.time())}"
+    DB.create_user_plain(username, "x", party_id=party_id)
+    user_id = DB.get_user_by_username(username)["id"]
+
+    try:
+        samples = []
+        t_all = time.perf_counter()
+        for i in range(args.events):
+            t0 = time.perf_counter()
+            DB.insert_audit_logs([(user_id, "VIEW", "patients", i, datetime.now())])
+            samples.append(time.perf_counter() - t0)
+        sync_s = time.perf_counter() - t_all
+        p = percentiles(samples)
+        print(f"synchronous  caller p50={p[50]:.4f} ms p99={p[99]:.4f} ms  "
+              f"end to end {args.events / sync_s:>10,.0f} events/s")
+
+        audit = AuditLog(spill_path=os.path.join(work, "spill.jsonl"), batch_size=args.batch)
+        samples = []
+        t_all = time.perf_counter()
+        for i in range(args.events):
+            t0 = time.perf_counter()
+            audit.record(user_id, "VIEW", "patients", i)
+            samples.append(time.perf_counter() - t0)
+        audit.close(timeout=600)
+        async_s = time.perf_counter() - t_all
+        p = percentiles(samples)
+        stats = audit.stats()
+        print(f"buffered     caller p50={p[50]:.4f} ms p99={p[99]:.4f} ms  "
+              f"end to end {args.events / async_s:>10,.0f} events/s  "
+              f"({stats['batches']} batches, {stats['spilled']} spilled)")
+        print(f"speed-up end to end: {sync_s / async_s:.1f}x")
+    finally:
+        DB.get_pool().close()
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Load test for the DB connection pool using the stand-in driver (no SQL Server).
+
+    python benchmarks/bench_pool.py --threads 16 --calls 200 --connect-ms 40 --query-ms 2
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app", "src")))
+
+from ConnectionPool import ConnectionPool, StandInDriver  # noqa: E402
+
+
+def run(threads, calls, checkout, release):
+    def worker(_):
+        for _ in range(calls):
+            conn = checkout()
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            release(conn)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as ex:
+        list(ex.map(worker, range(threads)))
+    return time.perf_counter() - t0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--calls", type=int, default=200, help="checkouts per thread")
+    ap.add_argument("--connect-ms", type=float, default=40.0)
+    ap.add_argument("--query-ms", type=float, default=2.0)
+    ap.add_argument("--max-size", type=int, default=8)
+    args = ap.parse_args(argv)
+    total = args.threads * args.calls
+
+    driver = StandInDriver(args.connect_ms / 1000, args.query_ms / 1000)
+    pool = ConnectionPool(driver.connect, min_size=1, max_size=args.max_size)
+    pooled = run(args.threads, args.calls, pool.acquire, pool.release)
+    stats = pool.stats()
+    pool.close()
+    print(f"pooled:   {total} calls in {pooled:.2f}s ({total / pooled:,.0f} calls/s), "
+          f"{driver.connects} connects")
+    print("          " + ", ".join(f"{k}={v}" for k, v in stats.items()))
+
+    # Same workload, one connect per call (the pre-pool behaviour); fewer calls to keep it short
+    calls = max(1, args.calls // 10)
+    driver = StandInDriver(args.connect_ms / 1000, args.query_ms / 1000)
+    unpooled = run(args.threads, calls, driver.connect, lambda c: c.close())
+    n = args.threads * calls
+    print(f"unpooled: {n} calls in {unpooled:.2f}s ({n / unpooled:,.0f} calls/s), "
+          f"{driver.connects} connects")
+
+
+if __name__ == "__main__":
+    main()
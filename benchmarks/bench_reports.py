@@ -0,0 +1,170 @@
+"""
+Report rollups: refresh from the watermark after a day at the desks, against a full rebuild.
+
+    python benchmarks/bench_reports.py                               # 100k patients, 5 simulated days
+    python benchmarks/bench_reports.py --patients 20000 --rounds 10 --writes 5000
+
+Each round writes what a busy day does: appointments booked for the coming weeks,
+today's visits completed or missed, lab tests ordered, room stays ended and
+started, today's billing run and a few corrections to older days. The rollups
+are then refreshed from their watermark (timed), and rebuilt from scratch (timed)
+as a check: every rollup row must come out the same. The generated data has no
+room stays, so a year of them is seeded first.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(HERE, "..", "app", "src")))
+
+import DB  # noqa: E402
+import Reports  # noqa: E402
+from bench_scheduling import percentiles  # noqa: E402
+
+ROLLUPS = ("report_doctor_day", "report_specialization_day", "report_lab_day", "report_revenue_day",
+           "report_room_day")
+LAB_TESTS = ("CBC", "Lipid panel", "HbA1c", "TSH", "Urinalysis", "Liver panel", "Kidney panel", "CRP")
+
+
+def seed_room_stays(rnd, days=365):
+    """Back-to-back stays of 1-6 days in every room over the past `days`; about 60% of rooms occupied now."""
+    now = datetime.now().replace(second=0, microsecond=0)
+    with DB.conn_cursor() as (_, cur):
+        cur.execute("SELECT COUNT(*) AS n FROM dbo.room_assignments;")
+        if cur.fetchone().n:
+            return 0
+        cur.execute("SELECT id FROM dbo.rooms;")
+        rooms = [r.id for r in cur.fetchall()]
+        cur.execute("SELECT MAX(id) AS n FROM dbo.patients;")
+        patients = cur.fetchone().n
+        stays = []
+        for room in rooms:
+            t = now - timedelta(days=days, hours=rnd.randrange(48))
+            while True:
+                end = t + timedelta(days=rnd.randint(1, 6), hours=rnd.randrange(24))
+                if end >= now:
+                    if rnd.random() < 0.6:
+                        stays.append((rnd.randint(1, patients), room, t, None))
+                    break
+                stays.append((rnd.randint(1, patients), room, t, end))
+                t = end + timedelta(hours=rnd.randrange(36))
+        cur.executemany("INSERT INTO dbo.room_assignments (patient_id, room_id, start_at, end_at) "
+                        "VALUES (?, ?, ?, ?);", stays)
+    return len(stays)
+
+
+def desk_day(rnd, writes, patients, doctors):
+    """One day of desk writes, about `writes` rows. Returns {kind: rows}."""
+    now = datetime.now().replace(microsecond=0)
+    midnight = datetime.combine(now.date(), datetime.min.time())
+    done = {}
+    with DB.conn_cursor() as (_, cur):
+        cur.execute("SELECT MAX(id) AS n FROM dbo.appointments;")
+        older = cur.fetchone().n or 0
+        booked = [(rnd.randint(1, patients), rnd.randint(1, doctors),
+                   midnight + timedelta(days=rnd.randint(1, 45), minutes=8 * 60 + 30 * rnd.randrange(16)))
+                  for _ in range(writes * 6 // 10)]
+        cur.executemany("INSERT INTO dbo.appointments (patient_id, doctor_id, appointment_at, status) "
+                        "VALUES (?, ?, ?, 'Scheduled');", booked)
+        done["booked"] = len(booked)
+
+        cur.execute("SELECT id FROM dbo.appointments WHERE appointment_at >= ? AND appointment_at < ? "
+                    "AND status = 'Scheduled';", (midnight, midnight + timedelta(days=1)))
+        todays = [r.id for r in cur.fetchall()]
+        cur.executemany("UPDATE dbo.appointments SET status = ? WHERE id = ?;",
+                        [(rnd.choice(("Completed", "Completed", "Completed", "No-Show")), a) for a in todays])
+        done["visits"] = len(todays)
+
+        labs = [(rnd.randint(1, patients), rnd.choice(LAB_TESTS), rnd.randint(1, doctors),
+                 now - timedelta(minutes=rnd.randrange(600))) for _ in range(writes * 2 // 10)]
+        cur.executemany("INSERT INTO dbo.lab_tests (patient_id, test_type, ordered_by_doctor_id, ordered_at) "
+                        "VALUES (?, ?, ?, ?);", labs)
+        done["lab tests"] = len(labs)
+
+        # discharge some current stays and admit someone else to those rooms
+        cur.execute("SELECT id, room_id FROM dbo.room_assignments WHERE end_at IS NULL AND start_at < ?;", (now,))
+        current = cur.fetchall()
+        moves = rnd.sample(current, min(len(current), max(writes // 100, 1)))
+        cur.executemany("UPDATE dbo.room_assignments SET end_at = ? WHERE id = ?;", [(now, r.id) for r in moves])
+        cur.executemany("INSERT INTO dbo.room_assignments (patient_id, room_id, start_at) VALUES (?, ?, ?);",
+                        [(rnd.randint(1, patients), r.room_id, now) for r in moves])
+        done["room moves"] = len(moves)
+
+        # corrections to older days: visits cancelled after the fact, anywhere in the history
+        corrections = [(rnd.randint(1, older),) for _ in range(max(writes // 200, 1)) if older]
+        cur.executemany("UPDATE dbo.appointments SET status = 'Cancelled' WHERE id = ?;", corrections)
+        done["corrections"] = len(corrections)
+    billed = DB.bill_services(now.date(), now.date() + timedelta(days=1))
+    done["billed lines"] = sum(n for n, _ in billed["lines"].values())
+    return done
+
+
+def snapshot(today):
+    """Every rollup row; today's room rows are left out (open stays accrue until the moment of refresh)."""
+    rows = {}
+    with DB.conn_cursor() as (_, cur):
+        for table in ROLLUPS:
+            cur.execute(f"SELECT * FROM dbo.{table} ORDER BY 1, 2;")
+            rows[table] = [tuple(r) for r in cur.fetchall() if not (table == "report_room_day" and r[0] == today)]
+    return rows
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--patients", type=int, default=100_000)
+    ap.add_argument("--doctors", type=int, default=500)
+    ap.add_argument("--rounds", type=int, default=5, help="simulated days")
+    ap.add_argument("--writes", type=int, default=5000, help="rows written per simulated day")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--sqlite", metavar="PATH", help="use this SQLite file (default: a copy of the generated one)")
+    args = ap.parse_args(argv)
+
+    if args.sqlite:
+        DB.use_sqlite(args.sqlite)
+    else:
+        from run import sqlite_copy
+        DB.use_sqlite(sqlite_copy(args))
+    rnd = random.Random(args.seed)
+    seeded = seed_room_stays(rnd)
+    if seeded:
+        print(f"seeded {seeded:,} room stays")
+    first = Reports.refresh(full=True)
+    print(f"first build: {first['days']:,} days in {first['seconds'] * 1000:.0f} ms")
+
+    incremental, full, mismatches = [], [], 0
+    for i in range(args.rounds):
+        writes = desk_day(rnd, args.writes, args.patients, args.doctors)
+        today = date.today()
+        r = Reports.refresh()
+        incremental.append(r["seconds"])
+        after_refresh = snapshot(today)
+        f = Reports.refresh(full=True)
+        full.append(f["seconds"])
+        same = after_refresh == snapshot(today)
+        mismatches += not same
+        print(f"day {i + 1}: {', '.join(f'{n:,} {kind}' for kind, n in writes.items())}\n"
+              f"       refresh {r['seconds'] * 1000:7.1f} ms ({r['days']:,} days from {r['changes']:,} logged changes)"
+              f"   full rebuild {f['seconds'] * 1000:7.1f} ms ({f['days']:,} days)   "
+              f"{'same rollups' if same else 'ROLLUPS DIFFER'}")
+
+    pi, pf = percentiles(incremental), percentiles(full)
+    print(f"refresh from watermark  p50={pi[50]:8.1f} ms  max={max(incremental) * 1000:8.1f} ms")
+    print(f"full rebuild            p50={pf[50]:8.1f} ms  max={max(full) * 1000:8.1f} ms   "
+          f"({pf[50] / pi[50]:.0f}x the refresh)")
+    t0 = time.perf_counter()
+    end = date.today() + timedelta(days=1)
+    DB.get_report_dashboard(end - timedelta(days=31), end)
+    print(f"30-day dashboard read from the rollups: {(time.perf_counter() - t0) * 1000:.1f} ms")
+    DB.get_pool().close()
+    if mismatches:
+        print(f"{mismatches} of {args.rounds} refreshes did not match a full rebuild")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
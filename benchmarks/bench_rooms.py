@@ -0,0 +1,114 @@
+"""
+Room census benchmark: concurrent admissions against the in-memory interval index.
+
+    python benchmarks/bench_rooms.py --rooms 400 --history 200 --threads 16
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app", "src")))
+
+from RoomCensus import RoomCensusEngine, RoomOccupiedError  # noqa: E402
+from bench_scheduling import percentiles  # noqa: E402
+
+WARDS = ("General", "ICU", "Maternity", "Pediatrics", "Surgery")
+
+
+def synth(rooms, history, now):
+    """Each room gets `history` back-to-back past stays of 1-5 days; ~60% are occupied right now."""
+    rnd = random.Random(42)
+    room_rows = [(r, f"R{r:04d}", WARDS[r % len(WARDS)]) for r in range(1, rooms + 1)]
+    assignments, aid = [], 0
+    for r, _, _ in room_rows:
+        t = now - timedelta(days=history * 4)
+        for _ in range(history):
+            end = t + timedelta(days=rnd.randint(1, 5))
+            if end >= now:
+                break
+            aid += 1
+            assignments.append((aid, r, aid, t, end))
+            t = end
+        if rnd.random() < 0.6:
+            aid += 1
+            assignments.append((aid, r, aid, max(t, now - timedelta(days=1)), None))
+    return room_rows, assignments, aid
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--rooms", type=int, default=400)
+    ap.add_argument("--history", type=int, default=200, help="past stays per room")
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--admissions", type=int, default=4000, help="admission attempts across all threads")
+    ap.add_argument("--queries", type=int, default=1000)
+    args = ap.parse_args(argv)
+
+    now = datetime.now().replace(second=0, microsecond=0)
+    rooms, assignments, last_id = synth(args.rooms, args.history, now)
+    engine = RoomCensusEngine()
+    t0 = time.perf_counter()
+    engine.load(rooms, assignments, now)
+    print(f"index build: {len(assignments):,} assignments in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    rnd = random.Random(7)
+
+    def free_window():
+        start = now + timedelta(hours=rnd.randrange(24 * 30))
+        return engine.free_rooms(start, start + timedelta(days=3), rnd.choice(WARDS))
+
+    for label, fn in (("free rooms, 3-day window", free_window),
+                      ("census by ward", lambda: engine.census(now))):
+        samples = []
+        for _ in range(args.queries):
+            t0 = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - t0)
+        p = percentiles(samples)
+        print(f"{label}: p50={p[50]:.3f} ms p95={p[95]:.3f} ms p99={p[99]:.3f} ms")
+
+    # concurrent admissions with the SQL insert stubbed out; every desk races for the same two weeks
+    ids = itertools.count(last_id + 1)
+    admitted, refused = [], [0]
+    lock = threading.Lock()
+
+    def desk(seed):
+        r = random.Random(seed)
+        for _ in range(args.admissions // args.threads):
+            room = r.randint(1, args.rooms)
+            start = now + timedelta(hours=r.randrange(24 * 14))
+            end = start + timedelta(hours=r.randint(12, 96))
+            try:
+                aid = engine.admit(seed, room, start, end, insert=lambda *a: next(ids))
+                with lock:
+                    admitted.append((room, start, end, aid))
+            except RoomOccupiedError:
+                with lock:
+                    refused[0] += 1
+
+    threads = [threading.Thread(target=desk, args=(s,)) for s in range(args.threads)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    print(f"{args.threads} desks: {len(admitted)} admitted, {refused[0]} refused in {elapsed * 1000:.0f} ms")
+
+    # no two accepted admissions of the same room may overlap
+    by_room = {}
+    for room, start, end, _ in admitted:
+        by_room.setdefault(room, []).append((start, end))
+    overlaps = sum(1 for stays in by_room.values()
+                   for (s1, e1), (s2, _) in zip(sorted(stays), sorted(stays)[1:]) if s2 < e1)
+    print(f"overlapping admissions: {overlaps}")
+    return 1 if overlaps else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
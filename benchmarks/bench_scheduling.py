@@ -0,0 +1,88 @@
+"""
+Scheduling engine benchmark: 500 doctors x one year of appointments, in memory.
+
+    python benchmarks/bench_scheduling.py --doctors 500 --days 365 --fill 0.7
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app", "src")))
+
+import Scheduling  # noqa: E402
+from Scheduling import SchedulingEngine, SlotTakenError  # noqa: E402
+
+
+def synth(doctors, days, fill, specializations, start, slot):
+    """Doctors spread over specializations; each working-day slot booked with probability `fill`."""
+    rnd = random.Random(42)
+    docs = [(d, f"Doctor {d}", d % specializations + 1) for d in range(1, doctors + 1)]
+    per_day = (Scheduling.DAY_END - Scheduling.DAY_START) // slot
+    booked = []
+    for day in range(days):
+        date = start + timedelta(days=day)
+        if date.weekday() not in Scheduling.WORK_DAYS:
+            continue
+        base = date + timedelta(minutes=Scheduling.DAY_START)
+        for d, _, _ in docs:
+            for k in range(per_day):
+                if rnd.random() < fill:
+                    booked.append((d, base + timedelta(minutes=k * slot)))
+    return docs, booked
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {p: samples[min(len(samples) - 1, int(len(samples) * p / 100))] * 1000 for p in (50, 95, 99)}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--doctors", type=int, default=500)
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--fill", type=float, default=0.7, help="share of slots already booked")
+    ap.add_argument("--specializations", type=int, default=20)
+    ap.add_argument("--queries", type=int, default=1000)
+    args = ap.parse_args(argv)
+
+    start = datetime(2030, 1, 1)
+    engine = SchedulingEngine()
+    t0 = time.perf_counter()
+    docs, booked = synth(args.doctors, args.days, args.fill, args.specializations, start, engine.slot)
+    print(f"generated {len(booked):,} appointments in {time.perf_counter() - t0:.1f}s")
+
+    t0 = time.perf_counter()
+    engine.load(docs, booked, start, start + timedelta(days=args.days))
+    print(f"index build: {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    rnd = random.Random(7)
+    for label, spec in (("per specialization", True), ("all doctors", False)):
+        samples = []
+        for _ in range(args.queries):
+            after = start + timedelta(minutes=rnd.randrange(args.days * 1440))
+            t0 = time.perf_counter()
+            engine.next_free_slots(rnd.randint(1, args.specializations) if spec else None, n=10, after=after)
+            samples.append(time.perf_counter() - t0)
+        p = percentiles(samples)
+        print(f"next 10 free slots ({label}): p50={p[50]:.2f} ms p95={p[95]:.2f} ms p99={p[99]:.2f} ms")
+
+    # booking path with the SQL round trip stubbed out: measures the in-memory conflict check
+    samples, taken = [], 0
+    for i in range(args.queries):
+        when, doctor_id = engine.next_free_slots(None, n=1, after=start + timedelta(days=rnd.randrange(args.days)))[0]
+        t0 = time.perf_counter()
+        try:
+            engine.book(i, doctor_id, when, book=lambda *a: 1)
+            engine.book(i, doctor_id, when, book=lambda *a: 1)  # second desk, same slot
+        except SlotTakenError:
+            taken += 1
+        samples.append(time.perf_counter() - t0)
+    p = percentiles(samples)
+    print(f"book + conflicting rebook: p50={p[50]:.3f} ms p99={p[99]:.3f} ms, conflicts caught {taken}/{args.queries}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Clinical full-text search benchmark: millions of notes in SQLite (FTS5).
+
+    python benchmarks/bench_search.py --notes 2000000     # generated once into benchmarks/data, then reused
+    python benchmarks/bench_search.py --notes 200000 --queries 200
+
+Notes are synthetic diagnoses, treatment plans and lab results, two thirds
+medical records and one third lab tests, spread over 20 notes per patient and
+ten years. They are loaded through the index triggers in batches; the run then
+times ranked queries with and without filters, and single-note writes.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(HERE, "..", "app", "src")))
+
+import DB  # noqa: E402
+import generate_data  # noqa: E402
+from bench_scheduling import percentiles  # noqa: E402
+
+CONDITIONS = ("type 2 diabetes mellitus", "essential hypertension", "community acquired pneumonia",
+              "acute bronchitis", "asthma exacerbation", "chronic kidney disease stage 3", "iron deficiency anemia",
+              "migraine without aura", "gastroesophageal reflux disease", "urinary tract infection",
+              "atrial fibrillation", "hypothyroidism", "osteoarthritis of the knee", "major depressive disorder",
+              "generalized anxiety disorder", "hyperlipidemia", "acute otitis media", "streptococcal pharyngitis",
+              "low back pain", "contact dermatitis", "cellulitis of the lower leg", "congestive heart failure",
+              "chronic obstructive pulmonary disease", "vitamin D deficiency", "gout flare", "peptic ulcer",
+              "allergic rhinitis", "acute sinusitis", "viral gastroenteritis", "sprained ankle")
+RARE_CONDITIONS = ("sarcoidosis", "myasthenia gravis", "pheochromocytoma", "Kawasaki disease", "Addison disease",
+                   "Guillain-Barré syndrome", "Wilson disease", "pemphigus vulgaris")
+QUALIFIERS = ("suspected", "confirmed", "mild", "moderate", "severe", "recurrent", "resolving", "worsening",
+              "stable", "poorly controlled", "well controlled")
+TREATMENTS = ("metformin 500 mg twice daily", "lisinopril 10 mg daily", "amoxicillin 500 mg three times daily",
+              "salbutamol inhaler as needed", "omeprazole 20 mg before breakfast", "levothyroxine 50 mcg daily",
+              "atorvastatin 20 mg at night", "ibuprofen 400 mg as needed", "physiotherapy twice weekly",
+              "low salt diet and daily walking", "ferrous sulfate 325 mg daily", "sertraline 50 mg daily",
+              "cognitive behavioural therapy referral", "nitrofurantoin 100 mg for 5 days",
+              "warfarin with INR monitoring", "rest, ice, compression and elevation", "follow-up in two weeks",
+              "refer to cardiology", "refer to nephrology", "repeat blood tests in three months")
+LAB_RESULTS = {
+    "CBC": ("hemoglobin {:.1f} g/dL, microcytic anemia", "white cell count {:.1f}, leukocytosis",
+            "within normal limits"),
+    "HbA1c": ("HbA1c {:.1f}% above target", "HbA1c {:.1f}% at target"),
+    "TSH": ("TSH {:.1f} mIU/L raised", "TSH {:.1f} mIU/L normal"),
+    "Urinalysis": ("nitrites positive, leukocytes 3+", "protein trace", "no abnormality detected"),
+    "Lipid panel": ("LDL {:.1f} mmol/L high", "triglycerides {:.1f} mmol/L elevated", "within normal limits"),
+    "Liver panel": ("ALT {:.0f} U/L elevated", "bilirubin normal, enzymes normal"),
+    "Kidney panel": ("creatinine {:.0f} µmol/L, eGFR reduced", "electrolytes within normal limits"),
+    "CRP": ("CRP {:.0f} mg/L elevated, consistent with infection", "CRP normal"),
+}
+
+
+def _diagnosis(rnd):
+    condition = rnd.choice(RARE_CONDITIONS) if rnd.random() < 0.002 else CONDITIONS[
+        min(int(rnd.paretovariate(1.2)) - 1, len(CONDITIONS) - 1)]  # a few conditions dominate, like real notes
+    text = f"{rnd.choice(QUALIFIERS)} {condition}"
+    if rnd.random() < 0.3:
+        text += f" with {rnd.choice(CONDITIONS)}"
+    return text
+
+
+def notes(count, patients, doctors, user_id, seed=42, years=10):
+    """Yield ("medical_records" | "lab_tests", row) for `count` notes, deterministic for a seed."""
+    rnd = random.Random(seed)
+    start = datetime.combine(datetime.today(), datetime.min.time()) - timedelta(days=365 * years)
+    span = 365 * years * 1440
+    for _ in range(count):
+        pid, at = rnd.randint(1, patients), start + timedelta(minutes=rnd.randrange(span))
+        if rnd.random() < 2 / 3:
+            plan = "; ".join(rnd.sample(TREATMENTS, rnd.randint(1, 3)))
+            yield "medical_records", (pid, _diagnosis(rnd), plan, user_id, at)
+        else:
+            test = rnd.choice(tuple(LAB_RESULTS))
+            yield "lab_tests", (pid, test, rnd.choice(LAB_RESULTS[test]).format(rnd.uniform(1, 200)),
+                                rnd.randint(1, doctors), at)
+
+
+COLUMNS = {
+    "medical_records": ("patient_id", "diagnosis", "treatment_plan", "created_by_user_id", "created_at"),
+    "lab_tests": ("patient_id", "test_type", "result", "ordered_by_doctor_id", "ordered_at"),
+}
+
+
+def seed_notes(count, patients, doctors, user_id, seed=42, batch=20_000):
+    """Insert generated notes in batches (the index triggers run for every row)."""
+    pending = {table: [] for table in COLUMNS}
+    sqlite = DB.get_backend().dialect == "sqlite"
+
+    def flush(cur):
+        for table, rows in pending.items():
+            if rows:
+                generate_data.insert_batch(cur, table, COLUMNS[table], rows, sqlite)
+                rows.clear()
+
+    with DB.conn_cursor() as (conn, cur):
+        for i, (table, row) in enumerate(notes(count, patients, doctors, user_id, seed), 1):
+            pending[table].append(row)
+            if i % batch == 0:
+                flush(cur)
+                conn.commit()
+        flush(cur)
+
+
+def queries(rnd, n):
+    """(label, search text) pairs: common, rare, multi-term and prefix queries."""
+    common = ("hypertension", "diabetes", "anemia", "normal", "elevated", "pneumonia")
+    rare = tuple(c.split()[0].lower() for c in RARE_CONDITIONS)
+    words = sorted({w for c in CONDITIONS + TREATMENTS for w in c.lower().replace(",", "").split() if len(w) > 4})
+    kinds = (
+        ("1 common term", lambda: rnd.choice(common)),
+        ("1 rare term", lambda: rnd.choice(rare)),
+        ("2 terms", lambda: f"{rnd.choice(QUALIFIERS).split()[-1]} {rnd.choice(words)}"),
+        ("3 terms", lambda: " ".join(rnd.sample(words, 2) + [rnd.choice(common)])),
+        ("prefix (as you type)", lambda: rnd.choice(words)[:4]),
+    )
+    for label, make in kinds:
+        for _ in range(n):
+            yield label, make()
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - t0, result
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--notes", type=int, default=2_000_000)
+    ap.add_argument("--queries", type=int, default=100, help="per query kind")
+    ap.add_argument("--limit", type=int, default=50)
+    args = ap.parse_args(argv)
+
+    patients, doctors = max(args.notes // 20, 1000), 100
+    path = os.path.join(HERE, "data", f"notes_{args.notes}.sqlite3")
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        DB.use_sqlite(path + ".part")
+        gen = generate_data.parser().parse_args(["--patients", str(patients), "--doctors", str(doctors),
+                                                 "--lab-tests", "0", "--invoices", "0"])
+        generate_data.generate(gen, log=lambda *_: None)
+        DB.create_user_plain("notes", "x", party_id=patients + 1)
+        user_id = DB.get_user_by_username("notes")["id"]
+        elapsed, _ = timed(seed_notes, args.notes, patients, doctors, user_id)
+        print(f"indexed {args.notes:,} notes through the triggers in {elapsed:.0f}s "
+              f"({args.notes / elapsed:,.0f} notes/s)")
+        DB.get_pool().close()
+        conn = sqlite3.connect(path + ".part")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.close()
+        os.replace(path + ".part", path)
+    DB.use_sqlite(path)
+    print(f"{args.notes:,} notes, {patients:,} patients, {os.path.getsize(path) / 2 ** 20:,.0f} MB")
+
+    rnd = random.Random(7)
+    DB.search_clinical("warm up")
+    by_kind = {}
+    for label, text in queries(rnd, args.queries):
+        by_kind.setdefault(label, []).append(timed(DB.search_clinical, text, limit=args.limit))
+    for label, text in queries(rnd, args.queries // 2):
+        if label in ("1 common term", "2 terms"):
+            by_kind.setdefault(f"{label}, one patient", []).append(
+                timed(DB.search_clinical, text, patient_id=rnd.randint(1, patients), limit=args.limit))
+            since = datetime.today().date() - timedelta(days=rnd.randint(30, 365))
+            by_kind.setdefault(f"{label}, last months", []).append(
+                timed(DB.search_clinical, text, date_from=since, limit=args.limit))
+    for label, runs in by_kind.items():
+        p = percentiles([t for t, _ in runs])
+        hits = sum(len(rows) for _, rows in runs) / len(runs)
+        print(f"{label:<32} p50={p[50]:7.2f} ms  p95={p[95]:7.2f} ms  p99={p[99]:7.2f} ms  {hits:5.1f} hits")
+
+    # incremental maintenance: one note per transaction, as the app writes them
+    samples, written = [], []
+    user_id = DB.get_user_by_username("notes")["id"]
+    for table, row in notes(args.queries, patients, doctors, user_id, seed=99):
+        t0 = time.perf_counter()
+        with DB.conn_cursor() as (_, cur):
+            cur.execute(f"INSERT INTO dbo.{table} ({', '.join(COLUMNS[table])}) VALUES (?, ?, ?, ?, ?) RETURNING id;",
+                        row)
+            written.append((table, cur.fetchone()[0]))
+        samples.append(time.perf_counter() - t0)
+    p = percentiles(samples)
+    print(f"{'insert one note (+ index)':<32} p50={p[50]:7.2f} ms  p95={p[95]:7.2f} ms  p99={p[99]:7.2f} ms")
+    with DB.conn_cursor() as (_, cur):  # leave the cached data set as it was
+        for table, note_id in written:
+            cur.execute(f"DELETE FROM dbo.{table} WHERE id = ?;", (note_id,))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Cold start benchmark: fresh app processes, from launch to the first patient page.
+
+    python benchmarks/bench_startup.py                          # 10 starts, 100k patients, offscreen
+    python benchmarks/bench_startup.py --budget-ms 1500         # exit 1 if the p50 start is over budget
+    python benchmarks/bench_startup.py --runtime-ui             # parse the .ui XML like before (compare)
+
+Each run starts `HMS.main --startup-check` in a new interpreter on a copy of
+the generated SQLite database (see run.py) with QT_QPA_PLATFORM=offscreen.
+The login form is filled in and submitted as soon as it is shown, so the
+"waiting for sign-in" phase is just the password check. The first run also
+compiles any stale .ui forms (UiLoader) and is reported on its own.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.abspath(os.path.join(HERE, "..", "app", "src"))
+sys.path.insert(0, SRC)
+
+USERNAME, PASSWORD = "startup", "startup"
+
+
+def child(budget_ms):
+    """One app start with a sign-in that types at machine speed (runs in the new process)."""
+    import StartupProfile  # noqa: F401  the clock starts here, as in HMS.py
+    import HMS
+    from PyQt5.QtCore import QTimer
+
+    class AutoLogin(HMS.LoginDialog):
+        def showEvent(self, event):
+            super().showEvent(event)
+            QTimer.singleShot(0, self._sign_in)
+
+        def _sign_in(self):
+            self.txtUsername.setText(USERNAME)
+            self.txtPassword.setText(PASSWORD)
+            self.btnLogin.click()
+
+    HMS.LoginDialog = AutoLogin
+    argv = ["--startup-check"] + (["--startup-budget-ms", str(budget_ms)] if budget_ms else [])
+    return HMS.main(argv)
+
+
+def start_once(db_path, runtime_ui, budget_ms):
+    """(profile dict, seconds from spawn to exit) of one cold start."""
+    fd, out = tempfile.mkstemp(suffix=".json", prefix="hms_startup_")
+    os.close(fd)
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen", HMS_DB_DRIVER="sqlite", HMS_SQLITE_PATH=db_path,
+               HMS_STARTUP_PROFILE_JSON=out, HMS_UI_RUNTIME="1" if runtime_ui else "0")
+    env.pop("HMS_STARTUP_PROFILE", None)  # the parent prints the summary
+    t0 = time.perf_counter()
+    cmd = [sys.executable, os.path.abspath(__file__), "--child"]
+    if budget_ms:
+        cmd += ["--budget-ms", str(budget_ms)]
+    proc = subprocess.run(cmd, env=env, cwd=SRC, capture_output=True, text=True, timeout=120)
+    elapsed = time.perf_counter() - t0
+    try:
+        with open(out, encoding="utf-8") as f:
+            profile = json.load(f)
+    except ValueError:
+        sys.exit(f"the app did not get to the patient list (exit {proc.returncode}):\n{proc.stderr}")
+    finally:
+        os.remove(out)
+    return profile, elapsed
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--patients", type=int, default=100_000)
+    ap.add_argument("--doctors", type=int, default=200)
+    ap.add_argument("--budget-ms", type=float, help="cold start to interactive budget for the p50 run")
+    ap.add_argument("--runtime-ui", action="store_true", help="HMS_UI_RUNTIME=1: no precompiled forms")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+    if args.child:
+        return child(args.budget_ms)
+
+    import DB
+    from bench_scheduling import percentiles
+    from run import sqlite_copy
+
+    db_path = sqlite_copy(args)
+    DB.use_sqlite(db_path)
+    DB.create_user_plain(USERNAME, PASSWORD, party_id=args.patients + 1)  # a generated doctor's party
+    DB.get_pool().close()
+
+    runs = [start_once(db_path, args.runtime_ui, args.budget_ms) for _ in range(args.runs + 1)]
+    (first, first_wall), rest = runs[0], runs[1:]
+    print(f"{'first start (compiles stale .ui)':<34} interactive {first['interactive_ms']:7.1f} ms  "
+          f"process {first_wall * 1000:7.1f} ms")
+
+    by_phase = {}
+    for profile, _ in rest:
+        for phase, ms, counted in profile["phases"]:
+            by_phase.setdefault((phase, counted), []).append(ms / 1000)
+    for (phase, counted), samples in by_phase.items():
+        p = percentiles(samples)
+        print(f"  {phase:<32} p50={p[50]:7.1f} ms  p95={p[95]:7.1f} ms{'' if counted else '  (not counted)'}")
+    p = percentiles([profile["interactive_ms"] / 1000 for profile, _ in rest])
+    wall = percentiles([elapsed for _, elapsed in rest])
+    print(f"{'interactive after':<34} p50={p[50]:7.1f} ms  p95={p[95]:7.1f} ms  "
+          f"({len(rest)} starts, {'runtime .ui' if args.runtime_ui else 'precompiled .ui'})")
+    print(f"{'process start to exit':<34} p50={wall[50]:7.1f} ms  p95={wall[95]:7.1f} ms")
+    if args.budget_ms and p[50] > args.budget_ms:
+        print(f"over budget: p50 {p[50]:.1f} ms > {args.budget_ms:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
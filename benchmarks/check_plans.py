@@ -0,0 +1,247 @@
+"""
+Query-plan regression check for the statements in DB.py.
+
+    python benchmarks/check_plans.py                # SQLite, fresh generated data set
+    python benchmarks/check_plans.py --update       # accept the current findings as the baseline
+    HMS_DB_DRIVER=pyodbc python benchmarks/check_plans.py --driver env   # SQL Server (use a scratch DB)
+
+Runs a workload that touches every DB.py statement, captures each statement's
+plan once (EXPLAIN QUERY PLAN on SQLite, SET SHOWPLAN_XML on SQL Server) and
+reports table/index scans and key lookups. Findings already listed in
+plan_baseline.json for the same dialect are accepted; anything new exits 1.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(HERE, "..", "app", "src")))
+
+import DB  # noqa: E402
+import generate_data  # noqa: E402
+from QueryStats import normalize_sql  # noqa: E402
+
+BASELINE = os.path.join(HERE, "plan_baseline.json")
+
+_ALIAS = re.compile(r"\b(?:dbo\.)?(\w+)\s+AS\s+(\w+)\b", re.IGNORECASE)
+_SQLITE_ACCESS = re.compile(r"^(SCAN|SEARCH) (?:(\w+)\.)?(\w+)(?: USING (COVERING INDEX|INDEX|INTEGER PRIMARY KEY|"
+                            r"PRIMARY KEY|AUTOMATIC COVERING INDEX|AUTOMATIC PARTIAL COVERING INDEX)\b ?(\w*))?")
+_SQLITE_FTS_MATCH = re.compile(r"VIRTUAL TABLE INDEX \d+:\S*M")  # FTS5 MATCH: a full-text index search
+_SHOWPLAN = "{http://schemas.microsoft.com/sqlserver/2004/07/showplan}"
+_MSSQL_SCANS = {"Table Scan": "scan", "Clustered Index Scan": "scan", "Index Scan": "index scan"}
+
+
+
+def sqlite_findings(cur, sql, params):
+    """Scans and non-covering index lookups from EXPLAIN QUERY PLAN."""
+    # only real tables count: CTEs, subqueries and temp staging tables are scanned by design
+    cur.execute("SELECT name FROM dbo.sqlite_master WHERE type = 'table'")
+    tables = {r[0] for r in cur.fetchall()}
+    aliases = {alias.lower(): table for table, alias in _ALIAS.findall(sql)}
+    cur.execute("EXPLAIN QUERY PLAN " + sql, params)
+    found = set()
+    for row in cur.fetchall():
+        m = _SQLITE_ACCESS.match(row[3])
+        if not m or _SQLITE_FTS_MATCH.search(row[3]):
+            continue  # CONSTANT ROW, subqueries, temp b-trees
+        op, schema, name, using, index = m.groups()
+        table = aliases.get(name.lower(), name)
+        if schema == "temp" or table not in tables:
+            continue
+        if op == "SCAN":
+            found.add(f"index scan {table} ({index})" if using == "COVERING INDEX" else f"scan {table}")
+        elif using == "INDEX":
+            found.add(f"key lookup {table} ({index})")
+        elif using and using.startswith("AUTOMATIC"):
+            found.add(f"automatic index {table}")
+    return found
+
+
+def mssql_findings(cur, sql, params):
+    """Scans and key/RID lookups from the estimated SHOWPLAN_XML plans."""
+    cur.execute("SET SHOWPLAN_XML ON;")
+    try:
+        cur.execute(sql, params) if params != () else cur.execute(sql)
+        plans = []
+        while True:
+            if cur.description:
+                plans += [r[0] for r in cur.fetchall()]
+            if not cur.nextset():
+                break
+    finally:
+        cur.execute("SET SHOWPLAN_XML OFF;")
+    found = set()
+    for xml in plans:
+        for relop in ET.fromstring(xml).iter(_SHOWPLAN + "RelOp"):
+            op = relop.get("PhysicalOp")
+            scan = relop.find(f"./{_SHOWPLAN}IndexScan")
+            if scan is None:
+                scan = relop.find(f"./{_SHOWPLAN}TableScan")
+            obj = scan.find(f"./{_SHOWPLAN}Object") if scan is not None else None
+            if obj is None:
+                continue
+            table = (obj.get("Table") or "").strip("[]")
+            index = (obj.get("Index") or "").strip("[]")
+            if not table or table[0] in "#@":
+                continue  # temp tables and table variables
+            if op == "RID Lookup" or scan.get("Lookup") in ("1", "true"):
+                found.add(f"key lookup {table} ({index})")
+            elif op in _MSSQL_SCANS:
+                found.add(f"{_MSSQL_SCANS[op]} {table}" + (f" ({index})" if op == "Index Scan" else ""))
+    return found
+
+
+class PlanCapture:
+    """DB.plan_hook: explains each (function, statement) the first time it runs."""
+
+    def __init__(self, dialect):
+        self.explain = sqlite_findings if dialect == "sqlite" else mssql_findings
+        self.findings = {}  # function -> set of findings
+        self.seen = set()
+        self.errors = []
+
+    def __call__(self, cur, function, sql, params):
+        key = (function, normalize_sql(sql))
+        if key in self.seen:
+            return
+        self.seen.add(key)
+        try:
+            found = self.explain(cur, sql, params)
+        except Exception as e:  # DDL and the like cannot always be explained
+            self.errors.append(f"{function}: {e}")
+            return
+        self.findings.setdefault(function, set()).update(found)
+
+
+def workload(args):
+    """Exercise every DB.py statement at least once."""
+    now = datetime.combine(datetime.now().date(), datetime.min.time()) + timedelta(days=1, hours=9)
+    tag = datetime.now().strftime("%H%M%S")
+    patient = {"FirstName": "Plan", "LastName": "Check", "NationalID": f"PLAN{tag}",
+               "Address": "1 Main St", "Gender": "Female", "BirthDate": None, "Phone": "0900"}
+
+    DB.list_patients_page(None, 200)
+    first = DB.list_patients_page(args.patients // 2, 200)
+    DB.search_patients("Ka", 50)
+    DB.search_patients("Ka", 50, cursor=first[0][0] if first else None)
+    DB.search_patients("0000012", 50)
+    watermark = DB.patient_change_watermark()
+    DB.get_patient_by_id(args.patients // 3)
+    DB.get_patient_row_version(args.patients // 3)
+    pid = DB.insert_patient(patient)
+    DB.insert_patients_bulk(list(enumerate([{**patient, "NationalID": f"PLANB{tag}{i}"} for i in range(3)]
+                                           + [patient])))  # the last one is a duplicate, rejected
+    row = DB.get_patient_by_id(pid)
+    DB.update_patient(pid, {**patient, "Address": "2 Main St"}, row.get("RowVersion") if row else None)
+    DB.update_patient(pid, {**patient, "Address": "3 Main St"})
+    DB.list_patient_changes(watermark, 500)
+    DB.prune_patient_changes()
+    DB.insert_appointment(pid, 1, now)
+    DB.book_appointment(pid, 2, now)
+    DB.list_booked_appointments(now, now + timedelta(days=7))
+    DB.list_specializations()
+    DB.list_doctors()
+    DB.list_rooms()
+    DB.list_room_assignments(now)
+    aid = DB.insert_room_assignment(pid, 1, now + timedelta(days=400))
+    if aid:
+        DB.end_room_assignment(aid, now + timedelta(days=401))
+    DB.create_user_plain(f"plan{tag}", "x", party_id=1)
+    DB.verify_user_password_plain(f"plan{tag}", "x")
+    user_id = DB.get_user_by_username(f"plan{tag}")["id"]
+    DB.list_medicines()
+    batches = DB.list_dispensable_batches(now.date())
+    DB.list_dispensable_batches(now.date(), 1)
+    batch_id = DB.receive_batch(1, f"PLAN{tag}", (now + timedelta(days=90)).date(), 10, user_id)
+    DB.dispense_stock([(batch_id, 2)] + [(b[0], 1) for b in batches[:2]], user_id)
+    DB.list_medicine_stock()
+    DB.list_near_expiry((now + timedelta(days=30)).date())
+    DB.bill_services(now.date() - timedelta(days=3), now.date())
+    for _ in DB.iter_invoice_lines(now.date() - timedelta(days=3), now.date()):
+        pass
+    timeline = DB.get_patient_timeline(pid, 5)
+    for section, rows in timeline.items():
+        DB.list_timeline_section(pid, section, (rows[-1][1], rows[-1][0]) if rows else (now, 1 << 30), 5)
+    DB.list_timeline_section(pid, "lab_tests", (None, 1 << 30), 5)
+    for table in DB.EXPORT_TABLES:
+        for _ in DB.iter_export(table, 100, batch=1000):
+            break
+    for _ in DB.iter_patient_match_fields(batch=1000):
+        break
+    DB.get_patient_match_fields([pid, 1, 2])
+    DB.search_clinical("follow up")
+    DB.search_clinical("cb", pid, now.date() - timedelta(days=365), now.date())
+    DB.list_patients()
+
+
+def diff(findings, accepted):
+    """{function: [new findings]} not covered by the baseline."""
+    new = {}
+    for function, found in findings.items():
+        extra = sorted(found - set(accepted.get(function, ())))
+        if extra:
+            new[function] = extra
+    return new
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--driver", choices=("sqlite", "env"), default="sqlite",
+                    help="sqlite: freshly generated SQLite file; env: the backend HMS_DB_DRIVER selects")
+    ap.add_argument("--patients", type=int, default=20_000, help="generated data size (sqlite)")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--update", action="store_true", help="record the current findings as accepted")
+    args = ap.parse_args(argv)
+
+    work = None
+    if args.driver == "sqlite":
+        work = tempfile.mkdtemp(prefix="hms_plans_")
+        DB.use_sqlite(os.path.join(work, "hms.sqlite3"))
+        gen = generate_data.parser().parse_args(["--patients", str(args.patients), "--doctors", "100"])
+        generate_data.generate(gen, log=lambda *_: None)
+    dialect = DB.get_backend().dialect
+
+    capture = PlanCapture(dialect)
+    DB.plan_hook = capture
+    try:
+        workload(args)
+    finally:
+        DB.plan_hook = None
+        DB.get_pool().close()
+        if work:
+            shutil.rmtree(work, ignore_errors=True)
+
+    for error in capture.errors:
+        print(f"not explained: {error}")
+    for function in sorted(capture.findings):
+        for finding in sorted(capture.findings[function]):
+            print(f"{function:<28} {finding}")
+
+    stored = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            stored = json.load(f)
+    if args.update:
+        stored[dialect] = {function: sorted(found) for function, found in sorted(capture.findings.items()) if found}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"plan baseline saved for {dialect}")
+        return 0
+    new = diff(capture.findings, stored.get(dialect, {}))
+    for function, extra in sorted(new.items()):
+        for finding in extra:
+            print(f"NEW PLAN FINDING {function}: {finding}")
+    if not new:
+        print(f"ok: {len(capture.seen)} statements, no plan findings beyond the {dialect} baseline")
+    return 1 if new else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+Synthetic HMS data: patients with appointments, prescriptions, lab tests and invoices, medicine stock.
+
+    python benchmarks/generate_data.py --patients 1000000 --sqlite database/HMS_DB.sqlite3
+    HMS_DB_DRIVER=pyodbc python benchmarks/generate_data.py --patients 1000000   # into CONN_STR
+
+Rows are deterministic for a given --seed and --patients and are written with
+explicit ids, table by table, in batches of --batch rows. Run it against an
+empty database.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app", "src")))
+
+import DB  # noqa: E402
+
+FIRST_NAMES = ("Ali", "Sara", "Reza", "Maryam", "Hossein", "Fatemeh", "Mohammad", "Zahra", "Amir", "Narges",
+               "John", "Emma", "Liam", "Olivia", "Noah", "Ava", "Lucas", "Mia", "Omar", "Leila",
+               "Daniel", "Sofia", "Arash", "Nika", "Kian", "Yasmin", "David", "Elena", "Hamid", "Parisa")
+LAST_NAMES = ("Ahmadi", "Hosseini", "Karimi", "Rahimi", "Moradi", "Jafari", "Rezaei", "Mohammadi", "Kazemi",
+              "Smith", "Johnson", "Brown", "Garcia", "Miller", "Davis", "Martinez", "Wilson", "Anderson",
+              "Taylor", "Thomas", "Moore", "Jackson", "Martin", "Lee", "Harris", "Clark", "Lewis", "Walker",
+              "Hall", "Young", "Allen", "King", "Wright", "Scott", "Green", "Baker", "Adams", "Nelson")
+SPECIALIZATIONS = ("Cardiology", "Dermatology", "Endocrinology", "Gastroenterology", "General Practice",
+                   "Gynecology", "Hematology", "Nephrology", "Neurology", "Oncology", "Ophthalmology",
+                   "Orthopedics", "Otolaryngology", "Pediatrics", "Psychiatry", "Pulmonology",
+                   "Radiology", "Rheumatology", "Surgery", "Urology")
+LAB_TESTS = ("CBC", "Lipid panel", "HbA1c", "TSH", "Urinalysis", "Liver panel", "Kidney panel", "CRP")
+WARDS = ("General", "ICU", "Maternity", "Pediatrics", "Surgery")
+
+
+def person(rnd, i):
+    return (rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES), f"{i:010d}",
+            f"{rnd.randint(1, 999)} Main St", rnd.choice(("Male", "Female")),
+            date(1940, 1, 1) + timedelta(days=rnd.randrange(80 * 365)), f"09{rnd.randrange(10 ** 9):09d}")
+
+
+def tables(args):
+    """Yield (table, columns, row iterable) in foreign-key order."""
+    rnd = random.Random(args.seed)
+    n, d = args.patients, args.doctors
+    today = datetime.combine(date.today(), datetime.min.time())
+
+    yield "parties", ("id", "party_type"), ((i, "PERSON") for i in range(1, n + d + 1))
+    yield "persons", ("id", "first_name", "last_name", "national_id", "address", "gender",
+                      "date_of_birth", "phone_number"), ((i, *person(rnd, i)) for i in range(1, n + d + 1))
+    yield "patients", ("id", "party_id"), ((i, i) for i in range(1, n + 1))
+    yield "employees", ("id", "party_id"), ((j, n + j) for j in range(1, d + 1))
+    yield "specializations", ("id", "name"), enumerate(SPECIALIZATIONS, 1)
+    yield "professional_profiles", ("employee_id", "specialization_id", "license_number"), (
+        (j, (j - 1) % len(SPECIALIZATIONS) + 1, f"LIC-{j:06d}") for j in range(1, d + 1))
+    yield "medicines", ("id", "name"), ((m, f"Medicine {m}") for m in range(1, args.medicines + 1))
+    yield "medicine_batches", ("id", "medicine_id", "batch_number", "expiration_date", "quantity_on_hand"), (
+        (bid, (bid - 1) // args.batches_per_medicine + 1, f"B{bid:07d}",
+         (today + timedelta(days=rnd.randint(-60, 720))).date(), rnd.randint(0, 500))
+        for bid in range(1, args.medicines * args.batches_per_medicine + 1))
+    yield "rooms", ("id", "room_number", "ward"), (
+        (r, f"R{r:04d}", WARDS[r % len(WARDS)]) for r in range(1, args.rooms + 1))
+
+    def appointments():
+        aid = 0
+        for pid in range(1, n + 1):
+            for _ in range(rnd.randint(0, 2 * args.appointments)):
+                aid += 1
+                day = today + timedelta(days=rnd.randint(-730, 60))
+                when = day + timedelta(minutes=8 * 60 + 30 * rnd.randrange(16))
+                status = "Scheduled" if when > today else rnd.choice(("Completed", "Completed", "Cancelled"))
+                yield aid, pid, rnd.randint(1, d), when, status
+    yield "appointments", ("id", "patient_id", "doctor_id", "appointment_at", "status"), appointments()
+
+    def prescriptions():
+        rid = 0
+        for pid in range(1, n + 1):
+            for _ in range(rnd.randint(0, 2 * args.prescriptions)):
+                rid += 1
+                yield (rid, pid, rnd.randint(1, d), rnd.randint(1, args.medicines), rnd.choice((250, 500, 1000)),
+                       "mg", "Daily", rnd.randint(1, 3), "Day", rnd.randint(3, 30),
+                       today - timedelta(days=rnd.randrange(730)))
+    yield "prescriptions", ("id", "patient_id", "doctor_id", "medicine_id", "dosage_amount", "dosage_unit",
+                            "frequency_type", "frequency_value", "duration_unit", "duration_value",
+                            "created_at"), prescriptions()
+
+    def lab_tests():
+        lid = 0
+        for pid in range(1, n + 1):
+            for _ in range(rnd.randint(0, 2 * args.lab_tests)):
+                lid += 1
+                yield (lid, pid, rnd.choice(LAB_TESTS), rnd.randint(1, d),
+                       today - timedelta(days=rnd.randrange(730), minutes=rnd.randrange(600)))
+    yield "lab_tests", ("id", "patient_id", "test_type", "ordered_by_doctor_id", "ordered_at"), lab_tests()
+
+    invoice_count = []
+
+    def invoices():
+        iid = 0
+        for pid in range(1, n + 1):
+            for _ in range(rnd.randint(0, 2 * args.invoices)):
+                iid += 1
+                yield iid, pid, (today - timedelta(days=rnd.randrange(730))).date(), rnd.choice(("Paid", "Unpaid"))
+        invoice_count.append(iid)
+    yield "invoices", ("id", "patient_id", "invoice_date", "status"), invoices()
+
+    def line_items():
+        lid = 0
+        for iid in range(1, invoice_count[0] + 1):
+            for kind in rnd.sample(("Visit", "Lab", "Pharmacy", "Room"), rnd.randint(1, 3)):
+                lid += 1
+                yield lid, iid, f"{kind} charge", round(rnd.uniform(10, 500), 2), kind
+    yield "invoice_line_items", ("id", "invoice_id", "description", "amount", "source_service_type"), line_items()
+
+
+# FTS5 flushes its pending terms at the end of every statement, so row-by-row inserts into the
+# tables behind the clinical search index (migration 0006) would write an index segment per row.
+# On SQLite they are loaded through a temp table instead: one INSERT ... SELECT per batch.
+FTS_TABLES = ("medical_records", "lab_tests")
+
+
+def insert_batch(cur, table, columns, batch, sqlite):
+    cols, marks = ", ".join(columns), ", ".join("?" * len(columns))
+    if sqlite and table in FTS_TABLES:
+        cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS stage_{table} AS SELECT {cols} FROM dbo.{table} WHERE 0;")
+        cur.executemany(f"INSERT INTO temp.stage_{table} ({cols}) VALUES ({marks});", batch)
+        cur.execute(f"INSERT INTO dbo.{table} ({cols}) SELECT {cols} FROM temp.stage_{table};")
+        cur.execute(f"DELETE FROM temp.stage_{table};")
+    else:
+        cur.executemany(f"INSERT INTO dbo.{table} ({cols}) VALUES ({marks})", batch)
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate(args, log=print):
+    conn = DB.get_connection()
+    mssql = DB.get_backend().dialect == "mssql"
+    total = 0
+    t_all = time.perf_counter()
+    try:
+        cur = conn.cursor()
+        if mssql:
+            cur.fast_executemany = True
+        for table, columns, rows in tables(args):
+            t0 = time.perf_counter()
+            identity = mssql and columns[0] == "id"
+            if identity:
+                cur.execute(f"SET IDENTITY_INSERT dbo.{table} ON;")
+            count = 0
+            for batch in batches(rows, args.batch):
+                insert_batch(cur, table, columns, batch, not mssql)
+                count += len(batch)
+            if identity:
+                cur.execute(f"SET IDENTITY_INSERT dbo.{table} OFF;")
+            conn.commit()
+            total += count
+            log(f"{table:<22} {count:>11,} rows  {time.perf_counter() - t0:6.1f}s")
+        # a generated registry is the starting point, not a stream of changes for the desks
+        # (nor for the report rollups: their first refresh builds them from the tables)
+        if mssql:
+            cur.execute("IF OBJECT_ID('dbo.patient_changes') IS NOT NULL TRUNCATE TABLE dbo.patient_changes;")
+            cur.execute("IF OBJECT_ID('dbo.report_dirty_days') IS NOT NULL TRUNCATE TABLE dbo.report_dirty_days;")
+        else:
+            cur.execute("DELETE FROM dbo.patient_changes;")
+            cur.execute("DELETE FROM dbo.report_dirty_days;")
+            cur.execute("ANALYZE dbo;")  # planner statistics for the fresh indexes
+        conn.commit()
+    finally:
+        conn.close()
+    log(f"{'total':<22} {total:>11,} rows  {time.perf_counter() - t_all:6.1f}s")
+
+
+def parser():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--patients", type=int, default=1_000_000)
+    ap.add_argument("--doctors", type=int, default=500)
+    ap.add_argument("--medicines", type=int, default=300)
+    ap.add_argument("--batches-per-medicine", type=int, default=4)
+    ap.add_argument("--rooms", type=int, default=400)
+    ap.add_argument("--appointments", type=int, default=3, help="average per patient")
+    ap.add_argument("--prescriptions", type=int, default=2, help="average per patient")
+    ap.add_argument("--lab-tests", type=int, default=1, help="average per patient")
+    ap.add_argument("--invoices", type=int, default=1, help="average per patient")
+    ap.add_argument("--batch", type=int, default=50_000)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--sqlite", metavar="PATH", help="write to this SQLite file instead of HMS_DB_DRIVER's backend")
+    return ap
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    if args.sqlite:
+        DB.use_sqlite(args.sqlite)
+    generate(args)
+
+
+if __name__ == "__main__":
+    main()
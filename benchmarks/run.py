@@ -0,0 +1,406 @@
+"""
+Repeatable DB benchmark suite with a stored baseline.
+
+    python benchmarks/run.py                        # SQLite, 100k patients, compare to baseline.json
+    python benchmarks/run.py --patients 1000000     # bigger data set (generated once, then cached)
+    python benchmarks/run.py --save-baseline        # accept the current numbers as the new baseline
+    HMS_DB_DRIVER=pyodbc python benchmarks/run.py --driver env   # against CONN_STR (data must exist)
+
+Times the DB.py API as the app calls it (pool, cursors, row mapping included).
+Exits 1 when any benchmark's p50 is more than --tolerance slower than the
+baseline recorded for the same backend and data size (and by at least
+MIN_SLOWDOWN_MS, so microsecond benchmarks do not fail on timer jitter).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(HERE, "..", "app", "src")))
+
+import DB  # noqa: E402
+import Migrations  # noqa: E402
+import generate_data  # noqa: E402
+from AuditLog import AuditLog  # noqa: E402
+from Dedupe import DedupeIndex  # noqa: E402
+from PatientCache import PatientCache  # noqa: E402
+from Pharmacy import PharmacyEngine  # noqa: E402
+from bench_scheduling import percentiles  # noqa: E402
+from bench_search import queries as search_queries, seed_notes  # noqa: E402
+
+BASELINE = os.path.join(HERE, "baseline.json")
+DATA_DIR = os.path.join(HERE, "data")  # cached generated databases (not committed)
+# smallest p50 slowdown that counts as a regression: sub-microsecond p50s (audit_record)
+# double from one run to the next on timer resolution and scheduling alone
+MIN_SLOWDOWN_MS = 0.002
+
+
+def bench_list_patients(ctx):
+    for _ in range(ctx.repeat):
+        yield lambda: DB.list_patients()
+
+
+def bench_list_patients_page(ctx):
+    rnd = random.Random(1)
+    for _ in range(ctx.ops):
+        after = rnd.choice((None, rnd.randint(1, ctx.patients)))
+        yield lambda after=after: DB.list_patients_page(after, 200)
+
+
+def bench_get_patient_by_id(ctx):
+    rnd = random.Random(2)
+    for _ in range(ctx.ops):
+        pid = rnd.randint(1, ctx.patients)
+        yield lambda pid=pid: DB.get_patient_by_id(pid)
+
+
+def bench_get_patient_cached(ctx):
+    # a clerk's working set: a few dozen patients opened again and again
+    rnd = random.Random(2)
+    cache = PatientCache()
+    hot = [rnd.randint(1, ctx.patients) for _ in range(40)]
+    for _ in range(ctx.ops):
+        pid = rnd.choice(hot)
+        yield lambda pid=pid: cache.get_patient(pid)
+
+
+def bench_search_patients(ctx):
+    rnd = random.Random(3)
+    names = generate_data.LAST_NAMES + generate_data.FIRST_NAMES
+    for _ in range(ctx.ops):
+        prefix = rnd.choice(names)[:rnd.randint(2, 4)]
+        yield lambda prefix=prefix: DB.search_patients(prefix, 50)
+
+
+def bench_insert_patient(ctx):
+    rnd = random.Random(4)
+    for i in range(ctx.ops):
+        first, last, _, address, gender, born, phone = generate_data.person(rnd, i)
+        data = {"FirstName": first, "LastName": last, "NationalID": f"B{ctx.run_id}{i:07d}",
+                "Address": address, "Gender": gender, "BirthDate": born, "Phone": phone}
+        yield lambda data=data: DB.insert_patient(data)
+
+
+def bench_poll_patient_changes(ctx):
+    # what each desk pays every few seconds to stay in sync: mostly nothing new; every
+    # tenth call edits a patient first (so p50 is the idle poll, p95+ includes the write)
+    rnd = random.Random(6)
+    watermark = [DB.patient_change_watermark()]
+
+    def poll(write):
+        if write:
+            p = DB.get_patient_by_id(rnd.randint(1, ctx.patients))
+            DB.update_patient(p["PatientID"], {**p, "Phone": f"09{rnd.randrange(10 ** 9):09d}"})
+        _, watermark[0] = DB.list_patient_changes(watermark[0], 500)
+
+    for i in range(ctx.ops):
+        yield lambda write=(i % 10 == 0): poll(write)
+
+
+def bench_book_appointment(ctx):
+    rnd = random.Random(5)
+    start = datetime.combine(datetime.now().date(), datetime.min.time()) + timedelta(days=1, hours=8)
+    for _ in range(ctx.ops):
+        pid, doctor = rnd.randint(1, ctx.patients), rnd.randint(1, ctx.doctors)
+        when = start + timedelta(days=rnd.randrange(60), minutes=30 * rnd.randrange(16))
+        yield lambda pid=pid, doctor=doctor, when=when: DB.book_appointment(pid, doctor, when)
+
+
+def _bench_user(ctx, name):
+    """
+    (user id, doctor) of a login for a generated doctor no other benchmark of this run
+    has taken: users.party_id is unique, so each benchmark gets its own doctor.
+    """
+    ctx.bench_doctors += 1
+    doctor = ctx.bench_doctors
+    username = f"{name}{ctx.run_id}"
+    DB.create_user_plain(username, "x", party_id=ctx.patients + doctor)
+    return DB.get_user_by_username(username)["id"], doctor
+
+
+def bench_dispense(ctx):
+    # one FEFO dispense line per call: plan from the in-memory batch queues, then the
+    # guarded batch updates and movements in one transaction
+    rnd = random.Random(7)
+    user_id, _ = _bench_user(ctx, "pharmacist")
+    engine = PharmacyEngine()
+    for m in range(1, 21):
+        for k in range(5):
+            engine.receive(m, f"BENCH{ctx.run_id}-{m}-{k}", date.today() + timedelta(days=30 * (k + 1)),
+                           10_000, user_id)
+    engine.refresh_from_db()
+    for _ in range(ctx.ops):
+        medicine, qty = rnd.randint(1, 20), rnd.randint(1, 30)
+        yield lambda medicine=medicine, qty=qty: engine.dispense([(medicine, qty)], user_id)
+
+
+def bench_medicine_stock(ctx):
+    for _ in range(ctx.ops):
+        yield DB.list_medicine_stock
+
+
+def bench_bill_day(ctx):
+    # end-of-day billing, one past day per call (a day is only billed once)
+    yesterday = date.today() - timedelta(days=1)
+    for i in range(ctx.ops):
+        day = yesterday - timedelta(days=i)
+        yield lambda day=day: DB.bill_services(day, day + timedelta(days=1))
+
+
+def bench_patient_timeline(ctx):
+    # first page of every section for a generated patient (a few visits each)
+    rnd = random.Random(11)
+    for _ in range(ctx.ops):
+        pid = rnd.randint(1, ctx.patients)
+        yield lambda pid=pid: DB.get_patient_timeline(pid)
+
+
+def _seed_history(pid, doctor, user_id, years=10):
+    """Two visits a month for `years`, each with a record, a lab test, a prescription and an invoice."""
+    start = datetime.combine(date.today(), datetime.min.time()) - timedelta(days=365 * years) + timedelta(hours=9)
+    visits = [start + timedelta(days=15 * i) for i in range(24 * years)]
+    with DB.conn_cursor() as (_, cur):
+        cur.executemany("INSERT INTO dbo.appointments (patient_id, doctor_id, appointment_at, status) "
+                        "VALUES (?, ?, ?, 'Completed');", [(pid, doctor, t) for t in visits])
+        cur.executemany("INSERT INTO dbo.medical_records (patient_id, diagnosis, treatment_plan, created_by_user_id, "
+                        "created_at) VALUES (?, 'Follow-up', 'Continue treatment', ?, ?);",
+                        [(pid, user_id, t) for t in visits])
+        cur.executemany("INSERT INTO dbo.lab_tests (patient_id, test_type, result, ordered_by_doctor_id, ordered_at) "
+                        "VALUES (?, 'CBC', 'Normal', ?, ?);", [(pid, doctor, t) for t in visits])
+        cur.executemany("INSERT INTO dbo.prescriptions (patient_id, doctor_id, medicine_id, dosage_amount, "
+                        "dosage_unit, created_at) VALUES (?, ?, 1, 5, 'mg', ?);", [(pid, doctor, t) for t in visits])
+        cur.executemany("INSERT INTO dbo.invoices (patient_id, invoice_date, status) VALUES (?, ?, 'Paid');",
+                        [(pid, t.date()) for t in visits])
+
+
+def bench_patient_timeline_10y(ctx):
+    # the same for a patient with ten years of history (240 rows per section)
+    user_id, doctor = _bench_user(ctx, "timeline")
+    _seed_history(1, doctor, user_id)
+    for _ in range(ctx.ops):
+        yield lambda: DB.get_patient_timeline(1)
+
+
+def _export_chunk(after):
+    chunks = DB.iter_export("patients", after, 5000)
+    try:
+        return next(chunks)
+    finally:
+        chunks.close()
+
+
+def bench_export_chunk(ctx):
+    # one fetchmany chunk of the streaming export, from a random resume key
+    for _ in range(ctx.ops):
+        after = random.randint(0, max(ctx.patients - 5000, 0))
+        yield lambda after=after: _export_chunk(after)
+
+
+def bench_dedupe_lookup(ctx):
+    # the Add Patient duplicate check: an existing patient re-entered with a surname typo
+    index = DedupeIndex()
+    index.load()
+    rows = DB.get_patient_match_fields(random.sample(range(1, ctx.patients + 1), ctx.ops))
+    for _, first, last, national_id, dob, phone in rows:
+        data = {"FirstName": first, "LastName": last[:-1] + "x", "NationalID": "",
+                "BirthDate": dob, "Phone": phone}
+        yield lambda data=data: index.candidates(data)
+
+
+def bench_clinical_search(ctx):
+    # ranked full-text search over 200k notes: common, rare, multi-word and prefix queries
+    user_id, _ = _bench_user(ctx, "notes")
+    seed_notes(200_000, ctx.patients, 4, user_id)
+    rnd = random.Random(11)
+    texts = [text for _, text in search_queries(rnd, ctx.ops // 5 + 1)]
+    rnd.shuffle(texts)
+    for text in texts[:ctx.ops]:
+        yield lambda text=text: DB.search_clinical(text)
+
+
+def bench_audit_sync(ctx):
+    # what each audited action would cost the GUI with one INSERT per event
+    user_id, _ = _bench_user(ctx, "auditsync")
+    for i in range(ctx.ops):
+        yield lambda i=i: DB.insert_audit_logs([(user_id, "VIEW", "patients", i, datetime.now())])
+
+
+def bench_audit_record(ctx):
+    # what it costs with the buffered writer: the flusher thread does the INSERTs
+    user_id, _ = _bench_user(ctx, "auditasync")
+    audit = AuditLog(spill_path=os.path.join(tempfile.gettempdir(), f"hms_bench_audit_{ctx.run_id}.jsonl"))
+    for i in range(ctx.ops):
+        yield lambda i=i: audit.record(user_id, "VIEW", "patients", i)
+    yield lambda: audit.close()
+
+
+def bench_report_refresh(ctx):
+    # rollup refresh after one booking: that day and today are recomputed (the warm-up is the full build)
+    rnd = random.Random(12)
+    today = datetime.combine(date.today(), datetime.min.time())
+    yield lambda: DB.refresh_report_rollups()
+    for _ in range(ctx.ops):
+        pid, doctor = rnd.randint(1, ctx.patients), rnd.randint(1, ctx.doctors)
+        when = today + timedelta(days=rnd.randint(1, 30), minutes=8 * 60 + 30 * rnd.randrange(16))
+
+        def call(pid=pid, doctor=doctor, when=when):
+            DB.insert_appointment(pid, doctor, when)
+            DB.refresh_report_rollups()
+        yield call
+
+
+def bench_report_dashboard(ctx):
+    # 30 days of dashboard figures, read from the rollups
+    end = date.today() + timedelta(days=1)
+    yield lambda: DB.refresh_report_rollups()
+    for _ in range(ctx.ops):
+        yield lambda: DB.get_report_dashboard(end - timedelta(days=31), end)
+
+
+BENCHMARKS = {
+    "list_patients": bench_list_patients,
+    "list_patients_page": bench_list_patients_page,
+    "get_patient_by_id": bench_get_patient_by_id,
+    "get_patient_cached": bench_get_patient_cached,
+    "search_patients": bench_search_patients,
+    "insert_patient": bench_insert_patient,
+    "book_appointment": bench_book_appointment,
+    "poll_patient_changes": bench_poll_patient_changes,
+    "dispense": bench_dispense,
+    "medicine_stock": bench_medicine_stock,
+    "bill_day": bench_bill_day,
+    "patient_timeline": bench_patient_timeline,
+    "patient_timeline_10y": bench_patient_timeline_10y,
+    "export_chunk": bench_export_chunk,
+    "dedupe_lookup": bench_dedupe_lookup,
+    "clinical_search": bench_clinical_search,
+    "audit_sync": bench_audit_sync,
+    "audit_record": bench_audit_record,
+    "report_refresh": bench_report_refresh,
+    "report_dashboard": bench_report_dashboard,
+}
+
+
+def run(ctx, names):
+    results = {}
+    for name in names:
+        calls = list(BENCHMARKS[name](ctx))
+        calls[0]()  # warm-up, not timed: pool connection, statement cache, page cache
+        samples = []
+        t_all = time.perf_counter()
+        for call in calls[1:]:
+            t0 = time.perf_counter()
+            call()
+            samples.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - t_all
+        p = percentiles(samples)
+        results[name] = {"p50_ms": round(p[50], 4), "p95_ms": round(p[95], 4), "p99_ms": round(p[99], 4),
+                         "ops": len(samples), "ops_per_s": round(len(samples) / elapsed, 1)}
+        print(f"{name:<20} p50={p[50]:9.3f} ms  p95={p[95]:9.3f} ms  p99={p[99]:9.3f} ms  "
+              f"{results[name]['ops_per_s']:>9,.1f} ops/s")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """[(name, baseline_p50, p50)] of benchmarks slower than baseline * (1 + tolerance) (and MIN_SLOWDOWN_MS)."""
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if (base and r["p50_ms"] > base["p50_ms"] * (1 + tolerance)
+                and r["p50_ms"] - base["p50_ms"] >= MIN_SLOWDOWN_MS):
+            regressions.append((name, base["p50_ms"], r["p50_ms"]))
+    return regressions
+
+
+def sqlite_copy(args):
+    """Fresh copy of the cached generated database, so every run starts from the same rows."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    cached = os.path.join(DATA_DIR, f"hms_{args.patients}.sqlite3")
+    if not os.path.exists(cached):
+        print(f"generating {args.patients:,} patients into {cached} (one-off)")
+        gen = generate_data.parser().parse_args(["--patients", str(args.patients), "--doctors", str(args.doctors)])
+        DB.use_sqlite(cached + ".part")
+        generate_data.generate(gen)
+        DB.get_pool().close()
+        conn = sqlite3.connect(cached + ".part")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")  # everything in the main file before copying it
+        conn.close()
+        os.replace(cached + ".part", cached)
+    else:
+        # a cache generated before the latest migrations: upgrade it once, not every copy
+        conn = sqlite3.connect(cached)
+        if Migrations.migrate(conn, "sqlite"):
+            conn.execute("ANALYZE")
+            conn.commit()
+        conn.close()
+    work = os.path.join(tempfile.mkdtemp(prefix="hms_bench_"), "hms.sqlite3")
+    shutil.copyfile(cached, work)
+    return work
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--driver", choices=("sqlite", "env"), default="sqlite",
+                    help="sqlite: generated SQLite copy; env: the backend HMS_DB_DRIVER selects")
+    ap.add_argument("--patients", type=int, default=100_000)
+    ap.add_argument("--doctors", type=int, default=500)
+    ap.add_argument("--ops", type=int, default=500, help="calls per benchmark")
+    ap.add_argument("--repeat", type=int, default=6, help="calls of the full list_patients")
+    ap.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="run just these")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--tolerance", type=float, default=0.30, help="allowed p50 slowdown (0.30 = 30%%)")
+    ap.add_argument("--save-baseline", action="store_true")
+    args = ap.parse_args(argv)
+
+    work = None
+    if args.driver == "sqlite":
+        work = sqlite_copy(args)
+        DB.use_sqlite(work)
+    backend = DB.get_backend().name
+    key = f"{backend}/{args.patients}"
+    ctx = argparse.Namespace(patients=args.patients, doctors=args.doctors, ops=args.ops,
+                             repeat=args.repeat, run_id=int(time.time()) % 100000,
+                             bench_doctors=0)  # doctors handed out by _bench_user
+    print(f"backend={backend} patients={args.patients:,} ops={args.ops}")
+    try:
+        results = run(ctx, args.only or list(BENCHMARKS))
+    finally:
+        DB.get_pool().close()
+        if work:
+            shutil.rmtree(os.path.dirname(work), ignore_errors=True)
+
+    stored = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            stored = json.load(f)
+    if args.save_baseline:
+        stored[key] = {"recorded": datetime.now().isoformat(timespec="seconds"),
+                       "machine": f"{platform.system()} {platform.machine()}, Python {platform.python_version()}, "
+                                  f"SQLite {sqlite3.sqlite_version}",
+                       "results": {**stored.get(key, {}).get("results", {}), **results}}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline saved for {key}")
+        return 0
+    if key not in stored:
+        print(f"no baseline for {key}; run with --save-baseline to record one")
+        return 0
+    regressions = compare(results, stored[key]["results"], args.tolerance)
+    for name, base, now in regressions:
+        print(f"REGRESSION {name}: p50 {now:.3f} ms vs baseline {base:.3f} ms (+{(now / base - 1) * 100:.0f}%)")
+    if not regressions:
+        print(f"ok: within {args.tolerance:.0%} of the {key} baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
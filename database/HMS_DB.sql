@@ -8,7 +8,12 @@ CREATE TABLE [persons] (
   [id] int PRIMARY KEY,
   [first_name] nvarchar(100) NOT NULL,
   [last_name] nvarchar(100) NOT NULL,
-  [national_id] nvarchar(20) UNIQUE NOT NULL
+  [national_id] nvarchar(20) UNIQUE NOT NULL,
+  [address] nvarchar(255),
+  [gender] nvarchar(20),
+  [date_of_birth] date,
+  [phone_number] nvarchar(50),
+  [row_version] rowversion
 )
 GO
 
@@ -155,7 +160,8 @@ GO
 
 CREATE TABLE [rooms] (
   [id] int PRIMARY KEY IDENTITY(1, 1),
-  [room_number] nvarchar(20) UNIQUE NOT NULL
+  [room_number] nvarchar(20) UNIQUE NOT NULL,
+  [ward] nvarchar(50) NOT NULL DEFAULT 'General'
 )
 GO
 
@@ -164,7 +170,8 @@ CREATE TABLE [room_assignments] (
   [patient_id] int NOT NULL,
   [room_id] int NOT NULL,
   [start_at] datetime NOT NULL,
-  [end_at] datetime
+  [end_at] datetime,
+  CHECK ([end_at] IS NULL OR [end_at] > [start_at])
 )
 GO
 
@@ -281,3 +288,34 @@ GO
 
 ALTER TABLE [audit_logs] ADD FOREIGN KEY ([user_id]) REFERENCES [users] ([id])
 GO
+
+CREATE INDEX [IX_persons_last_name] ON [persons] ([last_name]) INCLUDE ([first_name], [national_id])
+GO
+
+CREATE INDEX [IX_persons_first_name] ON [persons] ([first_name]) INCLUDE ([last_name], [national_id])
+GO
+
+CREATE INDEX [IX_appointments_doctor_id_appointment_at] ON [appointments] ([doctor_id], [appointment_at]) INCLUDE ([status])
+GO
+
+CREATE INDEX [IX_room_assignments_room_id_start_at] ON [room_assignments] ([room_id], [start_at]) INCLUDE ([end_at], [patient_id])
+GO
+
+CREATE TRIGGER [trg_room_assignments_no_overlap] ON [room_assignments]
+AFTER INSERT, UPDATE
+AS
+BEGIN
+  SET NOCOUNT ON;
+  -- [start_at, end_at) ranges of the same room may not overlap; NULL end_at = still occupied
+  IF EXISTS (
+    SELECT 1
+    FROM inserted AS i
+    JOIN [room_assignments] AS ra
+      ON ra.[room_id] = i.[room_id]
+     AND ra.[id] <> i.[id]
+     AND ra.[start_at] < ISNULL(i.[end_at], '9999-12-31')
+     AND i.[start_at] < ISNULL(ra.[end_at], '9999-12-31')
+  )
+    THROW 51000, 'Room assignment overlaps another assignment of the same room.', 1;
+END
+GO
@@ -0,0 +1,219 @@
+-- SQLite version of HMS_DB.sql, used by the "sqlite" backend (HMS_DB_DRIVER=sqlite).
+-- Same tables, columns, constraints and indexes; SQL Server-only pieces are replaced:
+--   IDENTITY          -> INTEGER PRIMARY KEY (rowid alias)
+--   rowversion        -> integer bumped by every UPDATE of the row
+--   AFTER trigger     -> BEFORE trigger + RAISE(ABORT)
+--   INCLUDE (...)     -> plain composite indexes (NOCASE where LIKE searches them)
+-- Column types are kept as "datetime"/"date" so the backend converts them back to Python objects.
+
+PRAGMA foreign_keys = ON;
+
+CREATE TABLE parties (
+  id integer PRIMARY KEY,
+  party_type nvarchar(20) NOT NULL
+);
+
+CREATE TABLE persons (
+  id integer PRIMARY KEY REFERENCES parties (id),
+  first_name nvarchar(100) NOT NULL,
+  last_name nvarchar(100) NOT NULL,
+  national_id nvarchar(20) UNIQUE NOT NULL,
+  address nvarchar(255),
+  gender nvarchar(20),
+  date_of_birth date,
+  phone_number nvarchar(50),
+  row_version integer NOT NULL DEFAULT 1
+);
+
+CREATE TABLE organizations (
+  id integer PRIMARY KEY REFERENCES parties (id),
+  name nvarchar(255) NOT NULL
+);
+
+CREATE TABLE users (
+  id integer PRIMARY KEY,
+  party_id integer UNIQUE NOT NULL REFERENCES parties (id),
+  username nvarchar(50) UNIQUE NOT NULL,
+  password_hash nvarchar(255) NOT NULL,
+  account_status nvarchar(20) NOT NULL DEFAULT 'Active'
+);
+
+CREATE TABLE roles (
+  id integer PRIMARY KEY,
+  name nvarchar(50) UNIQUE NOT NULL
+);
+
+CREATE TABLE user_role_assignments (
+  user_id integer REFERENCES users (id),
+  role_id integer REFERENCES roles (id),
+  PRIMARY KEY (user_id, role_id)
+);
+
+CREATE TABLE patients (
+  id integer PRIMARY KEY,
+  party_id integer UNIQUE NOT NULL REFERENCES parties (id)
+);
+
+CREATE TABLE employees (
+  id integer PRIMARY KEY,
+  party_id integer UNIQUE NOT NULL REFERENCES parties (id)
+);
+
+CREATE TABLE specializations (
+  id integer PRIMARY KEY,
+  name nvarchar(100) UNIQUE NOT NULL
+);
+
+CREATE TABLE professional_profiles (
+  employee_id integer REFERENCES employees (id),
+  specialization_id integer REFERENCES specializations (id),
+  license_number nvarchar(50) UNIQUE NOT NULL,
+  PRIMARY KEY (employee_id, specialization_id)
+);
+
+CREATE TABLE appointments (
+  id integer PRIMARY KEY,
+  patient_id integer NOT NULL REFERENCES patients (id),
+  doctor_id integer NOT NULL REFERENCES employees (id),
+  appointment_at datetime NOT NULL,
+  status nvarchar(20) NOT NULL
+);
+
+CREATE TABLE medical_records (
+  id integer PRIMARY KEY,
+  patient_id integer NOT NULL REFERENCES patients (id),
+  appointment_id integer REFERENCES appointments (id),
+  diagnosis nvarchar NOT NULL,
+  treatment_plan nvarchar,
+  created_by_user_id integer NOT NULL REFERENCES users (id),
+  created_at datetime DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE lab_tests (
+  id integer PRIMARY KEY,
+  patient_id integer NOT NULL REFERENCES patients (id),
+  test_type nvarchar(100) NOT NULL,
+  result nvarchar,
+  ordered_by_doctor_id integer NOT NULL REFERENCES employees (id)
+);
+
+CREATE TABLE medicines (
+  id integer PRIMARY KEY,
+  name nvarchar(100) NOT NULL
+);
+
+CREATE TABLE medicine_batches (
+  id integer PRIMARY KEY,
+  medicine_id integer NOT NULL REFERENCES medicines (id),
+  batch_number nvarchar(100) UNIQUE NOT NULL,
+  expiration_date date NOT NULL,
+  quantity_on_hand integer NOT NULL DEFAULT 0
+);
+
+CREATE TABLE inventory_movements (
+  id integer PRIMARY KEY,
+  batch_id integer NOT NULL REFERENCES medicine_batches (id),
+  quantity_change integer NOT NULL,
+  movement_type nvarchar(20) NOT NULL,
+  created_by_user_id integer NOT NULL REFERENCES users (id)
+);
+
+CREATE TABLE prescriptions (
+  id integer PRIMARY KEY,
+  patient_id integer NOT NULL REFERENCES patients (id),
+  doctor_id integer NOT NULL REFERENCES employees (id),
+  medicine_id integer NOT NULL REFERENCES medicines (id),
+  dosage_amount decimal(10,2) NOT NULL,
+  dosage_unit nvarchar(20) NOT NULL,
+  frequency_type nvarchar(20),
+  frequency_value integer,
+  duration_unit nvarchar(20),
+  duration_value integer,
+  instructions nvarchar,
+  created_at datetime DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE invoices (
+  id integer PRIMARY KEY,
+  patient_id integer NOT NULL REFERENCES patients (id),
+  invoice_date date NOT NULL,
+  status nvarchar(20) NOT NULL DEFAULT 'Unpaid'
+);
+
+CREATE TABLE invoice_line_items (
+  id integer PRIMARY KEY,
+  invoice_id integer NOT NULL REFERENCES invoices (id),
+  description nvarchar(255) NOT NULL,
+  amount decimal(18,2) NOT NULL,
+  source_service_type nvarchar(50),
+  source_service_id integer
+);
+
+CREATE TABLE rooms (
+  id integer PRIMARY KEY,
+  room_number nvarchar(20) UNIQUE NOT NULL,
+  ward nvarchar(50) NOT NULL DEFAULT 'General'
+);
+
+CREATE TABLE room_assignments (
+  id integer PRIMARY KEY,
+  patient_id integer NOT NULL REFERENCES patients (id),
+  room_id integer NOT NULL REFERENCES rooms (id),
+  start_at datetime NOT NULL,
+  end_at datetime,
+  CHECK (end_at IS NULL OR end_at > start_at)
+);
+
+CREATE TABLE audit_logs (
+  id integer PRIMARY KEY,
+  user_id integer NOT NULL REFERENCES users (id),
+  action nvarchar(255) NOT NULL,
+  table_name nvarchar(100),
+  record_id integer,
+  created_at datetime DEFAULT (datetime('now', 'localtime'))
+);
+
+-- NOCASE so case-insensitive LIKE 'prefix%' (search_patients) can seek these indexes
+CREATE INDEX IX_persons_national_id ON persons (national_id COLLATE NOCASE);
+
+CREATE INDEX IX_persons_last_name ON persons (last_name COLLATE NOCASE, first_name, national_id);
+
+CREATE INDEX IX_persons_first_name ON persons (first_name COLLATE NOCASE, last_name, national_id);
+
+CREATE INDEX IX_appointments_doctor_id_appointment_at ON appointments (doctor_id, appointment_at, status);
+
+CREATE INDEX IX_room_assignments_room_id_start_at ON room_assignments (room_id, start_at, end_at, patient_id);
+
+-- rowversion stand-in: any UPDATE that does not bump row_version itself gets it bumped here
+CREATE TRIGGER trg_persons_row_version
+AFTER UPDATE ON persons
+FOR EACH ROW WHEN NEW.row_version = OLD.row_version
+BEGIN
+  UPDATE persons SET row_version = OLD.row_version + 1 WHERE id = NEW.id;
+END;
+
+-- [start_at, end_at) ranges of the same room may not overlap; NULL end_at = still occupied
+CREATE TRIGGER trg_room_assignments_no_overlap_insert
+BEFORE INSERT ON room_assignments
+FOR EACH ROW WHEN EXISTS (
+  SELECT 1 FROM room_assignments AS ra
+  WHERE ra.room_id = NEW.room_id
+    AND ra.start_at < IFNULL(NEW.end_at, '9999-12-31')
+    AND NEW.start_at < IFNULL(ra.end_at, '9999-12-31')
+)
+BEGIN
+  SELECT RAISE(ABORT, 'Room assignment overlaps another assignment of the same room.');
+END;
+
+CREATE TRIGGER trg_room_assignments_no_overlap_update
+BEFORE UPDATE OF room_id, start_at, end_at ON room_assignments
+FOR EACH ROW WHEN EXISTS (
+  SELECT 1 FROM room_assignments AS ra
+  WHERE ra.room_id = NEW.room_id
+    AND ra.id <> NEW.id
+    AND ra.start_at < IFNULL(NEW.end_at, '9999-12-31')
+    AND NEW.start_at < IFNULL(ra.end_at, '9999-12-31')
+)
+BEGIN
+  SELECT RAISE(ABORT, 'Room assignment overlaps another assignment of the same room.');
+END;
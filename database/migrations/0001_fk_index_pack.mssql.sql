@@ -0,0 +1,87 @@
+-- 0001: index pack for foreign-key and lookup columns.
+-- Every FK column (and the date columns the app filters on) gets a nonclustered
+-- index, so joins and per-patient lookups seek instead of scanning. FK columns
+-- already leading a PK, UNIQUE constraint or index from HMS_DB.sql are skipped:
+--   users.party_id, patients.party_id, employees.party_id, persons.id,
+--   user_role_assignments.user_id, professional_profiles.employee_id,
+--   appointments.doctor_id, room_assignments.room_id
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_user_role_assignments_role_id' AND object_id = OBJECT_ID('dbo.user_role_assignments'))
+  CREATE INDEX [IX_user_role_assignments_role_id] ON [dbo].[user_role_assignments] ([role_id]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_professional_profiles_specialization_id' AND object_id = OBJECT_ID('dbo.professional_profiles'))
+  CREATE INDEX [IX_professional_profiles_specialization_id] ON [dbo].[professional_profiles] ([specialization_id]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_appointments_patient_id_appointment_at' AND object_id = OBJECT_ID('dbo.appointments'))
+  CREATE INDEX [IX_appointments_patient_id_appointment_at] ON [dbo].[appointments] ([patient_id], [appointment_at]) INCLUDE ([doctor_id], [status]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_appointments_appointment_at' AND object_id = OBJECT_ID('dbo.appointments'))
+  CREATE INDEX [IX_appointments_appointment_at] ON [dbo].[appointments] ([appointment_at]) INCLUDE ([doctor_id], [status]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_medical_records_patient_id_created_at' AND object_id = OBJECT_ID('dbo.medical_records'))
+  CREATE INDEX [IX_medical_records_patient_id_created_at] ON [dbo].[medical_records] ([patient_id], [created_at]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_medical_records_appointment_id' AND object_id = OBJECT_ID('dbo.medical_records'))
+  CREATE INDEX [IX_medical_records_appointment_id] ON [dbo].[medical_records] ([appointment_id]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_medical_records_created_by_user_id' AND object_id = OBJECT_ID('dbo.medical_records'))
+  CREATE INDEX [IX_medical_records_created_by_user_id] ON [dbo].[medical_records] ([created_by_user_id]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_lab_tests_patient_id' AND object_id = OBJECT_ID('dbo.lab_tests'))
+  CREATE INDEX [IX_lab_tests_patient_id] ON [dbo].[lab_tests] ([patient_id]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_lab_tests_ordered_by_doctor_id' AND object_id = OBJECT_ID('dbo.lab_tests'))
+  CREATE INDEX [IX_lab_tests_ordered_by_doctor_id] ON [dbo].[lab_tests] ([ordered_by_doctor_id]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_medicine_batches_medicine_id_expiration_date' AND object_id = OBJECT_ID('dbo.medicine_batches'))
+  CREATE INDEX [IX_medicine_batches_medicine_id_expiration_date] ON [dbo].[medicine_batches] ([medicine_id], [expiration_date]) INCLUDE ([quantity_on_hand]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_inventory_movements_batch_id' AND object_id = OBJECT_ID('dbo.inventory_movements'))
+  CREATE INDEX [IX_inventory_movements_batch_id] ON [dbo].[inventory_movements] ([batch_id]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_inventory_movements_created_by_user_id' AND object_id = OBJECT_ID('dbo.inventory_movements'))
+  CREATE INDEX [IX_inventory_movements_created_by_user_id] ON [dbo].[inventory_movements] ([created_by_user_id]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_prescriptions_patient_id_created_at' AND object_id = OBJECT_ID('dbo.prescriptions'))
+  CREATE INDEX [IX_prescriptions_patient_id_created_at] ON [dbo].[prescriptions] ([patient_id], [created_at]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_prescriptions_doctor_id' AND object_id = OBJECT_ID('dbo.prescriptions'))
+  CREATE INDEX [IX_prescriptions_doctor_id] ON [dbo].[prescriptions] ([doctor_id]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_prescriptions_medicine_id' AND object_id = OBJECT_ID('dbo.prescriptions'))
+  CREATE INDEX [IX_prescriptions_medicine_id] ON [dbo].[prescriptions] ([medicine_id]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_invoices_patient_id_invoice_date' AND object_id = OBJECT_ID('dbo.invoices'))
+  CREATE INDEX [IX_invoices_patient_id_invoice_date] ON [dbo].[invoices] ([patient_id], [invoice_date]) INCLUDE ([status]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_invoice_line_items_invoice_id' AND object_id = OBJECT_ID('dbo.invoice_line_items'))
+  CREATE INDEX [IX_invoice_line_items_invoice_id] ON [dbo].[invoice_line_items] ([invoice_id]) INCLUDE ([amount]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_room_assignments_patient_id' AND object_id = OBJECT_ID('dbo.room_assignments'))
+  CREATE INDEX [IX_room_assignments_patient_id] ON [dbo].[room_assignments] ([patient_id]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_room_assignments_end_at' AND object_id = OBJECT_ID('dbo.room_assignments'))
+  CREATE INDEX [IX_room_assignments_end_at] ON [dbo].[room_assignments] ([end_at]) INCLUDE ([room_id], [patient_id], [start_at]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_audit_logs_user_id' AND object_id = OBJECT_ID('dbo.audit_logs'))
+  CREATE INDEX [IX_audit_logs_user_id] ON [dbo].[audit_logs] ([user_id]);
+GO
@@ -0,0 +1,48 @@
+-- 0001 (SQLite): index pack for foreign-key and lookup columns.
+-- Every FK column (and the date columns the app filters on) gets an index, so
+-- joins and per-patient lookups seek instead of scanning. FK columns already
+-- leading a PK, UNIQUE constraint or index from HMS_DB.sqlite.sql are skipped:
+--   users.party_id, patients.party_id, employees.party_id, persons.id,
+--   user_role_assignments.user_id, professional_profiles.employee_id,
+--   appointments.doctor_id, room_assignments.room_id
+-- INCLUDE columns become trailing key columns here.
+
+CREATE INDEX IF NOT EXISTS IX_user_role_assignments_role_id ON user_role_assignments (role_id);
+
+CREATE INDEX IF NOT EXISTS IX_professional_profiles_specialization_id ON professional_profiles (specialization_id);
+
+CREATE INDEX IF NOT EXISTS IX_appointments_patient_id_appointment_at ON appointments (patient_id, appointment_at, doctor_id, status);
+
+CREATE INDEX IF NOT EXISTS IX_appointments_appointment_at ON appointments (appointment_at, doctor_id, status);
+
+CREATE INDEX IF NOT EXISTS IX_medical_records_patient_id_created_at ON medical_records (patient_id, created_at);
+
+CREATE INDEX IF NOT EXISTS IX_medical_records_appointment_id ON medical_records (appointment_id);
+
+CREATE INDEX IF NOT EXISTS IX_medical_records_created_by_user_id ON medical_records (created_by_user_id);
+
+CREATE INDEX IF NOT EXISTS IX_lab_tests_patient_id ON lab_tests (patient_id);
+
+CREATE INDEX IF NOT EXISTS IX_lab_tests_ordered_by_doctor_id ON lab_tests (ordered_by_doctor_id);
+
+CREATE INDEX IF NOT EXISTS IX_medicine_batches_medicine_id_expiration_date ON medicine_batches (medicine_id, expiration_date, quantity_on_hand);
+
+CREATE INDEX IF NOT EXISTS IX_inventory_movements_batch_id ON inventory_movements (batch_id);
+
+CREATE INDEX IF NOT EXISTS IX_inventory_movements_created_by_user_id ON inventory_movements (created_by_user_id);
+
+CREATE INDEX IF NOT EXISTS IX_prescriptions_patient_id_created_at ON prescriptions (patient_id, created_at);
+
+CREATE INDEX IF NOT EXISTS IX_prescriptions_doctor_id ON prescriptions (doctor_id);
+
+CREATE INDEX IF NOT EXISTS IX_prescriptions_medicine_id ON prescriptions (medicine_id);
+
+CREATE INDEX IF NOT EXISTS IX_invoices_patient_id_invoice_date ON invoices (patient_id, invoice_date, status);
+
+CREATE INDEX IF NOT EXISTS IX_invoice_line_items_invoice_id ON invoice_line_items (invoice_id, amount);
+
+CREATE INDEX IF NOT EXISTS IX_room_assignments_patient_id ON room_assignments (patient_id);
+
+CREATE INDEX IF NOT EXISTS IX_room_assignments_end_at ON room_assignments (end_at, room_id, patient_id, start_at);
+
+CREATE INDEX IF NOT EXISTS IX_audit_logs_user_id ON audit_logs (user_id);
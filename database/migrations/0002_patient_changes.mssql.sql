@@ -0,0 +1,39 @@
+-- 0002: patient change log for delta sync of the patient grid (DB.list_patient_changes).
+-- One row per inserted or deleted patient and per edited person that is a patient.
+-- [version] is a rowversion: clients read past their watermark but only below
+-- MIN_ACTIVE_ROWVERSION(), so rows of transactions still in flight are never skipped.
+
+CREATE TABLE [dbo].[patient_changes] (
+  [version] rowversion NOT NULL,
+  [patient_id] int NOT NULL,
+  [op] char(1) NOT NULL,
+  [changed_at] datetime NOT NULL DEFAULT (getdate())
+);
+GO
+
+CREATE UNIQUE CLUSTERED INDEX [CX_patient_changes_version] ON [dbo].[patient_changes] ([version]);
+GO
+
+CREATE TRIGGER [trg_patients_changes] ON [dbo].[patients]
+AFTER INSERT, DELETE
+AS
+BEGIN
+  SET NOCOUNT ON;
+  INSERT INTO dbo.patient_changes (patient_id, op)
+  SELECT id, 'I' FROM inserted
+  UNION ALL
+  SELECT id, 'D' FROM deleted;
+END;
+GO
+
+CREATE TRIGGER [trg_persons_patient_changes] ON [dbo].[persons]
+AFTER UPDATE
+AS
+BEGIN
+  SET NOCOUNT ON;
+  INSERT INTO dbo.patient_changes (patient_id, op)
+  SELECT p.id, 'U'
+  FROM inserted AS i
+  JOIN dbo.patients AS p ON p.party_id = i.id;
+END;
+GO
@@ -0,0 +1,30 @@
+-- 0002 (SQLite): patient change log for delta sync of the patient grid (DB.list_patient_changes).
+-- One row per inserted or deleted patient and per edited person that is a patient.
+-- Writers are serialized, so seq order is commit order and seq is the watermark.
+
+CREATE TABLE patient_changes (
+  seq integer PRIMARY KEY AUTOINCREMENT,
+  patient_id integer NOT NULL,
+  op char(1) NOT NULL,
+  changed_at datetime NOT NULL DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TRIGGER trg_patients_insert_changes
+AFTER INSERT ON patients
+BEGIN
+  INSERT INTO patient_changes (patient_id, op) VALUES (NEW.id, 'I');
+END;
+
+CREATE TRIGGER trg_patients_delete_changes
+AFTER DELETE ON patients
+BEGIN
+  INSERT INTO patient_changes (patient_id, op) VALUES (OLD.id, 'D');
+END;
+
+-- not on row_version: trg_persons_row_version's own bump would log every edit twice
+CREATE TRIGGER trg_persons_patient_changes
+AFTER UPDATE OF first_name, last_name, national_id, address, gender, date_of_birth, phone_number ON persons
+BEGIN
+  INSERT INTO patient_changes (patient_id, op)
+  SELECT id, 'U' FROM patients WHERE party_id = NEW.id;
+END;
@@ -0,0 +1,56 @@
+-- 0003: pharmacy stock aggregates for FEFO dispensing (PharmacyEngine / DB.dispense_stock).
+-- medicine_stock keeps stock on hand per medicine, maintained by a trigger on
+-- medicine_batches, so stock reports never sum batches or movements.
+-- Near-expiry reports seek a filtered index over batches that still hold stock.
+
+CREATE TABLE [dbo].[medicine_stock] (
+  [medicine_id] int PRIMARY KEY,
+  [quantity_on_hand] int NOT NULL DEFAULT (0)
+);
+GO
+
+ALTER TABLE [dbo].[medicine_stock] ADD FOREIGN KEY ([medicine_id]) REFERENCES [dbo].[medicines] ([id]);
+GO
+
+INSERT INTO dbo.medicine_stock (medicine_id, quantity_on_hand)
+SELECT m.id, ISNULL(SUM(b.quantity_on_hand), 0)
+FROM dbo.medicines AS m
+LEFT JOIN dbo.medicine_batches AS b ON b.medicine_id = m.id
+GROUP BY m.id;
+GO
+
+ALTER TABLE [dbo].[medicine_batches] ADD CONSTRAINT [CK_medicine_batches_quantity] CHECK ([quantity_on_hand] >= 0);
+GO
+
+ALTER TABLE [dbo].[inventory_movements] ADD
+  [created_at] datetime NOT NULL CONSTRAINT [DF_inventory_movements_created_at] DEFAULT (getdate()),
+  [prescription_id] int NULL;
+GO
+
+ALTER TABLE [dbo].[inventory_movements] ADD FOREIGN KEY ([prescription_id]) REFERENCES [dbo].[prescriptions] ([id]);
+GO
+
+CREATE INDEX [IX_medicine_batches_expiration_date] ON [dbo].[medicine_batches] ([expiration_date])
+  INCLUDE ([medicine_id], [batch_number], [quantity_on_hand]) WHERE [quantity_on_hand] > 0;
+GO
+
+CREATE TRIGGER [trg_medicine_batches_stock] ON [dbo].[medicine_batches]
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+  SET NOCOUNT ON;
+  WITH changes AS (
+    SELECT medicine_id, quantity_on_hand AS qty FROM inserted
+    UNION ALL
+    SELECT medicine_id, -quantity_on_hand FROM deleted
+  ), delta AS (
+    SELECT medicine_id, SUM(qty) AS qty FROM changes GROUP BY medicine_id
+  )
+  MERGE dbo.medicine_stock AS s
+  USING delta AS d ON s.medicine_id = d.medicine_id
+  WHEN MATCHED AND d.qty <> 0 THEN
+    UPDATE SET quantity_on_hand = s.quantity_on_hand + d.qty
+  WHEN NOT MATCHED THEN
+    INSERT (medicine_id, quantity_on_hand) VALUES (d.medicine_id, d.qty);
+END;
+GO
@@ -0,0 +1,49 @@
+-- 0003 (SQLite): pharmacy stock aggregates for FEFO dispensing (PharmacyEngine / DB.dispense_stock).
+-- medicine_stock keeps stock on hand per medicine, maintained by triggers on
+-- medicine_batches, so stock reports never sum batches or movements.
+-- Near-expiry reports seek a partial index over batches that still hold stock.
+-- SQLite cannot add a CHECK to an existing table; DB.dispense_stock guards quantities itself,
+-- and ALTER TABLE ADD COLUMN needs a constant default, so created_at is written by the app.
+
+CREATE TABLE medicine_stock (
+  medicine_id integer PRIMARY KEY REFERENCES medicines (id),
+  quantity_on_hand integer NOT NULL DEFAULT 0
+);
+
+INSERT INTO medicine_stock (medicine_id, quantity_on_hand)
+SELECT m.id, IFNULL(SUM(b.quantity_on_hand), 0)
+FROM medicines AS m
+LEFT JOIN medicine_batches AS b ON b.medicine_id = m.id
+GROUP BY m.id;
+
+ALTER TABLE inventory_movements ADD COLUMN created_at datetime;
+ALTER TABLE inventory_movements ADD COLUMN prescription_id integer REFERENCES prescriptions (id);
+
+CREATE INDEX IX_medicine_batches_expiration_date
+  ON medicine_batches (expiration_date, medicine_id, batch_number, quantity_on_hand)
+  WHERE quantity_on_hand > 0;
+
+CREATE TRIGGER trg_medicine_batches_stock_insert
+AFTER INSERT ON medicine_batches
+BEGIN
+  INSERT OR IGNORE INTO medicine_stock (medicine_id) VALUES (NEW.medicine_id);
+  UPDATE medicine_stock SET quantity_on_hand = quantity_on_hand + NEW.quantity_on_hand
+  WHERE medicine_id = NEW.medicine_id;
+END;
+
+CREATE TRIGGER trg_medicine_batches_stock_update
+AFTER UPDATE OF medicine_id, quantity_on_hand ON medicine_batches
+BEGIN
+  UPDATE medicine_stock SET quantity_on_hand = quantity_on_hand - OLD.quantity_on_hand
+  WHERE medicine_id = OLD.medicine_id;
+  INSERT OR IGNORE INTO medicine_stock (medicine_id) VALUES (NEW.medicine_id);
+  UPDATE medicine_stock SET quantity_on_hand = quantity_on_hand + NEW.quantity_on_hand
+  WHERE medicine_id = NEW.medicine_id;
+END;
+
+CREATE TRIGGER trg_medicine_batches_stock_delete
+AFTER DELETE ON medicine_batches
+BEGIN
+  UPDATE medicine_stock SET quantity_on_hand = quantity_on_hand - OLD.quantity_on_hand
+  WHERE medicine_id = OLD.medicine_id;
+END;
@@ -0,0 +1,48 @@
+-- 0004: set-based billing runs (DB.bill_services / Billing.run_billing).
+-- billing_tariffs prices each billable service type. Every generated line item
+-- records the service it bills (type, id, date of service); the filtered unique
+-- index on that key is what makes a rerun skip services already billed.
+-- A room day is keyed by its assignment and the day, so service_date is part of the key.
+-- lab_tests gets an ordered_at date to bill by; older tests keep NULL and are not billed.
+
+CREATE TABLE [dbo].[billing_tariffs] (
+  [service_type] nvarchar(50) PRIMARY KEY,
+  [description] nvarchar(255) NOT NULL,
+  [amount] decimal(18,2) NOT NULL
+);
+GO
+
+INSERT INTO dbo.billing_tariffs (service_type, description, amount) VALUES
+  (N'Visit', N'Doctor visit', 50.00),
+  (N'Lab', N'Lab test', 30.00),
+  (N'Pharmacy', N'Prescription', 15.00),
+  (N'Room', N'Room day', 120.00);
+GO
+
+ALTER TABLE [dbo].[invoice_line_items] ADD [service_date] date NULL;
+GO
+
+CREATE UNIQUE INDEX [UX_invoice_line_items_source]
+  ON [dbo].[invoice_line_items] ([source_service_type], [source_service_id], [service_date])
+  WHERE [source_service_id] IS NOT NULL;
+GO
+
+-- nullable with a default: existing rows stay NULL, new ones get the insert time
+ALTER TABLE [dbo].[lab_tests] ADD [ordered_at] datetime NULL
+  CONSTRAINT [DF_lab_tests_ordered_at] DEFAULT (getdate());
+GO
+
+CREATE INDEX [IX_lab_tests_ordered_at] ON [dbo].[lab_tests] ([ordered_at]) INCLUDE ([patient_id], [test_type]);
+GO
+
+-- invoice exports read a date range
+CREATE INDEX [IX_invoices_invoice_date] ON [dbo].[invoices] ([invoice_date]) INCLUDE ([patient_id], [status]);
+GO
+
+CREATE INDEX [IX_prescriptions_created_at] ON [dbo].[prescriptions] ([created_at]) INCLUDE ([patient_id], [medicine_id]);
+GO
+
+-- billing reads completed visits by date: cover patient_id too
+CREATE INDEX [IX_appointments_appointment_at] ON [dbo].[appointments] ([appointment_at])
+  INCLUDE ([doctor_id], [status], [patient_id]) WITH (DROP_EXISTING = ON);
+GO
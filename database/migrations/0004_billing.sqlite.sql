@@ -0,0 +1,41 @@
+-- 0004 (SQLite): set-based billing runs (DB.bill_services / Billing.run_billing).
+-- billing_tariffs prices each billable service type. Every generated line item
+-- records the service it bills (type, id, date of service); the unique partial
+-- index on that key is what makes a rerun skip services already billed.
+-- A room day is keyed by its assignment and the day, so service_date is part of the key.
+-- lab_tests gets an ordered_at date to bill by; older tests keep NULL and are not billed.
+
+CREATE TABLE billing_tariffs (
+  service_type nvarchar(50) PRIMARY KEY,
+  description nvarchar(255) NOT NULL,
+  amount decimal(18,2) NOT NULL
+);
+
+INSERT INTO billing_tariffs (service_type, description, amount) VALUES
+  ('Visit', 'Doctor visit', 50.00),
+  ('Lab', 'Lab test', 30.00),
+  ('Pharmacy', 'Prescription', 15.00),
+  ('Room', 'Room day', 120.00);
+
+ALTER TABLE invoice_line_items ADD COLUMN service_date date;
+
+CREATE UNIQUE INDEX UX_invoice_line_items_source
+  ON invoice_line_items (source_service_type, source_service_id, service_date)
+  WHERE source_service_id IS NOT NULL;
+
+ALTER TABLE lab_tests ADD COLUMN ordered_at datetime;
+
+CREATE TRIGGER trg_lab_tests_ordered_at
+AFTER INSERT ON lab_tests
+WHEN NEW.ordered_at IS NULL
+BEGIN
+  UPDATE lab_tests SET ordered_at = datetime('now', 'localtime') WHERE id = NEW.id;
+END;
+
+CREATE INDEX IX_lab_tests_ordered_at ON lab_tests (ordered_at, patient_id, test_type);
+CREATE INDEX IX_invoices_invoice_date ON invoices (invoice_date, patient_id, status);
+CREATE INDEX IX_prescriptions_created_at ON prescriptions (created_at, patient_id, medicine_id);
+
+-- billing reads completed visits by date: cover patient_id too
+DROP INDEX IF EXISTS IX_appointments_appointment_at;
+CREATE INDEX IX_appointments_appointment_at ON appointments (appointment_at, doctor_id, status, patient_id);
@@ -0,0 +1,16 @@
+-- 0005: per-patient, date-ordered indexes for the clinical timeline (DB.get_patient_timeline).
+-- Every timeline section seeks (patient_id, date) and walks it newest first; lab tests and
+-- room stays only had patient_id, so their pages had to sort the patient's whole history.
+
+DROP INDEX IF EXISTS [IX_lab_tests_patient_id] ON [dbo].[lab_tests];
+GO
+
+CREATE INDEX [IX_lab_tests_patient_id_ordered_at] ON [dbo].[lab_tests] ([patient_id], [ordered_at]);
+GO
+
+DROP INDEX IF EXISTS [IX_room_assignments_patient_id] ON [dbo].[room_assignments];
+GO
+
+CREATE INDEX [IX_room_assignments_patient_id_start_at] ON [dbo].[room_assignments] ([patient_id], [start_at])
+  INCLUDE ([room_id], [end_at]);
+GO
@@ -0,0 +1,9 @@
+-- 0005 (SQLite): per-patient, date-ordered indexes for the clinical timeline (DB.get_patient_timeline).
+-- Every timeline section seeks (patient_id, date) and walks it newest first; lab tests and
+-- room stays only had patient_id, so their pages had to sort the patient's whole history.
+
+DROP INDEX IF EXISTS IX_lab_tests_patient_id;
+CREATE INDEX IX_lab_tests_patient_id_ordered_at ON lab_tests (patient_id, ordered_at);
+
+DROP INDEX IF EXISTS IX_room_assignments_patient_id;
+CREATE INDEX IX_room_assignments_patient_id_start_at ON room_assignments (patient_id, start_at, room_id, end_at);
@@ -0,0 +1,30 @@
+-- no-transaction
+-- 0006: full-text indexes over the clinical notes (DB.search_clinical).
+-- Needs the Full-Text Search feature of SQL Server. CHANGE_TRACKING AUTO keeps the
+-- indexes current as records are written. Full-text DDL cannot run inside a transaction,
+-- so this file runs in autocommit and every batch is guarded to be safe to run again.
+
+IF NOT EXISTS (SELECT 1 FROM sys.fulltext_catalogs WHERE name = 'ftc_clinical')
+  CREATE FULLTEXT CATALOG [ftc_clinical];
+GO
+
+-- the full-text key must be a named single-column unique index; the primary keys are unnamed
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_medical_records_id')
+  CREATE UNIQUE INDEX [UX_medical_records_id] ON [dbo].[medical_records] ([id]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_lab_tests_id')
+  CREATE UNIQUE INDEX [UX_lab_tests_id] ON [dbo].[lab_tests] ([id]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.fulltext_indexes WHERE object_id = OBJECT_ID('dbo.medical_records'))
+  CREATE FULLTEXT INDEX ON [dbo].[medical_records] ([diagnosis] LANGUAGE 1033, [treatment_plan] LANGUAGE 1033)
+    KEY INDEX [UX_medical_records_id] ON [ftc_clinical]
+    WITH CHANGE_TRACKING AUTO;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.fulltext_indexes WHERE object_id = OBJECT_ID('dbo.lab_tests'))
+  CREATE FULLTEXT INDEX ON [dbo].[lab_tests] ([test_type] LANGUAGE 1033, [result] LANGUAGE 1033)
+    KEY INDEX [UX_lab_tests_id] ON [ftc_clinical]
+    WITH CHANGE_TRACKING AUTO;
+GO
@@ -0,0 +1,61 @@
+-- 0006 (SQLite): FTS5 inverted indexes over the clinical notes (DB.search_clinical).
+-- External-content tables: the text stays in medical_records / lab_tests, the FTS tables
+-- hold only the index, and the triggers keep it current as records are written.
+
+CREATE VIRTUAL TABLE medical_records_fts USING fts5 (
+  diagnosis, treatment_plan,
+  content = 'medical_records', content_rowid = 'id', tokenize = 'unicode61 remove_diacritics 2'
+);
+
+CREATE VIRTUAL TABLE lab_tests_fts USING fts5 (
+  test_type, result,
+  content = 'lab_tests', content_rowid = 'id', tokenize = 'unicode61 remove_diacritics 2'
+);
+
+INSERT INTO medical_records_fts (medical_records_fts) VALUES ('rebuild');
+INSERT INTO lab_tests_fts (lab_tests_fts) VALUES ('rebuild');
+
+CREATE TRIGGER trg_medical_records_fts_insert
+AFTER INSERT ON medical_records
+BEGIN
+  INSERT INTO medical_records_fts (rowid, diagnosis, treatment_plan)
+  VALUES (NEW.id, NEW.diagnosis, NEW.treatment_plan);
+END;
+
+CREATE TRIGGER trg_medical_records_fts_delete
+AFTER DELETE ON medical_records
+BEGIN
+  INSERT INTO medical_records_fts (medical_records_fts, rowid, diagnosis, treatment_plan)
+  VALUES ('delete', OLD.id, OLD.diagnosis, OLD.treatment_plan);
+END;
+
+CREATE TRIGGER trg_medical_records_fts_update
+AFTER UPDATE OF diagnosis, treatment_plan ON medical_records
+BEGIN
+  INSERT INTO medical_records_fts (medical_records_fts, rowid, diagnosis, treatment_plan)
+  VALUES ('delete', OLD.id, OLD.diagnosis, OLD.treatment_plan);
+  INSERT INTO medical_records_fts (rowid, diagnosis, treatment_plan)
+  VALUES (NEW.id, NEW.diagnosis, NEW.treatment_plan);
+END;
+
+CREATE TRIGGER trg_lab_tests_fts_insert
+AFTER INSERT ON lab_tests
+BEGIN
+  INSERT INTO lab_tests_fts (rowid, test_type, result) VALUES (NEW.id, NEW.test_type, NEW.result);
+END;
+
+CREATE TRIGGER trg_lab_tests_fts_delete
+AFTER DELETE ON lab_tests
+BEGIN
+  INSERT INTO lab_tests_fts (lab_tests_fts, rowid, test_type, result)
+  VALUES ('delete', OLD.id, OLD.test_type, OLD.result);
+END;
+
+-- not on ordered_at: trg_lab_tests_ordered_at fills it in after every insert
+CREATE TRIGGER trg_lab_tests_fts_update
+AFTER UPDATE OF test_type, result ON lab_tests
+BEGIN
+  INSERT INTO lab_tests_fts (lab_tests_fts, rowid, test_type, result)
+  VALUES ('delete', OLD.id, OLD.test_type, OLD.result);
+  INSERT INTO lab_tests_fts (rowid, test_type, result) VALUES (NEW.id, NEW.test_type, NEW.result);
+END;
@@ -0,0 +1,154 @@
+-- 0007: precomputed daily rollups for the dashboard (DB.refresh_report_rollups / Reports.py).
+-- Every write to a source table logs the day(s) it touches in report_dirty_days; a refresh
+-- recomputes only the days logged past its watermark (plus the days since the last refresh,
+-- for open room stays and appointments that became no-shows), never the whole history.
+-- day_to NULL: from day_from until today (a room stay that is still open).
+-- [version] is a rowversion: a refresh reads below MIN_ACTIVE_ROWVERSION() only, so days
+-- logged by transactions still in flight are left for the next one.
+
+CREATE TABLE [dbo].[report_dirty_days] (
+  [version] rowversion NOT NULL,
+  [day_from] date NOT NULL,
+  [day_to] date NULL
+);
+GO
+
+CREATE UNIQUE CLUSTERED INDEX [CX_report_dirty_days_version] ON [dbo].[report_dirty_days] ([version]);
+GO
+
+-- one row: the refresh watermark and the day it last ran (NULL: never, the first refresh rebuilds)
+CREATE TABLE [dbo].[report_state] (
+  [id] int PRIMARY KEY CHECK ([id] = 1),
+  [watermark] binary(8) NOT NULL DEFAULT (0x0000000000000000),
+  [refreshed_on] date NULL,
+  [refreshed_at] datetime NULL
+);
+GO
+
+INSERT INTO dbo.report_state (id) VALUES (1);
+GO
+
+CREATE TABLE [dbo].[report_doctor_day] (
+  [day] date NOT NULL,
+  [doctor_id] int NOT NULL,
+  [appointments] int NOT NULL,
+  [completed] int NOT NULL,
+  [cancelled] int NOT NULL,
+  [no_shows] int NOT NULL,
+  [lab_tests] int NOT NULL,
+  PRIMARY KEY ([day], [doctor_id])
+);
+GO
+
+CREATE TABLE [dbo].[report_specialization_day] (
+  [day] date NOT NULL,
+  [specialization_id] int NOT NULL,
+  [appointments] int NOT NULL,
+  [completed] int NOT NULL,
+  [cancelled] int NOT NULL,
+  [no_shows] int NOT NULL,
+  [lab_tests] int NOT NULL,
+  PRIMARY KEY ([day], [specialization_id])
+);
+GO
+
+CREATE TABLE [dbo].[report_lab_day] (
+  [day] date NOT NULL,
+  [test_type] nvarchar(100) NOT NULL,
+  [tests] int NOT NULL,
+  PRIMARY KEY ([day], [test_type])
+);
+GO
+
+CREATE TABLE [dbo].[report_revenue_day] (
+  [day] date NOT NULL,
+  [service_type] nvarchar(50) NOT NULL,
+  [lines] int NOT NULL,
+  [amount] decimal(18,2) NOT NULL,
+  PRIMARY KEY ([day], [service_type])
+);
+GO
+
+-- occupancy only: utilization divides by the ward's rooms when it is read
+CREATE TABLE [dbo].[report_room_day] (
+  [day] date NOT NULL,
+  [ward] nvarchar(50) NOT NULL,
+  [stays] int NOT NULL,
+  [occupied_minutes] int NOT NULL,
+  PRIMARY KEY ([day], [ward])
+);
+GO
+
+-- revenue is rolled up by date of service; lines billed before 0004 fall back to the invoice date
+CREATE INDEX [IX_invoice_line_items_service_date] ON [dbo].[invoice_line_items] ([service_date])
+  INCLUDE ([source_service_type], [amount]);
+GO
+
+CREATE TRIGGER [trg_appointments_report] ON [dbo].[appointments]
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+  SET NOCOUNT ON;
+  INSERT INTO dbo.report_dirty_days (day_from, day_to)
+  SELECT DISTINCT d, d
+  FROM (SELECT CAST(appointment_at AS date) AS d FROM inserted
+        UNION ALL
+        SELECT CAST(appointment_at AS date) FROM deleted) AS days;
+END;
+GO
+
+-- lab tests without ordered_at (older than 0004) are not reported
+CREATE TRIGGER [trg_lab_tests_report] ON [dbo].[lab_tests]
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+  SET NOCOUNT ON;
+  INSERT INTO dbo.report_dirty_days (day_from, day_to)
+  SELECT DISTINCT d, d
+  FROM (SELECT CAST(ordered_at AS date) AS d FROM inserted
+        UNION ALL
+        SELECT CAST(ordered_at AS date) FROM deleted) AS days
+  WHERE d IS NOT NULL;
+END;
+GO
+
+CREATE TRIGGER [trg_invoice_line_items_report] ON [dbo].[invoice_line_items]
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+  SET NOCOUNT ON;
+  INSERT INTO dbo.report_dirty_days (day_from, day_to)
+  SELECT DISTINCT d, d
+  FROM (SELECT ISNULL(li.service_date, i.invoice_date) AS d
+        FROM inserted AS li JOIN dbo.invoices AS i ON i.id = li.invoice_id
+        UNION ALL
+        SELECT ISNULL(li.service_date, i.invoice_date)
+        FROM deleted AS li JOIN dbo.invoices AS i ON i.id = li.invoice_id) AS days;
+END;
+GO
+
+CREATE TRIGGER [trg_invoices_report] ON [dbo].[invoices]
+AFTER UPDATE
+AS
+BEGIN
+  SET NOCOUNT ON;
+  IF UPDATE(invoice_date)
+    INSERT INTO dbo.report_dirty_days (day_from, day_to)
+    SELECT DISTINCT d, d
+    FROM (SELECT invoice_date AS d FROM inserted
+          UNION ALL
+          SELECT invoice_date FROM deleted) AS days;
+END;
+GO
+
+CREATE TRIGGER [trg_room_assignments_report] ON [dbo].[room_assignments]
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+  SET NOCOUNT ON;
+  INSERT INTO dbo.report_dirty_days (day_from, day_to)
+  SELECT CAST(start_at AS date), CAST(end_at AS date) FROM inserted
+  UNION ALL
+  SELECT CAST(start_at AS date), CAST(end_at AS date) FROM deleted;
+END;
+GO
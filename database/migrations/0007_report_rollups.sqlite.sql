@@ -0,0 +1,176 @@
+-- 0007 (SQLite): precomputed daily rollups for the dashboard (DB.refresh_report_rollups / Reports.py).
+-- Every write to a source table logs the day(s) it touches in report_dirty_days; a refresh
+-- recomputes only the days logged past its watermark (plus the days since the last refresh,
+-- for open room stays and appointments that became no-shows), never the whole history.
+-- day_to NULL: from day_from until today (a room stay that is still open).
+-- Writers are serialized, so seq order is commit order and seq is the watermark.
+-- The row-level triggers of bulk writes (a day's bookings, a billing run) skip a day the
+-- newest log row already holds: one seek on seq instead of a log row per source row.
+
+CREATE TABLE report_dirty_days (
+  seq integer PRIMARY KEY AUTOINCREMENT,
+  day_from date NOT NULL,
+  day_to date
+);
+
+-- one row: the refresh watermark and the day it last ran (NULL: never, the first refresh rebuilds)
+CREATE TABLE report_state (
+  id integer PRIMARY KEY CHECK (id = 1),
+  watermark integer NOT NULL DEFAULT 0,
+  refreshed_on date,
+  refreshed_at datetime
+);
+
+INSERT INTO report_state (id) VALUES (1);
+
+CREATE TABLE report_doctor_day (
+  day date NOT NULL,
+  doctor_id integer NOT NULL,
+  appointments integer NOT NULL,
+  completed integer NOT NULL,
+  cancelled integer NOT NULL,
+  no_shows integer NOT NULL,
+  lab_tests integer NOT NULL,
+  PRIMARY KEY (day, doctor_id)
+);
+
+CREATE TABLE report_specialization_day (
+  day date NOT NULL,
+  specialization_id integer NOT NULL,
+  appointments integer NOT NULL,
+  completed integer NOT NULL,
+  cancelled integer NOT NULL,
+  no_shows integer NOT NULL,
+  lab_tests integer NOT NULL,
+  PRIMARY KEY (day, specialization_id)
+);
+
+CREATE TABLE report_lab_day (
+  day date NOT NULL,
+  test_type nvarchar(100) NOT NULL,
+  tests integer NOT NULL,
+  PRIMARY KEY (day, test_type)
+);
+
+CREATE TABLE report_revenue_day (
+  day date NOT NULL,
+  service_type nvarchar(50) NOT NULL,
+  lines integer NOT NULL,
+  amount decimal(18,2) NOT NULL,
+  PRIMARY KEY (day, service_type)
+);
+
+-- occupancy only: utilization divides by the ward's rooms when it is read
+CREATE TABLE report_room_day (
+  day date NOT NULL,
+  ward nvarchar(50) NOT NULL,
+  stays integer NOT NULL,
+  occupied_minutes integer NOT NULL,
+  PRIMARY KEY (day, ward)
+);
+
+-- revenue is rolled up by date of service; lines billed before 0004 fall back to the invoice date
+CREATE INDEX IX_invoice_line_items_service_date ON invoice_line_items (service_date, source_service_type, amount);
+
+CREATE TRIGGER trg_appointments_report_insert
+AFTER INSERT ON appointments
+BEGIN
+  INSERT INTO report_dirty_days (day_from, day_to)
+  SELECT d, d FROM (SELECT date(NEW.appointment_at) AS d)
+  WHERE NOT EXISTS (SELECT 1 FROM report_dirty_days
+                    WHERE seq = (SELECT MAX(seq) FROM report_dirty_days) AND day_from = d AND day_to = d);
+END;
+
+CREATE TRIGGER trg_appointments_report_update
+AFTER UPDATE OF doctor_id, appointment_at, status ON appointments
+BEGIN
+  INSERT INTO report_dirty_days (day_from, day_to)
+  SELECT d, d FROM (SELECT date(OLD.appointment_at) AS d UNION SELECT date(NEW.appointment_at))
+  WHERE NOT EXISTS (SELECT 1 FROM report_dirty_days
+                    WHERE seq = (SELECT MAX(seq) FROM report_dirty_days) AND day_from = d AND day_to = d);
+END;
+
+CREATE TRIGGER trg_appointments_report_delete
+AFTER DELETE ON appointments
+BEGIN
+  INSERT INTO report_dirty_days (day_from, day_to) VALUES (date(OLD.appointment_at), date(OLD.appointment_at));
+END;
+
+-- lab tests without ordered_at (older than 0004) are not reported; one inserted without it
+-- is logged by the update trigger when trg_lab_tests_ordered_at fills it in
+CREATE TRIGGER trg_lab_tests_report_insert
+AFTER INSERT ON lab_tests
+WHEN NEW.ordered_at IS NOT NULL
+BEGIN
+  INSERT INTO report_dirty_days (day_from, day_to)
+  SELECT d, d FROM (SELECT date(NEW.ordered_at) AS d)
+  WHERE NOT EXISTS (SELECT 1 FROM report_dirty_days
+                    WHERE seq = (SELECT MAX(seq) FROM report_dirty_days) AND day_from = d AND day_to = d);
+END;
+
+CREATE TRIGGER trg_lab_tests_report_update
+AFTER UPDATE OF test_type, ordered_by_doctor_id, ordered_at ON lab_tests
+BEGIN
+  INSERT INTO report_dirty_days (day_from, day_to)
+  SELECT date(OLD.ordered_at), date(OLD.ordered_at) WHERE OLD.ordered_at IS NOT NULL
+  UNION ALL
+  SELECT date(NEW.ordered_at), date(NEW.ordered_at) WHERE NEW.ordered_at IS NOT NULL;
+END;
+
+CREATE TRIGGER trg_lab_tests_report_delete
+AFTER DELETE ON lab_tests
+WHEN OLD.ordered_at IS NOT NULL
+BEGIN
+  INSERT INTO report_dirty_days (day_from, day_to) VALUES (date(OLD.ordered_at), date(OLD.ordered_at));
+END;
+
+CREATE TRIGGER trg_invoice_line_items_report_insert
+AFTER INSERT ON invoice_line_items
+BEGIN
+  INSERT INTO report_dirty_days (day_from, day_to)
+  SELECT d, d FROM (SELECT IFNULL(NEW.service_date, (SELECT invoice_date FROM invoices WHERE id = NEW.invoice_id)) AS d)
+  WHERE NOT EXISTS (SELECT 1 FROM report_dirty_days
+                    WHERE seq = (SELECT MAX(seq) FROM report_dirty_days) AND day_from = d AND day_to = d);
+END;
+
+CREATE TRIGGER trg_invoice_line_items_report_update
+AFTER UPDATE OF invoice_id, amount, source_service_type, service_date ON invoice_line_items
+BEGIN
+  INSERT INTO report_dirty_days (day_from, day_to)
+  SELECT d, d FROM (SELECT IFNULL(OLD.service_date, (SELECT invoice_date FROM invoices WHERE id = OLD.invoice_id)) AS d
+                    UNION ALL
+                    SELECT IFNULL(NEW.service_date, (SELECT invoice_date FROM invoices WHERE id = NEW.invoice_id)));
+END;
+
+CREATE TRIGGER trg_invoice_line_items_report_delete
+AFTER DELETE ON invoice_line_items
+BEGIN
+  INSERT INTO report_dirty_days (day_from, day_to)
+  SELECT d, d FROM (SELECT IFNULL(OLD.service_date, (SELECT invoice_date FROM invoices WHERE id = OLD.invoice_id)) AS d);
+END;
+
+CREATE TRIGGER trg_invoices_report_update
+AFTER UPDATE OF invoice_date ON invoices
+BEGIN
+  INSERT INTO report_dirty_days (day_from, day_to)
+  VALUES (OLD.invoice_date, OLD.invoice_date), (NEW.invoice_date, NEW.invoice_date);
+END;
+
+CREATE TRIGGER trg_room_assignments_report_insert
+AFTER INSERT ON room_assignments
+BEGIN
+  INSERT INTO report_dirty_days (day_from, day_to) VALUES (date(NEW.start_at), date(NEW.end_at));
+END;
+
+CREATE TRIGGER trg_room_assignments_report_update
+AFTER UPDATE OF room_id, start_at, end_at ON room_assignments
+BEGIN
+  INSERT INTO report_dirty_days (day_from, day_to)
+  VALUES (date(OLD.start_at), date(OLD.end_at)), (date(NEW.start_at), date(NEW.end_at));
+END;
+
+CREATE TRIGGER trg_room_assignments_report_delete
+AFTER DELETE ON room_assignments
+BEGIN
+  INSERT INTO report_dirty_days (day_from, day_to) VALUES (date(OLD.start_at), date(OLD.end_at));
+END;
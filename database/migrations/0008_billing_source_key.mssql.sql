@@ -0,0 +1,18 @@
+-- 0008: narrow the billed-service key of 0004 (DB.bill_services).
+-- A visit, prescription or lab test is billed once, whatever its date: keyed by (type, id),
+-- so correcting the date of a billed service and rerunning the day does not bill it again.
+-- Only a room day keeps service_date in its key (one line per assignment and day).
+-- A database already holding such double-billed lines fails here: credit them first.
+
+DROP INDEX [UX_invoice_line_items_source] ON [dbo].[invoice_line_items];
+GO
+
+CREATE UNIQUE INDEX [UX_invoice_line_items_source]
+  ON [dbo].[invoice_line_items] ([source_service_type], [source_service_id])
+  WHERE [source_service_id] IS NOT NULL AND [source_service_type] <> N'Room';
+GO
+
+CREATE UNIQUE INDEX [UX_invoice_line_items_room_day]
+  ON [dbo].[invoice_line_items] ([source_service_id], [service_date])
+  WHERE [source_service_id] IS NOT NULL AND [source_service_type] = N'Room';
+GO
@@ -0,0 +1,26 @@
+-- 0009: the medicine_stock trigger of 0003 without its insert race.
+-- Two transactions receiving the first batches of the same medicine could both
+-- find no medicine_stock row and both insert it (a primary key violation that
+-- fails the second delivery). HOLDLOCK keeps the range locked from the MERGE's
+-- lookup to its insert, so the second one waits and then updates the row.
+
+CREATE OR ALTER TRIGGER [trg_medicine_batches_stock] ON [dbo].[medicine_batches]
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+  SET NOCOUNT ON;
+  WITH changes AS (
+    SELECT medicine_id, quantity_on_hand AS qty FROM inserted
+    UNION ALL
+    SELECT medicine_id, -quantity_on_hand FROM deleted
+  ), delta AS (
+    SELECT medicine_id, SUM(qty) AS qty FROM changes GROUP BY medicine_id
+  )
+  MERGE dbo.medicine_stock WITH (HOLDLOCK) AS s
+  USING delta AS d ON s.medicine_id = d.medicine_id
+  WHEN MATCHED AND d.qty <> 0 THEN
+    UPDATE SET quantity_on_hand = s.quantity_on_hand + d.qty
+  WHEN NOT MATCHED THEN
+    INSERT (medicine_id, quantity_on_hand) VALUES (d.medicine_id, d.qty);
+END;
+GO
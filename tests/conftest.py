@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app", "src")))
+
+import DB  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """DB helpers backed by a fresh SQLite file with the HMS schema."""
+    DB.use_sqlite(str(tmp_path / "hms.sqlite3"))
+    yield DB
+    DB.get_pool().close()
+
+
+@pytest.fixture
+def doctor_id(db):
+    """Employee id of a doctor (appointments reference employees)."""
+    with DB.conn_cursor() as (_, cur):
+        cur.execute("INSERT INTO dbo.parties (party_type) VALUES ('PERSON') RETURNING id;")
+        party_id = cur.fetchall()[0][0]
+        cur.execute("INSERT INTO dbo.employees (party_id) VALUES (?) RETURNING id;", (party_id,))
+        return cur.fetchall()[0][0]
+
+
+@pytest.fixture
+def user_id(db):
+    """Id of a login (audit rows reference users)."""
+    with DB.conn_cursor() as (_, cur):
+        cur.execute("INSERT INTO dbo.parties (party_type) VALUES ('PERSON') RETURNING id;")
+        party_id = cur.fetchall()[0][0]
+    DB.create_user_plain("tester", "x", party_id=party_id)
+    return DB.get_user_by_username("tester")["id"]
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+import pytest
+
+from ApiClient import ApiClient
+from ApiServer import ApiServer
+
+TOKEN = "test-token"
+
+
+@pytest.fixture
+def server(db, user_id):
+    """An ApiServer on a free loopback port, serving the test database from a background loop."""
+    server = ApiServer(TOKEN, workers=2)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    serving = []
+
+    def run():
+        asyncio.set_event_loop(loop)
+        task = loop.create_task(server.serve(port=0, ready=lambda addr: (setattr(server, "addr", addr), started.set())))
+        serving.append(task)
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        rest = asyncio.all_tasks(loop)  # open keep-alive connections
+        for t in rest:
+            t.cancel()
+        loop.run_until_complete(asyncio.gather(*rest, return_exceptions=True))
+        loop.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert started.wait(5)
+    yield server
+    loop.call_soon_threadsafe(serving[0].cancel)
+    thread.join(5)
+    server._threads.shutdown(wait=True)
+
+
+def client_of(server):
+    host, port = server.addr
+    return ApiClient(f"http://{host}:{port}", token=TOKEN)
+
+
+def test_login_answer_carries_no_password_hash(server):
+    ok, user, _ = client_of(server).call("verify_user_password_plain", "tester", "x")
+    assert ok and user["username"] == "tester"
+    assert "password_hash" not in user
+
+
+def test_client_logs_in_again_after_the_server_forgets_its_session(server):
+    client = client_of(server)
+    client.call("verify_user_password_plain", "tester", "x")
+    server._sessions.clear()  # what a restart of the service does
+
+    assert client.call("patient_change_watermark") is not None
+    assert len(server._sessions) == 1
+
+
+def test_refused_login_leaves_the_call_unauthorized(db, server):
+    client = client_of(server)
+    client.call("verify_user_password_plain", "tester", "x")
+    with db.conn_cursor() as (_, cur):
+        cur.execute("UPDATE dbo.users SET account_status = 'Disabled' WHERE username = 'tester';")
+    server._sessions.clear()
+
+    with pytest.raises(PermissionError):
+        client.call("patient_change_watermark")
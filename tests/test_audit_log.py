@@ -0,0 +1,61 @@
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+from AuditLog import AuditLog
+
+
+def audit_rows(db):
+    with db.conn_cursor() as (_, cur):
+        cur.execute("SELECT user_id, action, record_id FROM dbo.audit_logs ORDER BY record_id")
+        return [tuple(r) for r in cur.fetchall()]
+
+
+def test_rows_spilled_while_the_db_is_down_are_replayed_once(db, user_id, tmp_path):
+    down = [True]
+
+    def insert(rows):
+        if down[0]:
+            raise sqlite3.OperationalError("unable to open database file")
+        return db.insert_audit_logs(rows)
+
+    audit = AuditLog(insert=insert, spill_path=str(tmp_path / "spill.jsonl"), batch_size=2)
+    for record_id in range(1, 4):
+        audit.record(user_id, "VIEW", "patients", record_id)
+    audit.flush(5)
+    assert audit.stats()["spilled"] == 3 and audit_rows(db) == []
+
+    down[0] = False
+    audit._down_until = 0.0  # the retry pause is over
+    audit.flush(5)
+    audit.close()
+    assert audit_rows(db) == [(user_id, "VIEW", 1), (user_id, "VIEW", 2), (user_id, "VIEW", 3)]
+    assert not os.path.exists(audit.spill_path)
+
+
+def test_a_row_the_db_refuses_is_set_aside_not_retried(db, user_id, tmp_path):
+    audit = AuditLog(insert=db.insert_audit_logs, spill_path=str(tmp_path / "spill.jsonl"))
+    audit.record(user_id, "VIEW", "patients", 1)
+    audit.record(999, "VIEW", "patients", 2)  # no such user: a foreign key failure
+    audit.record(user_id, "VIEW", "patients", 3)
+    audit.flush(5)
+    audit.record(user_id, "VIEW", "patients", 4)  # not diverted to the spill file
+    audit.close()
+    assert audit_rows(db) == [(user_id, "VIEW", 1), (user_id, "VIEW", 3), (user_id, "VIEW", 4)]
+    assert not os.path.exists(audit.spill_path)
+    with open(audit.dead_letter_path, encoding="utf-8") as f:
+        [rejected] = [json.loads(line) for line in f]
+    assert rejected[:4] == [999, "VIEW", "patients", 2] and "IntegrityError" in rejected[5]
+
+
+def test_a_refused_row_in_the_spill_file_does_not_stall_it(db, user_id, tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    now = datetime.now().isoformat()
+    spill.write_text("".join(json.dumps([uid, "VIEW", "patients", rid, now]) + "\n"
+                             for uid, rid in ((user_id, 1), (999, 2), (user_id, 3))), encoding="utf-8")
+    audit = AuditLog(insert=db.insert_audit_logs, spill_path=str(spill))
+    audit.record(user_id, "VIEW", "patients", 4)  # starts the writer, which replays the file first
+    audit.close()
+    assert audit_rows(db) == [(user_id, "VIEW", 1), (user_id, "VIEW", 3), (user_id, "VIEW", 4)]
+    assert not spill.exists() and audit.stats()["rejected"] == 1
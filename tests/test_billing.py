@@ -0,0 +1,42 @@
+from datetime import date, datetime
+
+from test_round_trips import PATIENT
+
+
+def billed(db):
+    with db.conn_cursor() as (_, cur):
+        cur.execute("""
+            SELECT source_service_type, source_service_id, service_date
+            FROM dbo.invoice_line_items ORDER BY id
+        """)
+        return [tuple(r) for r in cur.fetchall()]
+
+
+def test_rerun_bills_nothing_twice(db, doctor_id):
+    patient_id = db.insert_patient(PATIENT)
+    db.insert_appointment(patient_id, doctor_id, datetime(2024, 3, 4, 10, 0), status="Completed")
+    first = db.bill_services(date(2024, 3, 4), date(2024, 3, 5))
+    assert first["invoices"] == 1 and first["lines"]["Visit"][0] == 1
+    again = db.bill_services(date(2024, 3, 4), date(2024, 3, 5))
+    assert again == {"invoices": 0, "lines": {}}
+    assert len(billed(db)) == 1
+
+
+def test_corrected_service_date_is_not_billed_again(db, doctor_id):
+    patient_id = db.insert_patient(PATIENT)
+    db.insert_appointment(patient_id, doctor_id, datetime(2024, 3, 4, 10, 0), status="Completed")
+    db.bill_services(date(2024, 3, 4), date(2024, 3, 5))
+    with db.conn_cursor() as (_, cur):  # the visit was really on the 5th
+        cur.execute("UPDATE dbo.appointments SET appointment_at = ?", (datetime(2024, 3, 5, 10, 0),))
+    assert db.bill_services(date(2024, 3, 4), date(2024, 3, 6))["lines"] == {}
+    assert [kind for kind, _, _ in billed(db)] == ["Visit"]
+
+
+def test_stay_ending_at_midnight_is_not_billed_for_that_day(db):
+    patient_id = db.insert_patient(PATIENT)
+    with db.conn_cursor() as (_, cur):
+        cur.execute("INSERT INTO dbo.rooms (room_number) VALUES ('101') RETURNING id")
+        room_id = cur.fetchone()[0]
+    db.insert_room_assignment(patient_id, room_id, datetime(2024, 3, 3, 14, 0), datetime(2024, 3, 5, 0, 0))
+    db.bill_services(date(2024, 3, 1), date(2024, 3, 8))
+    assert [day for kind, _, day in billed(db)] == [date(2024, 3, 3), date(2024, 3, 4)]
@@ -0,0 +1,78 @@
+import csv
+import sqlite3
+
+import pytest
+
+import BulkImport
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["FirstName", "LastName", "NationalID", "BirthDate"])
+        w.writerows(rows)
+    return str(path)
+
+
+def error_lines(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return {int(r["line"]): r["error"] for r in csv.DictReader(f)}
+
+
+def registered(db):
+    with db.conn_cursor() as (_, cur):
+        cur.execute("SELECT national_id FROM dbo.persons ORDER BY national_id")
+        return [r.national_id for r in cur.fetchall()]
+
+
+def test_rows_the_database_would_refuse_are_reported_not_fatal(db, tmp_path):
+    path = write_csv(tmp_path / "in.csv", [
+        ("Ali", "Rezaei", "A100", "1980-01-02"),
+        ("Sara", "Karimi", "X" * 21, ""),      # longer than persons.national_id
+        ("Reza", "Rezaei", "a100", ""),        # same ID but for case
+        ("Mina", "Ahmadi", "A101", "02/03/1990"),
+    ])
+    report = BulkImport.import_patients(path, batch_size=10)
+    assert (report.inserted, report.rejected) == (2, 2)
+    errors = error_lines(path + ".errors.csv")
+    assert errors[3] == "National ID is longer than 20 characters."
+    assert errors[4] == "Duplicate National ID within the file."
+    assert registered(db) == ["A100", "A101"]
+
+
+def test_a_refused_batch_is_split_down_to_the_offending_row(db, tmp_path, monkeypatch):
+    real = BulkImport.insert_patients_bulk
+
+    def insert(rows):  # the DB refuses line 4, as on a concurrent insert of the same ID
+        if any(line_no == 4 for line_no, _ in rows):
+            raise sqlite3.IntegrityError("UNIQUE constraint failed: persons.national_id")
+        return real(rows)
+
+    monkeypatch.setattr(BulkImport, "insert_patients_bulk", insert)
+    path = write_csv(tmp_path / "in.csv", [(f"P{i}", "Test", f"N{i}", "") for i in range(6)])
+    report = BulkImport.import_patients(path, batch_size=10)
+    assert (report.inserted, report.rejected) == (5, 1)
+    assert list(error_lines(path + ".errors.csv")) == [4]
+    assert len(registered(db)) == 5
+
+
+def test_other_failures_stop_at_the_last_checkpoint(db, tmp_path, monkeypatch):
+    real = BulkImport.insert_patients_bulk
+    calls = []
+
+    def insert(rows):  # the second batch loses its connection
+        calls.append(rows)
+        if len(calls) == 2:
+            raise sqlite3.OperationalError("disk I/O error")
+        return real(rows)
+
+    monkeypatch.setattr(BulkImport, "insert_patients_bulk", insert)
+    path = write_csv(tmp_path / "in.csv", [(f"P{i}", "Test", f"N{i}", "") for i in range(5)])
+    with pytest.raises(sqlite3.OperationalError):
+        BulkImport.import_patients(path, batch_size=2)
+    assert len(registered(db)) == 2
+
+    resumed = BulkImport.import_patients(path, batch_size=2)  # picks up after line 3
+    assert (resumed.inserted, resumed.rejected) == (3, 0)
+    assert len(registered(db)) == 5
+    assert error_lines(path + ".errors.csv") == {}
@@ -0,0 +1,50 @@
+from datetime import date
+
+from Dedupe import DedupeIndex, find_duplicates, prepare, score
+from test_round_trips import PATIENT
+
+
+def as_entered(**changes):
+    return {**PATIENT, **changes}
+
+
+def test_typos_in_name_and_birth_date_still_match(db):
+    patient_id = db.insert_patient(PATIENT)
+    index = DedupeIndex()
+    found = index.candidates(as_entered(LastName="Ahmady", BirthDate=date(1990, 1, 5)))  # day and month swapped
+    assert [row[0] for _, row, _ in found] == [patient_id]
+    s, _, reasons = found[0]
+    assert index.threshold <= s < 1
+    assert "DOB close" in reasons and "phone same" in reasons and "ID same" in reasons
+
+
+def test_namesake_with_other_details_is_not_a_candidate(db):
+    db.insert_patient(PATIENT)
+    other = as_entered(NationalID="0098765432", BirthDate=date(1975, 11, 20), Phone="09351112233")
+    assert DedupeIndex().candidates(other) == []
+
+
+def test_swapped_names_score_as_the_same_person():
+    a = prepare((1, "Sara", "Ahmadi", "0012345678", date(1990, 5, 1), "09120000000"))
+    b = prepare((2, "Ahmadi", "Sara", "0012345678", date(1990, 5, 1), "09120000000"))
+    s, reasons = score(a, b)
+    assert s == 1.0
+    assert reasons[0] == "name 1.00 (swapped)"
+
+
+def test_patient_added_after_the_load_is_found_and_can_be_excluded(db):
+    index = DedupeIndex()
+    index.load()
+    patient_id = db.insert_patient(PATIENT)  # reaches the index through the change feed
+    assert [row[0] for _, row, _ in index.candidates(PATIENT)] == [patient_id]
+    assert index.candidates(PATIENT, exclude_id=patient_id) == []  # editing the record itself
+
+
+def test_report_lists_each_pair_once(db):
+    first = db.insert_patient(PATIENT)
+    second = db.insert_patient(as_entered(FirstName="Sarah", NationalID=""))
+    db.insert_patient(as_entered(FirstName="Reza", LastName="Karimi", NationalID="0011111111",
+                                 BirthDate=date(1980, 2, 2), Phone="09121111111"))
+    pairs, stats = find_duplicates(workers=1)
+    assert [(a, b) for _, a, b, _ in pairs] == [(first, second)]
+    assert stats["patients"] == 3
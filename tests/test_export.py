@@ -0,0 +1,35 @@
+import csv
+import gzip
+import threading
+
+import pytest
+
+import Export
+from test_round_trips import PATIENT
+
+
+def test_a_stopped_export_continues_where_it_left_off(db, tmp_path):
+    for i in range(7):
+        db.insert_patient({**PATIENT, "NationalID": f"N{i}"})
+    stop, seen = threading.Event(), []
+
+    def progress(table, rows):
+        seen.append(rows)
+        stop.set()  # the user presses Stop after the first chunk
+
+    with pytest.raises(Export.ExportStopped):
+        Export.export_table("patients", str(tmp_path), batch=3, progress=progress, stop=stop)
+    assert seen == [3]
+
+    result = Export.export_table("patients", str(tmp_path), batch=3)
+    assert (result["rows"], result["total_rows"]) == (4, 7)
+    with gzip.open(result["path"], "rt", encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))[1:]
+    assert [r[4] for r in rows] == [f"N{i}" for i in range(7)]  # each row once, in key order
+
+
+def test_restart_starts_over(db, tmp_path):
+    db.insert_patient(PATIENT)
+    Export.export_table("patients", str(tmp_path), fmt="jsonl", compression="none")
+    again = Export.export_table("patients", str(tmp_path), fmt="jsonl", compression="none", restart=True)
+    assert (again["rows"], again["total_rows"]) == (1, 1)
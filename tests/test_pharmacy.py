@@ -0,0 +1,32 @@
+from datetime import date, timedelta
+
+import pytest
+
+from Pharmacy import OutOfStockError, PharmacyEngine
+
+
+@pytest.fixture
+def medicine_id(db):
+    with db.conn_cursor() as (_, cur):
+        cur.execute("INSERT INTO dbo.medicines (name) VALUES ('Amoxicillin') RETURNING id")
+        return cur.fetchone()[0]
+
+
+def test_stock_received_at_another_terminal_is_dispensed(db, user_id, medicine_id):
+    expires = date.today() + timedelta(days=90)
+    db.receive_batch(medicine_id, "B-1", expires, 5, user_id)
+    engine = PharmacyEngine()
+    engine.refresh_from_db()
+    db.receive_batch(medicine_id, "B-2", expires + timedelta(days=30), 10, user_id)  # another terminal
+    plans = engine.dispense([(medicine_id, 8)], user_id)
+    assert sum(qty for _, qty in plans[medicine_id]) == 8
+    assert engine.on_hand(medicine_id) == 7
+
+
+def test_a_real_shortfall_still_raises(db, user_id, medicine_id):
+    db.receive_batch(medicine_id, "B-1", date.today() + timedelta(days=90), 5, user_id)
+    engine = PharmacyEngine()
+    engine.refresh_from_db()
+    with pytest.raises(OutOfStockError):
+        engine.dispense([(medicine_id, 6)], user_id)
+    assert engine.on_hand(medicine_id) == 5
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+import pytest
+
+import DB
+
+
+@pytest.fixture
+def stats(db):
+    db.query_stats.reset()  # after the fixtures' own statements
+    yield db.query_stats
+    db.query_stats.enabled = True
+    db.query_stats.reset()
+
+
+def test_statements_acquire_and_transactions_are_recorded(db, user_id, stats):
+    db.insert_audit_logs([(user_id, "VIEW", "patients", 1, datetime(2026, 1, 5))])
+    snap = db.query_snapshot()
+    assert [s["function"] for s in snap["statements"]] == ["insert_audit_logs"]  # executemany
+    assert snap["acquire"]["count"] == 1 and snap["transaction"]["count"] == 1
+
+
+def test_disabled_records_nothing(db, user_id, stats):
+    stats.enabled = False
+    db.insert_audit_logs([(user_id, "VIEW", "patients", 1, datetime(2026, 1, 5))])
+    db.list_patients()
+    snap = db.query_snapshot()
+    assert snap["statements"] == []
+    assert snap["acquire"]["count"] == 0 and snap["transaction"]["count"] == 0
+
+
+def test_standin_driver_statements_are_recorded():
+    DB.use_standin_driver()
+    try:
+        DB.query_stats.reset()
+        assert DB.list_patients() == []
+        assert [s["function"] for s in DB.query_snapshot()["statements"]] == ["list_patients"]
+    finally:
+        DB.get_pool().close()
+        DB.query_stats.reset()
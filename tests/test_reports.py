@@ -0,0 +1,49 @@
+from datetime import date, datetime, timedelta
+
+import Reports
+from test_round_trips import PATIENT
+
+ROLLUPS = ("report_doctor_day", "report_specialization_day", "report_lab_day", "report_revenue_day",
+           "report_room_day")
+
+
+def rollups(db):
+    out = {}
+    with db.conn_cursor() as (_, cur):
+        for table in ROLLUPS:
+            cur.execute(f"SELECT * FROM dbo.{table}")
+            out[table] = sorted(tuple(r) for r in cur.fetchall())
+    return out
+
+
+def test_refresh_from_the_watermark_matches_a_full_rebuild(db, doctor_id):
+    patient_id = db.insert_patient(PATIENT)
+    today = datetime.combine(date.today(), datetime.min.time())
+    for days_ago in (40, 3, 0):
+        db.insert_appointment(patient_id, doctor_id, today - timedelta(days=days_ago, hours=-9), status="Completed")
+    db.refresh_report_rollups()
+    db.insert_appointment(patient_id, doctor_id, today - timedelta(days=200, hours=-11), status="Completed")
+    with db.conn_cursor() as (_, cur):  # a correction to an old day
+        cur.execute("UPDATE dbo.appointments SET status = 'No-Show' WHERE appointment_at < ?",
+                    (today - timedelta(days=30),))
+    db.bill_services(date.today() - timedelta(days=3), date.today() + timedelta(days=1))
+    assert db.refresh_report_rollups()["full"] is False
+    incremental = rollups(db)
+    assert db.refresh_report_rollups(full=True)["full"] is True
+    assert rollups(db) == incremental
+
+
+def test_dashboard_cache_follows_refreshes_by_other_desks(db, doctor_id):
+    patient_id = db.insert_patient(PATIENT)
+    start, end = date.today() - timedelta(days=7), date.today() + timedelta(days=1)
+    noon = datetime.combine(date.today(), datetime.min.time()) + timedelta(hours=12)
+    db.insert_appointment(patient_id, doctor_id, noon, status="Completed")
+    dashboard = Reports.Dashboard(max_age=3600)
+    first = dashboard.figures(start, end)
+    assert dashboard.figures(start, end) is first and dashboard.hits == 1
+
+    db.insert_appointment(patient_id, doctor_id, noon + timedelta(hours=1), status="Completed")
+    Reports.refresh()  # the cron (or another desk) consumes the logged day first
+    figures = dashboard.figures(start, end)
+    assert dashboard.misses == 2
+    assert sum(row[1] for row in figures["daily"]) == sum(row[1] for row in first["daily"]) + 1
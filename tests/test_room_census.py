@@ -0,0 +1,46 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from RoomCensus import OPEN, RoomCensusEngine, RoomIntervals, RoomOccupiedError
+from test_round_trips import PATIENT
+
+
+def test_intervals_answer_like_a_scan():
+    rnd = random.Random(3)
+    intervals, ranges, t = RoomIntervals(), [], 0
+    for aid in range(300):
+        t += rnd.randrange(1, 50)
+        end = t + rnd.randrange(1, 40)
+        ranges.append((aid, t, end))
+        t = end
+    rnd.shuffle(ranges)
+    for aid, start, end in ranges[:150]:
+        intervals.add(aid, start, end)
+    intervals.close(ranges[0][0], ranges[0][1] + 1)
+    kept = [(ranges[0][0], ranges[0][1], ranges[0][1] + 1), *ranges[1:150]]
+    for _ in range(2000):
+        start = rnd.randrange(t)
+        end = start + rnd.randrange(1, 60)
+        assert intervals.overlaps(start, end) == any(s < end and start < e for _, s, e in kept)
+        assert intervals.occupant_at(start) == next((a for a, s, e in kept if s <= start < e), None)
+    intervals.replace(ranges)
+    assert len(intervals) == 300 and intervals.end_of(ranges[0][0]) == ranges[0][2]
+
+
+def test_a_room_taken_elsewhere_is_reloaded(db):
+    patient_id = db.insert_patient(PATIENT)
+    with db.conn_cursor() as (_, cur):
+        cur.execute("INSERT INTO dbo.rooms (room_number, ward) VALUES ('R1', 'ICU') RETURNING id")
+        room_id = cur.fetchone()[0]
+    engine = RoomCensusEngine()
+    engine.refresh_from_db()
+    now = datetime.now()
+    other = db.insert_room_assignment(patient_id, room_id, now - timedelta(hours=1))  # another desk
+    with pytest.raises(RoomOccupiedError, match="just assigned elsewhere"):
+        engine.admit(patient_id, room_id, now, now + timedelta(days=1))
+    assert not engine.is_free(room_id, now + timedelta(days=2))
+    assert engine.census()["ICU"] == (1, 1)
+    assert engine.occupant(room_id)[0] == other
+    assert engine._room(room_id).end_of(other) == OPEN
@@ -0,0 +1,53 @@
+import threading
+from datetime import date, datetime
+
+import pytest
+
+PATIENT = {"FirstName": "Sara", "LastName": "Ahmadi", "NationalID": "0012345678",
+           "BirthDate": date(1990, 5, 1), "Gender": "F", "Phone": "09120000000", "Address": "Tehran"}
+
+
+def test_insert_patient_sqlite_takes_three_statements(db):
+    # parties, persons and patients: one statement each, in one transaction (SQL Server batches them into one)
+    with db.count_round_trips() as rt:
+        patient_id = db.insert_patient(PATIENT)
+    assert rt.count == 3
+    assert db.get_patient_by_id(patient_id)["NationalID"] == PATIENT["NationalID"]
+
+
+def test_update_patient_is_one_statement(db):
+    patient_id = db.insert_patient(PATIENT)
+    version = db.get_patient_by_id(patient_id)["RowVersion"]
+    with db.count_round_trips() as rt:
+        assert db.update_patient(patient_id, {**PATIENT, "Phone": "09121111111"}, version)
+    assert rt.count == 1
+    assert db.get_patient_by_id(patient_id)["Phone"] == "09121111111"
+
+
+def test_update_patient_with_stale_row_version_raises(db):
+    patient_id = db.insert_patient(PATIENT)
+    stale = db.get_patient_by_id(patient_id)["RowVersion"]
+    db.update_patient(patient_id, {**PATIENT, "Phone": "09121111111"}, stale)  # someone else saves first
+    with db.count_round_trips() as rt, pytest.raises(db.ConcurrencyError):
+        db.update_patient(patient_id, {**PATIENT, "Phone": "09122222222"}, stale)
+    assert rt.count == 1
+    assert db.get_patient_by_id(patient_id)["Phone"] == "09121111111"
+
+
+def test_update_patient_missing_without_row_version(db):
+    assert db.update_patient(999, PATIENT) is False
+
+
+def test_insert_appointment_is_one_statement(db, doctor_id):
+    patient_id = db.insert_patient(PATIENT)
+    with db.count_round_trips() as rt:
+        assert db.insert_appointment(patient_id, doctor_id, datetime(2026, 1, 5, 9, 30))
+    assert rt.count == 1
+
+
+def test_round_trips_are_counted_per_thread(db):
+    db.reset_round_trips()
+    other = threading.Thread(target=db.insert_patient, args=(PATIENT,))
+    other.start()
+    other.join()
+    assert db.round_trips() == 0